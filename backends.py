@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Backends de terminal para MT5 Smart Optimizer v2
+Cómo se lanza, vigila y cierra un terminal y dónde quedan sus rutas: Windows nativo, MT5 bajo
+Wine (un WINEPREFIX por slot) o el emulador local (mt5_emulator.py) para probar en Linux"""
+import getpass
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path, PureWindowsPath
+from typing import Any, Dict, List, Optional, Tuple
+
+from terminal_layout import TerminalLayout
+
+# psutil opcional para gestión de procesos
+try:
+    import psutil  # type: ignore
+except Exception:
+    psutil = None
+
+EMULATOR_SCRIPT = Path(__file__).resolve().parent / "mt5_emulator.py"
+
+Findings = List[Tuple[str, str]]  # (nivel "error"/"warning", mensaje), como en preflight.py
+
+
+# ----------------------- Procesos -----------------------
+def _no_window() -> int:
+    return getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if psutil:
+        return psutil.pid_exists(pid)
+    if os.name != "nt":
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+    try:
+        out = subprocess.check_output(["tasklist"], creationflags=_no_window()).decode("utf-8", errors="ignore")
+        return str(pid) in out
+    except Exception:
+        return False
+
+def stop_process_tree(pid: int, timeout: int = 60) -> bool:
+    """Cierra pid y sus hijos (agentes del Tester, wineserver...): terminate, espera y kill"""
+    if pid <= 0 or not pid_alive(pid):
+        return True
+    try:
+        if psutil:
+            try:
+                root = psutil.Process(pid)
+                procs = root.children(recursive=True) + [root]
+            except psutil.Error:
+                return not pid_alive(pid)
+            for p in procs:
+                try:
+                    p.terminate()
+                except psutil.Error:
+                    pass
+            _gone, alive = psutil.wait_procs(procs, timeout=timeout)
+            for p in alive:
+                try:
+                    p.kill()
+                except psutil.Error:
+                    pass
+            psutil.wait_procs(alive, timeout=10)
+            return not pid_alive(pid)
+        if os.name == "nt":
+            try:
+                subprocess.call(["taskkill", "/T", "/PID", str(pid)], creationflags=_no_window())
+                time.sleep(1.5)
+            except Exception:
+                pass
+            if pid_alive(pid):
+                try:
+                    subprocess.call(["taskkill", "/F", "/T", "/PID", str(pid)], creationflags=_no_window())
+                    time.sleep(1.0)
+                except Exception:
+                    pass
+            return not pid_alive(pid)
+        try:
+            os.killpg(os.getpgid(pid), signal.SIGTERM)
+        except OSError:
+            pass
+        deadline = time.time() + timeout
+        while pid_alive(pid) and time.time() < deadline:
+            time.sleep(0.2)
+        if pid_alive(pid):
+            try:
+                os.killpg(os.getpgid(pid), signal.SIGKILL)
+            except OSError:
+                pass
+            time.sleep(0.5)
+        return not pid_alive(pid)
+    except Exception:
+        return False
+
+
+# ----------------------- Backends -----------------------
+class TerminalBackend:
+    """
+    Interfaz común: rutas (layout y raíz de artefactos por slot), comando de lanzamiento,
+    vivo/cerrar por PID y checks para preflight. `mt5` es el bloque mt5 del config.
+    """
+
+    name = "base"
+    # False si no hace falta un terminal64.exe ni la carpeta del HASH (emulador)
+    needs_terminal = True
+
+    def __init__(self, mt5: Any, options: Optional[Dict[str, Any]] = None):
+        self.mt5 = mt5
+        self.options = dict(options or {})
+
+    def appdata(self, slot: Optional[int] = None) -> Path:
+        if self.mt5.appdata:
+            return Path(str(self.mt5.appdata).format(slot=slot or 0))
+        return Path(os.environ.get("APPDATA", str(Path.home() / "AppData" / "Roaming")))
+
+    def slot_dir(self, slot: Optional[int] = None) -> Optional[Path]:
+        """Instalación portable del slot (mt5.slot_root/slot_NN, como las deja provision.py); None sin slot_root"""
+        root = getattr(self.mt5, "slot_root", None)
+        if not root:
+            return None
+        return Path(os.path.expanduser(str(root))) / f"slot_{slot or 0:02d}"
+
+    def layout(self, slot: Optional[int] = None) -> TerminalLayout:
+        reports = Path(self.mt5.reports_dir) if self.mt5.reports_dir else Path.home() / "runs" / "reports"
+        ini_dir = Path(self.mt5.ini_dir) if self.mt5.ini_dir else Path.home()
+        return TerminalLayout(self.mt5.terminal_hash, self.appdata(slot), reports, ini_dir, self.slot_dir(slot))
+
+    def terminal_path(self, p: Path) -> str:
+        """Ruta tal y como la ve el terminal (para el .ini y /config:)"""
+        return str(p)
+
+    def command(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> List[str]:
+        install = self.slot_dir(slot)
+        if install is None:
+            return [exe_path, f"/config:{self.terminal_path(ini_path)}", "/test", "/skipupdate"]
+        # Terminal portable del slot: su propio exe y sus datos en <slot>/MQL5
+        exe = install / Path(exe_path.replace("\\", "/")).name
+        return [str(exe), f"/config:{self.terminal_path(ini_path)}", "/test", "/skipupdate", "/portable"]
+
+    def launch(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> subprocess.Popen:
+        raise NotImplementedError
+
+    def alive(self, pid: int) -> bool:
+        return pid_alive(pid)
+
+    def stop(self, pid: int, timeout: int = 60) -> bool:
+        return stop_process_tree(pid, timeout)
+
+    def check(self) -> Findings:
+        return []
+
+
+class WindowsBackend(TerminalBackend):
+    """terminal64.exe nativo: %APPDATA% y proceso sin ventana en su propio grupo"""
+
+    name = "windows"
+
+    def launch(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> subprocess.Popen:
+        creation = _no_window()
+        if hasattr(subprocess, "CREATE_NEW_PROCESS_GROUP"):
+            creation |= subprocess.CREATE_NEW_PROCESS_GROUP
+        return subprocess.Popen(self.command(exe_path, ini_path, slot), creationflags=creation)
+
+
+class WineBackend(TerminalBackend):
+    """
+    MT5 bajo Wine. options: prefix (admite {slot}: un WINEPREFIX por slot, así cerrar un
+    terminal con wineserver -k no toca a los demás), wine (binario) y user (usuario del prefix).
+    """
+
+    name = "wine"
+
+    def __init__(self, mt5: Any, options: Optional[Dict[str, Any]] = None):
+        super().__init__(mt5, options)
+        self._slots: Dict[int, Optional[int]] = {}  # pid -> slot del que se lanzó
+
+    def prefix(self, slot: Optional[int] = None) -> Path:
+        raw = str(self.options.get("prefix") or os.environ.get("WINEPREFIX") or "~/.wine")
+        return Path(os.path.expanduser(raw.format(slot=slot or 0)))
+
+    @property
+    def per_slot(self) -> bool:
+        return "{slot}" in str(self.options.get("prefix") or "")
+
+    def appdata(self, slot: Optional[int] = None) -> Path:
+        if self.mt5.appdata:
+            return super().appdata(slot)
+        user = self.options.get("user") or os.environ.get("USER") or getpass.getuser()
+        return self.prefix(slot) / "drive_c" / "users" / user / "AppData" / "Roaming"
+
+    def terminal_path(self, p: Path) -> str:
+        p = Path(p).absolute()
+        # Dentro de cualquier prefix -> C:\...; fuera -> la unidad Z: que Wine mapea a /
+        for parent in p.parents:
+            if parent.name == "drive_c":
+                return str(PureWindowsPath("C:\\", *p.relative_to(parent).parts))
+        return "Z:" + str(p).replace("/", "\\")
+
+    def env(self, slot: Optional[int] = None) -> Dict[str, str]:
+        env = dict(os.environ)
+        env["WINEPREFIX"] = str(self.prefix(slot))
+        env.setdefault("WINEDEBUG", "-all")
+        return env
+
+    def command(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> List[str]:
+        return [str(self.options.get("wine", "wine"))] + super().command(exe_path, ini_path, slot)
+
+    def launch(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> subprocess.Popen:
+        proc = subprocess.Popen(self.command(exe_path, ini_path, slot), env=self.env(slot), start_new_session=True)
+        self._slots[proc.pid] = slot
+        return proc
+
+    def stop(self, pid: int, timeout: int = 60) -> bool:
+        slot = self._slots.pop(pid, None)
+        if stop_process_tree(pid, timeout):
+            return True
+        # Sólo con prefix por slot es seguro matar el wineserver entero
+        if self.per_slot and slot is not None:
+            subprocess.call([str(self.options.get("wineserver", "wineserver")), "-k"], env=self.env(slot))
+        return not pid_alive(pid)
+
+    def check(self) -> Findings:
+        out: Findings = []
+        wine = str(self.options.get("wine", "wine"))
+        if not shutil.which(wine):
+            out.append(("error", f"binario de Wine no encontrado: {wine}"))
+        if not self.prefix(0).is_dir():
+            out.append(("error", f"WINEPREFIX inexistente: {self.prefix(0)} (créalo o provisiónalo por slot)"))
+        return out
+
+
+class EmulatorBackend(TerminalBackend):
+    """Emulador local (mt5_emulator.py): mismo .ini/.set y mismos artefactos, sin MT5"""
+
+    name = "emulator"
+    needs_terminal = False
+
+    def command(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> List[str]:
+        layout = self.layout(slot)
+        return [sys.executable, str(EMULATOR_SCRIPT), f"/config:{ini_path}", "/test", "/skipupdate",
+                "--profiles", str(layout.profiles_tester_dir), "--common-files", str(layout.common_mt5_so_dir.parent),
+                "--delay", str(float(self.options.get("delay", 0.0)))] + (
+                ["--fatal", str(self.options["fatal"])] if self.options.get("fatal") else [])
+
+    def launch(self, exe_path: str, ini_path: Path, slot: Optional[int] = None) -> subprocess.Popen:
+        return subprocess.Popen(self.command(exe_path, ini_path, slot), start_new_session=os.name != "nt")
+
+    def check(self) -> Findings:
+        if not EMULATOR_SCRIPT.is_file():
+            return [("error", f"emulador no encontrado: {EMULATOR_SCRIPT}")]
+        return []
+
+
+BACKENDS = {"windows": WindowsBackend, "wine": WineBackend, "emulator": EmulatorBackend}
+
+def make_backend(mt5: Any) -> TerminalBackend:
+    kind = str(getattr(mt5, "backend", None) or "windows").strip().lower()
+    cls = BACKENDS.get(kind)
+    if cls is None:
+        raise RuntimeError(f"Backend desconocido en mt5.backend: '{kind}'. Disponibles: {sorted(BACKENDS)}")
+    return cls(mt5, getattr(mt5, "backend_options", None))
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""batch_eval.py - Evaluación por lotes de combinaciones de parámetros para MT5 Smart Optimizer v2
+evaluate_many() lanza una lista de candidatos (p.ej. el top 50 de un study sobre un rango nuevo)
+con la misma maquinaria que run_single, con N terminales a la vez, y devuelve cada resultado
+en cuanto termina junto con las métricas de su report.json"""
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import optimizer_v2 as opt
+from early_abort import TrialAborted
+from journal_tail import JournalFatal
+from error_handler import ErrorHandler
+from logger import OptimizerLogger
+from optimizer_v2 import Config, SlotPool, TrialContext, trial_context
+from warm_start import load_prior_trials
+
+# Claves de overrides que van al bloque test (el resto son inputs del EA)
+TEST_KEYS = {"from": "from_", "from_": "from_", "to": "to", "symbol": "symbol", "timeframe": "timeframe",
+             "model": "model", "deposit": "deposit", "leverage": "leverage"}
+# Columnas de un CSV de candidatos que no son parámetros
+META_COLUMNS = {"number", "trial", "value", "state", "run_id", "from", "to", "seconds"}
+
+
+@dataclass
+class EvalResult:
+    index: int
+    params: Dict[str, Any]
+    phase: str  # complete / timeout / aborted / failed
+    value: Optional[float] = None  # final_balance - deposit, como el objetivo del study
+    final_balance: Optional[float] = None
+    run_id: Optional[str] = None
+    run_dir: Optional[str] = None
+    seconds: float = 0.0
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.phase == "complete"
+
+
+# ----------------------- Config y métricas -----------------------
+def apply_overrides(cfg: Config, overrides: Optional[Dict[str, Any]]) -> Tuple[Config, Dict[str, Any]]:
+    """(cfg con el bloque test ajustado, inputs comunes a todos los candidatos)"""
+    test_kw: Dict[str, Any] = {}
+    common: Dict[str, Any] = {}
+    for k, v in (overrides or {}).items():
+        if k in TEST_KEYS:
+            test_kw[TEST_KEYS[k]] = v
+        else:
+            common[k] = v
+    for k in ("model", "deposit", "leverage"):
+        if k in test_kw:
+            test_kw[k] = int(test_kw[k])
+    return (replace(cfg, test=replace(cfg.test, **test_kw)) if test_kw else cfg), common
+
+def read_metrics(run_dir: Optional[Path]) -> Dict[str, Any]:
+    """Métricas escalares de report.json (sin inputs ni bloques anidados); {} si no hay"""
+    if run_dir is None:
+        return {}
+    try:
+        data = json.loads((Path(run_dir) / "report.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {k: v for k, v in data.items() if isinstance(v, (int, float, str)) and not isinstance(v, bool)}
+
+
+# ----------------------- Evaluación -----------------------
+def _evaluate_one(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, index: int,
+                  params: Dict[str, Any], log: OptimizerLogger, slots: SlotPool, errors: ErrorHandler) -> EvalResult:
+    res = EvalResult(index=index, params=params, phase="failed")
+    with slots.acquire() as slot, trial_context(TrialContext(trial=index, slot=slot, sink=log.event)) as ctx:
+        t0 = time.time()
+        run_dir = None
+        try:
+            ok, fb, rid, run_dir = opt.run_single(cfg, exe_path, guard_sec, auto_close, base_overrides=params)
+            res.run_id = rid
+            if ok and fb is not None:
+                res.phase = "complete"
+                res.final_balance = float(fb)
+                res.value = float(fb) - float(cfg.test.deposit)
+        except JournalFatal as e:
+            res.phase = "fatal"
+            res.error = e.reason
+            res.metrics = {"error_class": e.kind, "journal": e.lines}
+        except TrialAborted as e:
+            res.phase = "aborted"
+            res.error = e.reason
+            res.metrics = dict(e.metrics or {})
+        except (TimeoutError, RuntimeError, OSError) as e:
+            # Un candidato roto no corta el lote: queda registrado y se sigue con el resto
+            res.phase = "timeout" if isinstance(e, TimeoutError) else "failed"
+            res.error = f"{type(e).__name__}: {e}"
+            errors.handle(e, {"trial": index, "run_id": ctx.run_id, "slot": slot})
+        res.run_id = res.run_id or ctx.run_id
+        res.seconds = round(time.time() - t0, 3)
+        if run_dir is not None:
+            res.run_dir = str(run_dir)
+            res.metrics = read_metrics(run_dir)
+        log.log_trial(index, params, res.value, run_id=res.run_id, slot=slot, phase=res.phase,
+                      seconds=res.seconds, batch=True)
+    return res
+
+def evaluate_many(cfg: Config, candidates: Iterable[Dict[str, Any]], overrides: Optional[Dict[str, Any]] = None,
+                  exe_path: Optional[str] = None, guard_sec: int = 300, auto_close: bool = True,
+                  n_jobs: int = 1, log_dir: str = "logs") -> Iterator[EvalResult]:
+    """
+    Evalúa cada combinación de `candidates` con como mucho `n_jobs` terminales a la vez y
+    produce un EvalResult por candidato en orden de finalización (index = posición de entrada).
+    overrides: test.from/to/symbol/timeframe/model/deposit/leverage se aplican al config; el
+    resto son inputs comunes que pisan los de cada candidato. Si se deja de iterar, los runs en
+    vuelo terminan (sus terminales se cierran) pero no se lanzan más.
+    """
+    run_cfg, common = apply_overrides(cfg, overrides)
+    exe = exe_path or run_cfg.mt5.terminal_path
+    n_jobs = max(1, int(n_jobs))
+    log = OptimizerLogger(log_dir=log_dir, async_mode=True)
+    log.log_optimization_start({
+        "test": {"symbol": run_cfg.test.symbol, "timeframe": run_cfg.test.timeframe,
+                 "from": run_cfg.test.from_, "to": run_cfg.test.to},
+        "optimizer": {"n_trials": None, "mode": "batch"},
+    })
+    slots = SlotPool(n_jobs)
+    errors = ErrorHandler(log)
+    pool = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="batch")
+    pending: Dict[Any, int] = {}
+    try:
+        for index, params in enumerate(candidates):
+            while len(pending) >= n_jobs:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pending.pop(fut)
+                    yield fut.result()
+            merged = dict(params, **common)
+            fut = pool.submit(_evaluate_one, run_cfg, exe, guard_sec, auto_close, index, merged, log, slots, errors)
+            pending[fut] = index
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.pop(fut)
+                yield fut.result()
+    finally:
+        pool.shutdown(wait=True)
+        log.close()
+
+
+# ----------------------- Candidatos -----------------------
+def _coerce(s: str) -> Any:
+    s = s.strip()
+    for cast in (int, float):
+        try:
+            return cast(s)
+        except ValueError:
+            pass
+    return s
+
+def _load_csv(path: Path) -> List[Tuple[Dict[str, Any], Optional[float]]]:
+    """Una fila por candidato; admite columnas params_<x> (trials_dataframe de Optuna) o planas"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    out = []
+    for row in rows:
+        prefixed = {k[len("params_"):]: v for k, v in row.items() if k and k.startswith("params_")}
+        raw = prefixed or {k: v for k, v in row.items() if k and k not in META_COLUMNS}
+        params = {k: _coerce(v) for k, v in raw.items() if v not in (None, "")}
+        value = row.get("value")
+        out.append((params, float(value) if value not in (None, "") else None))
+    return out
+
+def load_candidates(path: str, top: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    CSV de parámetros, o cualquier fuente de --warm-start-from (results.json, JSONL de trials,
+    carpeta de runs). Con top=N se quedan los N de mayor valor (los que no tienen valor, al final).
+    """
+    p = Path(path)
+    if not p.exists():
+        raise RuntimeError(f"Archivo de candidatos inexistente: {path}")
+    if p.suffix.lower() == ".csv":
+        rows = _load_csv(p)
+    else:
+        rows = [(t.params, t.value) for t in load_prior_trials([path])]
+    if top:
+        rows = sorted(rows, key=lambda r: float("-inf") if r[1] is None else r[1], reverse=True)[:top]
+    if not rows:
+        raise RuntimeError(f"Sin candidatos en {path}")
+    return [params for params, _value in rows]
+
+
+# ----------------------- CLI -----------------------
+def _parse_set(items: List[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for item in items:
+        if "=" not in item:
+            raise RuntimeError(f"--set espera clave=valor: {item}")
+        k, v = item.split("=", 1)
+        out[k.strip()] = _coerce(v)
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Evalúa una lista de combinaciones de parámetros en paralelo.")
+    ap.add_argument("-c", "--config", required=True, help="Ruta a JSON/YAML.")
+    ap.add_argument("--candidates", required=True, help="CSV de parámetros, results.json, JSONL de trials o carpeta de runs.")
+    ap.add_argument("--top", type=int, default=None, help="Sólo los N candidatos de mayor valor.")
+    ap.add_argument("--from", dest="date_from", help="Override de test.from (p.ej. rango fuera de muestra).")
+    ap.add_argument("--to", dest="date_to", help="Override de test.to.")
+    ap.add_argument("--set", dest="sets", action="append", default=[], help="Override clave=valor (repetible).")
+    ap.add_argument("--exe", help="Override del terminal64.exe")
+    ap.add_argument("--n-jobs", dest="n_jobs", type=int, default=1, help="Terminales simultáneos.")
+    ap.add_argument("--guard-sec", type=int, default=300, help="Tiempo máx de espera por artefactos por run.")
+    ap.add_argument("--auto-close", action="store_true", help="Cierra MT5 por PID al terminar cada run.")
+    ap.add_argument("--log-dir", default="logs", help="Directorio de logs.")
+    ap.add_argument("--out", help="JSONL de resultados (por defecto <log-dir>/batch_results.jsonl).")
+    args = ap.parse_args()
+
+    cfg = opt.load_config(args.config)
+    overrides = _parse_set(args.sets)
+    if args.date_from:
+        overrides["from"] = args.date_from
+    if args.date_to:
+        overrides["to"] = args.date_to
+    candidates = load_candidates(args.candidates, args.top)
+    out = Path(args.out or Path(args.log_dir) / "batch_results.jsonl")
+    opt.ensure_dir(out.parent)
+    print(f"INFO Evaluando {len(candidates)} candidatos con {max(1, args.n_jobs)} terminales -> {out}")
+
+    results: List[EvalResult] = []
+    with open(out, "w", encoding="utf-8") as f:
+        for res in evaluate_many(cfg, candidates, overrides, args.exe, args.guard_sec, args.auto_close,
+                                 args.n_jobs, args.log_dir):
+            results.append(res)
+            f.write(json.dumps(asdict(res), default=str) + "\n")
+            f.flush()
+            print(f"INFO [{len(results)}/{len(candidates)}] #{res.index} {res.phase} value={res.value} "
+                  f"dd={res.metrics.get('max_dd_rel_pct')} pf={res.metrics.get('profit_factor')} ({res.seconds} s)")
+
+    print("\n=== BATCH ===")
+    ranked = sorted(results, key=lambda r: float("-inf") if r.value is None else r.value, reverse=True)
+    for r in ranked:
+        print(f"#{r.index}: {r.phase} value={r.value} trades={r.metrics.get('total_trades')} params={r.params}")
+    sys.exit(0 if any(r.ok for r in results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Restricciones declarativas sobre los parámetros para MT5 Smart Optimizer v2
+search.constraints son expresiones Python acotadas (comparaciones, aritmética, and/or/not, in,
+abs/min/max/round) sobre los inputs del trial. Se compilan una vez y se evalúan antes de lanzar
+MT5: un punto que las viola no cuesta un backtest y el sampler lo ve como no factible."""
+import ast
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FUNCTIONS = {"abs": abs, "min": min, "max": max, "round": round}
+MODES = ("prune", "resample")
+# Con mode=resample: rechazos seguidos tras los que se para el study (restricciones imposibles)
+MAX_CONSECUTIVE_REJECTIONS = 500
+
+_ALLOWED = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.IfExp, ast.Call, ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List,
+)
+
+
+class Constraint:
+    """Una expresión compilada; `names` son los inputs que usa"""
+
+    def __init__(self, name: str, expr: str):
+        self.name = str(name)
+        self.expr = str(expr).strip()
+        try:
+            tree = ast.parse(self.expr, mode="eval")
+        except SyntaxError as e:
+            raise RuntimeError(f"Restricción '{self.name}' mal escrita: {self.expr} ({e.msg})") from e
+        self.names = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED):
+                raise RuntimeError(f"Restricción '{self.name}': '{type(node).__name__}' no está permitido en {self.expr}")
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords):
+                raise RuntimeError(f"Restricción '{self.name}': sólo se admiten {sorted(FUNCTIONS)} en {self.expr}")
+            if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+                self.names.add(node.id)
+        self._code = compile(tree, f"<constraint {self.name}>", "eval")
+        # a <op> b simple: la violación se mide como |a - b| (el sampler ve cuánto falta)
+        body = tree.body
+        self._sides = None
+        if isinstance(body, ast.Compare) and len(body.ops) == 1 and isinstance(body.ops[0], (ast.Lt, ast.LtE, ast.Gt, ast.GtE)):
+            self._sides = tuple(compile(ast.Expression(body=side), f"<constraint {self.name}>", "eval")
+                                for side in (body.left, body.comparators[0]))
+
+    def _eval(self, code: Any, env: Dict[str, Any]) -> Any:
+        return eval(code, {"__builtins__": {}}, dict(FUNCTIONS, **env))
+
+    def holds(self, env: Dict[str, Any]) -> bool:
+        return bool(self._eval(self._code, env))
+
+    def margin(self, env: Dict[str, Any]) -> float:
+        """0 si se cumple; > 0 si no (la distancia en comparaciones numéricas simples)"""
+        try:
+            if self.holds(env):
+                return 0.0
+            if self._sides is not None:
+                a, b = (float(self._eval(code, env)) for code in self._sides)
+                return max(abs(a - b), 1e-6)
+        except Exception:
+            pass
+        return 1.0
+
+
+class ConstraintSet:
+    """
+    Restricciones de un study sobre los params del trial completados con los inputs fijos del EA.
+    Cuenta los puntos comprobados y rechazados y los lanzamientos (y segundos previstos) ahorrados.
+    """
+
+    def __init__(self, constraints: List[Constraint], base: Optional[Dict[str, Any]] = None, mode: str = "prune"):
+        if mode not in MODES:
+            raise RuntimeError(f"search.constraints_mode no soportado: {mode} (usa {', '.join(MODES)})")
+        self.constraints = constraints
+        self.base = dict(base or {})
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.by_constraint: Dict[str, int] = {c.name: 0 for c in constraints}
+        self.saved_seconds = 0.0
+        self.unknown_cost = 0
+        self.consecutive = 0
+        self.errors: Dict[str, str] = {}
+
+    @classmethod
+    def build(cls, spec: Any, known: Sequence[str], base: Optional[Dict[str, Any]] = None,
+              mode: str = "prune") -> Optional["ConstraintSet"]:
+        """search.constraints (lista de expresiones o {nombre: expresión}); None si no hay ninguna"""
+        if not spec:
+            return None
+        if isinstance(spec, str):
+            spec = [spec]
+        if isinstance(spec, dict):
+            items: List[Tuple[str, str]] = [(k, v) for k, v in spec.items() if not str(k).startswith("_")]
+        elif isinstance(spec, (list, tuple)):
+            items = [(str(e), e) for e in spec]
+        else:
+            raise RuntimeError(f"search.constraints debe ser una lista o un objeto, no {type(spec).__name__}")
+        constraints = [Constraint(name, expr) for name, expr in items]
+        known_set = set(known) | set(base or {})
+        for c in constraints:
+            unknown = sorted(c.names - known_set)
+            if unknown:
+                raise RuntimeError(f"Restricción '{c.name}' usa nombres desconocidos {unknown} "
+                                   f"(ni en search.space ni en ea.inputs)")
+        return cls(constraints, base, mode)
+
+    def env(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(self.base, **params)
+
+    def violations(self, params: Dict[str, Any]) -> List[str]:
+        """Nombres de las restricciones que el punto incumple (cuenta en el informe)"""
+        env = self.env(params)
+        bad = []
+        for c in self.constraints:
+            try:
+                ok = c.holds(env)
+            except Exception as e:
+                # Un error al evaluar (tipos, división por cero) cuenta como incumplida
+                ok = False
+                with self._lock:
+                    if c.name not in self.errors:
+                        self.errors[c.name] = f"{type(e).__name__}: {e}"
+                        print(f"WARNING Restricción '{c.name}' no evaluable con {params}: {e}")
+            if not ok:
+                bad.append(c.name)
+        with self._lock:
+            self.checked += 1
+            if bad:
+                self.rejected += 1
+                self.consecutive += 1
+                for name in bad:
+                    self.by_constraint[name] += 1
+            else:
+                self.consecutive = 0
+        return bad
+
+    def margins(self, params: Dict[str, Any]) -> List[float]:
+        """Valores para constraints_func de Optuna (<= 0 factible); no cuenta en el informe"""
+        env = self.env(params)
+        return [c.margin(env) for c in self.constraints]
+
+    def record_saved(self, predicted_seconds: Optional[float]) -> None:
+        with self._lock:
+            if predicted_seconds is None:
+                self.unknown_cost += 1
+            else:
+                self.saved_seconds += float(predicted_seconds)
+
+    def exhausted(self) -> bool:
+        return self.consecutive >= MAX_CONSECUTIVE_REJECTIONS
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "constraints": {c.name: c.expr for c in self.constraints},
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "saved_launches": self.rejected,
+                "saved_seconds": round(self.saved_seconds, 1),
+                "saved_unknown_cost": self.unknown_cost,
+                "by_constraint": dict(self.by_constraint),
+                "errors": dict(self.errors),
+            }
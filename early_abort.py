@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Aborto temprano de trials para MT5 Smart Optimizer v2
+Lee incrementalmente el progress.jsonl que escribe so_report.mqh y evalúa reglas de aborto"""
+import json
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class TrialAborted(RuntimeError):
+    """El trial se abortó en vuelo por una regla; lleva las métricas parciales"""
+
+    def __init__(self, reason: str, metrics: Optional[Dict[str, Any]] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.metrics = dict(metrics or {})
+
+
+@dataclass
+class AbortRules:
+    """Reglas de aborto (None = regla desactivada)"""
+    max_dd_pct: Optional[float] = None
+    zero_trades_after_pct: Optional[float] = None
+    equity_floor: Optional[float] = None
+    progress_every_sec: int = 5
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> Optional["AbortRules"]:
+        if not d:
+            return None
+
+        def num(key: str) -> Optional[float]:
+            v = d.get(key)
+            return float(v) if v is not None else None
+
+        return cls(
+            max_dd_pct=num("max_dd_pct"),
+            zero_trades_after_pct=num("zero_trades_after_pct"),
+            equity_floor=num("equity_floor"),
+            progress_every_sec=int(d.get("progress_every_sec", 5)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None for v in (self.max_dd_pct, self.zero_trades_after_pct, self.equity_floor))
+
+
+class ProgressTail:
+    """Lector incremental de un JSONL que otro proceso va anexando"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._offset = 0
+        self._partial = b""
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Devuelve los registros completos nuevos desde la última llamada"""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+        except OSError:
+            return []
+        if not chunk:
+            return []
+        self._offset += len(chunk)
+        data = self._partial + chunk
+        lines = data.split(b"\n")
+        self._partial = lines.pop()  # línea incompleta (o b"")
+        out = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line.decode("utf-8", errors="ignore"))
+            except ValueError:
+                continue
+            if isinstance(rec, dict):
+                out.append(rec)
+        return out
+
+
+def _parse_mt5_time(s: Any) -> Optional[datetime]:
+    m = re.match(r"^(\d{4})[.\-/](\d{2})[.\-/](\d{2})(?:\s+(\d{2}):(\d{2}))?", str(s or "").strip())
+    if not m:
+        return None
+    y, mo, d, hh, mm = m.groups()
+    return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0))
+
+
+class AbortMonitor:
+    """Sigue la curva de equity de un run y decide si alguna regla se disparó"""
+
+    def __init__(self, rules: AbortRules, deposit: float, start: str, end: str):
+        self.rules = rules
+        self.deposit = float(deposit)
+        self.start = _parse_mt5_time(start)
+        self.end = _parse_mt5_time(end)
+        self.peak = float(deposit)
+        self.max_dd_pct = 0.0
+        self.last: Dict[str, Any] = {}
+        self.points = 0
+
+    def _pct_of_range(self, when: Optional[datetime]) -> Optional[float]:
+        if when is None or self.start is None or self.end is None or self.end <= self.start:
+            return None
+        span = (self.end - self.start).total_seconds()
+        return max(0.0, min(100.0, (when - self.start).total_seconds() / span * 100.0))
+
+    def update(self, records: List[Dict[str, Any]]) -> Optional[str]:
+        """Procesa registros nuevos; devuelve el motivo si hay que abortar"""
+        for rec in records:
+            try:
+                equity = float(rec.get("equity"))
+            except (TypeError, ValueError):
+                continue
+            self.points += 1
+            self.last = rec
+            self.peak = max(self.peak, equity)
+            dd = (self.peak - equity) / self.peak * 100.0 if self.peak > 0 else 0.0
+            self.max_dd_pct = max(self.max_dd_pct, dd)
+            pct = self._pct_of_range(_parse_mt5_time(rec.get("time")))
+            trades = int(rec.get("trades", 0) or 0)
+
+            r = self.rules
+            if r.max_dd_pct is not None and dd >= r.max_dd_pct:
+                return f"drawdown {dd:.1f}% >= {r.max_dd_pct}%"
+            if r.equity_floor is not None and equity <= r.equity_floor:
+                return f"equity {equity:.2f} <= piso {r.equity_floor}"
+            if r.zero_trades_after_pct is not None and pct is not None and trades == 0 and pct >= r.zero_trades_after_pct:
+                return f"0 trades tras {pct:.0f}% del rango"
+        return None
+
+    def partial_metrics(self) -> Dict[str, Any]:
+        last = self.last
+        return {
+            "equity": last.get("equity"),
+            "balance": last.get("balance"),
+            "trades": last.get("trades"),
+            "time": last.get("time"),
+            "max_dd_pct": round(self.max_dd_pct, 2),
+            "pct_of_range": self._pct_of_range(_parse_mt5_time(last.get("time"))),
+            "points": self.points,
+        }
+
+
+def make_abort_check(rules: Optional[AbortRules], progress_path: Path, deposit: float, start: str, end: str):
+    """Callable para el bucle de espera: lanza TrialAborted cuando una regla se dispara"""
+    if rules is None or not rules.enabled:
+        return None
+    tail = ProgressTail(progress_path)
+    monitor = AbortMonitor(rules, deposit, start, end)
+
+    def check() -> None:
+        reason = monitor.update(tail.poll())
+        if reason:
+            metrics = monitor.partial_metrics()
+            metrics["aborted_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            raise TrialAborted(reason, metrics)
+    return check
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """Manejo de errores personalizado para MT5 Smart Optimizer v2
 Provee excepciones personalizadas y handlers para diferentes tipos de errores"""
+import re
 import sys
+import time
 import traceback
+from collections import deque
 from typing import Optional, Callable, Any
 from functools import wraps
 
@@ -34,13 +37,48 @@ class FileError(OptimizerError):
 
 # Handler de errores
 
+def error_fingerprint(error: Exception) -> str:
+    """Huella estable de un error: tipo + mensaje sin números + frame de origen"""
+    message = re.sub(r"0x[0-9a-fA-F]+|\d+", "#", str(error))[:200]
+    origin = ""
+    tb = error.__traceback__
+    if tb is not None:
+        frames = traceback.extract_tb(tb)
+        if frames:
+            last = frames[-1]
+            origin = f"{last.filename}:{last.lineno}"
+    return f"{type(error).__name__}|{message}|{origin}"
+
 class ErrorHandler:
-    """Manejador centralizado de errores"""
+    """Manejador centralizado de errores
+    
+    Memoria acotada: error_history es un buffer circular de los últimos
+    max_history errores y error_groups agrega los conteos por huella.
+    """
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, max_history: int = 100, max_groups: int = 1000):
         self.logger = logger
         self.error_count = 0
-        self.error_history = []
+        self.error_history = deque(maxlen=max_history)
+        self.error_groups = {}
+        self.max_groups = max_groups
+    
+    def _aggregate(self, fingerprint: str, error_info: dict) -> None:
+        group = self.error_groups.get(fingerprint)
+        if group is None:
+            if len(self.error_groups) >= self.max_groups:
+                fingerprint = "__other__"
+                group = self.error_groups.get(fingerprint)
+            if group is None:
+                group = {
+                    'type': error_info['type'],
+                    'message': error_info['message'],
+                    'count': 0,
+                    'first_seen': time.time(),
+                }
+                self.error_groups[fingerprint] = group
+        group['count'] += 1
+        group['last_seen'] = time.time()
     
     def handle(self, error: Exception, context: Optional[dict] = None) -> None:
         """Maneja un error y registra información"""
@@ -52,6 +90,7 @@ class ErrorHandler:
             'traceback': traceback.format_exc()
         }
         self.error_history.append(error_info)
+        self._aggregate(error_fingerprint(error), error_info)
         
         if self.logger:
             self.logger.error(
@@ -71,8 +110,12 @@ class ErrorHandler:
         """Retorna resumen de errores"""
         return {
             'total_errors': self.error_count,
-            'error_types': list(set(e['type'] for e in self.error_history)),
-            'recent_errors': self.error_history[-5:] if self.error_history else []
+            'error_types': list(set(g['type'] for g in self.error_groups.values())),
+            'recent_errors': list(self.error_history)[-5:],
+            'error_groups': sorted(
+                ({'fingerprint': k, **v} for k, v in self.error_groups.items()),
+                key=lambda g: g['count'], reverse=True
+            )
         }
 
 # Decorador para manejo de errores
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Reparto determinista de un grid entre máquinas para MT5 Smart Optimizer v2
+Sin coordinador: cada host enumera el grid en el mismo orden estable (tras cuantizar), ejecuta
+sólo los puntos de su shard (--grid-shard i/N) y anexa los resultados a su fichero en una carpeta
+compartida. `python grid_shards.py merge <carpeta>` los combina en un único ranking."""
+import argparse
+import hashlib
+import itertools
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+SHARD_GLOB = "shard_*_of_*.jsonl"
+# Fases que cierran un punto: completo, o rechazado por search.constraints sin lanzar MT5
+FINAL_PHASES = ("complete", "rejected")
+
+
+# ----------------------- Enumeración estable -----------------------
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' con 1 <= i <= N"""
+    try:
+        i, n = (int(x) for x in str(spec).split("/", 1))
+    except ValueError:
+        raise RuntimeError(f"--grid-shard espera i/N (p.ej. 2/4): {spec}")
+    if n < 1 or not 1 <= i <= n:
+        raise RuntimeError(f"--grid-shard fuera de rango: {spec} (1 <= i <= N)")
+    return i, n
+
+def point_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=str)
+
+def enumerate_grid(grid: Dict[str, List[Any]], limit: Optional[int] = None,
+                   quantize: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    (índice global, params) en orden independiente del orden de claves del config: claves
+    ordenadas, valores en su orden. Tras cuantizar, los puntos repetidos se cuentan una vez.
+    """
+    keys = sorted(grid)
+    seen: Set[str] = set()
+    index = 0
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        if limit is not None and index >= limit:
+            return
+        params = dict(zip(keys, combo))
+        if quantize is not None:
+            params = quantize(params)
+        key = point_key(params)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield index, params
+        index += 1
+
+def shard_points(points: Iterator[Tuple[int, Dict[str, Any]]], shard: int, n_shards: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Reparto round-robin por índice: puntos vecinos (coste parecido) caen en shards distintos"""
+    for index, params in points:
+        if index % n_shards == shard - 1:
+            yield index, params
+
+def fingerprint(grid: Dict[str, List[Any]], context: Dict[str, Any], limit: Optional[int]) -> str:
+    """Huella del grid y del test: todos los shards de un merge deben compartirla"""
+    payload = json.dumps({"grid": {k: grid[k] for k in sorted(grid)}, "context": context, "limit": limit},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# ----------------------- Fichero de shard -----------------------
+class ShardLog:
+    """
+    JSONL de un shard en la carpeta compartida: cabecera, un registro por punto terminado y
+    cierre. Relanzar el mismo shard retoma: los puntos ya completos no se vuelven a lanzar.
+    """
+
+    def __init__(self, directory: Path, shard: int, n_shards: int, fp: str, total: int,
+                 context: Optional[Dict[str, Any]] = None):
+        self.path = Path(directory) / f"shard_{shard:03d}_of_{n_shards:03d}.jsonl"
+        self.shard = shard
+        self.n_shards = n_shards
+        self.fingerprint = fp
+        self.total = total
+        self.context = dict(context or {})
+        self.host = socket.gethostname() or "localhost"
+        self.recorded = 0
+
+    def completed(self) -> Set[int]:
+        """Índices ya cerrados (completos o rechazados) en un fichero previo del mismo grid"""
+        done: Set[int] = set()
+        if not self.path.exists():
+            return done
+        for rec in _read_jsonl(self.path):
+            if rec.get("event") == "shard_start" and rec.get("fingerprint") != self.fingerprint:
+                raise RuntimeError(f"{self.path} es de otro grid o de otro test (huella {rec.get('fingerprint')} "
+                                   f"!= {self.fingerprint}); usa otra carpeta de shards")
+            if rec.get("event") == "point" and rec.get("phase") in FINAL_PHASES:
+                done.add(int(rec["index"]))
+        return done
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, default=str) + "\n")
+            f.flush()
+
+    def start(self, points: int, resumed: int) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._append({"event": "shard_start", "shard": self.shard, "n_shards": self.n_shards,
+                      "fingerprint": self.fingerprint, "total": self.total, "points": points, "resumed": resumed,
+                      "host": self.host, "context": self.context, "ts": time.time()})
+
+    def record(self, index: int, params: Dict[str, Any], value: Optional[float], phase: str) -> None:
+        ok = phase == "complete" and value is not None
+        self._append({"event": "point", "index": index, "params": params, "value": value if ok else None,
+                      "phase": phase, "host": self.host, "ts": time.time()})
+        self.recorded += 1
+
+    def finish(self, phases: Dict[str, int]) -> None:
+        self._append({"event": "shard_end", "recorded": self.recorded, "phases": phases,
+                      "host": self.host, "ts": time.time()})
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # línea a medias de un host que se cayó escribiendo
+            if isinstance(rec, dict):
+                yield rec
+
+
+# ----------------------- Merge -----------------------
+def merge(directory: Path, top: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Combina los ficheros de shard de una carpeta en un ranking único (formato results.json,
+    legible por --warm-start-from). Por punto gana el registro completo más reciente.
+    """
+    directory = Path(directory)
+    files = sorted(directory.glob(SHARD_GLOB))
+    if not files:
+        raise RuntimeError(f"Sin ficheros de shard en {directory}")
+    headers: Dict[int, Dict[str, Any]] = {}
+    points: Dict[int, Dict[str, Any]] = {}
+    for path in files:
+        shard = None
+        for rec in _read_jsonl(path):
+            event = rec.get("event")
+            if event == "shard_start":
+                shard = int(rec["shard"])
+                headers[shard] = rec
+            elif event == "point" and shard is not None:
+                rec = dict(rec, shard=shard)
+                prev = points.get(int(rec["index"]))
+                if prev is None or rec["phase"] == "complete" or prev["phase"] != "complete":
+                    points[int(rec["index"])] = rec
+
+    if not headers:
+        raise RuntimeError(f"Los ficheros de shard de {directory} no tienen cabecera (shard_start)")
+    first = next(iter(headers.values()))
+    fps = {h["fingerprint"] for h in headers.values()}
+    ns = {h["n_shards"] for h in headers.values()}
+    if len(fps) > 1 or len(ns) > 1:
+        raise RuntimeError(f"Los shards de {directory} no son del mismo grid (huellas {sorted(fps)}, N {sorted(ns)})")
+    n_shards, total = int(first["n_shards"]), int(first["total"])
+    complete = [p for p in points.values() if p["phase"] == "complete" and p.get("value") is not None]
+    complete.sort(key=lambda p: (-float(p["value"]), p["index"]))
+    pending = [i for i in range(total) if i not in points or points[i]["phase"] not in FINAL_PHASES]
+    phases: Dict[str, int] = {}
+    for p in points.values():
+        phases[p["phase"]] = phases.get(p["phase"], 0) + 1
+
+    ctx = first.get("context") or {}
+    rows = [{"number": p["index"], "params": p["params"], "value": p["value"], "state": "COMPLETE",
+             "shard": p["shard"], "host": p.get("host"), "from": ctx.get("from"), "to": ctx.get("to")}
+            for p in (complete[:top] if top else complete)]
+    return {
+        "trials": rows,
+        "shards": {
+            "n_shards": n_shards,
+            "fingerprint": first["fingerprint"],
+            "total": total,
+            "present": sorted(headers),
+            "missing": [i for i in range(1, n_shards + 1) if i not in headers],
+            "complete": len(complete),
+            "pending": len(pending),
+            "pending_sample": pending[:20],
+            "phases": phases,
+            "hosts": sorted({h.get("host") for h in headers.values() if h.get("host")}),
+        },
+    }
+
+
+# ----------------------- CLI -----------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Combina los resultados de un grid repartido con --grid-shard i/N.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("merge", help="Une los shard_*.jsonl de una carpeta en un ranking.")
+    m.add_argument("directory", help="Carpeta compartida con los ficheros de shard.")
+    m.add_argument("--out", help="JSON de salida (por defecto <carpeta>/merged_results.json).")
+    m.add_argument("--top", type=int, default=None, help="Sólo los N mejores en trials.")
+    args = ap.parse_args(argv)
+
+    merged = merge(Path(args.directory), args.top)
+    out = Path(args.out or Path(args.directory) / "merged_results.json")
+    out.write_text(json.dumps(merged, indent=2, default=str), encoding="utf-8")
+    s = merged["shards"]
+    print(f"INFO {s['complete']}/{s['total']} puntos completos de {len(s['present'])}/{s['n_shards']} shards "
+          f"(hosts: {', '.join(s['hosts'])})")
+    if s["missing"]:
+        print(f"WARNING Shards sin fichero: {s['missing']}")
+    if s["pending"]:
+        print(f"WARNING {s['pending']} puntos sin resultado completo (relanza su --grid-shard i/N para retomarlos)")
+    for row in merged["trials"][:10]:
+        print(f"#{row['number']} (shard {row['shard']}) value={row['value']} params={row['params']}")
+    print(f"INFO Ranking guardado: {out}")
+    return 0 if not s["missing"] and not s["pending"] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Seguimiento de los journals de MT5 para MT5 Smart Optimizer v2
+Lee incrementalmente los logs del terminal y del Tester (UTF-16 con BOM, un fichero por día)
+y corta el trial en cuanto aparece un error fatal conocido (EA no encontrado, símbolo sin
+historial, OnInit fallido...) en lugar de esperar a que venza guard_sec"""
+import argparse
+import codecs
+import re
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from early_abort import TrialAborted
+
+# (clase de error, regex sin distinguir mayúsculas); gana la primera que casa
+DEFAULT_PATTERNS: List[Tuple[str, str]] = [
+    ("expert_not_found", r"(cannot load|failed to load|cannot open) .*\.ex5|\.ex5\S* (not found|cannot be loaded)|expert file .*not found"),
+    ("symbol_not_found", r"symbol \S+ (not found|does not exist)|unknown symbol"),
+    ("no_history", r"no history data|not enough (history|bars)|history \S+ (error|failed)|history (not found|not synchronized)"),
+    ("invalid_inputs", r"incorrect (input )?parameters|init_parameters_incorrect|invalid (input|parameter) "),
+    ("init_failed", r"oninit (returns|returned) non-zero|oninit critical error|initialization failed"),
+    ("invalid_config", r"(cannot|failed to) (open|read|load) .*\.(ini|set)\b|invalid tester (settings|configuration)"),
+    ("out_of_memory", r"not enough memory|out of memory"),
+]
+
+# Tope por lectura: un journal que crece mucho se procesa en varias vueltas del bucle de espera
+_READ_CHUNK = 1 << 20
+
+# Runs en vuelo por carpeta de datos del terminal (slots que comparten AppData comparten journal)
+_OWNERS: Dict[str, Set[str]] = {}
+_OWNERS_LOCK = threading.Lock()
+
+
+class JournalFatal(TrialAborted):
+    """El journal del terminal mostró un error fatal; lleva la clase y las líneas del contexto"""
+
+    def __init__(self, kind: str, line: str, lines: Optional[List[str]] = None, source: Optional[str] = None):
+        lines = list(lines or [line])
+        super().__init__(f"journal:{kind}", {"error_class": kind, "line": line, "journal": lines, "source": source})
+        self.kind = kind
+        self.line = line
+        self.lines = lines
+        self.source = source
+
+
+@dataclass
+class JournalRules:
+    """Tabla de patrones fatales (config 'journal'); patterns {clase: regex|null} se fusiona con la de serie"""
+    enabled: bool = True
+    patterns: List[Tuple[str, str]] = field(default_factory=lambda: list(DEFAULT_PATTERNS))
+    # Líneas que nunca son fatales aunque casen (p.ej. un Print() del propio EA)
+    ignore: List[str] = field(default_factory=list)
+    context_lines: int = 20
+
+    def __post_init__(self):
+        try:
+            self._compiled = [(k, re.compile(p, re.IGNORECASE)) for k, p in self.patterns]
+            self._ignore = [re.compile(p, re.IGNORECASE) for p in self.ignore]
+        except re.error as e:
+            raise RuntimeError(f"Patrón de journal inválido: {e}") from e
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "JournalRules":
+        if not d:
+            return cls()
+        table = {} if d.get("replace_defaults") else dict(DEFAULT_PATTERNS)
+        for kind, pattern in dict(d.get("patterns") or {}).items():
+            if str(kind).startswith("_"):
+                continue  # claves _help/_comment de la plantilla
+            if pattern is None:
+                table.pop(kind, None)  # null desactiva una clase de serie
+            else:
+                table[str(kind)] = str(pattern)
+        return cls(
+            enabled=bool(d.get("enabled", True)),
+            patterns=list(table.items()),
+            ignore=[str(p) for p in d.get("ignore") or []],
+            context_lines=int(d.get("context_lines", 20)),
+        )
+
+    def match(self, line: str) -> Optional[str]:
+        """Clase de error de la línea o None"""
+        if any(rx.search(line) for rx in self._ignore):
+            return None
+        for kind, rx in self._compiled:
+            if rx.search(line):
+                return kind
+        return None
+
+
+# ----------------------- Lectura incremental -----------------------
+def _sniff_encoding(head: bytes) -> Tuple[str, int]:
+    """(codec, bytes de BOM): MT5 escribe UTF-16LE con BOM; se aceptan también UTF-8 y UTF-16 sin BOM"""
+    if head.startswith(codecs.BOM_UTF16_LE):
+        return "utf-16-le", 2
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8", 3
+    if len(head) >= 2 and head[1:2] == b"\x00":
+        return "utf-16-le", 0
+    return "utf-8", 0
+
+
+class JournalFile:
+    """Un fichero de journal leído desde `offset`; guarda la línea incompleta entre lecturas"""
+
+    def __init__(self, path: Path, offset: int = 0):
+        self.path = Path(path)
+        self.offset = int(offset)
+        self._decoder: Any = None
+        self._partial = ""
+
+    def poll(self) -> List[str]:
+        try:
+            size = self.path.stat().st_size
+        except OSError:
+            return []
+        if size < self.offset:
+            # Truncado o recreado: se vuelve a leer desde el principio
+            self.offset, self._decoder, self._partial = 0, None, ""
+        if size == self.offset:
+            return []
+        try:
+            with open(self.path, "rb") as f:
+                if self._decoder is None:
+                    codec, bom = _sniff_encoding(f.read(4))
+                    # El decodificador incremental conserva medio carácter UTF-16/UTF-8 entre lecturas
+                    self._decoder = codecs.getincrementaldecoder(codec)(errors="replace")
+                    self.offset = max(self.offset, bom)
+                    if self.offset % 2 and codec == "utf-16-le":
+                        self.offset += 1
+                f.seek(self.offset)
+                chunk = f.read(_READ_CHUNK)
+        except OSError:
+            return []
+        self.offset += len(chunk)
+        lines = (self._partial + self._decoder.decode(chunk)).split("\n")
+        self._partial = lines.pop()
+        return [ln.rstrip("\r") for ln in lines if ln.strip()]
+
+    def read_all(self) -> List[str]:
+        """Lee hasta el final en tantas vueltas de _READ_CHUNK como haga falta, con la última línea sin salto"""
+        out: List[str] = []
+        while True:
+            before = self.offset
+            out.extend(self.poll())
+            if self.offset == before:
+                break
+        if self._partial.strip():
+            out.append(self._partial.rstrip("\r"))
+        self._partial = ""
+        return out
+
+
+def journal_dirs(layout: Any) -> List[Path]:
+    """Logs del terminal, del Tester y de cada agente local de un layout"""
+    data = layout.terminal_data_dir
+    return [data / "logs", data / "Tester" / "logs"] + sorted(layout.tester_root.glob("Agent-*-*/logs"))
+
+
+class JournalTail:
+    """
+    Sigue los *.log de varios directorios con rotación diaria (YYYYMMDD.log). start() fija el
+    punto de partida: de lo ya existente sólo cuenta lo escrito después; un fichero nuevo (el
+    del día siguiente, o el de un agente que arranca) se lee desde el principio.
+    """
+
+    def __init__(self, dirs: Callable[[], Iterable[Path]]):
+        self._dirs = dirs
+        self._files: Dict[Path, JournalFile] = {}
+        # Fichero más reciente por directorio: sólo se siguen ése y los que aparezcan después
+        self._newest: Dict[Path, str] = {}
+
+    def start(self) -> "JournalTail":
+        for d in self._dirs():
+            logs = sorted(d.glob("*.log")) if d.is_dir() else []
+            if logs:
+                last = logs[-1]
+                self._newest[d] = last.name
+                try:
+                    self._files[last] = JournalFile(last, last.stat().st_size)
+                except OSError:
+                    pass
+            else:
+                self._newest[d] = ""
+        return self
+
+    def _discover(self) -> None:
+        for d in self._dirs():
+            if not d.is_dir():
+                continue
+            floor = self._newest.setdefault(d, "")
+            for p in sorted(d.glob("*.log")):
+                if p.name >= floor and p not in self._files:
+                    self._files[p] = JournalFile(p, 0)
+                    self._newest[d] = p.name
+
+    def poll(self) -> List[Tuple[str, str]]:
+        """Líneas nuevas como (fichero, línea), en orden de fichero"""
+        self._discover()
+        out: List[Tuple[str, str]] = []
+        for path in sorted(self._files):
+            out.extend((str(path), line) for line in self._files[path].poll())
+        return out
+
+
+class JournalWatch:
+    """
+    Pasa las líneas nuevas por la tabla de patrones; guarda las últimas para el registro del trial.
+    Con `owner` (run_id) se apunta en la carpeta de datos `key`: si otro run la comparte en algún
+    momento, sólo corta con líneas que nombran al run (params_<run_id>.set, <run_id>.ini...) y el
+    resto de fatales quedan para el guard del run al que pertenezcan. close() lo borra.
+    """
+
+    def __init__(self, rules: JournalRules, tail: JournalTail, owner: Optional[str] = None,
+                 key: Optional[str] = None):
+        self.rules = rules
+        self.tail = tail
+        self.recent: "deque[str]" = deque(maxlen=max(1, rules.context_lines))
+        self.lines = 0
+        self.owner = owner
+        self.key = key if owner else None
+        self.shared = False
+        if self.key is not None:
+            with _OWNERS_LOCK:
+                _OWNERS.setdefault(self.key, set()).add(owner)
+
+    def __call__(self) -> None:
+        self.check()
+
+    def check(self) -> None:
+        if self.key is not None and not self.shared:
+            # Pegajoso: una línea leída tarde puede ser de un run que ya terminó
+            with _OWNERS_LOCK:
+                self.shared = len(_OWNERS.get(self.key, ())) > 1
+        for source, line in self.tail.poll():
+            self.lines += 1
+            self.recent.append(line)
+            kind = self.rules.match(line)
+            if not kind:
+                continue
+            if self.shared and self.owner not in line:
+                print(f"WARNING Journal compartido con otro run: {kind} sin atribuir a {self.owner}, se ignora")
+                continue
+            raise JournalFatal(kind, line, list(self.recent), source)
+
+    def close(self) -> None:
+        if self.key is None:
+            return
+        with _OWNERS_LOCK:
+            owners = _OWNERS.get(self.key, set())
+            owners.discard(self.owner)
+            if not owners:
+                _OWNERS.pop(self.key, None)
+        self.key = None
+
+
+def make_journal_check(rules: Optional[JournalRules], layout: Any,
+                       owner: Optional[str] = None) -> Optional[JournalWatch]:
+    """
+    Callable para el bucle de espera: lanza JournalFatal. Llamar antes de lanzar el terminal y,
+    con `owner`, cerrarlo (close) al terminar la espera
+    """
+    if rules is None or not rules.enabled:
+        return None
+    watch = JournalWatch(rules, JournalTail(lambda: journal_dirs(layout)), owner, str(layout.terminal_data_dir))
+    watch.tail.start()
+    return watch
+
+
+def scan(paths: List[Path], rules: JournalRules) -> List[Tuple[str, str, str]]:
+    """Recorre journals completos y devuelve (fichero, clase, línea) de cada línea fatal"""
+    files: List[Path] = []
+    for p in paths:
+        files.extend(sorted(p.glob("*.log")) if p.is_dir() else [p])
+    out = []
+    for f in files:
+        for line in JournalFile(f).read_all():
+            kind = rules.match(line)
+            if kind:
+                out.append((str(f), kind, line))
+    return out
+
+
+# ----------------------- CLI -----------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Busca errores fatales conocidos en journals de MT5.")
+    ap.add_argument("paths", nargs="+", help="Ficheros .log o directorios de logs.")
+    args = ap.parse_args(argv)
+    hits = scan([Path(p) for p in args.paths], JournalRules())
+    for source, kind, line in hits:
+        print(f"{kind}\t{source}\t{line}")
+    if not hits:
+        print("INFO Sin errores fatales en los journals")
+    return 1 if hits else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,16 +3,90 @@
 Proporciona logging con rotación, niveles y formato estructurado"""
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 import json
 
+
+class _ContextFormatter(logging.Formatter):
+    """Formatter que serializa el contexto en el hilo del handler, no en el que loguea"""
+
+    def format(self, record):
+        s = super().format(record)
+        context = getattr(record, "so_context", None)
+        if context:
+            s = f"{s} | Context: {json.dumps(context, ensure_ascii=False, default=str)}"
+        return s
+
+
+class StructuredTrialLog:
+    """Escritor JSONL asíncrono: emit() sólo encola; un hilo serializa y vuelca por lotes"""
+
+    def __init__(self, path, max_batch=256, flush_interval=0.5):
+        self.path = path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._thread = threading.Thread(target=self._writer, name="StructuredTrialLog", daemon=True)
+        self._thread.start()
+
+    def emit(self, event, **fields):
+        """Encola un registro (sin json.dumps ni I/O en el hilo llamador)"""
+        if self._closed:
+            return
+        fields["event"] = event
+        fields["ts"] = time.time()
+        self._queue.put(fields)
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            stop = False
+            while not stop:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = []
+                while True:
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    f.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch))
+                    f.flush()
+
+    def close(self, timeout=10.0):
+        """Drena la cola pendiente y detiene el hilo escritor"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
 class OptimizerLogger:
     """Logger estructurado con soporte para archivo y consola"""
     
-    def __init__(self, name="MT5Optimizer", log_dir="logs", level=logging.INFO):
+    def __init__(self, name="MT5Optimizer", log_dir="logs", level=logging.INFO, async_mode=False):
         self.name = name
         self.log_dir = log_dir
+        self.async_mode = async_mode
+        self.listener = None
+        self.events = None
         self.logger = logging.getLogger(name)
         self.logger.setLevel(level)
         self.logger.propagate = False
@@ -31,11 +105,17 @@ class OptimizerLogger:
                     pass
 
         self._setup_handlers()
+
+        # Modo asíncrono: registros por trial en JSONL mediante cola + hilo escritor
+        if async_mode:
+            self.events = StructuredTrialLog(os.path.join(log_dir, f"{name}.trials.jsonl"))
     
     def _setup_handlers(self):
         """Configura handlers para archivo y consola"""
+        handlers = []
+
         # Formato detallado
-        formatter = logging.Formatter(
+        formatter = _ContextFormatter(
             '%(asctime)s | %(name)s | %(levelname)-8s | %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
@@ -47,16 +127,26 @@ class OptimizerLogger:
         )
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
+        handlers.append(file_handler)
         
         # Handler de consola (solo INFO y superior)
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter(
+        console_formatter = _ContextFormatter(
             '%(levelname)-8s | %(message)s'
         )
         console_handler.setFormatter(console_formatter)
-        self.logger.addHandler(console_handler)
+        handlers.append(console_handler)
+
+        if self.async_mode:
+            # El hilo llamador sólo encola; formato e I/O ocurren en el listener
+            log_queue = queue.Queue()
+            self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            self.logger.addHandler(QueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                self.logger.addHandler(handler)
     
     def info(self, message, **kwargs):
         """Log nivel INFO con contexto adicional"""
@@ -79,13 +169,13 @@ class OptimizerLogger:
         self._log(logging.CRITICAL, message, kwargs)
     
     def _log(self, level, message, context):
-        """Método interno para log con contexto"""
-        if context:
-            context_str = json.dumps(context, ensure_ascii=False)
-            full_message = f"{message} | Context: {context_str}"
-        else:
-            full_message = message
-        self.logger.log(level, full_message)
+        """Método interno para log con contexto (serializado por el formatter)"""
+        self.logger.log(level, message, extra={"so_context": context or None})
+
+    def event(self, name, **fields):
+        """Registro estructurado por trial (sólo en modo asíncrono)"""
+        if self.events is not None:
+            self.events.emit(name, **fields)
     
     def log_optimization_start(self, config):
         """Log inicio de optimización"""
@@ -93,12 +183,20 @@ class OptimizerLogger:
                   symbol=config.get('test', {}).get('symbol'),
                   timeframe=config.get('test', {}).get('timeframe'),
                   n_trials=config.get('optimizer', {}).get('n_trials'))
+        self.event("optimization_start",
+                   symbol=config.get('test', {}).get('symbol'),
+                   timeframe=config.get('test', {}).get('timeframe'),
+                   date_from=config.get('test', {}).get('from'),
+                   date_to=config.get('test', {}).get('to'),
+                   n_trials=config.get('optimizer', {}).get('n_trials'))
     
-    def log_trial(self, trial_number, params, value):
-        """Log resultado de trial"""
+    def log_trial(self, trial_number, params, value, **context):
+        """Log resultado de trial (run_id, slot, phase... como contexto)"""
         self.debug(f"Trial {trial_number} completado",
                    params=params,
-                   value=value)
+                   value=value,
+                   **context)
+        self.event("trial", trial=trial_number, params=params, value=value, **context)
     
     def log_optimization_end(self, best_params, best_value, duration):
         """Log fin de optimización"""
@@ -106,6 +204,22 @@ class OptimizerLogger:
                   best_value=best_value,
                   duration_seconds=duration,
                   best_params=best_params)
+        self.event("optimization_end", best_value=best_value,
+                   duration_seconds=duration, best_params=best_params)
+
+    def close(self):
+        """Vacía las colas del modo asíncrono y libera los handlers"""
+        if self.events is not None:
+            self.events.close()
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            try:
+                handler.close()
+            except Exception:
+                pass
 
 # Instancia global
 _default_logger = None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""mt5_emulator.py - Terminal MT5 simulado para probar la orquestación completa en Linux
+Se invoca como terminal64.exe (/config:<ini> /test), lee el .ini y el .set del Tester y deja
+los mismos artefactos que so_report.mqh: progress.jsonl, trades.csv, report.json, _READY y el
+HTML del informe (sin Report= en el .ini, o con export_trades=0 en el .set, no se escriben
+como en modo lean). Los trades dependen sólo de los inputs y del día (EA sin estado entre fechas).
+También escribe el journal del Tester (UTF-16 con BOM, como MT5) y con --fatal simula un error
+fatal: deja la línea en el journal y se queda colgado hasta que lo cierren."""
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+import codecs
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+TERMINAL_FLAGS = {"/test", "/skipupdate", "/portable"}
+# Inputs del include, no del EA: no cambian la simulación ni salen en report.json
+_SO_INPUTS = {"export_trades"}
+TRADES_HEADER = ["ticket", "time", "type", "price", "volume", "profit", "commission", "swap", "symbol", "comment"]
+
+
+def read_kv(path: Path) -> Dict[str, str]:
+    """Pares clave=valor de un .ini o .set (se ignoran secciones y comillas)"""
+    out: Dict[str, str] = {}
+    for line in path.read_text(encoding="utf-8", errors="ignore").splitlines():
+        if "=" in line and not line.startswith(("[", ";")):
+            k, v = line.split("=", 1)
+            out[k.strip()] = v.strip().strip('"')
+    return out
+
+def _ea_inputs(inputs: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in inputs.items() if not k.startswith("so_") and k not in _SO_INPUTS}
+
+def _day(s: str) -> datetime:
+    return datetime.strptime(s.strip()[:10].replace("-", "."), "%Y.%m.%d")
+
+def simulate(inputs: Dict[str, str], symbol: str, timeframe: str, from_: str, to: str) -> List[Dict[str, Any]]:
+    """Trades deterministas: la calidad sale de los inputs y cada día se decide por separado"""
+    key = json.dumps(dict(sorted(_ea_inputs(inputs).items()))) + symbol + timeframe
+    edge = (zlib.crc32(key.encode("utf-8")) % 1000) / 1000.0 - 0.4
+    lot = float(inputs.get("lot_size", 0.1) or 0.1)
+    trades = []
+    day, end = _day(from_), _day(to)
+    while day <= end:
+        rng = random.Random(zlib.crc32(f"{key}|{day:%Y%m%d}".encode("utf-8")))
+        if rng.random() < 0.3:
+            profit = rng.gauss(edge * 8.0, 20.0) * lot * 10
+            trades.append({"ticket": len(trades) + 1, "time": f"{day:%Y.%m.%d} {rng.randrange(24):02d}:00",
+                           "type": rng.choice([0, 1]), "price": round(1.1 + rng.random() / 10, 5),
+                           "volume": lot, "profit": f"{profit:.2f}", "commission": "0.00", "swap": "0.00",
+                           "symbol": symbol, "comment": ""})
+        day += timedelta(days=1)
+    return trades
+
+def deal_rows(trades: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Filas de trades.csv como las escribe so_report.mqh: deal de entrada (profit a cero) y de salida (tipo opuesto)"""
+    rows = []
+    for t in trades:
+        rows.append(dict(t, ticket=len(rows) + 1, profit="0.00"))
+        rows.append(dict(t, ticket=len(rows) + 1, type=1 - int(t["type"])))
+    return rows
+
+def build_report(run_id: str, ini: Dict[str, str], inputs: Dict[str, str], trades: List[Dict[str, Any]]) -> Dict[str, Any]:
+    deposit = float(ini.get("Deposit", 10000))
+    balance = peak = deposit
+    dd_abs = dd_rel = 0.0
+    gp = gl = 0.0
+    for t in trades:
+        p = float(t["profit"])
+        gp, gl = (gp + p, gl) if p > 0 else (gp, gl + p)
+        balance += p
+        peak = max(peak, balance)
+        dd_abs = max(dd_abs, peak - balance)
+        dd_rel = max(dd_rel, (peak - balance) / peak * 100 if peak > 0 else 0.0)
+    return {
+        "run_id": run_id, "symbol": ini.get("Symbol"), "timeframe": ini.get("Period"),
+        "start_date": ini.get("FromDate"), "end_date": ini.get("ToDate"),
+        "initial_deposit": round(deposit, 2), "final_balance": round(balance, 2),
+        "total_net_profit": round(balance - deposit, 2), "gross_profit": round(gp, 2), "gross_loss": round(gl, 2),
+        "profit_factor": round(gp / abs(gl), 2) if gl else 0.0,
+        "expected_payoff": round((balance - deposit) / len(trades), 2) if trades else 0.0,
+        "max_dd_abs": round(dd_abs, 2), "max_dd_rel_pct": round(dd_rel, 2),
+        "total_trades": len(trades), "total_deals": len(trades) * 2,
+        "ea": {"name": ini.get("Expert"), "mode": "emulator"},
+        "inputs": _ea_inputs(inputs),
+    }
+
+def journal(profiles: Path, message: str) -> None:
+    """Añade una línea al journal del Tester del día (<datos>/Tester/logs/YYYYMMDD.log)"""
+    logs = profiles.parents[2] / "Tester" / "logs"
+    logs.mkdir(parents=True, exist_ok=True)
+    path = logs / f"{datetime.now():%Y%m%d}.log"
+    now = datetime.now()
+    line = f"EM\t0\t{now:%H:%M:%S}.{now.microsecond // 1000:03d}\tTester\t{message}\r\n"
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            f.write(codecs.BOM_UTF16_LE)
+        f.write(line.encode("utf-16-le"))
+
+def run(ini_path: Path, profiles: Path, common_files: Path, delay: float = 0.0, fatal: str = "") -> Path:
+    ini = read_kv(ini_path)
+    inputs = read_kv(profiles / ini["ExpertParameters"])
+    journal(profiles, f"{ini.get('Symbol')},{ini.get('Period')}: testing of Experts\\{ini.get('Expert')} "
+                      f"from {ini.get('FromDate')} to {ini.get('ToDate')} started")
+    if fatal:
+        # Como el terminal real: el error queda en el journal y el proceso no termina por sí solo
+        journal(profiles, fatal.replace("{set}", ini["ExpertParameters"]))
+        time.sleep(3600)
+    run_dir = common_files / "MT5_SO" / inputs["so_run_id"]
+    run_dir.mkdir(parents=True, exist_ok=True)
+    trades = simulate(inputs, ini.get("Symbol", ""), ini.get("Period", ""), ini["FromDate"], ini["ToDate"])
+
+    # progress.jsonl como so_progress_sec: mitad y final del rango
+    deposit = float(ini.get("Deposit", 10000))
+    if int(float(inputs.get("so_progress_sec", 0) or 0)) > 0:
+        with open(run_dir / "progress.jsonl", "a", encoding="utf-8") as f:
+            for part in (trades[:len(trades) // 2], trades):
+                eq = deposit + sum(float(t["profit"]) for t in part)
+                stamp = part[-1]["time"] if part else ini["FromDate"]
+                f.write(json.dumps({"time": stamp, "equity": round(eq, 2), "balance": round(eq, 2), "trades": len(part)}) + "\n")
+                f.flush()
+                time.sleep(delay / 2)
+    else:
+        time.sleep(delay)
+
+    report = build_report(inputs["so_run_id"], ini, inputs, trades)
+    if str(inputs.get("export_trades", "1")).strip().lower() not in ("0", "false"):
+        with open(run_dir / "trades.csv", "w", encoding="latin-1", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=TRADES_HEADER)
+            w.writeheader()
+            w.writerows(deal_rows(trades))
+    (run_dir / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if ini.get("Report"):
+        html = Path(ini["Report"])
+        html.parent.mkdir(parents=True, exist_ok=True)
+        html.write_text(f"<html><body><p>{ini['FromDate']} - {ini['ToDate']}</p>"
+                        f"<p>Final balance {report['final_balance']:.2f} USD</p></body></html>", encoding="utf-8")
+    (run_dir / "_READY").write_text("OK_JSON|OK_CSV", encoding="latin-1")
+    journal(profiles, f"final balance {report['final_balance']:.2f} USD")
+    return run_dir
+
+
+# ----------------------- CLI -----------------------
+def main(argv: List[str]) -> int:
+    # Argumentos estilo terminal64.exe (/config:...) más las rutas que el backend resuelve
+    config = next((a.split(":", 1)[1] for a in argv if a.lower().startswith("/config:")), None)
+    rest = [a for a in argv if not a.lower().startswith("/config:") and a.lower() not in TERMINAL_FLAGS]
+    ap = argparse.ArgumentParser(description="Terminal MT5 simulado.")
+    ap.add_argument("--profiles", required=True, help="MQL5/Profiles/Tester del terminal.")
+    ap.add_argument("--common-files", required=True, help="Terminal/Common/Files.")
+    ap.add_argument("--delay", type=float, default=0.0, help="Segundos simulados de backtest.")
+    ap.add_argument("--fatal", default="", help="Línea de error fatal para el journal (el run se cuelga); {set} = preset del run.")
+    args = ap.parse_args(rest)
+    if not config:
+        print("ERROR Falta /config:<ini>")
+        return 2
+    run_dir = run(Path(config), Path(args.profiles), Path(args.common_files), args.delay, args.fatal)
+    print(f"INFO Emulador: artefactos en {run_dir}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
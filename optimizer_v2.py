@@ -4,22 +4,41 @@
 from __future__ import annotations
 
 import argparse
-import copy
+import contextlib
+import heapq
+import itertools
 import json
+import math
 import os
+import queue
 import re
+import socket
 import subprocess
 import sys
+import threading
 import time
-from dataclasses import dataclass, field
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, Callable, Iterator
+
+from backends import TerminalBackend, WindowsBackend, make_backend, pid_alive, stop_process_tree
+from constraints import ConstraintSet
+from early_abort import AbortRules, TrialAborted, make_abort_check
+from journal_tail import JournalFatal, JournalRules, make_journal_check
+from error_handler import ErrorHandler
+from grid_shards import ShardLog, enumerate_grid, fingerprint, parse_shard, point_key, shard_points
+from logger import OptimizerLogger
+from postprocess import PostProcessor
+from resources import ResourceLedger, ResourceMeter, combine as combine_resources, psutil as _psutil
+from samplers import build_sampler
+from scheduling import CostModel, SchedulePlan, TimeBudget, chunked_lpt, trial_features
+from sharding import ShardedRunner
+from status import ConsoleStatus, ProgressTracker, StatusServer
+from terminal_layout import TerminalLayout
+from warm_start import apply_warm_start
 
-# psutil opcional para gestión de procesos
-try:
-    import psutil  # type: ignore
-except Exception:
-    psutil = None
 
 
 # ----------------------- Utilidades básicas -----------------------
@@ -33,11 +52,31 @@ def write_text(p: Path, s: str) -> None:
 def read_text(p: Path) -> str:
     return p.read_text(encoding="utf-8")
 
-def windows_user_roaming() -> Path:
-    return Path(os.environ.get("APPDATA", str(Path.home() / "AppData" / "Roaming")))
+class RunIdAllocator:
+    """
+    IDs de run sin colisiones entre hilos, procesos y hosts:
+    run_<fecha>_<hora>_<host>_p<pid>_s<slot>_<contador>. El host lleva un crc32 estable (no
+    hash(), que cambia por proceso) y el pid se lee en cada llamada para sobrevivir a un fork.
+    """
+
+    def __init__(self, host: Optional[str] = None, pid: Optional[int] = None):
+        host = host or socket.gethostname() or "localhost"
+        self.host_tag = re.sub(r"[^A-Za-z0-9]", "", host)[:8].lower() + "%04x" % (zlib.crc32(host.encode("utf-8")) & 0xFFFF)
+        self._pid = pid
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next(self, slot: Optional[int] = None) -> str:
+        with self._lock:
+            n = next(self._counter)
+        pid = os.getpid() if self._pid is None else self._pid
+        slot_tag = "x" if slot is None else "%02d" % slot
+        return f"{time.strftime('run_%Y%m%d_%H%M%S')}_{self.host_tag}_p{pid}_s{slot_tag}_{n:06d}"
+
+_RUN_IDS = RunIdAllocator()
 
-def now_run_id() -> str:
-    return time.strftime("run_%Y%m%d_%H%M%S_") + ("%04x" % (int(time.time() * 10000) & 0xFFFF))
+def now_run_id(slot: Optional[int] = None) -> str:
+    return _RUN_IDS.next(slot)
 
 def norm_date_for_ini(s: str) -> str:
     s = s.strip()
@@ -66,6 +105,14 @@ class Mt5Cfg:
     terminal_path: str
     terminal_hash: str
     datadir: Optional[str] = None
+    appdata: Optional[str] = None
+    reports_dir: Optional[str] = None
+    ini_dir: Optional[str] = None
+    # windows / wine / emulator (backends.py) y sus opciones (p.ej. prefix de Wine con {slot})
+    backend: str = "windows"
+    backend_options: Dict[str, Any] = field(default_factory=dict)
+    # Raíz de las instalaciones portables de provision.py: el slot N lanza slot_root/slot_NN con /portable
+    slot_root: Optional[str] = None
 
 @dataclass
 class TestCfg:
@@ -81,11 +128,17 @@ class TestCfg:
 class EaCfg:
     name: str
     inputs: Dict[str, Any] = field(default_factory=dict)
+    # El EA no arrastra estado entre fechas (sin posiciones abiertas ni indicadores largos): permite --shards
+    stateless_across_boundaries: bool = False
+    shard_compounding: str = "additive"
 
 @dataclass
 class SearchCfg:
     space: Dict[str, Any] = field(default_factory=dict)
     sampler: Optional[Any] = None
+    # Expresiones sobre los inputs que se comprueban antes de lanzar MT5 (constraints.py)
+    constraints: Optional[Any] = None
+    constraints_mode: str = "prune"
 
 @dataclass
 class Config:
@@ -93,6 +146,9 @@ class Config:
     test: TestCfg
     ea: EaCfg
     search: Optional[SearchCfg] = None
+    abort: Optional[AbortRules] = None
+    # Patrones fatales del journal de MT5 (None = no se sigue el journal)
+    journal: Optional[JournalRules] = None
 
 
 # ----------------------- Loader (tolerante) -----------------------
@@ -172,7 +228,8 @@ def _coerce_legacy_to_modern(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
     return modern
 
-def load_config(path: str) -> Config:
+def read_config_data(path: str) -> Dict[str, Any]:
+    """Config crudo (JSON o YAML) ya convertido de legacy a mt5/test/ea si hace falta."""
     raw = Path(path).read_text(encoding="utf-8")
     txt = strip_inline_comments(raw)
 
@@ -194,6 +251,10 @@ def load_config(path: str) -> Config:
         maybe = _coerce_legacy_to_modern(data)
         if maybe:
             data = maybe
+    return data
+
+def load_config(path: str) -> Config:
+    data = read_config_data(path)
 
     # Si aún faltan, error amable
     missing_top = [k for k in ("mt5", "test", "ea") if k not in data]
@@ -215,6 +276,12 @@ def load_config(path: str) -> Config:
         terminal_path=str(mt5d["terminal_path"]).strip(),
         terminal_hash=str(mt5d["terminal_hash"]).strip(),
         datadir=mt5d.get("datadir"),
+        appdata=mt5d.get("appdata"),
+        reports_dir=mt5d.get("reports_dir"),
+        ini_dir=mt5d.get("ini_dir"),
+        backend=str(mt5d.get("backend") or "windows").strip().lower(),
+        backend_options=dict(mt5d.get("backend_options") or {}),
+        slot_root=mt5d.get("slot_root"),
     )
     test = TestCfg(
         symbol=str(testd["symbol"]),
@@ -228,6 +295,8 @@ def load_config(path: str) -> Config:
     ea = EaCfg(
         name=str(ead["name"]),
         inputs=dict(ead.get("inputs", {})),
+        stateless_across_boundaries=bool(ead.get("stateless_across_boundaries", False)),
+        shard_compounding=str(ead.get("shard_compounding", "additive")),
     )
 
     search = None
@@ -236,33 +305,46 @@ def load_config(path: str) -> Config:
         search = SearchCfg(
             space=dict(s.get("space", {})),
             sampler=s.get("sampler"),
+            constraints=s.get("constraints"),
+            constraints_mode=str(s.get("constraints_mode", "prune")),
         )
 
-    return Config(mt5=mt5, test=test, ea=ea, search=search)
+    abort = AbortRules.from_dict(data.get("abort"))
+    journal = JournalRules.from_dict(data.get("journal"))
 
+    return Config(mt5=mt5, test=test, ea=ea, search=search, abort=abort, journal=journal)
 
-# ----------------------- Paths por HASH -----------------------
-def profiles_tester_dir(mt5_hash: str) -> Path:
-    return windows_user_roaming() / "MetaQuotes" / "Terminal" / mt5_hash / "MQL5" / "Profiles" / "Tester"
 
-def experts_root_dir(mt5_hash: str) -> Path:
-    return windows_user_roaming() / "MetaQuotes" / "Terminal" / mt5_hash / "MQL5" / "Experts"
+# ----------------------- Layout por terminal -----------------------
+_LAYOUTS: Dict[Tuple[str, str, str, str], TerminalLayout] = {}
+_LAYOUTS_LOCK = threading.Lock()
+_BACKENDS: Dict[str, TerminalBackend] = {}
 
-def common_mt5_so_dir() -> Path:
-    return windows_user_roaming() / "MetaQuotes" / "Terminal" / "Common" / "Files" / "MT5_SO"
+def backend_for(cfg: Config) -> TerminalBackend:
+    """Backend del terminal (mt5.backend), uno por bloque mt5 distinto."""
+    m = cfg.mt5
+    key = json.dumps([m.backend, m.backend_options, m.terminal_hash, m.appdata, m.reports_dir, m.ini_dir],
+                     sort_keys=True, default=str)
+    with _LAYOUTS_LOCK:
+        backend = _BACKENDS.get(key)
+        if backend is None:
+            backend = _BACKENDS[key] = make_backend(m)
+        return backend
 
-def local_agent_files_dir(mt5_hash: str) -> Optional[Path]:
-    tester_root = windows_user_roaming() / "MetaQuotes" / "Tester" / mt5_hash
-    if not tester_root.exists():
-        return None
-    for p in tester_root.glob("Agent-*-*"):
-        candidate = p / "MQL5" / "Files" / "MT5_SO"
-        if candidate.exists():
-            return candidate
-    agents = list(tester_root.glob("Agent-*-*"))
-    if agents:
-        return agents[0] / "MQL5" / "Files" / "MT5_SO"
-    return None
+def layout_for(cfg: Config, slot: Optional[int] = None) -> TerminalLayout:
+    """Layout del terminal sin validar ni crear directorios (para inspección/preflight)."""
+    return backend_for(cfg).layout(slot)
+
+def get_layout(cfg: Config, slot: Optional[int] = None) -> TerminalLayout:
+    """Layout del terminal resuelto y validado una sola vez por combinación de raíces."""
+    probe = layout_for(cfg, slot)
+    key = (probe.terminal_hash, str(probe.appdata), str(probe.reports_dir), str(probe.ini_dir), str(probe.data_dir))
+    with _LAYOUTS_LOCK:
+        layout = _LAYOUTS.get(key)
+        if layout is None:
+            layout = probe.validate()
+            _LAYOUTS[key] = layout
+        return layout
 
 
 # ----------------------- .set / .ini -----------------------
@@ -274,12 +356,7 @@ def build_set_lines(kv: Dict[str, Any]) -> list[str]:
         lines.append(f"{k}={v}")
     return lines
 
-def write_set_to_profiles_tester(mt5_hash: str, set_name: str, lines: list[str]) -> Path:
-    dst = profiles_tester_dir(mt5_hash) / set_name
-    write_text(dst, "\n".join(lines) + "\n")
-    return dst
-
-def write_ini(cfg: Config, set_name: str, ini_path: Path, report_path: Path) -> None:
+def write_ini(cfg: Config, set_name: str, ini_path: Path, report_path: Path | str | None) -> None:
     ini = []
     ini.append("[Tester]")
     ini.append(f"Symbol={cfg.test.symbol}")
@@ -294,69 +371,27 @@ def write_ini(cfg: Config, set_name: str, ini_path: Path, report_path: Path) ->
     ini.append("Optimization=0")
     ini.append("ReportReplace=1")
     ini.append("ShutdownTerminal=1")
-    report_value = str(report_path).replace("\\", "/")
-    ini.append(f'Report="{report_value}"')
+    if report_path is not None:
+        # Sin Report= (artefactos lean) MT5 no genera el informe HTML
+        report_value = str(report_path).replace("\\", "/")
+        ini.append(f'Report="{report_value}"')
     write_text(ini_path, "\n".join(ini) + "\n")
 
 
 # ----------------------- Proceso MT5 (PID) -----------------------
-def _launch_mt5(exe_path: str, ini_path: Path) -> subprocess.Popen:
-    args = [exe_path, f"/config:{str(ini_path)}", "/test", "/skipupdate"]
-    print(f'INFO Lanzando MT5: "{exe_path}" /config:{str(ini_path)} /test /skipupdate', flush=True)
-    creation = 0
-    if hasattr(subprocess, "CREATE_NEW_PROCESS_GROUP"):
-        creation |= subprocess.CREATE_NEW_PROCESS_GROUP
-    if hasattr(subprocess, "CREATE_NO_WINDOW"):
-        creation |= subprocess.CREATE_NO_WINDOW
-    return subprocess.Popen(args, creationflags=creation)
+def _launch_mt5(exe_path: str, ini_path: Path, backend: Optional[TerminalBackend] = None,
+                slot: Optional[int] = None) -> subprocess.Popen:
+    backend = backend or WindowsBackend(None)
+    print(f"INFO Lanzando MT5 ({backend.name}): {subprocess.list2cmdline(backend.command(exe_path, ini_path, slot))}", flush=True)
+    return backend.launch(exe_path, ini_path, slot)
 
 def _pid_alive(pid: int) -> bool:
-    if pid <= 0:
-        return False
-    if psutil:
-        return psutil.pid_exists(pid)
-    try:
-        out = subprocess.check_output(["tasklist"], creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).decode("utf-8", errors="ignore")
-        return str(pid) in out
-    except Exception:
-        return False
+    return pid_alive(pid)
 
-def _stop_pid_gently(pid: int, timeout: int = 60) -> bool:
-    if pid <= 0:
-        return True
-    if not _pid_alive(pid):
-        return True
-    try:
-        if psutil:
-            p = psutil.Process(pid)
-            try:
-                p.terminate()
-            except Exception:
-                pass
-            try:
-                p.wait(timeout=timeout)
-                return True
-            except Exception:
-                try:
-                    p.kill()
-                    p.wait(timeout=10)
-                    return True
-                except Exception:
-                    pass
-        try:
-            subprocess.call(["taskkill", "/T", "/PID", str(pid)], creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
-            time.sleep(1.5)
-        except Exception:
-            pass
-        if _pid_alive(pid):
-            try:
-                subprocess.call(["taskkill", "/F", "/T", "/PID", str(pid)], creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
-                time.sleep(1.0)
-            except Exception:
-                pass
-        return not _pid_alive(pid)
-    except Exception:
-        return False
+def _stop_pid_gently(pid: int, timeout: int = 60, backend: Optional[TerminalBackend] = None) -> bool:
+    if backend is not None:
+        return backend.stop(pid, timeout)
+    return stop_process_tree(pid, timeout)
 
 
 # ----------------------- Helpers de espera / fallback -----------------------
@@ -437,7 +472,8 @@ def override_report_html_dates(report_html: Path, start: str, end: str) -> None:
 
     print(f"INFO Rango de fechas HTML forzado a {start} - {end}")
 
-def wait_ready_and_report(common_run: Path, local_run: Optional[Path], guard_sec: int, report_html: Path, short_watchdog_sec: int = 120) -> Tuple[bool, Optional[float]]:
+def wait_ready_and_report(common_run: Path, local_run: Optional[Path], guard_sec: int, report_html: Optional[Path], short_watchdog_sec: int = 120,
+                          abort_check: Optional[Callable[[], None]] = None) -> Tuple[bool, Optional[float]]:
     t0 = time.time()
     common_ready = common_run / "_READY"
     common_report = common_run / "report.json"
@@ -469,8 +505,12 @@ def wait_ready_and_report(common_run: Path, local_run: Optional[Path], guard_sec
         if _dir_has_progress(common_run) or (local_run and _dir_has_progress(local_run)):
             origin_only = False
 
+        # Lanza TrialAborted si una regla de aborto se disparó con el progress.jsonl leído hasta ahora
+        if abort_check is not None:
+            abort_check()
+
         elapsed = time.time() - t0
-        if report_html.exists() and not common_report.exists() and elapsed > min(180, guard_sec * 0.5):
+        if report_html is not None and report_html.exists() and not common_report.exists() and elapsed > min(180, guard_sec * 0.5):
             try:
                 html = read_text(report_html)
                 fb = _try_parse_final_balance_from_html(html)
@@ -491,25 +531,170 @@ def wait_ready_and_report(common_run: Path, local_run: Optional[Path], guard_sec
         time.sleep(0.5)
 
 
+# ----------------------- Contexto de trial / slots -----------------------
+# rich: informe HTML + trades.csv + report.json; lean: sólo report.json (trials de búsqueda)
+ARTIFACT_LEVELS = ("lean", "rich")
+
+@dataclass
+class TrialContext:
+    """Identidad del trial en curso en este hilo (para logging estructurado)."""
+    trial: Optional[int] = None
+    slot: Optional[int] = None
+    run_id: Optional[str] = None
+    sink: Optional[Callable[..., None]] = None
+    # Motivo para cerrar el run en vuelo (p.ej. presupuesto agotado); None = seguir
+    cancel: Optional[Callable[[], Optional[str]]] = None
+    # Pool de post-proceso en segundo plano (None = HTML/cierre/meta.json dentro del slot)
+    post: Optional[PostProcessor] = None
+    # Muestreo de CPU/RSS/IO del terminal cada N s (0 = sin contabilidad) y su resultado
+    meter_interval: float = 0.0
+    resources: Optional[Dict[str, Any]] = None
+    # Nivel de artefactos del run (ARTIFACT_LEVELS): lean = sólo report.json
+    artifacts: str = "rich"
+    # Pool del que los sub-runs del trial (tramos de sharding) toman slots libres
+    slots: Optional["SlotPool"] = None
+
+_CTX = threading.local()
+
+def current_trial_context() -> Optional[TrialContext]:
+    return getattr(_CTX, "ctx", None)
+
+@contextlib.contextmanager
+def trial_context(ctx: TrialContext) -> Iterator[TrialContext]:
+    prev = current_trial_context()
+    _CTX.ctx = ctx
+    try:
+        yield ctx
+    finally:
+        _CTX.ctx = prev
+
+def _trial_event(phase: str, **fields: Any) -> None:
+    """Emite un evento de fase si hay un sink instalado; no-op en caso contrario."""
+    ctx = current_trial_context()
+    if ctx is None or ctx.sink is None:
+        return
+    ctx.sink("phase", phase=phase, trial=ctx.trial, slot=ctx.slot, run_id=ctx.run_id, **fields)
+
+def _with_cancel(abort_check: Optional[Callable[[], None]], cancel: Optional[Callable[[], Optional[str]]]) -> Optional[Callable[[], None]]:
+    """Añade al chequeo de aborto la cancelación externa del trial (misma salida: TrialAborted)"""
+    if cancel is None:
+        return abort_check
+
+    def check() -> None:
+        reason = cancel()
+        if reason:
+            raise TrialAborted(reason)
+        if abort_check:
+            abort_check()
+    return check
+
+def _with_journal(abort_check: Optional[Callable[[], None]], journal_check: Optional[Callable[[], None]]) -> Optional[Callable[[], None]]:
+    """Antepone al chequeo de aborto el journal del terminal (error fatal conocido: JournalFatal)"""
+    if journal_check is None:
+        return abort_check
+
+    def check() -> None:
+        journal_check()
+        if abort_check:
+            abort_check()
+    return check
+
+def _fanout(*sinks: Optional[Callable[..., None]]) -> Callable[..., None]:
+    """Combina varios sinks de eventos en uno solo."""
+    active = [s for s in sinks if s is not None]
+
+    def sink(name: str, **fields: Any) -> None:
+        for s in active:
+            s(name, **fields)
+    return sink
+
+class SlotPool:
+    """Asigna un número de slot estable (0..n-1) a cada trial concurrente."""
+
+    def __init__(self, n_slots: int):
+        self.n_slots = max(1, int(n_slots))
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for i in range(self.n_slots):
+            self._free.put(i)
+
+    def in_use(self) -> int:
+        return self.n_slots - self._free.qsize()
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[int]:
+        slot = self._free.get()
+        try:
+            yield slot
+        finally:
+            self._free.put(slot)
+
+    @contextlib.contextmanager
+    def try_acquire(self) -> Iterator[Optional[int]]:
+        """Como acquire pero sin esperar: None si no hay slot libre"""
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            yield None
+            return
+        try:
+            yield slot
+        finally:
+            self._free.put(slot)
+
+
+# Cierre en segundo plano del último terminal de cada slot: el siguiente lanzamiento en ese slot
+# espera a que el PID anterior haya salido (dos terminales sobre los mismos datos se pisan)
+_SLOT_TEARDOWN: Dict[int, threading.Event] = {}
+_SLOT_TEARDOWN_LOCK = threading.Lock()
+
+def _slot_teardown_pending(slot: Optional[int]) -> Optional[threading.Event]:
+    """Marca pendiente el cierre del terminal del slot; el post-proceso hace set() al cerrarlo"""
+    if slot is None:
+        return None
+    stopped = threading.Event()
+    with _SLOT_TEARDOWN_LOCK:
+        _SLOT_TEARDOWN[slot] = stopped
+    return stopped
+
+def _await_slot_teardown(slot: Optional[int], timeout: float = 120.0) -> None:
+    """Bloquea hasta que el terminal anterior del slot se haya cerrado (o vence timeout)"""
+    if slot is None:
+        return
+    with _SLOT_TEARDOWN_LOCK:
+        stopped = _SLOT_TEARDOWN.get(slot)
+    if stopped is not None and not stopped.wait(timeout):
+        print(f"WARNING El terminal anterior del slot {slot} sigue cerrándose tras {timeout:.0f} s; se lanza igualmente")
+
+
 # ----------------------- Ejecución de un run -----------------------
-def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, base_overrides: Optional[Dict[str, Any]] = None) -> Tuple[bool, Optional[float], str, Path]:
-    run_cfg = copy.deepcopy(cfg)
+def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, base_overrides: Optional[Dict[str, Any]] = None, layout: Optional[TerminalLayout] = None) -> Tuple[bool, Optional[float], str, Path]:
     overrides = dict(base_overrides or {})
     trial_timeframe = overrides.pop("timeframe", None)
+    run_cfg = cfg
     if trial_timeframe:
-        run_cfg.test.timeframe = str(trial_timeframe)
-
-    run_id = now_run_id()
-
-    common_root = common_mt5_so_dir()
+        # Vista superficial: sólo se reemplaza el bloque test; ea.inputs se comparte y nunca se muta
+        run_cfg = replace(cfg, test=replace(cfg.test, timeframe=str(trial_timeframe)))
+
+    ctx = current_trial_context()
+    slot = ctx.slot if ctx else None
+    backend = backend_for(run_cfg)
+    layout = layout or get_layout(run_cfg, slot)
+    run_id = now_run_id(slot)
+    if ctx is not None:
+        ctx.run_id = run_id
+
+    common_root = layout.common_mt5_so_dir
     common_run = common_root / run_id
-    ensure_dir(common_run)
-    local_base = local_agent_files_dir(run_cfg.mt5.terminal_hash)
+    try:
+        # Carpeta exclusiva del run: si ya existe, otro proceso/host usa el mismo ID
+        common_run.mkdir(parents=True, exist_ok=False)
+    except FileExistsError:
+        raise RuntimeError(f"Colisión de run_id: {common_run} ya existe")
+    local_base = layout.local_agent_files_dir()
     local_run = (local_base / run_id) if local_base else None
     if local_run:
         ensure_dir(local_run)
 
-    write_text(common_root / "__WHERE.txt", str(common_run))
     write_text(common_run / "origin.txt", run_id)
 
     so_block = {
@@ -521,6 +706,13 @@ def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, bas
         "so_start_date": run_cfg.test.from_,
         "so_end_date": run_cfg.test.to,
     }
+    abort_rules = run_cfg.abort if (run_cfg.abort and run_cfg.abort.enabled) else None
+    if abort_rules:
+        so_block["so_progress_sec"] = abort_rules.progress_every_sec
+    lean = bool(ctx and ctx.artifacts == "lean")
+    if lean:
+        # so_report.mqh no escribe trades.csv; report.json y _READY siguen igual
+        so_block["export_trades"] = 0
 
     merged = dict(run_cfg.ea.inputs or {})
     if overrides:
@@ -530,36 +722,63 @@ def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, bas
     set_kv = dict(merged)
     set_kv.update(so_block)
     set_lines = build_set_lines(set_kv)
-    set_name = f"params_{run_id[-4:]}_{abs(hash(run_id)) & 0xffffffff:08x}.set"
-    set_path = write_set_to_profiles_tester(run_cfg.mt5.terminal_hash, set_name, set_lines)
+    set_path = layout.set_path(run_id)
+    write_text(set_path, "\n".join(set_lines) + "\n")
     print(f"INFO Preset desplegado: {str(set_path)}")
     print(f"INFO Expert relativo: {run_cfg.ea.name}")
-    print(f"INFO MT5 buscará: {str(experts_root_dir(run_cfg.mt5.terminal_hash) / run_cfg.ea.name)}")
-
-    reports_root = Path.home() / "runs" / "reports"
-    ensure_dir(reports_root)
-    report_html = reports_root / f"report_{abs(hash(run_id)) & 0xffffffff:08x}.html"
-
-    ini_path = Path.home() / f"{run_id[-4:]}_{abs(hash(run_id)) & 0xffff:04x}.ini"
-    write_ini(run_cfg, set_path.name, ini_path, report_html)
+    print(f"INFO MT5 buscará: {str(layout.experts_root_dir / run_cfg.ea.name)}")
 
-    proc = _launch_mt5(exe_path, ini_path)
-    pid = proc.pid if proc and proc.pid else -1
+    report_html = None if lean else layout.report_html(run_id)
+    ini_path = layout.ini_path(run_id)
+    write_ini(run_cfg, set_path.name, ini_path, backend.terminal_path(report_html) if report_html else None)
 
-    ok, fb = wait_ready_and_report(common_run, local_run, guard_sec, report_html, short_watchdog_sec=120)
-    override_report_html_dates(report_html, run_cfg.test.from_, run_cfg.test.to)
-
-    if auto_close:
-        closed = _stop_pid_gently(pid, timeout=45)
-        if closed:
-            print(f"INFO MT5 cerrado por PID: {pid}")
-        else:
-            print(f"WARNING No se pudo cerrar por PID: {pid}")
-    else:
+    _await_slot_teardown(slot)
+    # Antes del lanzamiento: del journal sólo cuenta lo que escriba este run
+    journal_check = make_journal_check(run_cfg.journal, layout, owner=run_id)
+    try:
+        proc = _launch_mt5(exe_path, ini_path, backend, slot)
+        pid = proc.pid if proc and proc.pid else -1
+        _trial_event("launch", pid=pid, timeframe=run_cfg.test.timeframe)
+        meter = ResourceMeter.start(pid, ctx.meter_interval) if (ctx and ctx.meter_interval > 0) else None
+
+        t_wait = time.time()
+        abort_check = make_abort_check(abort_rules, common_run / "progress.jsonl", run_cfg.test.deposit, run_cfg.test.from_, run_cfg.test.to)
+        abort_check = _with_cancel(_with_journal(abort_check, journal_check), ctx.cancel if ctx else None)
         try:
-            proc.wait(timeout=10)
-        except Exception:
-            pass
+            ok, fb = wait_ready_and_report(common_run, local_run, guard_sec, report_html, short_watchdog_sec=120, abort_check=abort_check)
+        except TrialAborted as e:
+            _trial_event("wait", ok=False, aborted=e.reason, seconds=round(time.time() - t_wait, 3))
+            if meter:
+                ctx.resources = meter.stop()
+            t_post = time.time()
+            # El terminal se cierra siempre: seguir simulando un trial abortado sólo gasta el slot
+            if not _stop_pid_gently(pid, timeout=45, backend=backend):
+                print(f"WARNING No se pudo cerrar por PID: {pid}")
+            _trial_event("teardown", seconds=round(time.time() - t_post, 3))
+            if isinstance(e, JournalFatal):
+                print(f"WARNING Trial abortado ({e.reason}): {e.line}")
+            else:
+                print(f"WARNING Trial abortado ({e.reason}): {e.metrics}")
+            meta = {"aborted": e.reason, "partial": e.metrics, "run_id": run_id, "symbol": run_cfg.test.symbol,
+                    "timeframe": run_cfg.test.timeframe, "from": run_cfg.test.from_, "to": run_cfg.test.to, "pid": pid}
+            write_text(common_run / "meta.json", json.dumps(meta, indent=2))
+            raise
+    finally:
+        if journal_check:
+            journal_check.close()
+    _trial_event("wait", ok=ok, final_balance=fb, seconds=round(time.time() - t_wait, 3))
+    if meter:
+        # Hasta _READY: el cierre del terminal no cuenta como coste del backtest
+        ctx.resources = meter.stop()
+
+    post = ctx.post if (ctx and ok) else None
+    if post is None:
+        _finish_run(run_cfg, run_id, common_run, report_html, proc, pid, fb, auto_close)
+    else:
+        # El resultado ya se conoce: cierre, HTML y meta.json siguen en segundo plano y el slot queda libre;
+        # el próximo lanzamiento en este slot espera sólo al cierre
+        post.submit(run_id, _in_context, ctx, _finish_run, run_cfg, run_id, common_run, report_html, proc, pid, fb,
+                    auto_close, _slot_teardown_pending(slot))
 
     if not ok:
         try:
@@ -572,6 +791,38 @@ def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, bas
 
     if fb is not None:
         print(f"INFO Final balance: {fb}")
+    return ok, fb, run_id, common_run
+
+def _in_context(ctx: TrialContext, fn: Callable[..., Any], *args: Any) -> Any:
+    """Ejecuta fn en otro hilo con la identidad del trial (los eventos siguen llevando trial/slot/run_id)"""
+    with trial_context(ctx):
+        return fn(*args)
+
+def _finish_run(run_cfg: Config, run_id: str, common_run: Path, report_html: Optional[Path], proc: Any, pid: int,
+                fb: Optional[float], auto_close: bool, stopped: Optional[threading.Event] = None) -> None:
+    """Post-proceso de un run con resultado: cierre del terminal (set() de `stopped`), fechas del HTML y meta.json"""
+    t_post = time.time()
+    try:
+        if auto_close:
+            closed = _stop_pid_gently(pid, timeout=45, backend=backend_for(run_cfg))
+            if closed:
+                print(f"INFO MT5 cerrado por PID: {pid}")
+            else:
+                print(f"WARNING No se pudo cerrar por PID: {pid}")
+        else:
+            try:
+                proc.wait(timeout=10)
+            except Exception:
+                pass
+    finally:
+        if stopped is not None:
+            stopped.set()
+    _trial_event("teardown", seconds=round(time.time() - t_post, 3))
+
+    if report_html is not None:
+        override_report_html_dates(report_html, run_cfg.test.from_, run_cfg.test.to)
+
+    if fb is not None:
         meta = {
             "final_balance": fb,
             "run_id": run_id,
@@ -584,7 +835,86 @@ def run_single(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, bas
         write_text(common_run / "meta.json", json.dumps(meta, indent=2))
         print(f"INFO Meta guardada: {str(common_run / 'meta.json')}")
 
-    return ok, fb, run_id, common_run
+
+# ----------------------- Pre-calentamiento de historial -----------------------
+def _study_timeframes(cfg: Config) -> list[str]:
+    """Timeframes que el study puede pedir (search.space o grid del sampler)."""
+    found: list[str] = []
+    search = cfg.search
+    if search is not None:
+        spec = search.space.get("timeframe")
+        if isinstance(spec, (list, tuple)) and len(spec) >= 2 and spec[0] == "choice":
+            found.extend(str(v) for v in spec[1])
+        if isinstance(search.sampler, dict):
+            grid = search.sampler.get("search_space")
+            if isinstance(grid, dict) and isinstance(grid.get("timeframe"), (list, tuple)):
+                found.extend(str(v) for v in grid["timeframe"])
+    if not found:
+        found.append(cfg.test.timeframe)
+    # Sin duplicados, respetando el orden de aparición
+    return list(dict.fromkeys(found))
+
+def warmup_targets(cfg: Config) -> list[Tuple[str, str, int, str, str]]:
+    """Combinaciones distintas (symbol, timeframe, model, from, to) del study."""
+    return [
+        (cfg.test.symbol, tf, cfg.test.model, cfg.test.from_, cfg.test.to)
+        for tf in _study_timeframes(cfg)
+    ]
+
+def _warm_key(target: Tuple[str, str, int, str, str]) -> str:
+    return "|".join(str(x) for x in target)
+
+def _warm_state_path(layout: TerminalLayout) -> Path:
+    return layout.common_mt5_so_dir / f"_warm_{layout.terminal_hash}.json"
+
+def load_warm_state(layout: TerminalLayout) -> Dict[str, Any]:
+    try:
+        data = json.loads(read_text(_warm_state_path(layout)))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def prewarm_history(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, force: bool = False) -> Dict[str, Any]:
+    """
+    Lanza un test mínimo por cada combinación distinta del study para que MT5
+    descargue el historial y construya las cachés de ticks antes de los trials.
+    Se ejecuta en serie (un terminal) y persiste el estado para no repetirlo.
+    """
+    layout = get_layout(cfg)
+    state = {} if force else load_warm_state(layout)
+    summary: Dict[str, Any] = {"warmed": [], "skipped": [], "failed": [], "seconds": 0.0}
+    t_total = time.time()
+
+    for target in warmup_targets(cfg):
+        key = _warm_key(target)
+        if state.get(key, {}).get("ok"):
+            summary["skipped"].append(key)
+            continue
+
+        symbol, timeframe, model, from_, to = target
+        print(f"INFO Pre-calentando historial: {symbol} {timeframe} model={model} {from_} - {to}")
+        t0 = time.time()
+        try:
+            ok, fb, rid, rdir = run_single(
+                cfg, exe_path, guard_sec, auto_close=auto_close,
+                base_overrides={"timeframe": timeframe}, layout=layout,
+            )
+        except TimeoutError as e:
+            ok = False
+            print(f"WARNING Pre-calentamiento sin artefactos para {key}: {e}")
+        elapsed = time.time() - t0
+
+        state[key] = {"ok": bool(ok), "seconds": round(elapsed, 2), "warmed_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        (summary["warmed"] if ok else summary["failed"]).append(key)
+        write_text(_warm_state_path(layout), json.dumps(state, indent=2))
+
+    summary["seconds"] = round(time.time() - t_total, 2)
+    print(
+        f"INFO Pre-calentamiento: {len(summary['warmed'])} calentados, "
+        f"{len(summary['skipped'])} ya calientes, {len(summary['failed'])} fallidos "
+        f"en {summary['seconds']} s (no computa como tiempo de trials)"
+    )
+    return summary
 
 
 # ----------------------- Optuna -----------------------
@@ -602,95 +932,327 @@ def suggest_from_space(trial, space: Dict[str, Any]) -> Dict[str, Any]:
             raise RuntimeError(f"Tipo no soportado en search.space para {k}: {kind}")
     return params
 
-def _resolve_sampler(search_cfg: SearchCfg):
-    """Construye el sampler de Optuna según la configuración."""
-    try:
-        import optuna  # type: ignore  # noqa: F401
-        from optuna.samplers import GridSampler, TPESampler  # type: ignore
-    except Exception as e:
-        raise RuntimeError("Optuna no está instalado. pip install optuna") from e
-
-    cfg_sampler = search_cfg.sampler
-    if cfg_sampler is None:
-        return TPESampler(seed=42)
-
-    def _normalize_grid_space(raw: Dict[str, Any]) -> Dict[str, list[Any]]:
-        grid_space: Dict[str, list[Any]] = {}
-        for key, values in raw.items():
-            if isinstance(values, str) or not isinstance(values, (list, tuple, set)):
-                raise RuntimeError(
-                    f"GridSampler requiere un iterable de opciones en search.sampler.search_space para '{key}'."
-                )
-            if not values:
-                raise RuntimeError(
-                    f"GridSampler requiere al menos una opción para '{key}'."
-                )
-            grid_space[key] = list(values)
-        if not grid_space:
-            raise RuntimeError("GridSampler requiere al menos una variable en search.sampler.search_space.")
-        return grid_space
-
-    def _default_grid_space() -> Dict[str, list[Any]]:
-        if not search_cfg.space:
+def _normalize_grid_space(raw: Dict[str, Any]) -> Dict[str, list[Any]]:
+    grid_space: Dict[str, list[Any]] = {}
+    for key, values in raw.items():
+        if isinstance(values, str) or not isinstance(values, (list, tuple, set)):
             raise RuntimeError(
-                "GridSampler requiere que search.space defina variables tipo 'choice'."
+                f"GridSampler requiere un iterable de opciones en search.sampler.search_space para '{key}'."
             )
-        grid_space: Dict[str, list[Any]] = {}
-        for key, spec in search_cfg.space.items():
-            if not isinstance(spec, (list, tuple)) or not spec:
-                raise RuntimeError(f"Spec inválida para GridSampler en '{key}'.")
-            kind = spec[0]
-            if kind != "choice":
-                raise RuntimeError(
-                    f"GridSampler requiere 'choice' en search.space para la variable '{key}'."
-                )
-            if len(spec) < 2:
-                raise RuntimeError(f"Spec inválida para GridSampler en '{key}'.")
-            values = spec[1]
-            if isinstance(values, str) or not isinstance(values, (list, tuple, set)):
-                raise RuntimeError(
-                    f"GridSampler requiere un iterable de opciones en search.space para '{key}'."
-                )
-            if not values:
-                raise RuntimeError(
-                    f"GridSampler requiere al menos una opción para '{key}'."
-                )
-            grid_space[key] = list(values)
-        return grid_space
+        if not values:
+            raise RuntimeError(
+                f"GridSampler requiere al menos una opción para '{key}'."
+            )
+        grid_space[key] = list(values)
+    if not grid_space:
+        raise RuntimeError("GridSampler requiere al menos una variable en search.sampler.search_space.")
+    return grid_space
+
+def _default_grid_space(search_cfg: SearchCfg) -> Dict[str, list[Any]]:
+    if not search_cfg.space:
+        raise RuntimeError(
+            "GridSampler requiere que search.space defina variables tipo 'choice'."
+        )
+    grid_space: Dict[str, list[Any]] = {}
+    for key, spec in search_cfg.space.items():
+        if not isinstance(spec, (list, tuple)) or not spec:
+            raise RuntimeError(f"Spec inválida para GridSampler en '{key}'.")
+        kind = spec[0]
+        if kind != "choice":
+            raise RuntimeError(
+                f"GridSampler requiere 'choice' en search.space para la variable '{key}'."
+            )
+        if len(spec) < 2:
+            raise RuntimeError(f"Spec inválida para GridSampler en '{key}'.")
+        values = spec[1]
+        if isinstance(values, str) or not isinstance(values, (list, tuple, set)):
+            raise RuntimeError(
+                f"GridSampler requiere un iterable de opciones en search.space para '{key}'."
+            )
+        if not values:
+            raise RuntimeError(
+                f"GridSampler requiere al menos una opción para '{key}'."
+            )
+        grid_space[key] = list(values)
+    return grid_space
 
-    if isinstance(cfg_sampler, str):
-        sampler_name = cfg_sampler.strip().lower()
-        if sampler_name in {"tpe", "tp", "tpesampler"}:
-            return TPESampler(seed=42)
-        if sampler_name in {"grid", "grid_sampler", "gridsampler"}:
-            return GridSampler(_default_grid_space())
-        raise RuntimeError(f"Sampler desconocido en search.sampler: '{cfg_sampler}'.")
+_GRID_NAMES = {"grid", "grid_sampler", "gridsampler"}
 
+def _sampler_name(cfg_sampler: Any) -> str:
+    if isinstance(cfg_sampler, str):
+        return cfg_sampler.strip().lower()
     if isinstance(cfg_sampler, dict):
-        sampler_name = str(
+        return str(
             cfg_sampler.get("type")
             or cfg_sampler.get("name")
             or cfg_sampler.get("sampler")
             or ""
         ).strip().lower()
-        if sampler_name in {"tpe", "tp", "tpesampler"}:
-            seed = int(cfg_sampler.get("seed", 42))
-            return TPESampler(seed=seed)
-        if sampler_name in {"grid", "grid_sampler", "gridsampler"}:
-            raw_space = cfg_sampler.get("search_space")
-            if raw_space is None:
-                return GridSampler(_default_grid_space())
+    return ""
+
+def grid_space_for(search_cfg: SearchCfg) -> Optional[Dict[str, list[Any]]]:
+    """Espacio del GridSampler si el study es un grid; None en otro caso."""
+    cfg_sampler = search_cfg.sampler
+    if _sampler_name(cfg_sampler) not in _GRID_NAMES:
+        return None
+    if isinstance(cfg_sampler, dict):
+        raw_space = cfg_sampler.get("search_space")
+        if raw_space is not None:
             if not isinstance(raw_space, dict):
                 raise RuntimeError(
                     "GridSampler requiere que search.sampler.search_space sea un objeto JSON con listas de opciones."
                 )
-            return GridSampler(_normalize_grid_space(raw_space))
-        raise RuntimeError(f"Sampler desconocido en search.sampler: '{cfg_sampler}'.")
+            return _normalize_grid_space(raw_space)
+    return _default_grid_space(search_cfg)
+
+def _resolve_sampler(search_cfg: SearchCfg, constraints: Optional[ConstraintSet] = None):
+    """Construye el sampler de Optuna según la configuración (registro en samplers.py)."""
+    func = None
+    if constraints is not None:
+        func = lambda t: constraints.margins(_quantize_params_for_broker(dict(t.params)))
+    return build_sampler(search_cfg.sampler, grid_space_for(search_cfg), constraints_func=func)
+
+def constraints_for(cfg: Config) -> Optional[ConstraintSet]:
+    """search.constraints compiladas sobre los inputs fijos del EA (None si no hay ninguna)"""
+    if cfg.search is None or not cfg.search.constraints:
+        return None
+    known = set(cfg.search.space) | set(grid_space_for(cfg.search) or {})
+    base = dict(cfg.ea.inputs, timeframe=cfg.test.timeframe)
+    return ConstraintSet.build(cfg.search.constraints, known, base, cfg.search.constraints_mode)
 
-    raise RuntimeError(f"Tipo no soportado para search.sampler: {type(cfg_sampler)!r}.")
+def _print_schedule(plan: Dict[str, Any]) -> None:
+    if plan["predicted_makespan_seconds"] is None:
+        return
+    print(f"schedule: makespan previsto {plan['predicted_makespan_seconds']} s en {plan['n_slots']} slots "
+          f"(serie {plan['predicted_serial_seconds']} s, {plan['unknown_cost']} sin previsión), real {plan['seconds']} s")
+
+def _print_constraints(report: Dict[str, Any]) -> None:
+    print(f"constraints: {report['rejected']} de {report['checked']} puntos rechazados sin lanzar MT5 "
+          f"(~{report['saved_seconds']} s ahorrados) {report['by_constraint']}")
+
+
+def _start_status(tracker: ProgressTracker, status_port: Optional[int], status_every: float) -> list:
+    """Arranca el endpoint HTTP y/o la línea de consola de estado; devuelve lo que hay que detener."""
+    running: list = []
+    if status_port is not None:
+        server = StatusServer(tracker, port=status_port).start()
+        print(f"INFO Estado en vivo: http://127.0.0.1:{server.port}/status")
+        running.append(server)
+    if status_every and status_every > 0:
+        running.append(ConsoleStatus(tracker, every=status_every).start())
+    return running
+
+def _cost_features(cfg: Config, params: Dict[str, Any]) -> Dict[str, Any]:
+    return trial_features(params.get("timeframe", cfg.test.timeframe), cfg.test.model,
+                          cfg.test.from_, cfg.test.to, params)
+
+def _cost_model_path(log_dir: str) -> Path:
+    return Path(log_dir) / "cost_model.json"
+
+def _slot_utilisation(tracker: ProgressTracker) -> float:
+    """Fracción media del tiempo de pared que los slots pasaron ocupados por un trial"""
+    slots = tracker.snapshot()["slots"].values()
+    return round(sum(s["utilisation"] for s in slots) / max(1, len(slots)), 4)
+
+def _make_budget(timeout: Optional[float], drain_grace: float) -> Optional[TimeBudget]:
+    if not timeout or timeout <= 0:
+        return None
+    print(f"INFO Presupuesto de tiempo: {timeout} s (drenaje de {drain_grace} s para los trials en vuelo)")
+    return TimeBudget(timeout, grace=drain_grace)
+
+def _write_results(log_dir: str, cfg: Config, trials: list[Dict[str, Any]], extra: Dict[str, Any]) -> Path:
+    """Resultados del study en <log_dir>/results.json (legible por --warm-start-from)"""
+    path = Path(log_dir) / "results.json"
+    rows = [dict(t, **{"from": cfg.test.from_, "to": cfg.test.to}) for t in trials]
+    for row in rows:
+        # -inf (timeout/fallo) no es JSON válido: queda null, que --warm-start-from descarta
+        if isinstance(row.get("value"), float) and not math.isfinite(row["value"]):
+            row["value"] = None
+    write_text(path, json.dumps({"trials": rows, **extra}, indent=2, default=str))
+    print(f"INFO Resultados guardados: {path}")
+    return path
+
+def _make_ledger(resource_interval: float) -> Optional[ResourceLedger]:
+    """Contabilidad de recursos por trial (None = desactivada o sin psutil)"""
+    if not resource_interval or resource_interval <= 0:
+        return None
+    if _psutil is None:
+        print("WARNING psutil no está instalado: sin contabilidad de recursos por trial. pip install psutil")
+        return None
+    return ResourceLedger(resource_interval)
 
+def _print_capacity(capacity: Dict[str, Any]) -> None:
+    print(f"capacity ({capacity['cpus']} CPUs, {capacity['mem_mb']} MB):")
+    for key, c in capacity["groups"].items():
+        print(f"  {key}: {c['slots']} slots (CPU {c['by_cpu']}, RAM {c['by_mem']})")
+
+class SlotShardedRunner(ShardedRunner):
+    """
+    ShardedRunner cuyos tramos corren dentro del trial: cada uno con una copia de su TrialContext
+    (layout del slot, cancel, medidor, artefactos y eventos). El slot del trial va procesando
+    tramos y los slots libres del pool se suman sin esperar, así nunca hay interbloqueo.
+    """
 
-def run_optuna(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs: int, auto_close: bool) -> None:
+    def _map(self, tasks: list[Callable[[], Any]]) -> list[Any]:
+        parent = current_trial_context()
+        if parent is None or parent.slots is None:
+            return super()._map(tasks)
+        pending: "queue.Queue[Tuple[int, Callable[[], Any]]]" = queue.Queue()
+        for item in enumerate(tasks):
+            pending.put(item)
+        results: list[Any] = [None] * len(tasks)
+        failures: list[BaseException] = []
+        usage: list[Dict[str, Any]] = []
+        lock = threading.Lock()
+
+        def work(slot: int) -> None:
+            while not failures:
+                try:
+                    i, task = pending.get_nowait()
+                except queue.Empty:
+                    return
+                ctx = replace(parent, slot=slot, run_id=None, resources=None)
+                try:
+                    with trial_context(ctx):
+                        results[i] = task()
+                except BaseException as e:  # TimeoutError/TrialAborted: se relanza en el hilo del trial
+                    with lock:
+                        failures.append(e)
+                finally:
+                    if ctx.resources:
+                        with lock:
+                            usage.append(ctx.resources)
+
+        def helper() -> None:
+            with parent.slots.try_acquire() as slot:
+                if slot is not None:
+                    work(slot)
+
+        threads = [threading.Thread(target=helper, daemon=True) for _ in range(len(tasks) - 1)]
+        for t in threads:
+            t.start()
+        work(parent.slot)
+        for t in threads:
+            t.join()
+        parent.resources = combine_resources(usage)
+        if failures:
+            raise failures[0]
+        return results
+
+def _make_runner(cfg: Config, shards: int, drift_every: int) -> Optional[ShardedRunner]:
+    """Runner con sharding por fechas (None = run_single normal)"""
+    if shards <= 1:
+        return None
+    if not cfg.ea.stateless_across_boundaries:
+        raise RuntimeError("--shards requiere ea.stateless_across_boundaries = true en el config "
+                           "(el EA no debe arrastrar posiciones ni estado entre tramos de fechas).")
+    print(f"INFO Sharding por fechas: {shards} tramos por trial ({cfg.ea.shard_compounding}), "
+          f"comprobación de deriva cada {drift_every} trials")
+    return SlotShardedRunner(run_single, shards, compounding=cfg.ea.shard_compounding, drift_every=drift_every)
+
+def _run_trial(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool, number: int, params: Dict[str, Any],
+               log: OptimizerLogger, slots: SlotPool, errors: ErrorHandler,
+               tracker: Optional[ProgressTracker] = None, cost: Optional[CostModel] = None,
+               runner: Optional[Callable[..., Tuple[bool, Optional[float], str, Path]]] = None,
+               budget: Optional[TimeBudget] = None, post: Optional[PostProcessor] = None,
+               ledger: Optional[ResourceLedger] = None, artifacts: str = "rich") -> Tuple[float, str, Dict[str, Any]]:
+    """
+    Ejecuta un trial en un slot libre y deja su registro estructurado.
+    Devuelve (valor, fase, extra); en trials abortados extra lleva el motivo y las métricas parciales.
+    """
+    sink = _fanout(log.event, tracker.event if tracker else None)
+    with slots.acquire() as slot, trial_context(TrialContext(trial=number, slot=slot, sink=sink,
+                                                                       cancel=budget.cancel_reason if budget else None,
+                                                                       post=post,
+                                                                       meter_interval=ledger.interval if ledger else 0.0,
+                                                                       artifacts=artifacts, slots=slots)) as ctx:
+        concurrency = slots.in_use()
+        if tracker:
+            tracker.trial_started(number, slot, params)
+        feats = _cost_features(cfg, params)
+        predicted = cost.predict(feats) if cost else None
+        t0 = time.time()
+        value = float("-inf")
+        phase = "failed"
+        extra: Dict[str, Any] = {}
+        try:
+            ok, fb, rid, rdir = (runner or run_single)(cfg, exe_path, guard_sec, auto_close=auto_close, base_overrides=params)
+            ctx.run_id = rid
+            if ok and fb is not None:
+                value = float(fb) - float(cfg.test.deposit)
+                phase = "complete"
+        except JournalFatal as e:
+            # Error del entorno, no del set: no hay valor parcial que enseñar al sampler
+            phase = "fatal"
+            extra = {"abort_reason": e.reason, "error_class": e.kind, "journal": e.lines}
+        except TrialAborted as e:
+            phase = "aborted"
+            extra = {"abort_reason": e.reason, "partial": e.metrics}
+        except TimeoutError as e:
+            phase = "timeout"
+            errors.handle(e, {"trial": number, "run_id": ctx.run_id, "slot": slot})
+        seconds = round(time.time() - t0, 3)
+        if ctx.resources:
+            extra["resources"] = dict(ctx.resources, concurrency=concurrency)
+            if ledger:
+                ledger.record(feats, ctx.resources, concurrency)
+        if cost and phase == "complete":
+            cost.record(predicted, seconds, trial=number, features=feats)
+            cost.observe(feats, seconds)
+        log.log_trial(number, params, value, run_id=ctx.run_id, slot=slot,
+                      phase=phase, seconds=seconds, predicted_seconds=predicted, artifacts=artifacts, **extra)
+        if tracker:
+            tracker.trial_finished(number, slot, value, phase, params=params, seconds=seconds)
+    return value, phase, extra
+
+def rerun_finalists(cfg: Config, exe_path: str, guard_sec: int, auto_close: bool,
+                    top: list[Tuple[int, Dict[str, Any], float]], log: OptimizerLogger, slots: SlotPool,
+                    errors: ErrorHandler, post: Optional[PostProcessor] = None) -> Dict[str, Any]:
+    """
+    Re-ejecuta en modo rich (HTML + trades.csv) los mejores (número, params, valor) de una búsqueda
+    lean, en los mismos slots y con su número de trial: el registro nuevo lleva artifacts="rich".
+    Rango completo y sin presupuesto; el coste no alimenta el modelo (un run rico tarda más).
+    """
+    run_ids: Dict[int, str] = {}
+
+    def rich_single(run_cfg, exe, guard, auto_close=False, base_overrides=None):
+        ok, fb, rid, rdir = run_single(run_cfg, exe, guard, auto_close=auto_close, base_overrides=base_overrides)
+        run_ids[current_trial_context().trial] = rid
+        return ok, fb, rid, rdir
+
+    print(f"INFO Re-ejecutando {len(top)} finalistas con artefactos rich")
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=slots.n_slots) as pool:
+        futures = [(number, params, search_value,
+                    pool.submit(_run_trial, cfg, exe_path, guard_sec, auto_close, number, params, log, slots, errors,
+                                None, None, rich_single, None, post, None, "rich"))
+                   for number, params, search_value in top]
+        rows = []
+        for number, params, search_value, fut in futures:
+            value, phase, _extra = fut.result()
+            ok = phase == "complete"
+            rows.append({"number": number, "params": params, "search_value": search_value,
+                         "value": value if ok else None, "phase": phase, "run_id": run_ids.get(number),
+                         # Un backtest determinista debe repetir su valor; si no, el lean no es fiable
+                         "drift": round(value - search_value, 2) if ok else None})
+    return {"k": len(top), "seconds": round(time.time() - t0, 2), "failed": sum(1 for r in rows if r["phase"] != "complete"),
+            "trials": rows}
+
+def _print_finalists(report: Dict[str, Any]) -> None:
+    print(f"finalists: {report['k'] - report['failed']}/{report['k']} re-ejecutados en rich ({report['seconds']} s)")
+    for row in report["trials"]:
+        print(f"  #{row['number']} value={row['value']} drift={row['drift']} run_id={row['run_id']}")
+
+def run_optuna(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs: int, auto_close: bool, prewarm: bool = False, log_dir: str = "logs",
+               status_port: Optional[int] = None, status_every: float = 0, warm_start_from: Optional[list[str]] = None,
+               warm_start_mode: str = "inject", warm_start_downweight: bool = False,
+               shards: int = 0, shard_drift_every: int = 20, timeout: Optional[float] = None, drain_grace: float = 60.0,
+               post_workers: int = 2, resource_interval: float = 1.0, artifacts: str = "rich", finalists: int = 3) -> Any:
+    """
+    Ejecuta el study de Optuna y devuelve el objeto study al terminar.
+    Con artifacts="lean" los trials sólo dejan report.json y al final los `finalists` mejores
+    se re-ejecutan en rich (rerun_finalists).
+    """
     try:
         import optuna  # type: ignore
     except Exception as e:
@@ -698,8 +1260,12 @@ def run_optuna(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs
 
     if cfg.search is None:
         raise RuntimeError("No hay configuración de 'search' para Optuna.")
+    if artifacts not in ARTIFACT_LEVELS:
+        raise RuntimeError(f"Nivel de artefactos no soportado: {artifacts} (usa {', '.join(ARTIFACT_LEVELS)})")
 
-    sampler = _resolve_sampler(cfg.search)
+    runner = _make_runner(cfg, shards, shard_drift_every)
+    constraints = constraints_for(cfg)
+    sampler = _resolve_sampler(cfg.search, constraints)
     study = optuna.create_study(
         direction="maximize",
         study_name=f"mt5_opt_{cfg.test.symbol}_{cfg.test.timeframe}",
@@ -707,31 +1273,371 @@ def run_optuna(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs
     )
     print(f"INFO Study: {study.study_name}")
 
+    if warm_start_from:
+        if grid_space_for(cfg.search) is not None:
+            print("WARNING --warm-start-from se ignora con GridSampler: el grid recorre todos sus puntos igualmente.")
+        else:
+            ws = apply_warm_start(study, cfg, warm_start_from, mode=warm_start_mode, down_weight=warm_start_downweight,
+                                  constraints=constraints)
+            study.set_user_attr("warm_start", ws)
+            print(f"INFO Warm start ({ws['mode']}): {ws['applied']} aplicados de {ws['loaded']} cargados "
+                  f"({ws['mapped']} adaptados al espacio, {ws['dropped']} descartados)")
+
+    if prewarm:
+        warm = prewarm_history(cfg, exe_path, guard_sec, auto_close=auto_close)
+        study.set_user_attr("prewarm_seconds", warm["seconds"])
+
+    log = OptimizerLogger(log_dir=log_dir, async_mode=True)
+    log.log_optimization_start({
+        "test": {"symbol": cfg.test.symbol, "timeframe": cfg.test.timeframe, "from": cfg.test.from_, "to": cfg.test.to},
+        "optimizer": {"n_trials": n_trials},
+    })
+    slots = SlotPool(n_jobs)
+    errors = ErrorHandler(log)
+    tracker = ProgressTracker(n_trials=n_trials, n_slots=n_jobs)
+    cost = CostModel.load(_cost_model_path(log_dir))
+    tracker.providers["cost_model"] = cost.accuracy
+    if runner:
+        tracker.providers["sharding"] = runner.summary
+    budget = _make_budget(timeout, drain_grace)
+    if budget:
+        tracker.providers["budget"] = budget.summary
+    post = PostProcessor(post_workers) if post_workers > 0 else None
+    if post:
+        tracker.providers["postprocess"] = post.stats
+    ledger = _make_ledger(resource_interval)
+    if ledger:
+        tracker.providers["resources"] = ledger.summary
+    # resample: n_trials cuenta lanzamientos; los puntos rechazados no consumen cupo
+    resample = constraints is not None and constraints.mode == "resample"
+    if constraints:
+        tracker.providers["constraints"] = constraints.report
+    quota = {"launched": 0}
+    quota_lock = threading.Lock()
+
     def objective(trial):
         trial_params = suggest_from_space(trial, cfg.search.space)
         trial_params = _quantize_params_for_broker(trial_params)
-        try:
-            ok, fb, rid, rdir = run_single(cfg, exe_path, guard_sec, auto_close=auto_close, base_overrides=trial_params)
-            if not ok or fb is None:
-                return float("-inf")
-        except TimeoutError:
-            return float("-inf")
-        return float(fb) - float(cfg.test.deposit)
-
-    study.optimize(
-        objective,
-        n_trials=n_trials,
-        n_jobs=max(1, n_jobs),
-        gc_after_trial=True,
-        catch=(TimeoutError,)
-    )
-
-    best = study.best_trial
+        if constraints:
+            violated = constraints.violations(trial_params)
+            if violated:
+                # Sin lanzar MT5: pruned, y el TPE lo ve como no factible vía constraints_func
+                constraints.record_saved(cost.predict(_cost_features(cfg, trial_params)))
+                trial.set_user_attr("constraints_violated", violated)
+                if resample and constraints.exhausted():
+                    print(f"WARNING {constraints.consecutive} puntos seguidos incumplen search.constraints: "
+                          f"se para el study (¿restricciones imposibles?)")
+                    study.stop()
+                raise optuna.TrialPruned(f"restricciones: {', '.join(violated)}")
+        if resample:
+            with quota_lock:
+                if quota["launched"] >= n_trials:
+                    study.stop()
+                    trial.set_user_attr("quota_reached", True)
+                    raise optuna.TrialPruned("n_trials lanzados")
+                quota["launched"] += 1
+        if budget:
+            predicted = cost.predict(_cost_features(cfg, trial_params))
+            if not budget.fits(predicted):
+                # No cabe: se deja sin lanzar y se para el study (lo que está en vuelo drena)
+                study.stop()
+                trial.set_user_attr("budget_skipped", {"predicted": predicted, "remaining": round(budget.remaining(), 1)})
+                raise optuna.TrialPruned("presupuesto insuficiente para el siguiente trial")
+        value, phase, extra = _run_trial(cfg, exe_path, guard_sec, auto_close, trial.number, trial_params, log, slots, errors, tracker, cost, runner, budget, post, ledger,
+                                         artifacts)
+        if extra.get("resources"):
+            trial.set_user_attr("resources", extra["resources"])
+        if phase == "fatal":
+            # FAIL en el study (catch abajo): TPE no lo usa y el journal queda en los atributos
+            trial.set_user_attr("error_class", extra["error_class"])
+            trial.set_user_attr("journal", extra["journal"])
+            raise JournalFatal(extra["error_class"], extra["journal"][-1], extra["journal"])
+        if phase == "aborted":
+            # Pruned con el valor parcial como intermedio: TPE lo ordena por cuánto llegó a perder
+            partial = extra["partial"]
+            trial.set_user_attr("abort_reason", extra["abort_reason"])
+            trial.set_user_attr("partial", partial)
+            if partial.get("equity") is not None:
+                trial.report(float(partial["equity"]) - float(cfg.test.deposit), step=int(partial.get("pct_of_range") or 0))
+            raise optuna.TrialPruned(extra["abort_reason"])
+        return value
+
+    t_trials = time.time()
+    monitors = _start_status(tracker, status_port, status_every)
+    try:
+        study.optimize(
+            objective,
+            n_trials=None if resample else n_trials,
+            n_jobs=max(1, n_jobs),
+            gc_after_trial=True,
+            catch=(TimeoutError, JournalFatal)
+        )
+        trials_seconds = round(time.time() - t_trials, 2)
+        utilisation = _slot_utilisation(tracker)
+        study.set_user_attr("slot_utilisation", utilisation)
+        if artifacts == "lean" and finalists > 0:
+            # Los timeouts quedan COMPLETE con -inf: no son finalistas (drift infinito en results.json)
+            ranked = sorted((t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                             if t.value is not None and math.isfinite(t.value)),
+                            key=lambda t: t.value, reverse=True)
+            top, seen = [], set()
+            for t in ranked:
+                params = _quantize_params_for_broker(dict(t.params))
+                # Los inyectados por warm start no tienen run en este study (los encolados sí se ejecutaron);
+                # un punto repetido, una vez
+                if t.user_attrs.get("warm_start_injected") or point_key(params) in seen:
+                    continue
+                seen.add(point_key(params))
+                top.append((t.number, params, t.value))
+                if len(top) >= finalists:
+                    break
+            if top:
+                study.set_user_attr("finalists", rerun_finalists(cfg, exe_path, guard_sec, auto_close, top, log, slots, errors, post))
+        if post:
+            post.close()
+            study.set_user_attr("postprocess", post.stats())
+        acc = cost.accuracy()
+        study.set_user_attr("cost_model", {k: v for k, v in acc.items() if k != "recent"})
+        if runner:
+            study.set_user_attr("sharding", runner.summary())
+        if budget:
+            study.set_user_attr("budget", budget.summary())
+        if ledger:
+            study.set_user_attr("resources", ledger.summary())
+            study.set_user_attr("capacity", ledger.capacity())
+        if constraints:
+            study.set_user_attr("constraints", constraints.report())
+        completed = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+        best = study.best_trial if completed else None
+        log.log_optimization_end(best.params if best else None, best.value if best else None, trials_seconds)
+    finally:
+        if post:
+            post.close()
+        for m in monitors:
+            m.stop()
+        cost.save(_cost_model_path(log_dir))
+        log.close()
+    _write_results(log_dir, cfg, [
+        {"number": t.number, "params": t.params, "value": t.value, "state": t.state.name}
+        for t in study.get_trials(deepcopy=False)
+    ], {k: v for k, v in study.user_attrs.items() if k in ("cost_model", "sharding", "budget", "warm_start", "slot_utilisation", "postprocess",
+                                                             "resources", "capacity", "constraints", "finalists")})
+
+    if constraints:
+        _print_constraints(study.user_attrs["constraints"])
+    if "finalists" in study.user_attrs:
+        _print_finalists(study.user_attrs["finalists"])
     print("\n=== BEST TRIAL ===")
+    if best is None:
+        print("value: None (ningún trial completado)")
+        return study
     print(f"value: {best.value}")
+    if prewarm:
+        print(f"prewarm_seconds: {study.user_attrs.get('prewarm_seconds')}")
+    print(f"trials_seconds: {trials_seconds}")
+    print(f"slot_utilisation: {utilisation}")
+    print(f"cost_model: MAE={acc['mae_seconds']} s MAPE={acc['mape']} (n={acc['n']})")
+    if budget:
+        print(f"budget: {budget.summary()}")
+    if ledger:
+        _print_capacity(study.user_attrs["capacity"])
     print("params:")
     for k, v in best.params.items():
         print(f"  {k}: {v}")
+    return study
+
+
+# ----------------------- Grid con memoria acotada -----------------------
+def iter_grid_points(grid: Dict[str, list[Any]]) -> Iterator[Dict[str, Any]]:
+    """Recorre el grid de forma perezosa (producto cartesiano en orden de claves)."""
+    keys = list(grid.keys())
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        yield dict(zip(keys, combo))
+
+def run_grid_bounded(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs: int, auto_close: bool, log_dir: str = "logs",
+                     status_port: Optional[int] = None, status_every: float = 0,
+                     shards: int = 0, shard_drift_every: int = 20, timeout: Optional[float] = None,
+                     drain_grace: float = 60.0, post_workers: int = 2, resource_interval: float = 1.0,
+                     grid_shard: Optional[Tuple[int, int]] = None, shard_dir: Optional[str] = None,
+                     artifacts: str = "rich", finalists: int = 3) -> Dict[str, Any]:
+    """
+    Barrido de grid con memoria constante: sin study de Optuna en RAM, los
+    registros de cada trial van al JSONL estructurado y sólo se retiene el mejor.
+    Con grid_shard=(i, N) sólo se lanzan los puntos del shard i y cada resultado se anexa
+    a su fichero en shard_dir (por defecto log_dir); el número de trial es el índice global.
+    Con artifacts="lean" se retienen los `finalists` mejores para re-ejecutarlos en rich
+    (con shards, los de cada shard: entre todos cubren el top global).
+    """
+    grid = grid_space_for(cfg.search) if cfg.search is not None else None
+    if grid is None:
+        raise RuntimeError("--bounded-memory requiere un study con GridSampler (search.sampler = grid).")
+    if artifacts not in ARTIFACT_LEVELS:
+        raise RuntimeError(f"Nivel de artefactos no soportado: {artifacts} (usa {', '.join(ARTIFACT_LEVELS)})")
+    n_jobs = max(1, n_jobs)
+    constraints = constraints_for(cfg)
+    shard_log: Optional[ShardLog] = None
+    if grid_shard:
+        shard, n_shards = grid_shard
+        cap = n_trials if n_trials > 0 else None
+        total = sum(1 for _ in enumerate_grid(grid, cap, _quantize_params_for_broker))
+        context = {"symbol": cfg.test.symbol, "timeframe": cfg.test.timeframe, "model": cfg.test.model,
+                   "from": cfg.test.from_, "to": cfg.test.to, "deposit": cfg.test.deposit,
+                   "ea": cfg.ea.name, "inputs": cfg.ea.inputs}
+        if constraints:
+            # Otras restricciones rechazan otros puntos: no se mezclan en la misma carpeta
+            context["constraints"] = cfg.search.constraints
+        shard_log = ShardLog(Path(shard_dir or log_dir), shard, n_shards, fingerprint(grid, context, cap), total, context)
+        done = shard_log.completed()
+        mine = len(range(shard - 1, total, n_shards))
+        limit = mine - len(done)
+        indexed: Iterator[Tuple[int, Dict[str, Any]]] = (
+            (i, p) for i, p in shard_points(enumerate_grid(grid, cap, _quantize_params_for_broker), shard, n_shards)
+            if i not in done)
+        shard_log.start(mine, len(done))
+        print(f"INFO Shard {shard}/{n_shards} del grid: {mine} de {total} puntos ({len(done)} ya completos), "
+              f"{n_jobs} slots -> {shard_log.path}")
+    else:
+        total = 1
+        for values in grid.values():
+            total *= len(values)
+        limit = min(n_trials, total) if n_trials > 0 else total
+        indexed = enumerate(itertools.islice(iter_grid_points(grid), limit))
+        print(f"INFO Grid acotado en memoria: {limit} de {total} combinaciones, {n_jobs} slots")
+    runner = _make_runner(cfg, shards, shard_drift_every)
+
+    log = OptimizerLogger(log_dir=log_dir, async_mode=True)
+    log.log_optimization_start({
+        "test": {"symbol": cfg.test.symbol, "timeframe": cfg.test.timeframe, "from": cfg.test.from_, "to": cfg.test.to},
+        "optimizer": {"n_trials": limit},
+    })
+    slots = SlotPool(n_jobs)
+    errors = ErrorHandler(log)
+    tracker = ProgressTracker(n_trials=limit, n_slots=n_jobs)
+    cost = CostModel.load(_cost_model_path(log_dir))
+    tracker.providers["cost_model"] = cost.accuracy
+    if runner:
+        tracker.providers["sharding"] = runner.summary
+    budget = _make_budget(timeout, drain_grace)
+    if budget:
+        tracker.providers["budget"] = budget.summary
+    post = PostProcessor(post_workers) if post_workers > 0 else None
+    if post:
+        tracker.providers["postprocess"] = post.stats
+    ledger = _make_ledger(resource_interval)
+    if ledger:
+        tracker.providers["resources"] = ledger.summary
+    if constraints:
+        tracker.providers["constraints"] = constraints.report
+    summary: Dict[str, Any] = {"best_value": None, "best_params": None, "best_trial": None, "phases": {}}
+    # Min-heap con los `finalists` mejores (valor, número, params) para la re-ejecución rich
+    keep = finalists if artifacts == "lean" else 0
+    top: list[Tuple[float, int, Dict[str, Any]]] = []
+
+    def predict(params: Dict[str, Any]) -> Optional[float]:
+        return cost.predict(_cost_features(cfg, params))
+
+    def consume(done) -> None:
+        for fut in done:
+            number, params = futures.pop(fut)
+            value, phase, _extra = fut.result()
+            summary["phases"][phase] = summary["phases"].get(phase, 0) + 1
+            if shard_log:
+                shard_log.record(number, params, value, phase)
+            if phase == "complete" and (summary["best_value"] is None or value > summary["best_value"]):
+                summary.update(best_value=value, best_params=params, best_trial=number)
+            if phase == "complete" and keep > 0:
+                heapq.heappush(top, (value, number, params))
+                if len(top) > keep:
+                    heapq.heappop(top)
+
+    # Makespan previsto con las predicciones del modelo de coste al lanzar, frente al real
+    plan = SchedulePlan(n_jobs)
+    t0 = time.time()
+    futures: Dict[Any, Tuple[int, Dict[str, Any]]] = {}
+    monitors = _start_status(tracker, status_port, status_every)
+    try:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            # LPT por bloques: dentro de cada bloque, primero lo que se prevé más largo
+            points = chunked_lpt(indexed, lambda item: predict(item[1]), chunk=max(32, n_jobs * 8))
+            for number, params in points:
+                if len(futures) >= n_jobs:
+                    done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                    consume(done)
+                if budget and budget.expired():
+                    break
+                params = _quantize_params_for_broker(params)
+                predicted = predict(params)
+                if constraints and constraints.violations(params):
+                    constraints.record_saved(predicted)
+                    if shard_log:
+                        shard_log.record(number, params, None, "rejected")
+                    continue
+                # Un punto largo que no cabe se salta; los siguientes (más cortos por LPT) pueden caber
+                if budget and not budget.fits(predicted):
+                    continue
+                plan.add(predicted)
+                fut = pool.submit(_run_trial, cfg, exe_path, guard_sec, auto_close, number, params, log, slots, errors, tracker, cost, runner, budget, post, ledger,
+                                  artifacts)
+                futures[fut] = (number, params)
+            done, _ = wait(list(futures))
+            consume(done)
+        summary["seconds"] = round(time.time() - t0, 2)
+        summary["slot_utilisation"] = _slot_utilisation(tracker)
+        summary["schedule"] = dict(plan.summary(), seconds=summary["seconds"])
+        if top:
+            summary["finalists"] = rerun_finalists(cfg, exe_path, guard_sec, auto_close,
+                                                   [(n, p, v) for v, n, p in sorted(top, key=lambda x: (-x[0], x[1]))],
+                                                   log, slots, errors, post)
+        if post:
+            post.close()
+            summary["postprocess"] = post.stats()
+        summary["errors"] = errors.get_error_summary()["error_groups"][:10]
+        summary["cost_model"] = cost.accuracy()
+        if runner:
+            summary["sharding"] = runner.summary()
+        if budget:
+            summary["budget"] = budget.summary()
+        if ledger:
+            summary["resources"] = ledger.summary()
+            summary["capacity"] = ledger.capacity()
+        if constraints:
+            summary["constraints"] = constraints.report()
+        if shard_log:
+            shard_log.finish(summary["phases"])
+            summary["grid_shard"] = {"shard": shard_log.shard, "n_shards": shard_log.n_shards, "total": shard_log.total,
+                                     "recorded": shard_log.recorded, "file": str(shard_log.path)}
+        log.log_optimization_end(summary["best_params"], summary["best_value"], summary["seconds"])
+    finally:
+        if post:
+            post.close()
+        for m in monitors:
+            m.stop()
+        cost.save(_cost_model_path(log_dir))
+        log.close()
+    # Sin study en RAM: el detalle de cada trial está en el JSONL, aquí sólo el mejor
+    best_rows = [{"number": summary["best_trial"], "params": summary["best_params"], "value": summary["best_value"],
+                  "state": "COMPLETE"}] if summary["best_params"] is not None else []
+    _write_results(log_dir, cfg, best_rows, {k: v for k, v in summary.items() if not k.startswith("best_")})
+
+    print("\n=== BEST TRIAL ===")
+    print(f"value: {summary['best_value']}")
+    print(f"trials_seconds: {summary['seconds']}")
+    print(f"slot_utilisation: {summary['slot_utilisation']}")
+    print(f"phases: {summary['phases']}")
+    print(f"cost_model: MAE={summary['cost_model']['mae_seconds']} s MAPE={summary['cost_model']['mape']}")
+    _print_schedule(summary["schedule"])
+    if budget:
+        print(f"budget: {summary['budget']}")
+    if ledger:
+        _print_capacity(summary["capacity"])
+    if constraints:
+        _print_constraints(summary["constraints"])
+    if "finalists" in summary:
+        _print_finalists(summary["finalists"])
+    print("params:")
+    for k, v in (summary["best_params"] or {}).items():
+        print(f"  {k}: {v}")
+    return summary
 
 
 # ----------------------- CLI -----------------------
@@ -743,12 +1649,54 @@ def main() -> None:
     ap.add_argument("--n-trials", dest="n_trials", type=int, default=0, help="Cantidad de trials para Optuna.")
     ap.add_argument("--trials", dest="n_trials_alias", type=int, default=None, help="Alias de --n-trials.")
     ap.add_argument("--n-jobs", dest="n_jobs", type=int, default=1, help="Paralelismo Optuna.")
-    ap.add_argument("--timeout", type=int, default=None, help="(Reservado) Timeout total para Optuna.")
+    ap.add_argument("--timeout", type=int, default=None,
+                    help="Presupuesto total en segundos: sólo se lanza un trial si su runtime previsto cabe en lo que queda.")
+    ap.add_argument("--drain-grace", type=float, default=60.0,
+                    help="Segundos que se deja terminar a los trials en vuelo al agotarse --timeout antes de cerrar sus terminales.")
     ap.add_argument("--guard-sec", type=int, default=300, help="Tiempo máx de espera por artefactos por run.")
     ap.add_argument("--auto-close", action="store_true", help="Cierra MT5 por PID al terminar cada run.")
+    ap.add_argument("--prewarm", action="store_true", help="Pre-calienta historial/ticks por cada timeframe del study antes de los trials.")
+    ap.add_argument("--log-dir", default="logs", help="Directorio del log y del JSONL estructurado por trial.")
+    ap.add_argument("--status-port", type=int, default=None, help="Sirve el estado en vivo en http://127.0.0.1:PORT/status (0 = puerto libre).")
+    ap.add_argument("--status-every", type=float, default=0, help="Imprime una línea de estado en consola cada N segundos.")
+    ap.add_argument("--bounded-memory", action="store_true", help="Grid con memoria constante: sin study en RAM, trials volcados al JSONL.")
+    ap.add_argument("--warm-start-from", action="append", default=None, metavar="FUENTE",
+                    help="Trials previos: JSONL de trials, JSON de resultados o carpeta MT5_SO con report.json (repetible).")
+    ap.add_argument("--warm-start-mode", choices=("inject", "enqueue"), default="inject",
+                    help="inject: añade los previos como completados; enqueue: re-evalúa los 10 mejores.")
+    ap.add_argument("--warm-start-downweight", action="store_true",
+                    help="Reescala y encoge hacia la mediana los trials de rangos de fechas distintos.")
+    ap.add_argument("--shards", type=int, default=0,
+                    help="Divide test.from..test.to en K tramos por trial y los ejecuta en paralelo (requiere ea.stateless_across_boundaries).")
+    ap.add_argument("--shard-drift-every", type=int, default=20,
+                    help="Cada N trials con sharding ejecuta también el rango completo para vigilar la deriva (0 = nunca).")
+    ap.add_argument("--post-workers", type=int, default=2,
+                    help="Hilos de post-proceso (HTML, cierre del terminal, meta.json) fuera del slot; 0 = dentro del trial.")
+    ap.add_argument("--resource-interval", type=float, default=1.0,
+                    help="Segundos entre muestras de CPU/RSS/IO del terminal por trial (0 = sin contabilidad).")
+    ap.add_argument("--grid-shard", default=None, metavar="i/N",
+                    help="Grid repartido entre hosts: ejecuta sólo el shard i de N (orden estable tras cuantizar).")
+    ap.add_argument("--grid-shard-dir", default=None,
+                    help="Carpeta compartida para los ficheros de shard (por defecto --log-dir); únelos con grid_shards.py merge.")
+    ap.add_argument("--artifacts", choices=ARTIFACT_LEVELS, default="rich",
+                    help="Artefactos de los trials de búsqueda: rich (HTML + trades.csv + report.json) o lean (sólo report.json).")
+    ap.add_argument("--finalists", type=int, default=3,
+                    help="Con --artifacts lean, re-ejecuta en rich los N mejores trials al terminar (0 = ninguno).")
+    ap.add_argument("--skip-preflight", action="store_true",
+                    help="No verifica exe, hash, Expert, permisos ni search.space antes de lanzar.")
     args = ap.parse_args()
 
-    cfg = load_config(args.config)
+    if args.skip_preflight:
+        cfg = load_config(args.config)
+    else:
+        from preflight import run_preflight  # import diferido: preflight importa este módulo
+        report, cfg = run_preflight(args.config, args.exe)
+        if report.errors or report.warnings:
+            print(report.format())
+        if not report.ok:
+            print("ERROR: Preflight fallido; corrige lo anterior (o usa --skip-preflight).")
+            sys.exit(2)
+        print(f"INFO Preflight OK: {len(report.checks)} checks en {report.seconds} s")
     exe_path = args.exe or cfg.mt5.terminal_path
 
     if args.n_trials_alias is not None and args.n_trials == 0:
@@ -763,10 +1711,38 @@ def main() -> None:
         ok, fb, rid, rdir = run_single(cfg, exe_path, args.guard_sec, auto_close=args.auto_close, base_overrides=None)
         sys.exit(0 if ok else 1)
 
+    if args.grid_shard:
+        # Sin coordinador: cada host lanza su parte del grid completo (o de los primeros --n-trials puntos)
+        if args.prewarm:
+            prewarm_history(cfg, exe_path, args.guard_sec, auto_close=args.auto_close)
+        summary = run_grid_bounded(cfg, exe_path, args.guard_sec, n_trials=args.n_trials, n_jobs=max(1, args.n_jobs), auto_close=args.auto_close,
+                                   log_dir=args.log_dir, status_port=args.status_port, status_every=args.status_every,
+                                   shards=args.shards, shard_drift_every=args.shard_drift_every,
+                                   timeout=args.timeout, drain_grace=args.drain_grace, post_workers=args.post_workers,
+                                   resource_interval=args.resource_interval,
+                                   grid_shard=parse_shard(args.grid_shard), shard_dir=args.grid_shard_dir,
+                                   artifacts=args.artifacts, finalists=args.finalists)
+        print(f"INFO Shard {args.grid_shard} registrado en {summary['grid_shard']['file']}")
+        sys.exit(0)
+
     if args.n_trials and args.n_trials > 0:
         if not cfg.search or not cfg.search.space:
             raise RuntimeError("No hay 'search.space' definido en el config para Optuna.")
-        run_optuna(cfg, exe_path, args.guard_sec, n_trials=args.n_trials, n_jobs=max(1, args.n_jobs), auto_close=args.auto_close)
+        if args.bounded_memory:
+            if args.prewarm:
+                prewarm_history(cfg, exe_path, args.guard_sec, auto_close=args.auto_close)
+            run_grid_bounded(cfg, exe_path, args.guard_sec, n_trials=args.n_trials, n_jobs=max(1, args.n_jobs), auto_close=args.auto_close, log_dir=args.log_dir,
+                             status_port=args.status_port, status_every=args.status_every,
+                             shards=args.shards, shard_drift_every=args.shard_drift_every,
+                             timeout=args.timeout, drain_grace=args.drain_grace, post_workers=args.post_workers,
+                             resource_interval=args.resource_interval, artifacts=args.artifacts, finalists=args.finalists)
+            sys.exit(0)
+        run_optuna(cfg, exe_path, args.guard_sec, n_trials=args.n_trials, n_jobs=max(1, args.n_jobs), auto_close=args.auto_close, prewarm=args.prewarm, log_dir=args.log_dir,
+                   status_port=args.status_port, status_every=args.status_every, warm_start_from=args.warm_start_from,
+                   warm_start_mode=args.warm_start_mode, warm_start_downweight=args.warm_start_downweight,
+                   shards=args.shards, shard_drift_every=args.shard_drift_every,
+                   timeout=args.timeout, drain_grace=args.drain_grace, post_workers=args.post_workers,
+                   resource_interval=args.resource_interval, artifacts=args.artifacts, finalists=args.finalists)
         sys.exit(0)
 
     print("ERROR: Especifica --single-run o --n-trials N (>0) para Optuna.")
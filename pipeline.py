@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""pipeline.py - Optimización por etapas encadenadas para MT5 Smart Optimizer v2
+Cada stage optimiza su parte de search.space y congela su mejor combinación en los siguientes"""
+import argparse
+import json
+import math
+import shutil
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import optimizer_v2 as opt
+from optimizer_v2 import Config, SearchCfg
+
+
+# ----------------------- Congelado / estrechado del espacio -----------------------
+def freeze_params(cfg: Config, params: Dict[str, Any]) -> Config:
+    """Copia de cfg con params fijados: timeframe va a test, el resto a ea.inputs"""
+    test = cfg.test
+    inputs = dict(cfg.ea.inputs)
+    for k, v in params.items():
+        if k == "timeframe":
+            test = replace(test, timeframe=str(v))
+        else:
+            inputs[k] = v
+    return replace(cfg, test=test, ea=replace(cfg.ea, inputs=inputs))
+
+def _without_keys(search: SearchCfg, keys) -> SearchCfg:
+    keys = set(keys)
+    space = {k: v for k, v in search.space.items() if k not in keys}
+    sampler = search.sampler
+    if isinstance(sampler, dict) and isinstance(sampler.get("search_space"), dict):
+        sampler = dict(sampler)
+        sampler["search_space"] = {k: v for k, v in sampler["search_space"].items() if k not in keys}
+    return replace(search, space=space, sampler=sampler)
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _shrink_choices(values: List[Any], center: Any, factor: float) -> List[Any]:
+    nums = [v for v in values if _is_number(v)]
+    if not _is_number(center) or len(nums) != len(values) or len(values) < 3:
+        return list(values)
+    half = (max(nums) - min(nums)) * factor / 2.0
+    kept = [v for v in values if abs(v - center) <= half + 1e-12]
+    return kept or [center]
+
+def shrink_space(search: SearchCfg, incumbent: Dict[str, Any], factor: float) -> SearchCfg:
+    """
+    Estrecha cada dimensión alrededor del incumbente a `factor` de su ancho.
+    int/float recortan [lo, hi]; choice numérico conserva los valores dentro de la ventana.
+    """
+    space: Dict[str, Any] = {}
+    for k, spec in search.space.items():
+        if k not in incumbent or not isinstance(spec, (list, tuple)) or not spec:
+            space[k] = spec
+            continue
+        kind, center = spec[0], incumbent[k]
+        if kind in ("int", "float") and _is_number(center):
+            lo, hi = float(spec[1]), float(spec[2])
+            half = (hi - lo) * factor / 2.0
+            new_lo, new_hi = max(lo, center - half), min(hi, center + half)
+            if kind == "int":
+                new_lo, new_hi = int(math.floor(new_lo)), int(math.ceil(new_hi))
+            space[k] = [kind, new_lo, new_hi]
+        elif kind == "choice":
+            space[k] = ["choice", _shrink_choices(list(spec[1]), center, factor)]
+        else:
+            space[k] = spec
+    sampler = search.sampler
+    if isinstance(sampler, dict) and isinstance(sampler.get("search_space"), dict):
+        sampler = dict(sampler)
+        sampler["search_space"] = {
+            k: (_shrink_choices(list(v), incumbent[k], factor) if k in incumbent else v)
+            for k, v in sampler["search_space"].items()
+        }
+    return replace(search, space=space, sampler=sampler)
+
+
+# ----------------------- Importancia de parámetros -----------------------
+def _variance_importances(trials: List[Any]) -> Dict[str, float]:
+    """Importancia por omega² (varianza explicada por grupo, corregida por nº de grupos); sin dependencias"""
+    rows = [(t.params, float(t.value)) for t in trials if t.value is not None and math.isfinite(t.value)]
+    if len(rows) < 2:
+        return {}
+    ys = [y for _, y in rows]
+    mean = sum(ys) / len(ys)
+    ss_total = sum((y - mean) ** 2 for y in ys)
+    names = sorted({k for p, _ in rows for k in p})
+    raw: Dict[str, float] = {}
+    for name in names:
+        pairs = [(p[name], y) for p, y in rows if name in p]
+        distinct = sorted({v for v, _ in pairs}, key=repr)
+        if len(distinct) > 10 and all(_is_number(v) for v in distinct):
+            ordered = sorted(v for v, _ in pairs)
+            edges = [ordered[int(len(ordered) * q / 5)] for q in range(1, 5)]
+            key = lambda v: sum(v >= e for e in edges)  # noqa: E731
+        else:
+            key = repr
+        groups: Dict[Any, List[float]] = {}
+        for v, y in pairs:
+            groups.setdefault(key(v), []).append(y)
+        ss_between = sum(len(g) * (sum(g) / len(g) - mean) ** 2 for g in groups.values())
+        dof_within = len(pairs) - len(groups)
+        ms_within = (ss_total - ss_between) / dof_within if dof_within > 0 else 0.0
+        omega = (ss_between - (len(groups) - 1) * ms_within) / (ss_total + ms_within) if ss_total > 0 else 0.0
+        raw[name] = max(0.0, omega)
+    total = sum(raw.values())
+    return {k: (v / total if total > 0 else 0.0) for k, v in raw.items()}
+
+def param_importances(study) -> Dict[str, float]:
+    """Importancias de Optuna; si faltan dependencias (sklearn) usa omega²"""
+    try:
+        import optuna  # type: ignore
+        return dict(optuna.importance.get_param_importances(study))
+    except (ImportError, RuntimeError, ValueError):
+        from optuna.trial import TrialState  # type: ignore
+        return _variance_importances(study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)))
+
+
+# ----------------------- Ejecución del pipeline -----------------------
+def _stage_trials(cfg: Config, requested: Optional[int]) -> int:
+    if requested:
+        return int(requested)
+    grid = opt.grid_space_for(cfg.search) if cfg.search else None
+    if grid is None:
+        raise RuntimeError("Stage sin n_trials y sin GridSampler: define 'n_trials' en el pipeline.")
+    return math.prod(len(v) for v in grid.values())
+
+def best_of(study) -> Tuple[Optional[float], Dict[str, Any]]:
+    """(mejor valor, params) del study; (None, {}) si ningún trial completó"""
+    from optuna.trial import TrialState  # type: ignore
+    if not study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)):
+        return None, {}
+    return study.best_value, dict(study.best_params)
+
+def stage_log_dir(log_dir: str, name: str, previous: Optional[str] = None) -> str:
+    """
+    Subcarpeta propia para un study (su results.json y su JSONL no pisan los de otros) que
+    arranca con el modelo de coste del study anterior (o el de log_dir).
+    """
+    path = Path(log_dir) / name
+    path.mkdir(parents=True, exist_ok=True)
+    src = Path(previous or log_dir) / "cost_model.json"
+    if src.exists():
+        shutil.copyfile(src, path / "cost_model.json")
+    return str(path)
+
+def run_stage(cfg: Config, exe_path: str, guard_sec: int, n_trials: int, n_jobs: int, auto_close: bool,
+              log_dir: str, importance: Optional[Dict[str, Any]] = None, shrink: float = 0.0,
+              artifacts: str = "rich", finalists: int = 3) -> Dict[str, Any]:
+    """
+    Ejecuta un stage; con `importance` corta tras N trials, congela lo irrelevante y estrecha el resto.
+    Cada study escribe en su subcarpeta de log_dir (result["log_dirs"]); la segunda fase arranca
+    con los trials de la primera inyectados (warm start) para que el TPE no pierda su historia.
+    artifacts/finalists pasan a run_optuna (lean: sólo report.json y re-ejecución rich de los mejores).
+    """
+    result: Dict[str, Any] = {"frozen_low_importance": {}, "importances": {}, "log_dirs": []}
+    after = int((importance or {}).get("after_trials", 0))
+    min_imp = float((importance or {}).get("min_importance", 0.05))
+
+    if not after or after >= n_trials:
+        result["log_dirs"].append(log_dir)
+        study = opt.run_optuna(cfg, exe_path, guard_sec, n_trials=n_trials, n_jobs=n_jobs,
+                               auto_close=auto_close, log_dir=log_dir, artifacts=artifacts, finalists=finalists)
+        best_value, best_params = best_of(study)
+        result.update(best_value=best_value, best_params=best_params)
+        return result
+
+    first_dir = stage_log_dir(log_dir, "fase1")
+    result["log_dirs"].append(first_dir)
+    study = opt.run_optuna(cfg, exe_path, guard_sec, n_trials=after, n_jobs=n_jobs,
+                           auto_close=auto_close, log_dir=first_dir, artifacts=artifacts, finalists=finalists)
+    best_value, incumbent = best_of(study)
+    low: Dict[str, Any] = {}
+    if best_value is None:
+        print(f"WARNING Ningún trial completado en los primeros {after}: se sigue sin congelar ni estrechar")
+    else:
+        imps = param_importances(study)
+        result["importances"] = imps
+        low = {k: v for k, v in incumbent.items() if k in imps and imps[k] < min_imp}
+        print(f"INFO Importancias tras {after} trials: {imps}")
+        if low:
+            print(f"INFO Congelando dimensiones de baja importancia: {low}")
+    result["frozen_low_importance"] = low
+
+    narrowed = freeze_params(cfg, low)
+    search = _without_keys(cfg.search, low)
+    if shrink and shrink > 0 and incumbent:
+        search = shrink_space(search, incumbent, shrink)
+    narrowed = replace(narrowed, search=search)
+
+    if not search.space and not (isinstance(search.sampler, dict) and search.sampler.get("search_space")):
+        result.update(best_value=best_value, best_params=incumbent)
+        return result
+
+    second_dir = stage_log_dir(log_dir, "fase2", first_dir)
+    result["log_dirs"].append(second_dir)
+    prior = Path(first_dir) / "results.json"
+    seed = [str(prior)] if prior.exists() and opt.grid_space_for(search) is None else None
+    rest = opt.run_optuna(narrowed, exe_path, guard_sec, n_trials=n_trials - after, n_jobs=n_jobs,
+                          auto_close=auto_close, log_dir=second_dir, warm_start_from=seed,
+                          artifacts=artifacts, finalists=finalists)
+    rest_value, rest_params = best_of(rest)
+    if rest_value is not None and (best_value is None or rest_value > best_value):
+        best_value, incumbent = rest_value, {**low, **rest_params}
+    result.update(best_value=best_value, best_params=incumbent)
+    return result
+
+def run_pipeline(spec: Dict[str, Any], base_dir: Path, exe_path: Optional[str], guard_sec: int,
+                 auto_close: bool, n_jobs: int, log_dir: str) -> Dict[str, Any]:
+    stages = spec.get("stages") or []
+    if not stages:
+        raise RuntimeError("El pipeline no define 'stages'.")
+    frozen: Dict[str, Any] = dict(spec.get("initial_params") or {})
+    summary: Dict[str, Any] = {"stages": [], "frozen": {}}
+    t_pipeline = time.time()
+    last_dir: Optional[str] = None
+
+    for i, stage in enumerate(stages, 1):
+        if isinstance(stage, str):
+            stage = {"config": stage}
+        path = Path(stage["config"])
+        if not path.is_absolute():
+            path = base_dir / path
+        cfg = opt.load_config(str(path))
+        if cfg.search is None:
+            raise RuntimeError(f"Stage {i} ({path.name}) no tiene bloque 'search'.")
+
+        # Lo optimizado en stages previos queda fijo salvo que este stage lo vuelva a buscar
+        searched = set(cfg.search.space)
+        if isinstance(cfg.search.sampler, dict) and isinstance(cfg.search.sampler.get("search_space"), dict):
+            searched |= set(cfg.search.sampler["search_space"])
+        cfg = freeze_params(cfg, {k: v for k, v in frozen.items() if k not in searched})
+
+        n_trials = _stage_trials(cfg, stage.get("n_trials"))
+        print(f"\nINFO === Stage {i}/{len(stages)}: {path.name} ({n_trials} trials) ===")
+        t0 = time.time()
+        # Un results.json por stage (y por fase); el modelo de coste pasa de un study al siguiente
+        stage_dir = stage_log_dir(log_dir, f"stage{i:02d}", last_dir)
+        result = run_stage(
+            cfg, exe_path or cfg.mt5.terminal_path, guard_sec, n_trials, n_jobs, auto_close, stage_dir,
+            importance=stage.get("importance", spec.get("importance")),
+            shrink=float(stage.get("shrink", spec.get("shrink", 0.0))),
+            artifacts=str(stage.get("artifacts", spec.get("artifacts", "rich"))),
+            finalists=int(stage.get("finalists", spec.get("finalists", 3))),
+        )
+        last_dir = result["log_dirs"][-1]
+        if result["best_value"] is None:
+            print(f"WARNING Stage {i} sin trials completados: no congela nada para los siguientes")
+        frozen.update(result["best_params"])
+        result.update(stage=i, config=str(path), n_trials=n_trials, seconds=round(time.time() - t0, 2))
+        summary["stages"].append(result)
+
+    if last_dir and (Path(last_dir) / "cost_model.json").exists():
+        shutil.copyfile(Path(last_dir) / "cost_model.json", Path(log_dir) / "cost_model.json")
+    summary["frozen"] = frozen
+    summary["seconds"] = round(time.time() - t_pipeline, 2)
+    return summary
+
+
+# ----------------------- CLI -----------------------
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Encadena stages de optimización congelando el mejor de cada uno.")
+    ap.add_argument("-c", "--config", required=True, help="JSON del pipeline (lista de stages).")
+    ap.add_argument("--exe", help="Override del terminal64.exe")
+    ap.add_argument("--n-jobs", dest="n_jobs", type=int, default=1, help="Paralelismo Optuna por stage.")
+    ap.add_argument("--guard-sec", type=int, default=300, help="Tiempo máx de espera por artefactos por run.")
+    ap.add_argument("--auto-close", action="store_true", help="Cierra MT5 por PID al terminar cada run.")
+    ap.add_argument("--log-dir", default="logs", help="Directorio de logs y del resumen del pipeline.")
+    args = ap.parse_args()
+
+    path = Path(args.config)
+    spec = json.loads(path.read_text(encoding="utf-8"))
+    summary = run_pipeline(spec, path.parent, args.exe, args.guard_sec, args.auto_close, max(1, args.n_jobs), args.log_dir)
+
+    out = Path(args.log_dir) / "pipeline_summary.json"
+    opt.write_text(out, json.dumps(summary, indent=2, default=str))
+    print("\n=== PIPELINE ===")
+    for st in summary["stages"]:
+        print(f"stage {st['stage']}: value={st['best_value']} params={st['best_params']} ({st['seconds']} s)")
+    print("params finales:")
+    for k, v in summary["frozen"].items():
+        print(f"  {k}: {v}")
+    print(f"INFO Resumen: {out}")
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Post-proceso en segundo plano para MT5 Smart Optimizer v2
+Reescritura del HTML, meta.json y cierre del terminal salen del slot del trial: el valor
+se devuelve en cuanto se conoce y este pool acotado termina el resto"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class PostProcessor:
+    """
+    Pool de `workers` hilos con como mucho `max_pending` trabajos encolados o en curso.
+    submit() bloquea cuando se llega al límite (backpressure: los terminales por cerrar no
+    se acumulan sin fin) y close() drena lo pendiente antes de terminar el study.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: Optional[int] = None):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending or self.workers * 4))
+        self._capacity = threading.BoundedSemaphore(self.max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="post")
+        self._lock = threading.Lock()
+        self._outstanding: Set[Future] = set()
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+        self.pending_peak = 0
+        self.blocked_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.errors: "deque[Dict[str, Any]]" = deque(maxlen=20)
+
+    def submit(self, label: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        t0 = time.time()
+        self._capacity.acquire()
+        blocked = time.time() - t0
+        with self._lock:
+            self.submitted += 1
+            self.blocked_seconds += blocked
+            self.pending_peak = max(self.pending_peak, len(self._outstanding) + 1)
+        try:
+            fut = self._pool.submit(self._run, label, fn, args, kwargs)
+        except RuntimeError:
+            self._capacity.release()
+            raise
+        with self._lock:
+            self._outstanding.add(fut)
+        fut.add_done_callback(self._forget)
+        return fut
+
+    def _run(self, label: str, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        t0 = time.time()
+        ok = True
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            ok = False
+            print(f"WARNING Post-proceso fallido ({label}): {type(e).__name__}: {e}")
+            with self._lock:
+                self.errors.append({"label": label, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            with self._lock:
+                self.busy_seconds += time.time() - t0
+                if ok:
+                    self.done += 1
+                else:
+                    self.failed += 1
+            self._capacity.release()
+
+    def _forget(self, fut: Future) -> None:
+        with self._lock:
+            self._outstanding.discard(fut)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que termine lo pendiente; False si vence el timeout"""
+        with self._lock:
+            pending = list(self._outstanding)
+        _done, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        drained = self.drain(timeout)
+        if not drained:
+            print(f"WARNING Post-proceso sin drenar tras {timeout} s: {len(self._outstanding)} trabajos pendientes")
+        self._pool.shutdown(wait=drained)
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": len(self._outstanding),
+                "pending_peak": self.pending_peak,
+                "submitted": self.submitted,
+                "done": self.done,
+                "failed": self.failed,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "busy_seconds": round(self.busy_seconds, 3),
+                "errors": list(self.errors),
+            }
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""preflight.py - Verificación previa a lanzar cualquier terminal MT5
+Une validate_config.py con load_config y comprueba en paralelo todo lo que un run necesita
+(exe, directorios por HASH, Expert y su SO_ProgressOnTick si hay abort, permisos, agentes y search.space) en un solo informe"""
+import argparse
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from optimizer_v2 import Config, backend_for, constraints_for, grid_space_for, layout_for, load_config, read_config_data
+from validate_config import ConfigValidator
+
+# Un check de disco que no responde en este tiempo (unidad de red, Wine colgado) cuenta como error
+CHECK_TIMEOUT_SEC = 5.0
+
+Findings = List[Tuple[str, str]]  # (nivel "error"/"warning", mensaje)
+
+
+@dataclass
+class PreflightReport:
+    config: str
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    checks: Dict[str, str] = field(default_factory=dict)  # nombre -> ok/warning/error
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def add(self, name: str, findings: Findings) -> None:
+        levels = {lvl for lvl, _ in findings}
+        self.checks[name] = "error" if "error" in levels else ("warning" if levels else "ok")
+        for lvl, msg in findings:
+            (self.errors if lvl == "error" else self.warnings).append(f"[{name}] {msg}")
+
+    def format(self) -> str:
+        lines = ["=" * 60, f"Preflight: {self.config} ({len(self.checks)} checks en {self.seconds} s)", "=" * 60]
+        if self.errors:
+            lines.append("ERRORES:")
+            lines.extend(f"  {i + 1}. {e}" for i, e in enumerate(self.errors))
+        if self.warnings:
+            lines.append("ADVERTENCIAS:")
+            lines.extend(f"  {i + 1}. {w}" for i, w in enumerate(self.warnings))
+        if self.ok:
+            lines.append("OK: todo listo para lanzar terminales")
+        lines.append("=" * 60)
+        return "\n".join(lines)
+
+
+# ----------------------- Checks de disco -----------------------
+def _probe_writable(d: Path, create: bool) -> Optional[str]:
+    """None si se puede escribir en d (con un archivo real, os.access miente en Wine/SMB)"""
+    if not d.is_dir():
+        if not create:
+            return f"no existe: {d}"
+        try:
+            d.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            return f"no se puede crear {d}: {e}"
+    probe = d / f".preflight_{uuid.uuid4().hex[:8]}"
+    try:
+        probe.write_text("ok", encoding="utf-8")
+        probe.unlink()
+    except OSError as e:
+        return f"sin permisos de escritura en {d}: {e}"
+    return None
+
+def check_backend(cfg: Config, exe_path: str) -> Findings:
+    return backend_for(cfg).check()
+
+def check_exe(cfg: Config, exe_path: str) -> Findings:
+    if not backend_for(cfg).needs_terminal:
+        return []
+    install = backend_for(cfg).slot_dir(0)
+    p = install / Path(exe_path.replace("\\", "/")).name if install else Path(exe_path)
+    if not p.is_file():
+        return [("error", f"terminal no encontrado: {p}")]
+    return []
+
+def check_hash_dir(cfg: Config, exe_path: str) -> Findings:
+    if not backend_for(cfg).needs_terminal:
+        return []
+    layout = layout_for(cfg)
+    if layout.data_dir is not None:
+        if (layout.data_dir / "MQL5").is_dir():
+            return []
+        return [("error", f"mt5.slot_root sin instalación portable en {layout.data_dir} (ejecuta provision.py)")]
+    if layout.terminal_data_dir.is_dir():
+        return []
+    known = sorted(p.name for p in layout.terminal_data_dir.parent.glob("*")
+                   if p.is_dir() and (p / "MQL5").is_dir()) if layout.terminal_data_dir.parent.is_dir() else []
+    hint = f" Hashes con MQL5 en {layout.terminal_data_dir.parent}: {known}" if known else ""
+    return [("error", f"terminal_hash '{cfg.mt5.terminal_hash}' sin carpeta de datos: {layout.terminal_data_dir}.{hint}")]
+
+def check_expert(cfg: Config, exe_path: str) -> Findings:
+    if not backend_for(cfg).needs_terminal:
+        return []
+    layout = layout_for(cfg)
+    target = layout.experts_root_dir / cfg.ea.name
+    if target.is_file():
+        return []
+    source = target.with_suffix(".mq5")
+    if source.is_file():
+        return [("error", f"falta el compilado {target.name} (sólo está {source.name}): compílalo en MetaEditor")]
+    return [("error", f"Expert no encontrado en experts_root_dir: {target}")]
+
+def check_progress_hook(cfg: Config, exe_path: str) -> Findings:
+    """Con bloque abort, el EA debe llamar SO_ProgressOnTick() en OnTick o no habrá progress.jsonl"""
+    if not (cfg.abort and cfg.abort.enabled) or not backend_for(cfg).needs_terminal:
+        return []
+    source = (layout_for(cfg).experts_root_dir / cfg.ea.name).with_suffix(".mq5")
+    if not source.is_file():
+        return [("warning", f"abort activo sin el fuente {source.name}: no se puede comprobar que OnTick llame "
+                            "SO_ProgressOnTick(); si no lo hace, no hay progress.jsonl y el aborto temprano nunca salta")]
+    raw = source.read_bytes()
+    # MetaEditor guarda los .mq5 en UTF-16LE con BOM o en UTF-8
+    text = raw.decode("utf-16") if raw[:2] == b"\xff\xfe" else raw.decode("utf-8", errors="replace")
+    if "SO_ProgressOnTick(" not in text:
+        return [("warning", f"abort activo pero {source.name} no llama SO_ProgressOnTick(): añádelo al inicio de "
+                            "OnTick() y recompila, o el aborto temprano nunca salta")]
+    return []
+
+def check_profiles_tester(cfg: Config, exe_path: str) -> Findings:
+    err = _probe_writable(layout_for(cfg).profiles_tester_dir, create=False)
+    return [("error", f"Profiles/Tester: {err}")] if err else []
+
+def check_common_files(cfg: Config, exe_path: str) -> Findings:
+    layout = layout_for(cfg)
+    if not layout.common_mt5_so_dir.parent.is_dir():
+        return [("error", f"Common/Files no existe: {layout.common_mt5_so_dir.parent} (¿appdata correcto?)")]
+    err = _probe_writable(layout.common_mt5_so_dir, create=True)
+    return [("error", f"Common/Files: {err}")] if err else []
+
+def check_work_dirs(cfg: Config, exe_path: str) -> Findings:
+    layout = layout_for(cfg)
+    out: Findings = []
+    for name, d in (("reports_dir", layout.reports_dir), ("ini_dir", layout.ini_dir)):
+        err = _probe_writable(d, create=True)
+        if err:
+            out.append(("error", f"{name}: {err}"))
+    return out
+
+def check_agents(cfg: Config, exe_path: str) -> Findings:
+    if not backend_for(cfg).needs_terminal:
+        return []
+    layout = layout_for(cfg)
+    if not list(layout.tester_root.glob("Agent-*-*")):
+        return [("warning", f"sin agentes del Tester en {layout.tester_root}: "
+                            "se crean en el primer test (sólo se usará Common/Files)")]
+    return []
+
+
+# ----------------------- Checks de configuración -----------------------
+def _space_findings(space: Dict[str, Any], timeframes: List[str]) -> Findings:
+    out: Findings = []
+    for key, spec in space.items():
+        if not isinstance(spec, (list, tuple)) or not spec:
+            out.append(("error", f"search.space.{key}: spec inválida {spec!r}"))
+            continue
+        kind = spec[0]
+        if kind in ("int", "float"):
+            if len(spec) < 3:
+                out.append(("error", f"search.space.{key}: {kind} necesita [tipo, min, max]"))
+                continue
+            try:
+                lo, hi = float(spec[1]), float(spec[2])
+            except (TypeError, ValueError):
+                out.append(("error", f"search.space.{key}: límites no numéricos {spec[1:3]}"))
+                continue
+            if lo > hi:
+                out.append(("error", f"search.space.{key}: min {spec[1]} > max {spec[2]}"))
+            if kind == "int" and (lo != int(lo) or hi != int(hi)):
+                out.append(("error", f"search.space.{key}: límites no enteros para int {spec[1:3]}"))
+        elif kind == "choice":
+            choices = spec[1] if len(spec) > 1 else None
+            if not isinstance(choices, (list, tuple)) or not choices:
+                out.append(("error", f"search.space.{key}: choice necesita una lista no vacía"))
+                continue
+            if len(set(map(str, choices))) != len(choices):
+                out.append(("warning", f"search.space.{key}: opciones repetidas {list(choices)}"))
+            if key == "timeframe":
+                bad = [c for c in choices if c not in timeframes]
+                if bad:
+                    out.append(("error", f"search.space.timeframe: {bad} no están en {timeframes}"))
+        else:
+            out.append(("error", f"search.space.{key}: tipo no soportado '{kind}' (int, float o choice)"))
+    return out
+
+def check_search(cfg: Config, exe_path: str) -> Findings:
+    if cfg.search is None or not cfg.search.space:
+        return [("warning", "sin search.space: sólo sirve para --single-run")]
+    out = _space_findings(cfg.search.space, ConfigValidator.TIMEFRAMES)
+    try:
+        grid = grid_space_for(cfg.search)
+    except RuntimeError as e:
+        return out + [("error", str(e))]
+    if grid and "timeframe" in grid:
+        bad = [c for c in grid["timeframe"] if c not in ConfigValidator.TIMEFRAMES]
+        if bad:
+            out.append(("error", f"search.sampler.search_space.timeframe: {bad} no están en {ConfigValidator.TIMEFRAMES}"))
+    try:
+        constraints = constraints_for(cfg)
+    except RuntimeError as e:
+        return out + [("error", f"search.constraints: {e}")]
+    if constraints and cfg.search.constraints_mode == "resample" and grid:
+        out.append(("warning", "search.constraints_mode=resample con grid: el grid no remuestrea, los puntos sólo se saltan"))
+    return out
+
+DISK_CHECKS: Dict[str, Callable[[Config, str], Findings]] = {
+    "backend": check_backend,
+    "exe": check_exe,
+    "terminal_hash": check_hash_dir,
+    "expert": check_expert,
+    "progress_hook": check_progress_hook,
+    "profiles_tester": check_profiles_tester,
+    "common_files": check_common_files,
+    "work_dirs": check_work_dirs,
+    "agents": check_agents,
+    "search_space": check_search,
+}
+
+
+# ----------------------- Orquestación -----------------------
+def run_preflight(config_path: str, exe_path: Optional[str] = None,
+                  timeout: float = CHECK_TIMEOUT_SEC) -> Tuple[PreflightReport, Optional[Config]]:
+    """Informe agregado y el Config cargado (None si el config ni siquiera se pudo cargar)"""
+    t0 = time.time()
+    report = PreflightReport(config=str(config_path))
+
+    # 1) Estructura: validador clásico sobre el crudo (también YAML/legacy) + loader estricto
+    try:
+        data = read_config_data(config_path)
+    except Exception as e:  # JSON/YAML mal formado o ilegible: errores de tipos muy distintos
+        report.add("config", [("error", str(e))])
+        report.seconds = round(time.time() - t0, 2)
+        return report, None
+    validator = ConfigValidator(config_path)
+    validator.check(data)
+    findings: Findings = [("error", e) for e in validator.errors]
+    cfg: Optional[Config] = None
+    try:
+        cfg = load_config(config_path)
+    except (RuntimeError, KeyError, TypeError, ValueError) as e:
+        findings.append(("error", f"load_config: {e}"))
+    report.add("config", findings)
+    if cfg is None:
+        report.seconds = round(time.time() - t0, 2)
+        return report, None
+
+    # 2) Disco y espacio de búsqueda, todos a la vez; los que se cuelgan cuentan como error
+    exe = exe_path or cfg.mt5.terminal_path
+    pool = ThreadPoolExecutor(max_workers=len(DISK_CHECKS), thread_name_prefix="preflight")
+    futures = {pool.submit(fn, cfg, exe): name for name, fn in DISK_CHECKS.items()}
+    _done, pending = wait(list(futures), timeout=timeout)
+    for fut, name in futures.items():
+        if fut in pending:
+            report.add(name, [("error", f"sin respuesta en {timeout} s (¿unidad de red o Wine colgado?)")])
+            continue
+        try:
+            report.add(name, fut.result())
+        except Exception as e:
+            report.add(name, [("error", f"{type(e).__name__}: {e}")])
+    pool.shutdown(wait=False)
+    report.seconds = round(time.time() - t0, 2)
+    return report, cfg
+
+
+# ----------------------- CLI -----------------------
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Verifica config, terminal y permisos antes de lanzar MT5.")
+    ap.add_argument("config", help="Ruta a JSON/YAML.")
+    ap.add_argument("--exe", help="Override del terminal64.exe")
+    ap.add_argument("--timeout", type=float, default=CHECK_TIMEOUT_SEC, help="Segundos máx por check de disco.")
+    args = ap.parse_args()
+    report, _cfg = run_preflight(args.config, args.exe, args.timeout)
+    print(report.format())
+    sys.exit(0 if report.ok else 1)
+
+if __name__ == '__main__':
+    main()
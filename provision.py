@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""provision.py - Clona un terminal MT5 portable maestro en N carpetas de slot
+El historial y los ticks (bases/) y los binarios se enlazan (reflink o hardlink) en vez de
+copiarse; perfiles, Experts, config y salidas de so_report.mqh se copian por slot."""
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Inmutables: se comparten entre slots (rutas relativas al maestro, estilo glob con /)
+SHARED_PATTERNS = ["bases/*", "*.exe", "*.dll"]
+# No se clonan: se regeneran por slot y sólo ocuparían espacio
+EXCLUDE_PATTERNS = ["logs/*", "MQL5/Logs/*", "Tester/*", "MQL5/Files/MT5_SO/*"]
+
+_FICLONE = 0x40049409  # ioctl de Linux (btrfs/xfs/...) para clonar con copy-on-write
+
+
+def _match(rel: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(rel, p) for p in patterns)
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Copia copy-on-write si el sistema de archivos lo soporta (sólo Linux)"""
+    try:
+        import fcntl  # type: ignore
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        return True
+    except OSError:
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+def _hardlink(src: Path, dst: Path) -> bool:
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        return False
+
+def _place(src: Path, dst: Path, mode: str) -> str:
+    """Enlaza o copia un archivo compartido; devuelve el método usado"""
+    if mode in ("auto", "reflink") and _reflink(src, dst):
+        return "reflink"
+    if mode in ("auto", "hardlink") and _hardlink(src, dst):
+        return "hardlink"
+    shutil.copy2(src, dst)
+    return "copy"
+
+def _up_to_date(src: Path, dst: Path, shared: bool) -> bool:
+    try:
+        ds, ss = dst.stat(), src.stat()
+    except OSError:
+        return False
+    if shared and ds.st_ino == ss.st_ino and ds.st_dev == ss.st_dev:
+        return True
+    return ds.st_size == ss.st_size and int(ds.st_mtime) >= int(ss.st_mtime)
+
+def iter_master_files(master: Path, exclude: Optional[List[str]] = None):
+    """(ruta, relativa con /) de cada archivo del maestro que se clona"""
+    exclude = EXCLUDE_PATTERNS if exclude is None else exclude
+    for root, dirs, files in os.walk(master):
+        rel_root = Path(root).relative_to(master).as_posix()
+        dirs[:] = [d for d in dirs if not _match(f"{d}/x" if rel_root == "." else f"{rel_root}/{d}/x", exclude)]
+        for name in files:
+            rel = name if rel_root == "." else f"{rel_root}/{name}"
+            if not _match(rel, exclude):
+                yield Path(root) / name, rel
+
+
+def provision_slot(master: Path, slot_dir: Path, mode: str = "auto",
+                   shared: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Clona el maestro en slot_dir; idempotente (omite lo que ya está al día)"""
+    shared = SHARED_PATTERNS if shared is None else shared
+    stats: Dict[str, Any] = {"slot": str(slot_dir), "reflink": 0, "hardlink": 0, "copy": 0, "skipped": 0,
+                             "bytes_shared": 0, "bytes_copied": 0}
+    for src, rel in iter_master_files(master, exclude):
+        dst = slot_dir / rel
+        is_shared = _match(rel, shared)
+        if _up_to_date(src, dst, is_shared):
+            stats["skipped"] += 1
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.exists():
+            dst.unlink()
+        size = src.stat().st_size
+        if is_shared:
+            how = _place(src, dst, mode)
+        else:
+            shutil.copy2(src, dst)
+            how = "copy"
+        stats[how] += 1
+        stats["bytes_shared" if how != "copy" else "bytes_copied"] += size
+    return stats
+
+def verify_slot(master: Path, slot_dir: Path, exclude: Optional[List[str]] = None) -> List[str]:
+    """Problemas del clon: archivos ausentes o con tamaño distinto al del maestro"""
+    problems = []
+    for src, rel in iter_master_files(master, exclude):
+        dst = slot_dir / rel
+        if not dst.is_file():
+            problems.append(f"falta {rel}")
+        elif dst.stat().st_size != src.stat().st_size:
+            problems.append(f"tamaño distinto en {rel}")
+    return problems
+
+def provision(master: Path, dest_root: Path, n_slots: int, mode: str = "auto",
+              shared: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> Dict[str, Any]:
+    master, dest_root = Path(master), Path(dest_root)
+    if not master.is_dir():
+        raise RuntimeError(f"Terminal maestro inexistente: {master}")
+    if mode not in ("auto", "reflink", "hardlink", "copy"):
+        raise RuntimeError(f"Modo de provisión no soportado: {mode}")
+    t0 = time.time()
+    summary: Dict[str, Any] = {"master": str(master), "mode": mode, "slots": [], "problems": {}}
+    for i in range(n_slots):
+        slot_dir = dest_root / f"slot_{i:02d}"
+        stats = provision_slot(master, slot_dir, mode, shared, exclude)
+        problems = verify_slot(master, slot_dir, exclude)
+        if problems:
+            summary["problems"][str(slot_dir)] = problems
+        summary["slots"].append(stats)
+    # Cada byte enlazado es un byte que no se duplicó en disco
+    summary["bytes_saved"] = sum(s["bytes_shared"] for s in summary["slots"])
+    summary["bytes_copied"] = sum(s["bytes_copied"] for s in summary["slots"])
+    summary["seconds"] = round(time.time() - t0, 2)
+    return summary
+
+
+def _human(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} TB"
+
+
+# ----------------------- CLI -----------------------
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Clona un MT5 portable maestro en N slots compartiendo el historial.")
+    ap.add_argument("--master", required=True, help="Carpeta del terminal portable maestro (con terminal64.exe y bases/).")
+    ap.add_argument("--dest", required=True, help="Carpeta donde crear slot_00, slot_01, ...")
+    ap.add_argument("--slots", type=int, required=True, help="Número de terminales a provisionar.")
+    ap.add_argument("--mode", choices=("auto", "reflink", "hardlink", "copy"), default="auto",
+                    help="auto: reflink si el FS lo soporta, si no hardlink, si no copia.")
+    ap.add_argument("--summary", help="Ruta opcional del resumen JSON.")
+    args = ap.parse_args()
+
+    summary = provision(Path(args.master), Path(args.dest), args.slots, args.mode)
+    for s in summary["slots"]:
+        print(f"INFO {s['slot']}: reflink={s['reflink']} hardlink={s['hardlink']} copia={s['copy']} "
+              f"al_día={s['skipped']}")
+    print(f"INFO Para usarlos: \"mt5\": {{\"slot_root\": {json.dumps(str(Path(args.dest)))}}} (lanza slot_NN con /portable)")
+    print(f"INFO Espacio ahorrado: {_human(summary['bytes_saved'])}; copiado: {_human(summary['bytes_copied'])} "
+          f"en {summary['seconds']} s")
+    if summary["mode"] != "copy" and any(s["hardlink"] for s in summary["slots"]):
+        print("WARNING Los hardlinks comparten datos: descarga historial sólo en el maestro, no desde los slots.")
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    for slot, problems in summary["problems"].items():
+        print(f"ERROR {slot}: {len(problems)} problemas, p.ej. {problems[:3]}")
+    sys.exit(1 if summary["problems"] else 0)
+
+if __name__ == '__main__':
+    main()
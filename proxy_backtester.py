@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""proxy_backtester.py - Backtester proxy en NumPy de Estrategia_Boll_Stoch_ATR_Agresiva_VFinal
+Reimplementa de forma aproximada la lógica del EA (cierre fuera de Bollinger + %K en sobreventa/
+sobrecompra por encima/debajo de %D con margen_cruce + SL/TP/trailing por ATR) sobre arrays OHLC,
+para filtrar miles de combinaciones antes de MT5.
+La fidelidad frente a MT5 se mide con el reporte de calibración (calibrate / CLI)."""
+import argparse
+import csv
+import json
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ----------------------- Barras OHLC -----------------------
+@dataclass
+class Bars:
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.close.shape[0])
+
+    def index_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Índices [lo, hi) de las barras entre start y end por día completo ("2023.01.01 00:00" o
+        "2023-01-01"), como el rango From/To del tester. Sin fechas en las barras, todas.
+        """
+        days = np.array([_day(t) for t in self.time])
+        if not len(days) or not all(days):
+            return 0, len(self)
+        lo = int(np.searchsorted(days, _day(start), side="left")) if start else 0
+        hi = int(np.searchsorted(days, _day(end), side="right")) if end else len(self)
+        return lo, hi
+
+def _day(stamp: Optional[str]) -> str:
+    """Día "YYYY.MM.DD" de un sello de MT5 o ISO; "" si no lo es"""
+    m = re.match(r"\s*(\d{4})[.\-/](\d{2})[.\-/](\d{2})", str(stamp or ""))
+    return ".".join(m.groups()) if m else ""
+
+def load_bars_csv(path: str) -> Bars:
+    """
+    Lee barras exportadas desde MT5 (Centro de historial: <DATE> <TIME> <OPEN> ... separado por tab)
+    o un CSV con cabecera date/time/open/high/low/close.
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        delim = "\t" if "\t" in sample else (";" if sample.count(";") > sample.count(",") else ",")
+        reader = csv.reader(f, delimiter=delim)
+        header = [h.strip().strip("<>").lower() for h in next(reader)]
+        col = {h: i for i, h in enumerate(header)}
+        missing = [k for k in ("open", "high", "low", "close") if k not in col]
+        if missing:
+            raise RuntimeError(f"CSV de barras sin columnas {missing}: {path}")
+        times, o, h, l, c = [], [], [], [], []
+        for row in reader:
+            if not row:
+                continue
+            stamp = row[col["date"]] if "date" in col else ""
+            if "time" in col:
+                stamp = f"{stamp} {row[col['time']]}".strip()
+            times.append(stamp)
+            o.append(float(row[col["open"]])); h.append(float(row[col["high"]]))
+            l.append(float(row[col["low"]])); c.append(float(row[col["close"]]))
+    return Bars(np.array(times), np.array(o), np.array(h), np.array(l), np.array(c))
+
+
+# ----------------------- Indicadores (con caché) -----------------------
+def _sma(x: np.ndarray, n: int) -> np.ndarray:
+    """Media móvil simple; respeta el calentamiento (NaN iniciales) de la serie de entrada"""
+    out = np.full(x.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    start = int(valid[0]) if valid.size else x.shape[0]
+    if n <= 0 or n > x.shape[0] - start:
+        return out
+    cs = np.cumsum(np.insert(x[start:], 0, 0.0))
+    out[start + n - 1:] = (cs[n:] - cs[:-n]) / n
+    return out
+
+def _rolling(x: np.ndarray, n: int, fn) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or n > x.shape[0]:
+        return out
+    out[n - 1:] = fn(np.lib.stride_tricks.sliding_window_view(x, n), axis=-1)
+    return out
+
+class IndicatorCache:
+    """Memoriza los arrays de indicadores por periodo: combinaciones que comparten periodos no recalculan"""
+
+    def __init__(self, bars: Bars):
+        self.bars = bars
+        self._cache: Dict[Tuple[Any, ...], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Tuple[Any, ...], build):
+        if key in self._cache:
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        value = self._cache[key] = build()
+        return value
+
+    def bollinger(self, period: int, deviation: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(media, banda superior, banda inferior); desviación poblacional como iBands"""
+        mid = self._get(("sma", period), lambda: _sma(self.bars.close, period))
+        std = self._get(("std", period), lambda: _rolling(self.bars.close, period, np.std))
+        return self._get(("bb", period, float(deviation)),
+                         lambda: (mid, mid + deviation * std, mid - deviation * std))
+
+    def stochastic(self, k: int, d: int, slowing: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(%K, %D) con slowing como iStochastic (suma de numeradores / suma de rangos)"""
+        def build():
+            b = self.bars
+            ll = self._get(("min", k), lambda: _rolling(b.low, k, np.min))
+            hh = self._get(("max", k), lambda: _rolling(b.high, k, np.max))
+            num = _sma(b.close - ll, slowing)
+            den = _sma(hh - ll, slowing)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                main = np.where(den > 0, num / den * 100.0, 50.0)
+            main[np.isnan(num)] = np.nan
+            return main, _sma(main, d)
+        return self._get(("sto", k, d, slowing), build)
+
+    def atr(self, period: int) -> np.ndarray:
+        def build():
+            b = self.bars
+            prev = np.roll(b.close, 1)
+            prev[0] = b.close[0]
+            tr = np.maximum(b.high, prev) - np.minimum(b.low, prev)
+            return _sma(tr, period)
+        return self._get(("atr", period), build)
+
+
+# ----------------------- Parámetros -----------------------
+@dataclass(frozen=True)
+class ProxyParams:
+    bb_period: int = 20
+    bb_deviation: float = 2.0
+    sto_period_k: int = 14
+    sto_period_d: int = 3
+    sto_slowing: int = 3
+    atr_period: int = 14
+    sl_atr_multiplier: float = 2.0
+    tp_atr_multiplier: float = 3.0
+    atrMultiplierTrailing: float = 0.0
+    margen_cruce: float = 0.0
+    minDistanceToTPMultiplier: float = 0.0
+    lot_size: float = 0.10
+
+    @classmethod
+    def from_inputs(cls, inputs: Dict[str, Any]) -> "ProxyParams":
+        """Toma los inputs del EA (ea.inputs + overrides del trial); ignora claves desconocidas"""
+        kw: Dict[str, Any] = {}
+        for name, f in cls.__dataclass_fields__.items():
+            if name in inputs and inputs[name] is not None:
+                kw[name] = int(inputs[name]) if f.type in (int, "int") else float(inputs[name])
+        return cls(**kw)
+
+
+# ----------------------- Simulación vectorizada -----------------------
+class ProxyBacktester:
+    """
+    Evalúa lotes de combinaciones recorriendo las barras una vez con el estado de todas
+    ellas en vectores (P,). Reglas del EA sobre la barra cerrada: compra si cierre < banda
+    inferior, %K < 20, %K > %D y %K-%D > margen_cruce; venta en espejo (cierre > banda superior,
+    %K > 80, %D-%K > margen_cruce). Entrada a la apertura siguiente; SL antes que TP si ambos
+    caen en la misma barra; una posición a la vez. El trailing sólo mueve el stop en beneficio:
+    más allá de la entrada, mejor que el actual y a más de ATR*minDistanceToTPMultiplier del TP.
+    """
+
+    def __init__(self, bars: Bars, deposit: float = 1000.0, contract_size: float = 100000.0):
+        self.bars = bars
+        self.deposit = float(deposit)
+        self.contract_size = float(contract_size)
+        self.cache = IndicatorCache(bars)
+
+    def _stack(self, keys: List[Any], build) -> Tuple[np.ndarray, np.ndarray]:
+        """Apila arrays únicos como (N, U) (fila por barra, contigua) y el índice de cada combinación"""
+        uniq: Dict[Any, int] = {}
+        idx = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            idx[i] = uniq.setdefault(key, len(uniq))
+        return np.ascontiguousarray(np.stack([build(key) for key in uniq], axis=1)), idx
+
+    def evaluate(self, params: Dict[str, Any], deposit: Optional[float] = None) -> Dict[str, Any]:
+        return self.evaluate_batch([params], None if deposit is None else [deposit])[0]
+
+    def evaluate_batch(self, params_list: Sequence[Dict[str, Any]],
+                       deposits: Optional[Sequence[float]] = None,
+                       window: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Un resultado por combinación; `deposits` (uno por combinación) sustituye al depósito del
+        backtester y `window` ([lo, hi) de Bars.index_range) limita las barras operadas. Los
+        indicadores se calculan sobre la serie completa, como el historial previo del tester.
+        """
+        ps = [p if isinstance(p, ProxyParams) else ProxyParams.from_inputs(p) for p in params_list]
+        if not ps:
+            return []
+        if deposits is not None and len(deposits) != len(ps):
+            raise RuntimeError(f"Depósitos ({len(deposits)}) y combinaciones ({len(ps)}) no coinciden")
+        b, P = self.bars, len(ps)
+        lo_i, hi_i = window if window is not None else (0, len(b))
+        if hi_i - lo_i < 1:
+            raise RuntimeError(f"Ventana de barras vacía: {window}")
+        c = self.cache
+
+        k_mat, k_idx = self._stack([(p.sto_period_k, p.sto_period_d, p.sto_slowing) for p in ps],
+                                   lambda key: c.stochastic(*key)[0])
+        d_mat, _ = self._stack([(p.sto_period_k, p.sto_period_d, p.sto_slowing) for p in ps],
+                               lambda key: c.stochastic(*key)[1])
+        bb_keys = [(p.bb_period, p.bb_deviation) for p in ps]
+        up_mat, bb_idx = self._stack(bb_keys, lambda key: c.bollinger(*key)[1])
+        lo_mat, _ = self._stack(bb_keys, lambda key: c.bollinger(*key)[2])
+        atr_mat, atr_idx = self._stack([p.atr_period for p in ps], lambda key: c.atr(key))
+
+        margin = np.array([p.margen_cruce for p in ps])
+        sl_m = np.array([p.sl_atr_multiplier for p in ps])
+        tp_m = np.array([p.tp_atr_multiplier for p in ps])
+        tr_m = np.array([p.atrMultiplierTrailing for p in ps])
+        tp_gap = np.array([p.minDistanceToTPMultiplier for p in ps])
+        value = np.array([p.lot_size for p in ps]) * self.contract_size
+
+        pos = np.zeros(P, dtype=np.int8)
+        entry = np.zeros(P); stop = np.zeros(P); take = np.zeros(P)
+        deposit = np.full(P, self.deposit) if deposits is None else np.asarray(deposits, dtype=np.float64)
+        balance = deposit.copy(); peak = balance.copy(); max_dd = np.zeros(P)
+        gp = np.zeros(P); gl = np.zeros(P); trades = np.zeros(P, dtype=np.int64)
+
+        def close_at(mask: np.ndarray, price: np.ndarray) -> None:
+            pnl = np.where(mask, (price - entry) * pos * value, 0.0)
+            balance[:] += pnl
+            gp[:] += np.where(pnl > 0, pnl, 0.0)
+            gl[:] += np.where(pnl < 0, -pnl, 0.0)
+            trades[:] += mask
+            pos[mask] = 0
+
+        for i in range(max(lo_i, 1), hi_i):
+            # 1) señal de la barra i-1 (cerrada) -> entrada a la apertura de i
+            k = k_mat[i - 1][k_idx]
+            kd = k - d_mat[i - 1][k_idx]
+            a = atr_mat[i - 1][atr_idx]
+            up = (b.close[i - 1] < lo_mat[i - 1][bb_idx]) & (k < 20) & (kd > 0) & (kd > margin)
+            down = (b.close[i - 1] > up_mat[i - 1][bb_idx]) & (k > 80) & (kd < 0) & (-kd > margin)
+            flat = (pos == 0) & np.isfinite(a)
+            go_long, go_short = flat & up, flat & down
+            opened = go_long | go_short
+            if opened.any():
+                px = b.open[i]
+                side = np.where(go_long, 1, -1)
+                pos[opened] = side[opened]
+                entry[opened] = px
+                stop[opened] = (px - side * sl_m * a)[opened]
+                take[opened] = (px + side * tp_m * a)[opened]
+
+            # 2) salidas intrabarra: SL primero (conservador), luego TP
+            lo, hi = b.low[i], b.high[i]
+            hit_sl = ((pos == 1) & (lo <= stop)) | ((pos == -1) & (hi >= stop))
+            if hit_sl.any():
+                close_at(hit_sl, stop)
+            hit_tp = ((pos == 1) & (hi >= take)) | ((pos == -1) & (lo <= take))
+            if hit_tp.any():
+                close_at(hit_tp, take)
+
+            # 3) trailing al cierre, sólo en beneficio y lejos del TP
+            a_now = atr_mat[i][atr_idx]
+            trail = (tr_m > 0) & np.isfinite(a_now)
+            if trail.any():
+                nsl = b.close[i] - pos * tr_m * a_now
+                long_t = trail & (pos == 1) & (nsl > entry) & (nsl > stop) & (take - nsl > a_now * tp_gap)
+                short_t = trail & (pos == -1) & (nsl < entry) & (nsl < stop) & (nsl - take > a_now * tp_gap)
+                stop[:] = np.where(long_t | short_t, nsl, stop)
+
+            # 4) drawdown sobre equity al cierre
+            equity = balance + np.where(pos != 0, (b.close[i] - entry) * pos * value, 0.0)
+            np.maximum(peak, equity, out=peak)
+            np.maximum(max_dd, (peak - equity) / peak, out=max_dd)
+
+        still = pos != 0
+        if still.any():
+            close_at(still, np.full(P, b.close[hi_i - 1]))
+
+        out = []
+        for j in range(P):
+            out.append({
+                "initial_deposit": float(deposit[j]),
+                "final_balance": round(float(balance[j]), 2),
+                "total_net_profit": round(float(balance[j] - deposit[j]), 2),
+                "gross_profit": round(float(gp[j]), 2),
+                "gross_loss": round(float(-gl[j]), 2),
+                "profit_factor": round(float(gp[j] / gl[j]), 2) if gl[j] > 0 else (9999.0 if gp[j] > 0 else 0.0),
+                "total_trades": int(trades[j]),
+                "max_dd_rel_pct": round(float(max_dd[j] * 100.0), 2),
+            })
+        return out
+
+
+# ----------------------- Calibración frente a MT5 -----------------------
+def _ranks(x: np.ndarray) -> np.ndarray:
+    order = np.argsort(x, kind="mergesort")
+    ranks = np.empty(len(x))
+    ranks[order] = np.arange(len(x), dtype=float)
+    for v in np.unique(x):  # empates -> rango medio
+        m = x == v
+        if m.sum() > 1:
+            ranks[m] = ranks[m].mean()
+    return ranks
+
+def _corr(a: np.ndarray, b: np.ndarray) -> Optional[float]:
+    if len(a) < 2 or np.std(a) == 0 or np.std(b) == 0:
+        return None
+    return round(float(np.corrcoef(a, b)[0, 1]), 4)
+
+def calibrate(proxy: Sequence[Dict[str, Any]], mt5: Sequence[Dict[str, Any]],
+              metrics: Sequence[str] = ("total_net_profit", "total_trades", "max_dd_rel_pct"),
+              top_fraction: float = 0.1) -> Dict[str, Any]:
+    """
+    Compara resultados proxy y MT5 emparejados por posición. Por métrica: Pearson, Spearman,
+    error absoluto medio y acuerdo de signo; además, solapamiento del top por total_net_profit.
+    """
+    if len(proxy) != len(mt5):
+        raise RuntimeError(f"Calibración con listas de distinto tamaño: {len(proxy)} vs {len(mt5)}")
+    report: Dict[str, Any] = {"n": len(proxy), "metrics": {}}
+    for m in metrics:
+        rows = [(float(p[m]), float(r[m])) for p, r in zip(proxy, mt5) if m in p and m in r]
+        if not rows:
+            continue
+        a = np.array([x for x, _ in rows]); b = np.array([y for _, y in rows])
+        report["metrics"][m] = {
+            "n": len(rows),
+            "pearson": _corr(a, b),
+            "spearman": _corr(_ranks(a), _ranks(b)),
+            "mae": round(float(np.mean(np.abs(a - b))), 4),
+            "sign_agreement": round(float(np.mean(np.sign(a) == np.sign(b))), 4),
+        }
+    key = "total_net_profit"
+    if proxy and all(key in p for p in proxy) and all(key in r for r in mt5):
+        k = max(1, int(round(len(proxy) * top_fraction)))
+        top_p = set(np.argsort([-float(p[key]) for p in proxy])[:k].tolist())
+        top_m = set(np.argsort([-float(r[key]) for r in mt5])[:k].tolist())
+        report["top_overlap"] = {"k": k, "overlap": round(len(top_p & top_m) / k, 4)}
+    return report
+
+def load_mt5_reports(runs_dir: Path) -> List[Dict[str, Any]]:
+    """report.json de cada run bajo runs_dir (MT5_SO/<run_id>/report.json), con sus inputs"""
+    out = []
+    for path in sorted(Path(runs_dir).glob("*/report.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if isinstance(data.get("inputs"), dict):
+            data["_path"] = str(path)
+            out.append(data)
+    return out
+
+def bars_identity(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """(símbolo, timeframe) del nombre del CSV exportado ("EURUSD_H1.csv"); None si no se deduce"""
+    parts = Path(path).stem.upper().split("_")
+    if len(parts) >= 2 and re.fullmatch(r"M\d+|H\d+|D1|W1|MN1?", parts[-1]):
+        return "_".join(parts[:-1]), parts[-1]
+    return None, None
+
+def match_reports(reports: Sequence[Dict[str, Any]], bars: Bars, symbol: Optional[str],
+                  timeframe: Optional[str]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+    """
+    Reparte los reports en (comparables, descartados con motivo): descarta los de otro símbolo o
+    timeframe y los que no tienen barras en su rango start_date/end_date. A cada comparable le
+    añade `_window`, el rango de barras para evaluate_batch.
+    """
+    kept: List[Dict[str, Any]] = []
+    skipped: List[Tuple[Dict[str, Any], str]] = []
+    for r in reports:
+        r_sym = str(r.get("symbol") or "").upper()
+        r_tf = str(r.get("timeframe") or "").upper().replace("PERIOD_", "")
+        if symbol and r_sym and r_sym != symbol.upper():
+            skipped.append((r, f"símbolo {r_sym} (barras de {symbol.upper()})"))
+            continue
+        if timeframe and r_tf and r_tf != timeframe.upper():
+            skipped.append((r, f"timeframe {r_tf} (barras de {timeframe.upper()})"))
+            continue
+        lo, hi = bars.index_range(r.get("start_date"), r.get("end_date"))
+        if hi - lo < 1:
+            skipped.append((r, f"sin barras entre {r.get('start_date')} y {r.get('end_date')}"))
+            continue
+        kept.append(dict(r, _window=(lo, hi)))
+    return kept, skipped
+
+
+# ----------------------- CLI -----------------------
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Calibra el backtester proxy contra report.json de MT5.")
+    ap.add_argument("--bars", required=True, help="CSV de barras OHLC del símbolo/timeframe de los runs.")
+    ap.add_argument("--runs", required=True, help="Carpeta con <run_id>/report.json (p.ej. Common/Files/MT5_SO).")
+    ap.add_argument("--symbol", default=None, help="Símbolo de las barras (por defecto, del nombre: EURUSD_H1.csv).")
+    ap.add_argument("--timeframe", default=None, help="Timeframe de las barras, p.ej. H1 (por defecto, del nombre).")
+    ap.add_argument("--contract-size", type=float, default=100000.0, help="Tamaño de contrato (1 lote).")
+    ap.add_argument("--out", default="logs/proxy_calibration.json", help="Ruta del reporte de calibración.")
+    args = ap.parse_args()
+
+    bars = load_bars_csv(args.bars)
+    symbol, timeframe = bars_identity(args.bars)
+    symbol, timeframe = args.symbol or symbol, args.timeframe or timeframe
+    if not symbol or not timeframe:
+        print("WARNING Sin --symbol/--timeframe ni nombre SIMBOLO_TF.csv: no se filtran runs de otro símbolo o timeframe")
+    reports, skipped = match_reports(load_mt5_reports(Path(args.runs)), bars, symbol, timeframe)
+    for r, why in skipped:
+        print(f"WARNING Run descartado ({why}): {r['_path']}")
+    if not reports:
+        print(f"ERROR No hay report.json con inputs comparables con {args.bars} en {args.runs}")
+        sys.exit(2)
+
+    # Un solo backtester (y caché de indicadores) para todos los runs; una pasada por cada rango de fechas
+    bt = ProxyBacktester(bars, contract_size=args.contract_size)
+    by_window: Dict[Tuple[int, int], List[int]] = {}
+    for j, r in enumerate(reports):
+        by_window.setdefault(r["_window"], []).append(j)
+    proxy: List[Dict[str, Any]] = [{} for _ in reports]
+    for window, idx in by_window.items():
+        res = bt.evaluate_batch([reports[j]["inputs"] for j in idx], window=window,
+                                deposits=[float(reports[j].get("initial_deposit") or 1000.0) for j in idx])
+        for j, p in zip(idx, res):
+            proxy[j] = p
+    report = calibrate(proxy, reports)
+    report["runs"] = [{"report": r["_path"], "mt5_net": r.get("total_net_profit"), "proxy_net": p["total_net_profit"]}
+                      for r, p in zip(reports, proxy)]
+    report["skipped"] = [{"report": r["_path"], "reason": why} for r, why in skipped]
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print("=== CALIBRACIÓN PROXY vs MT5 ===")
+    for m, st in report["metrics"].items():
+        print(f"{m}: pearson={st['pearson']} spearman={st['spearman']} mae={st['mae']} signo={st['sign_agreement']}")
+    if "top_overlap" in report:
+        print(f"top-{report['top_overlap']['k']} solapamiento: {report['top_overlap']['overlap']}")
+    print(f"INFO Reporte: {out}")
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
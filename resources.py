@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Contabilidad de recursos por trial para MT5 Smart Optimizer v2
+ResourceMeter muestrea con psutil el árbol de procesos del terminal (agentes incluidos):
+CPU, RSS pico, bytes leídos/escritos y tiempo de pared. ResourceLedger lo agrega por
+(timeframe, modelo, días de rango) y por concurrencia para dimensionar los slots de un host"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# psutil opcional: sin él no hay contabilidad (los trials siguen igual)
+try:
+    import psutil  # type: ignore
+except Exception:
+    psutil = None
+
+_MB = 1024.0 * 1024.0
+
+
+class ResourceMeter:
+    """
+    Hilo que cada `interval` s recorre pid y sus descendientes. CPU e IO son acumulados por
+    proceso: se guarda el último valor visto de cada pid (un agente que termina conserva lo
+    que llegó a consumir). El RSS pico es el máximo de la suma del árbol en una muestra.
+    """
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = int(pid)
+        self.interval = max(0.05, float(interval))
+        self._cpu: Dict[int, float] = {}
+        self._read: Dict[int, int] = {}
+        self._write: Dict[int, int] = {}
+        self.peak_rss = 0
+        self.samples = 0
+        self._t0 = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"meter-{pid}", daemon=True)
+
+    @classmethod
+    def start(cls, pid: int, interval: float = 1.0) -> Optional["ResourceMeter"]:
+        if psutil is None or pid <= 0:
+            return None
+        meter = cls(pid, interval)
+        meter.sample()
+        meter._thread.start()
+        return meter
+
+    def _tree(self) -> List[Any]:
+        try:
+            root = psutil.Process(self.pid)
+            return [root] + root.children(recursive=True)
+        except psutil.Error:
+            return []
+
+    def sample(self) -> None:
+        rss = 0
+        for p in self._tree():
+            try:
+                with p.oneshot():
+                    cpu = p.cpu_times()
+                    mem = p.memory_info()
+                    io = p.io_counters() if hasattr(p, "io_counters") else None
+            except psutil.Error:
+                continue
+            self._cpu[p.pid] = max(self._cpu.get(p.pid, 0.0), cpu.user + cpu.system)
+            rss += mem.rss
+            if io is not None:
+                self._read[p.pid] = max(self._read.get(p.pid, 0), io.read_bytes)
+                self._write[p.pid] = max(self._write.get(p.pid, 0), io.write_bytes)
+        self.peak_rss = max(self.peak_rss, rss)
+        self.samples += 1
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> Dict[str, Any]:
+        """Última muestra y resumen del run"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval * 2 + 1)
+        self.sample()
+        wall = time.time() - self._t0
+        cpu = sum(self._cpu.values())
+        return {
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "cores": round(cpu / wall, 3) if wall > 0 else None,
+            "peak_rss_mb": round(self.peak_rss / _MB, 1),
+            "read_mb": round(sum(self._read.values()) / _MB, 2),
+            "write_mb": round(sum(self._write.values()) / _MB, 2),
+            "processes": len(self._cpu),
+            "samples": self.samples,
+        }
+
+
+def combine(parts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Resumen conjunto de runs simultáneos de un mismo trial (p.ej. los tramos de sharding)"""
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+    wall = max(p["wall_seconds"] for p in parts)
+    cpu = sum(p["cpu_seconds"] for p in parts)
+    return {
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "cores": round(cpu / wall, 3) if wall > 0 else None,
+        # Cota superior: los picos de cada terminal no tienen por qué coincidir
+        "peak_rss_mb": round(sum(p["peak_rss_mb"] for p in parts), 1),
+        "read_mb": round(sum(p["read_mb"] for p in parts), 2),
+        "write_mb": round(sum(p["write_mb"] for p in parts), 2),
+        "processes": sum(p["processes"] for p in parts),
+        "samples": sum(p["samples"] for p in parts),
+    }
+
+def _mean(xs: List[float]) -> Optional[float]:
+    return round(sum(xs) / len(xs), 3) if xs else None
+
+
+class ResourceLedger:
+    """
+    Uso de recursos de los trials de un study, agrupado por (timeframe, modelo, días de rango).
+    Dentro de cada grupo, el tiempo de pared medio por nivel de concurrencia muestra a partir de
+    cuántos slots simultáneos los trials empiezan a frenarse entre sí.
+    """
+
+    def __init__(self, interval: float = 1.0, history: int = 500):
+        self.interval = float(interval)
+        self.history = int(history)
+        self._lock = threading.Lock()
+        self.groups: Dict[str, List[Dict[str, Any]]] = {}
+        self.total = 0
+
+    @staticmethod
+    def group_key(features: Dict[str, Any]) -> str:
+        days = features.get("span_days")
+        return f"{features.get('timeframe')}|model{features.get('model')}|{int(days) if days else '?'}d"
+
+    def record(self, features: Dict[str, Any], usage: Optional[Dict[str, Any]], concurrency: int = 1) -> None:
+        if not usage:
+            return
+        row = dict(usage, concurrency=int(concurrency))
+        with self._lock:
+            rows = self.groups.setdefault(self.group_key(features), [])
+            rows.append(row)
+            if len(rows) > self.history:
+                del rows[0]
+            self.total += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            groups = {k: list(v) for k, v in self.groups.items()}
+            total = self.total
+        out: Dict[str, Any] = {"trials": total, "groups": {}}
+        for key, rows in sorted(groups.items()):
+            by_conc: Dict[int, List[float]] = {}
+            for r in rows:
+                by_conc.setdefault(r["concurrency"], []).append(r["wall_seconds"])
+            out["groups"][key] = {
+                "n": len(rows),
+                "wall_seconds": _mean([r["wall_seconds"] for r in rows]),
+                "cpu_seconds": _mean([r["cpu_seconds"] for r in rows]),
+                "cores": _mean([r["cores"] for r in rows if r.get("cores") is not None]),
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in rows),
+                "read_mb": _mean([r["read_mb"] for r in rows]),
+                "write_mb": _mean([r["write_mb"] for r in rows]),
+                "wall_by_concurrency": {str(c): _mean(ws) for c, ws in sorted(by_conc.items())},
+            }
+        return out
+
+    def capacity(self, cpus: Optional[int] = None, mem_mb: Optional[float] = None,
+                 cpu_target: float = 0.85, mem_target: float = 0.80) -> Dict[str, Any]:
+        """
+        Slots sostenibles por grupo en un host con `cpus` núcleos y `mem_mb` de RAM (por defecto,
+        este host): el mínimo entre núcleos·objetivo / núcleos por trial y RAM·objetivo / RSS pico.
+        """
+        if cpus is None:
+            cpus = os.cpu_count() or 1
+        if mem_mb is None and psutil is not None:
+            mem_mb = psutil.virtual_memory().total / _MB
+        out: Dict[str, Any] = {"cpus": cpus, "mem_mb": round(mem_mb, 0) if mem_mb else None, "groups": {}}
+        for key, g in self.summary()["groups"].items():
+            by_cpu = math.floor(cpus * cpu_target / g["cores"]) if g.get("cores") else None
+            by_mem = math.floor(mem_mb * mem_target / g["peak_rss_mb"]) if mem_mb and g.get("peak_rss_mb") else None
+            bounds = [b for b in (by_cpu, by_mem) if b is not None]
+            out["groups"][key] = {"slots": max(1, min(bounds)) if bounds else None,
+                                  "by_cpu": by_cpu, "by_mem": by_mem}
+        return out
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Robustez por Monte Carlo sobre trades.csv para MT5 Smart Optimizer v2
+Reordena, remuestrea y omite trades de un run como operaciones NumPy sobre una matriz
+(simulaciones × trades) y resume percentiles de drawdown y beneficio en milisegundos.
+Sirve de ranking secundario del top-K de un study sin lanzar ningún terminal más."""
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import optimizer_v2 as opt
+
+METHODS = ("shuffle", "bootstrap", "skip")
+PERCENTILES = (5, 25, 50, 75, 95)
+# Celdas por bloque de simulaciones (float64): acota la RAM con muchos trades
+MAX_CELLS = 4_000_000
+
+
+# ----------------------- Trades -----------------------
+# DEAL_TYPE de so_report.mqh (0 buy, 1 sell); el resto (balance, crédito, comisiones sueltas...) no es un trade
+_DEAL_SIGN = {"0": 1.0, "buy": 1.0, "1": -1.0, "sell": -1.0}
+
+def load_trades(path: Path) -> np.ndarray:
+    """
+    Resultado neto por posición cerrada, en orden. trades.csv trae deals: el de entrada
+    (comisión, profit a cero) se acumula y se suma al deal que reduce la posición (profit,
+    comisión y swap de salida). Entrada y salida se distinguen por el volumen neto por símbolo.
+    """
+    out: List[float] = []
+    position: Dict[str, float] = {}
+    pending: Dict[str, float] = {}
+    with open(path, encoding="latin-1", newline="") as f:
+        for row in csv.DictReader(f):
+            sign = _DEAL_SIGN.get(str(row.get("type") or "").strip().lower())
+            if sign is None:
+                continue
+            net = 0.0
+            for key in ("profit", "commission", "swap"):
+                try:
+                    net += float(row.get(key) or 0.0)
+                except ValueError:
+                    pass
+            try:
+                volume = float(row.get("volume") or 0.0)
+            except ValueError:
+                volume = 0.0
+            symbol = row.get("symbol") or ""
+            held = position.get(symbol, 0.0)
+            position[symbol] = round(held + sign * volume, 8)
+            if held == 0.0 or (held > 0) == (sign > 0):
+                pending[symbol] = pending.get(symbol, 0.0) + net
+                continue
+            out.append(net + pending.pop(symbol, 0.0))
+    return np.asarray(out, dtype=np.float64)
+
+def _run_deposit(run_dir: Path, default: float) -> float:
+    try:
+        rep = json.loads((run_dir / "report.json").read_text(encoding="utf-8"))
+        return float(rep.get("initial_deposit") or default)
+    except (OSError, ValueError, TypeError):
+        return float(default)
+
+
+# ----------------------- Simulación vectorizada -----------------------
+def curve_stats(pnl: np.ndarray, deposit: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(beneficio, drawdown máximo en %) de cada fila de una matriz de resultados por trade"""
+    if not pnl.shape[1]:
+        return np.zeros(pnl.shape[0]), np.zeros(pnl.shape[0])
+    # Operaciones in situ: dos matrices temporales en total, no una por paso
+    equity = np.cumsum(pnl, axis=1)
+    equity += deposit
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(peak, deposit, out=peak)
+    np.divide(equity, peak, out=peak)
+    return equity[:, -1] - deposit, (1.0 - peak.min(axis=1)) * 100.0
+
+def _blocks(n_sims: int, n_trades: int) -> Iterator[int]:
+    rows = max(1, MAX_CELLS // max(1, n_trades))
+    for start in range(0, n_sims, rows):
+        yield min(rows, n_sims - start)
+
+def _matrix(method: str, pnl: np.ndarray, rows: int, rng: np.random.Generator, skip_prob: float) -> np.ndarray:
+    n = pnl.shape[0]
+    if method == "shuffle":
+        # Mismo conjunto de trades en otro orden: el beneficio no cambia, el drawdown sí
+        return rng.permuted(np.broadcast_to(pnl, (rows, n)), axis=1)
+    if method == "bootstrap":
+        return pnl[rng.integers(0, n, size=(rows, n))]
+    if method == "skip":
+        # Cada trade se pierde con probabilidad skip_prob (requotes, slippage, horario del broker)
+        return np.where(rng.random((rows, n)) < skip_prob, 0.0, pnl)
+    raise RuntimeError(f"Método de Monte Carlo desconocido: {method} (usa {', '.join(METHODS)})")
+
+def _summary(profit: np.ndarray, dd: np.ndarray, observed_dd: float, ruin_dd_pct: float) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, xs in (("profit", profit), ("dd", dd)):
+        for p, v in zip(PERCENTILES, np.percentile(xs, PERCENTILES)):
+            out[f"{name}_p{p:02d}"] = round(float(v), 2)
+    out["profit_mean"] = round(float(profit.mean()), 2)
+    out["p_loss"] = round(float((profit < 0).mean()), 4)
+    out["p_ruin"] = round(float((dd >= ruin_dd_pct).mean()), 4)
+    # Fracción de simulaciones con peor DD que el observado: cerca de 1 = orden de trades con suerte
+    out["dd_luck"] = round(float((dd > observed_dd).mean()), 4)
+    return out
+
+def monte_carlo(pnl: Sequence[float], deposit: float, n_sims: int = 2000, methods: Sequence[str] = METHODS,
+                skip_prob: float = 0.1, ruin_dd_pct: float = 50.0, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Percentiles de beneficio y drawdown (% sobre el pico de balance) por método:
+    shuffle (orden aleatorio), bootstrap (remuestreo con reemplazo) y skip (omitir trades).
+    """
+    t0 = time.perf_counter()
+    pnl = np.asarray(pnl, dtype=np.float64)
+    deposit = float(deposit)
+    obs_profit, obs_dd = curve_stats(pnl[None, :], deposit)
+    out: Dict[str, Any] = {"trades": int(pnl.shape[0]), "n_sims": int(n_sims), "deposit": deposit,
+                           "observed": {"profit": round(float(obs_profit[0]), 2), "dd": round(float(obs_dd[0]), 2)}}
+    if pnl.shape[0] < 2:
+        out["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        return out
+    rng = np.random.default_rng(seed)
+    for method in methods:
+        profits, dds = [], []
+        for rows in _blocks(int(n_sims), pnl.shape[0]):
+            profit, dd = curve_stats(_matrix(method, pnl, rows, rng, skip_prob), deposit)
+            profits.append(profit)
+            dds.append(dd)
+        out[method] = _summary(np.concatenate(profits), np.concatenate(dds), float(obs_dd[0]), ruin_dd_pct)
+    out["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+    return out
+
+def analyse_run(run_dir: Path, deposit: float = 10000.0, **kwargs: Any) -> Dict[str, Any]:
+    """monte_carlo() sobre <run_dir>/trades.csv con el depósito de su report.json"""
+    run_dir = Path(run_dir)
+    trades = run_dir / "trades.csv"
+    if not trades.exists():
+        raise RuntimeError(f"El run no tiene trades.csv: {run_dir}")
+    return monte_carlo(load_trades(trades), _run_deposit(run_dir, deposit), **kwargs)
+
+
+# ----------------------- Ranking secundario del top-K -----------------------
+def score_of(result: Dict[str, Any], key: str) -> Optional[float]:
+    """Valor de 'método.estadístico' (p.ej. bootstrap.profit_p05) en un resultado de monte_carlo()"""
+    method, _, stat = key.partition(".")
+    v = (result.get(method) or {}).get(stat)
+    return float(v) if v is not None else None
+
+def _lower_is_better(key: str) -> bool:
+    stat = key.partition(".")[2]
+    return stat.startswith(("dd_", "p_loss", "p_ruin"))
+
+def study_runs(source: Path, runs_root: Optional[Path] = None, top: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Trials completos de un study con su carpeta de run, ordenados por valor (ranking primario).
+    source: directorio de logs o *.trials.jsonl (run_id bajo runs_root = Common/Files/MT5_SO), o
+    directamente la carpeta MT5_SO (valor = total_net_profit de cada report.json).
+    """
+    source = Path(source)
+    rows: List[Dict[str, Any]] = []
+    if source.is_dir() and not list(source.glob("*.trials.jsonl")):
+        for rep in sorted(source.glob("*/report.json")):
+            try:
+                data = json.loads(rep.read_text(encoding="utf-8"))
+                value = float(data["total_net_profit"])
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            rows.append({"run_id": rep.parent.name, "value": value, "params": data.get("inputs") or {},
+                         "run_dir": rep.parent})
+    else:
+        if runs_root is None:
+            raise RuntimeError("Con un log de trials hace falta la carpeta de runs (MT5_SO) o el config")
+        files = sorted(source.glob("*.trials.jsonl")) if source.is_dir() else [source]
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("event") != "trial" or rec.get("phase", "complete") != "complete" or not rec.get("run_id"):
+                        continue
+                    if rec.get("artifacts") == "lean":
+                        continue  # sin trades.csv: cuenta su re-ejecución rich de finalista, si la hubo
+                    try:
+                        value = float(rec["value"])
+                    except (TypeError, ValueError, KeyError):
+                        continue
+                    rows.append({"trial": rec.get("trial"), "run_id": rec["run_id"], "value": value,
+                                 "params": rec.get("params") or {}, "run_dir": Path(runs_root) / rec["run_id"]})
+    rows.sort(key=lambda r: r["value"], reverse=True)
+    return rows[:top] if top else rows
+
+def rank_runs(rows: List[Dict[str, Any]], key: str = "bootstrap.profit_p05", deposit: float = 10000.0,
+              **kwargs: Any) -> List[Dict[str, Any]]:
+    """
+    Re-ordena runs ya ejecutados por un estadístico de Monte Carlo sobre sus trades.csv.
+    Cada fila conserva su posición primaria (primary_rank, por valor) y añade robust y score.
+    """
+    out = []
+    for i, row in enumerate(sorted(rows, key=lambda r: r["value"], reverse=True), 1):
+        res = dict(row, primary_rank=i)
+        try:
+            res["robust"] = analyse_run(Path(row["run_dir"]), deposit, **kwargs)
+            res["score"] = score_of(res["robust"], key)
+        except (RuntimeError, OSError) as e:
+            print(f"WARNING Sin análisis de robustez para {row.get('run_id')}: {e}")
+            res["robust"], res["score"] = None, None
+        out.append(res)
+    sign = 1.0 if _lower_is_better(key) else -1.0
+    out.sort(key=lambda r: (r["score"] is None, sign * (r["score"] or 0.0), r["primary_rank"]))
+    for i, r in enumerate(out, 1):
+        r["rank"] = i
+    return out
+
+
+# ----------------------- CLI -----------------------
+def _print_result(label: str, res: Dict[str, Any]) -> None:
+    obs = res["observed"]
+    print(f"{label}: {res['trades']} trades, profit={obs['profit']} dd={obs['dd']}% ({res['ms']} ms, {res['n_sims']} sims)")
+    for method in METHODS:
+        m = res.get(method)
+        if m:
+            print(f"  {method:9s} profit p05/p50/p95={m['profit_p05']}/{m['profit_p50']}/{m['profit_p95']} "
+                  f"dd p50/p95={m['dd_p50']}/{m['dd_p95']}% p_loss={m['p_loss']} dd_luck={m['dd_luck']}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Monte Carlo de robustez sobre trades.csv y ranking secundario del top-K.")
+    ap.add_argument("--run", action="append", default=[], help="Carpeta de un run (con trades.csv); repetible.")
+    ap.add_argument("--study", help="Directorio de logs / *.trials.jsonl de un study, o carpeta MT5_SO.")
+    ap.add_argument("-c", "--config", help="Config del study (para localizar MT5_SO con --study).")
+    ap.add_argument("--runs-root", help="Carpeta MT5_SO con los runs (alternativa a --config).")
+    ap.add_argument("--top", type=int, default=20, help="Top-K por valor a re-ordenar.")
+    ap.add_argument("--key", default="bootstrap.profit_p05", help="Estadístico del ranking: método.estadístico.")
+    ap.add_argument("--sims", type=int, default=2000, help="Simulaciones por método.")
+    ap.add_argument("--skip-prob", type=float, default=0.1, help="Probabilidad de omitir cada trade (método skip).")
+    ap.add_argument("--ruin-dd", type=float, default=50.0, help="Drawdown %% que cuenta como ruina.")
+    ap.add_argument("--deposit", type=float, default=10000.0, help="Depósito si el run no trae report.json.")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="JSON con el resultado completo.")
+    args = ap.parse_args(argv)
+    opts = {"n_sims": args.sims, "skip_prob": args.skip_prob, "ruin_dd_pct": args.ruin_dd, "seed": args.seed}
+
+    if args.run:
+        results = {r: analyse_run(Path(r), args.deposit, **opts) for r in args.run}
+        for r, res in results.items():
+            _print_result(Path(r).name, res)
+        payload: Any = results
+    elif args.study:
+        runs_root = Path(args.runs_root) if args.runs_root else None
+        if runs_root is None and args.config:
+            runs_root = opt.get_layout(opt.load_config(args.config)).common_mt5_so_dir
+        ranked = rank_runs(study_runs(Path(args.study), runs_root, args.top), args.key, args.deposit, **opts)
+        print(f"=== RANKING por {args.key} (top {args.top} por valor) ===")
+        for r in ranked:
+            ms = r["robust"]["ms"] if r["robust"] else None
+            print(f"#{r['rank']} (valor #{r['primary_rank']}) {r['run_id']} value={r['value']} score={r['score']} ({ms} ms)")
+        payload = ranked
+    else:
+        ap.error("indica --run o --study")
+        return 2
+    if args.out:
+        Path(args.out).write_text(json.dumps(payload, indent=2, default=str), encoding="utf-8")
+        print(f"INFO Resultado guardado: {args.out}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Registro de samplers de Optuna para MT5 Smart Optimizer v2
+search.sampler admite un nombre ("tpe", "random", "cmaes", "qmc", "grid") o un objeto con
+"type" y opciones; "startup" antepone un diseño inicial QMC (Sobol/Halton) a cualquiera"""
+import argparse
+import json
+import math
+import threading
+import warnings
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:
+    import optuna  # type: ignore
+    from optuna.samplers import BaseSampler  # type: ignore
+except Exception:  # pragma: no cover - el módulo se importa sin Optuna (p.ej. preflight)
+    optuna = None
+    BaseSampler = object  # type: ignore
+
+SamplerFactory = Callable[[Dict[str, Any], Optional[Dict[str, list]]], Any]
+SAMPLERS: Dict[str, SamplerFactory] = {}
+
+# Primos para las dimensiones de Halton (una por parámetro del espacio)
+_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71,
+           73, 79, 83, 89, 97, 101, 103, 107, 109, 113, 127, 131, 137, 139, 149, 151]
+
+
+def register_sampler(*names: str) -> Callable[[SamplerFactory], SamplerFactory]:
+    """Registra una factoría (opciones, grid) -> sampler bajo uno o varios nombres"""
+    def deco(fn: SamplerFactory) -> SamplerFactory:
+        for n in names:
+            SAMPLERS[n.lower()] = fn
+        return fn
+    return deco
+
+def _require_optuna() -> None:
+    if optuna is None:
+        raise RuntimeError("Optuna no está instalado. pip install optuna")
+
+def _seed(opts: Dict[str, Any]) -> int:
+    return int(opts.get("seed", 42))
+
+
+# ----------------------- Samplers -----------------------
+@register_sampler("tpe", "tp", "tpesampler")
+def _tpe(opts: Dict[str, Any], grid: Optional[Dict[str, list]]) -> Any:
+    with warnings.catch_warnings():
+        # constraints_func es experimental en Optuna; aquí sólo llega con search.constraints
+        warnings.simplefilter("ignore", optuna.exceptions.ExperimentalWarning)
+        return optuna.samplers.TPESampler(
+            seed=_seed(opts),
+            n_startup_trials=int(opts.get("n_startup_trials", 10)),
+            multivariate=bool(opts.get("multivariate", False)),
+            group=bool(opts.get("group", False)),
+            constant_liar=bool(opts.get("constant_liar", False)),
+            constraints_func=opts.get("_constraints_func"),
+        )
+
+@register_sampler("random", "randomsampler")
+def _random(opts: Dict[str, Any], grid: Optional[Dict[str, list]]) -> Any:
+    return optuna.samplers.RandomSampler(seed=_seed(opts))
+
+@register_sampler("grid", "grid_sampler", "gridsampler")
+def _grid(opts: Dict[str, Any], grid: Optional[Dict[str, list]]) -> Any:
+    if grid is None:
+        raise RuntimeError("GridSampler requiere un espacio de grid.")
+    return optuna.samplers.GridSampler(grid)
+
+@register_sampler("cmaes", "cma", "cma-es", "cmaessampler")
+def _cmaes(opts: Dict[str, Any], grid: Optional[Dict[str, list]]) -> Any:
+    """CMA-ES para las dimensiones numéricas; las categóricas van al sampler independiente"""
+    try:
+        import cmaes  # type: ignore  # noqa: F401
+    except Exception as e:
+        raise RuntimeError("CmaEsSampler requiere el paquete cmaes. pip install cmaes") from e
+    independent = build_sampler(opts.get("independent", {"type": "tpe", "seed": _seed(opts)}))
+    return optuna.samplers.CmaEsSampler(
+        seed=_seed(opts),
+        n_startup_trials=int(opts.get("n_startup_trials", 0)),
+        sigma0=opts.get("sigma0"),
+        restart_strategy=opts.get("restart_strategy"),
+        independent_sampler=independent,
+        warn_independent_sampling=False,
+    )
+
+@register_sampler("qmc", "qmcsampler", "sobol", "halton")
+def _qmc(opts: Dict[str, Any], grid: Optional[Dict[str, list]]) -> Any:
+    """Sobol vía optuna.QMCSampler (necesita scipy); Halton con la implementación propia"""
+    kind = str(opts.get("qmc_type", opts.get("_name") if opts.get("_name") in ("sobol", "halton") else "sobol")).lower()
+    scramble = bool(opts.get("scramble", True))
+    if kind == "halton":
+        return HaltonSampler(seed=_seed(opts), scramble=scramble)
+    if kind != "sobol":
+        raise RuntimeError(f"qmc_type no soportado: {kind} (usa sobol o halton)")
+    try:
+        import scipy  # type: ignore  # noqa: F401
+    except Exception as e:
+        raise RuntimeError("QMC Sobol requiere scipy. pip install scipy (o usa qmc_type=halton)") from e
+    return optuna.samplers.QMCSampler(qmc_type="sobol", scramble=scramble, seed=_seed(opts),
+                                      warn_independent_sampling=False)
+
+
+class HaltonSampler(BaseSampler):  # type: ignore[misc]
+    """
+    Secuencia de Halton (con rotación aleatoria por dimensión si scramble) sin dependencias.
+    Cada parámetro ocupa una dimensión en el orden en que se sugiere por primera vez y el
+    punto i-ésimo corresponde al trial número i: diseños que cubren el espacio sin huecos.
+    """
+
+    def __init__(self, seed: Optional[int] = None, scramble: bool = True):
+        import numpy as np  # type: ignore
+        self._rng = np.random.default_rng(seed)
+        self._scramble = scramble
+        self._dims: Dict[str, int] = {}
+        self._shifts: List[float] = []
+        self._lock = threading.Lock()
+
+    def reseed_rng(self) -> None:
+        import numpy as np  # type: ignore
+        self._rng = np.random.default_rng()
+
+    def infer_relative_search_space(self, study, trial):
+        return {}
+
+    def sample_relative(self, study, trial, search_space):
+        return {}
+
+    def _dim(self, name: str) -> int:
+        with self._lock:
+            if name not in self._dims:
+                if len(self._dims) >= len(_PRIMES):
+                    raise RuntimeError(f"HaltonSampler admite como mucho {len(_PRIMES)} parámetros")
+                self._dims[name] = len(self._dims)
+                self._shifts.append(float(self._rng.random()) if self._scramble else 0.0)
+            return self._dims[name]
+
+    def point(self, index: int, dim: int) -> float:
+        """Coordenada `dim` del punto `index` (>= 1) en [0, 1)"""
+        base, f, r, i = _PRIMES[dim], 1.0, 0.0, index
+        while i > 0:
+            f /= base
+            r += f * (i % base)
+            i //= base
+        return (r + self._shifts[dim]) % 1.0
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        u = self.point(trial.number + 1, self._dim(param_name))
+        return map_unit(u, param_distribution)
+
+
+def map_unit(u: float, dist: Any) -> Any:
+    """Lleva u en [0, 1) al dominio de una distribución de Optuna"""
+    D = optuna.distributions
+    if isinstance(dist, D.CategoricalDistribution):
+        return dist.choices[min(len(dist.choices) - 1, int(u * len(dist.choices)))]
+    if isinstance(dist, D.IntDistribution):
+        step = dist.step or 1
+        n = (dist.high - dist.low) // step + 1
+        return int(dist.low + min(n - 1, int(u * n)) * step)
+    if isinstance(dist, D.FloatDistribution):
+        if dist.log:
+            return math.exp(math.log(dist.low) + u * (math.log(dist.high) - math.log(dist.low)))
+        value = dist.low + u * (dist.high - dist.low)
+        if dist.step:
+            value = dist.low + round((value - dist.low) / dist.step) * dist.step
+        return min(dist.high, value)
+    raise RuntimeError(f"Distribución no soportada: {dist!r}")
+
+
+class StartupSampler(BaseSampler):  # type: ignore[misc]
+    """Los primeros `n_startup` trials los decide `startup` (p.ej. QMC); el resto, `main`"""
+
+    def __init__(self, startup: Any, main: Any, n_startup: int):
+        self.startup = startup
+        self.main = main
+        self.n_startup = int(n_startup)
+
+    def _pick(self, trial) -> Any:
+        return self.startup if trial.number < self.n_startup else self.main
+
+    def reseed_rng(self) -> None:
+        self.startup.reseed_rng()
+        self.main.reseed_rng()
+
+    def infer_relative_search_space(self, study, trial):
+        return self._pick(trial).infer_relative_search_space(study, trial)
+
+    def sample_relative(self, study, trial, search_space):
+        return self._pick(trial).sample_relative(study, trial, search_space)
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        return self._pick(trial).sample_independent(study, trial, param_name, param_distribution)
+
+    def before_trial(self, study, trial) -> None:
+        self._pick(trial).before_trial(study, trial)
+
+    def after_trial(self, study, trial, state, values) -> None:
+        picked = self._pick(trial)
+        picked.after_trial(study, trial, state, values)
+        if picked is not self.main:
+            # El principal guarda también la factibilidad (constraints_func) de los puntos QMC
+            self.main.after_trial(study, trial, state, values)
+
+
+# ----------------------- Construcción -----------------------
+def _options(spec: Any) -> Dict[str, Any]:
+    if spec is None:
+        return {"_name": "tpe"}
+    if isinstance(spec, str):
+        return {"_name": spec.strip().lower()}
+    if isinstance(spec, dict):
+        name = spec.get("type") or spec.get("name") or spec.get("sampler") or ""
+        return dict(spec, _name=str(name).strip().lower())
+    raise RuntimeError(f"Tipo no soportado para search.sampler: {type(spec)!r}.")
+
+def build_sampler(spec: Any, grid: Optional[Dict[str, list]] = None,
+                  constraints_func: Optional[Callable[[Any], Sequence[float]]] = None) -> Any:
+    """
+    Sampler a partir de search.sampler. Con "startup": {"qmc_type": "sobol"|"halton",
+    "n_trials": N} los N primeros trials salen de un diseño QMC y el TPE/CMA-ES principal
+    arranca ya con esos N puntos (su arranque aleatorio propio se reduce a N).
+    constraints_func (search.constraints) llega al TPE para que aprenda la región no factible;
+    random, CMA-ES, QMC y el startup QMC no la usan (se avisa con un WARNING).
+    """
+    _require_optuna()
+    opts = _options(spec)
+    if constraints_func is not None:
+        opts["_constraints_func"] = constraints_func
+    factory = SAMPLERS.get(opts["_name"])
+    if factory is None:
+        raise RuntimeError(f"Sampler desconocido en search.sampler: '{opts['_name']}'. "
+                           f"Disponibles: {sorted(SAMPLERS)}")
+    startup = opts.get("startup")
+    grid_like = opts["_name"] in ("grid", "grid_sampler", "gridsampler")
+    if constraints_func is not None and factory is not _tpe and not grid_like:
+        print(f"WARNING search.constraints con sampler '{opts['_name']}': sólo TPE aprende la región no factible; "
+              f"los puntos que incumplen se siguen rechazando sin lanzar MT5, pero el sampler puede repetirlos")
+    if not startup or grid_like:
+        return factory(opts, grid)
+    startup = {"qmc_type": startup} if isinstance(startup, str) else dict(startup)
+    n = int(startup.get("n_trials", 16))
+    if constraints_func is not None:
+        print(f"WARNING search.constraints: los {n} trials del startup QMC no tienen en cuenta las restricciones "
+              f"(el diseño cubre todo el espacio); el sampler principal las ve desde el trial {n}")
+    opts.setdefault("n_startup_trials", n)
+    main = factory(opts, grid)
+    first = _qmc(dict(startup, seed=startup.get("seed", _seed(opts))), grid)
+    return StartupSampler(first, main, n)
+
+
+# ----------------------- Benchmark -----------------------
+BENCH_SPACE: Dict[str, Any] = {
+    "atrMultiplierSL": ["float", 1.0, 4.0],
+    "atrMultiplierTP": ["float", 1.0, 6.0],
+    "bb_period": ["int", 10, 40],
+    "sto_period_k": ["int", 5, 21],
+    "timeframe": ["choice", ["H1", "H4", "H6"]],
+}
+
+def synthetic_profit(p: Dict[str, Any]) -> float:
+    """Superficie tipo beneficio: cresta estrecha en SL/TP, óptimo interior en periodos, H4 mejor"""
+    sl, tp = p["atrMultiplierSL"], p["atrMultiplierTP"]
+    ridge = -((tp - 1.8 * sl) ** 2) * 40.0 - ((sl - 2.2) ** 2) * 25.0
+    periods = -((p["bb_period"] - 24) / 6.0) ** 2 * 30.0 - ((p["sto_period_k"] - 9) / 4.0) ** 2 * 20.0
+    tf = {"H1": -40.0, "H4": 0.0, "H6": -15.0}[p["timeframe"]]
+    return 500.0 + ridge + periods + tf
+
+def _suggest(trial, space: Dict[str, Any]) -> Dict[str, Any]:
+    out = {}
+    for k, spec in space.items():
+        if spec[0] == "int":
+            out[k] = trial.suggest_int(k, int(spec[1]), int(spec[2]))
+        elif spec[0] == "float":
+            out[k] = trial.suggest_float(k, float(spec[1]), float(spec[2]))
+        else:
+            out[k] = trial.suggest_categorical(k, list(spec[1]))
+    return out
+
+def benchmark(specs: Dict[str, Any], n_trials: int = 40, seeds: Sequence[int] = (0, 1, 2),
+              objective: Callable[[Dict[str, Any]], float] = synthetic_profit,
+              space: Optional[Dict[str, Any]] = None, checkpoints: Sequence[int] = (10, 20, 30)) -> Dict[str, Any]:
+    """
+    Eficiencia de muestreo: mejor valor medio (entre semillas) tras k trials para cada spec.
+    Los samplers cuyo paquete opcional falta se omiten con su motivo.
+    """
+    _require_optuna()
+    space = space or BENCH_SPACE
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    out: Dict[str, Any] = {}
+    for label, spec in specs.items():
+        curves: List[List[float]] = []
+        try:
+            for seed in seeds:
+                opts = _options(spec)
+                sampler = build_sampler(dict(opts, type=opts["_name"], seed=seed))
+                study = optuna.create_study(direction="maximize", sampler=sampler)
+                study.optimize(lambda t: objective(_suggest(t, space)), n_trials=n_trials)
+                best, curve = -math.inf, []
+                for t in study.trials:
+                    best = max(best, t.value if t.value is not None else -math.inf)
+                    curve.append(best)
+                curves.append(curve)
+        except RuntimeError as e:
+            out[label] = {"skipped": str(e)}
+            continue
+        mean_curve = [sum(c[i] for c in curves) / len(curves) for i in range(n_trials)]
+        out[label] = {
+            "best_at": {str(k): round(mean_curve[k - 1], 3) for k in list(checkpoints) + [n_trials] if k <= n_trials},
+            "final": round(mean_curve[-1], 3),
+            "curve": [round(v, 3) for v in mean_curve],
+        }
+    return out
+
+
+# ----------------------- CLI -----------------------
+DEFAULT_BENCH = {
+    "random": "random",
+    "tpe": {"type": "tpe"},
+    "tpe_multivariate": {"type": "tpe", "multivariate": True},
+    "halton+tpe": {"type": "tpe", "multivariate": True, "startup": {"qmc_type": "halton", "n_trials": 12}},
+    "sobol+tpe": {"type": "tpe", "multivariate": True, "startup": {"qmc_type": "sobol", "n_trials": 16}},
+    "cmaes": {"type": "cmaes", "startup": {"qmc_type": "halton", "n_trials": 8}},
+}
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark de eficiencia de muestreo sobre un objetivo sintético.")
+    ap.add_argument("--trials", type=int, default=40, help="Trials por study.")
+    ap.add_argument("--seeds", type=int, default=3, help="Semillas por sampler (se promedia).")
+    ap.add_argument("--specs", help="JSON {etiqueta: search.sampler} a comparar (por defecto, la batería estándar).")
+    ap.add_argument("--out", help="Ruta opcional del resultado JSON.")
+    args = ap.parse_args()
+    specs = json.loads(args.specs) if args.specs else DEFAULT_BENCH
+    warnings.filterwarnings("ignore", category=optuna.exceptions.ExperimentalWarning)
+    result = benchmark(specs, n_trials=args.trials, seeds=range(args.seeds))
+    print(f"{'sampler':<20} " + " ".join(f"best@{k:<6}" for k in (10, 20, 30, args.trials)))
+    for label, r in result.items():
+        if "skipped" in r:
+            print(f"{label:<20} omitido: {r['skipped']}")
+            continue
+        print(f"{label:<20} " + " ".join(f"{r['best_at'].get(str(k), float('nan')):<11.2f}" for k in (10, 20, 30, args.trials)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
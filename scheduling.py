@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Modelo de coste de runtime y planificación LPT para MT5 Smart Optimizer v2
+Aprende cuánto tarda un trial según (timeframe, modelo, rango de fechas) y ordena
+el trabajo del más largo al más corto para que ningún slot quede solo al final;
+TimeBudget decide si el siguiente trial cabe en lo que queda de --timeout"""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Minutos por barra de cada timeframe de MT5
+TF_MINUTES = {
+    "M1": 1, "M2": 2, "M3": 3, "M4": 4, "M5": 5, "M6": 6, "M10": 10, "M12": 12, "M15": 15,
+    "M20": 20, "M30": 30, "H1": 60, "H2": 120, "H3": 180, "H4": 240, "H6": 360, "H8": 480,
+    "H12": 720, "D1": 1440, "W1": 10080, "MN1": 43200,
+}
+
+
+def _parse_date(s: str) -> Optional[datetime]:
+    m = re.match(r"^(\d{4})[.\-/](\d{2})[.\-/](\d{2})", str(s or "").strip())
+    return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
+
+def trial_features(timeframe: str, model: int, from_: str, to: str,
+                   params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Rasgos de coste de un trial; `bars` es el nº aproximado de barras del rango"""
+    start, end = _parse_date(from_), _parse_date(to)
+    span_days = max(1.0, (end - start).days) if start and end else None
+    tf = str(timeframe).upper()
+    bars = span_days * 1440.0 / TF_MINUTES[tf] if span_days and tf in TF_MINUTES else None
+    return {"timeframe": tf, "model": int(model), "span_days": span_days, "bars": bars,
+            "params": dict(params or {})}
+
+
+class CostModel:
+    """
+    Estimador de segundos por trial, thread-safe y de memoria constante.
+    1) Con historia del grupo (timeframe, modelo): media de segundos por día de rango × días.
+    2) Si no: ajuste global segundos = a + b·barras (mínimos cuadrados con sumas acumuladas).
+    3) Si no hay datos: None (desconocido; el planificador lo lanza primero para aprender).
+    Los parámetros del EA se conservan en los rasgos pero no entran en el ajuste: su efecto
+    en el runtime es despreciable frente al timeframe y el rango.
+    """
+
+    def __init__(self, history: int = 50):
+        self._lock = threading.Lock()
+        self.groups: Dict[str, Dict[str, float]] = {}
+        self.fit = {"n": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0}
+        self.acc = {"n": 0.0, "abs_err": 0.0, "abs_pct": 0.0, "bias": 0.0}
+        self.recent: "deque[Dict[str, Any]]" = deque(maxlen=history)
+
+    @staticmethod
+    def _group(f: Dict[str, Any]) -> str:
+        return f"{f['timeframe']}|{f['model']}"
+
+    def observe(self, features: Dict[str, Any], seconds: float) -> None:
+        """Incorpora un trial completado (los timeouts/abortos están censurados: no se observan)"""
+        seconds = float(seconds)
+        with self._lock:
+            if features.get("span_days"):
+                g = self.groups.setdefault(self._group(features), {"n": 0.0, "spd": 0.0})
+                g["n"] += 1
+                g["spd"] += seconds / features["span_days"]
+            x = features.get("bars")
+            if x:
+                for k, v in (("n", 1.0), ("sx", x), ("sy", seconds), ("sxx", x * x), ("sxy", x * seconds)):
+                    self.fit[k] += v
+
+    def predict(self, features: Dict[str, Any]) -> Optional[float]:
+        with self._lock:
+            g = self.groups.get(self._group(features))
+            if g and g["n"] and features.get("span_days"):
+                return round(g["spd"] / g["n"] * features["span_days"], 3)
+            f, x = self.fit, features.get("bars")
+            if not f["n"] or not x:
+                return None
+            mean_y = f["sy"] / f["n"]
+            den = f["n"] * f["sxx"] - f["sx"] ** 2
+            if f["n"] < 2 or den <= 1e-9:
+                return round(mean_y, 3)
+            b = (f["n"] * f["sxy"] - f["sx"] * f["sy"]) / den
+            a = (f["sy"] - b * f["sx"]) / f["n"]
+            return round(max(1.0, a + b * x), 3)
+
+    def record(self, predicted: Optional[float], actual: float, trial: Any = None,
+               features: Optional[Dict[str, Any]] = None) -> None:
+        """Registra predicho vs real para seguir la precisión del modelo"""
+        if predicted is None:
+            return
+        err = float(actual) - float(predicted)
+        with self._lock:
+            self.acc["n"] += 1
+            self.acc["abs_err"] += abs(err)
+            self.acc["abs_pct"] += abs(err) / max(1e-9, float(actual))
+            self.acc["bias"] += err
+            self.recent.append({"trial": trial, "timeframe": (features or {}).get("timeframe"),
+                                "predicted": round(float(predicted), 3), "actual": round(float(actual), 3)})
+
+    def accuracy(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.acc["n"]
+            return {
+                "n": int(n),
+                "mae_seconds": round(self.acc["abs_err"] / n, 3) if n else None,
+                "mape": round(self.acc["abs_pct"] / n, 4) if n else None,
+                "bias_seconds": round(self.acc["bias"] / n, 3) if n else None,
+                "recent": list(self.recent),
+            }
+
+    # ---------------- Persistencia ----------------
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"groups": {k: dict(v) for k, v in self.groups.items()}, "fit": dict(self.fit)}
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "CostModel":
+        """Modelo aprendido en studies anteriores (vacío si no existe o está corrupto)"""
+        model = cls()
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+            model.groups = {k: {"n": float(v["n"]), "spd": float(v["spd"])} for k, v in data.get("groups", {}).items()}
+            model.fit.update({k: float(v) for k, v in data.get("fit", {}).items() if k in model.fit})
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        return model
+
+
+# ----------------------- Planificación LPT -----------------------
+def lpt_order(items: Iterable[Any], predict: Callable[[Any], Optional[float]]) -> List[Any]:
+    """Ordena de mayor a menor coste previsto; los desconocidos van primero (se aprende antes)"""
+    scored = [(predict(it), i, it) for i, it in enumerate(items)]
+    scored.sort(key=lambda t: (t[0] is not None, -(t[0] or 0.0), t[1]))
+    return [it for _, _, it in scored]
+
+def chunked_lpt(items: Iterable[Any], predict: Callable[[Any], Optional[float]], chunk: int) -> Iterator[Any]:
+    """LPT por bloques de `chunk` elementos: memoria acotada sobre iteradores perezosos"""
+    it = iter(items)
+    while True:
+        block = list(itertools.islice(it, max(1, chunk)))
+        if not block:
+            return
+        yield from lpt_order(block, predict)
+
+class SchedulePlan:
+    """
+    List scheduling previsto de lo que se va lanzando: cada runtime va al slot que antes queda
+    libre. Memoria O(n_slots); los trials sin previsión se cuentan aparte y no suman.
+    """
+
+    def __init__(self, n_slots: int):
+        self.slots = [0.0] * max(1, int(n_slots))
+        self.launched = 0
+        self.unknown = 0
+
+    def add(self, seconds: Optional[float]) -> None:
+        self.launched += 1
+        if seconds is None:
+            self.unknown += 1
+            return
+        i = self.slots.index(min(self.slots))
+        self.slots[i] += float(seconds)
+
+    @property
+    def makespan(self) -> float:
+        return max(self.slots)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "n_slots": len(self.slots),
+            "launched": self.launched,
+            "unknown_cost": self.unknown,
+            "predicted_serial_seconds": round(sum(self.slots), 1),
+            "predicted_makespan_seconds": round(self.makespan, 1) if self.launched > self.unknown else None,
+        }
+
+def makespan(durations: Iterable[float], n_slots: int) -> float:
+    """Makespan de lanzar `durations` en orden con list scheduling sobre n_slots (simulación)"""
+    plan = SchedulePlan(n_slots)
+    for d in durations:
+        plan.add(d)
+    return plan.makespan
+
+
+# ----------------------- Presupuesto de tiempo -----------------------
+class TimeBudget:
+    """
+    Presupuesto global de --timeout. Un trial sólo se lanza si su runtime previsto cabe en lo
+    que queda (los desconocidos se lanzan mientras quede tiempo). Al vencer, lo que está en
+    vuelo drena durante `grace` segundos; pasado ese margen sus terminales se cierran.
+    """
+
+    def __init__(self, seconds: float, grace: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.seconds = float(seconds)
+        self.grace = max(0.0, float(grace))
+        self.clock = clock
+        self.start = clock()
+        self.deadline = self.start + self.seconds
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - self.clock())
+
+    def expired(self) -> bool:
+        return self.clock() >= self.deadline
+
+    def fits(self, predicted: Optional[float]) -> bool:
+        """¿Cabe un trial con este runtime previsto? Cuenta los que se dejan sin lanzar"""
+        remaining = self.remaining()
+        ok = remaining > 0 and (predicted is None or float(predicted) <= remaining)
+        if not ok:
+            with self._lock:
+                self.skipped += 1
+        return ok
+
+    def cancel_reason(self) -> Optional[str]:
+        """Motivo para cerrar un trial en vuelo (None mientras dure el drenaje)"""
+        return "presupuesto agotado (--timeout)" if self.clock() >= self.deadline + self.grace else None
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"seconds": self.seconds, "elapsed": round(self.clock() - self.start, 1),
+                    "remaining": round(self.remaining(), 1), "grace": self.grace,
+                    "skipped": self.skipped}
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Sharding por rango de fechas para MT5 Smart Optimizer v2
+Divide test.from..test.to en K sub-rangos, los ejecuta en paralelo y cose trades.csv y
+métricas en un único resultado. Sólo para EAs marcados ea.stateless_across_boundaries."""
+import csv
+import functools
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TRADES_HEADER = ["ticket", "time", "type", "price", "volume", "profit", "commission", "swap", "symbol", "comment"]
+
+
+# ----------------------- Rangos -----------------------
+def _parse(s: str) -> datetime:
+    return datetime.strptime(s.strip()[:10].replace("-", ".").replace("/", "."), "%Y.%m.%d")
+
+def split_range(from_: str, to: str, k: int) -> List[Tuple[str, str]]:
+    """K sub-rangos contiguos por días (el último termina en `to`); menos si el rango es corto"""
+    start, end = _parse(from_), _parse(to)
+    days = (end - start).days + 1
+    k = max(1, min(int(k), days))
+    bounds = [start + timedelta(days=round(i * days / k)) for i in range(k + 1)]
+    out = []
+    for i in range(k):
+        a, b = bounds[i], bounds[i + 1] - timedelta(days=1)
+        out.append((a.strftime("%Y.%m.%d"), b.strftime("%Y.%m.%d")))
+    return out
+
+
+# ----------------------- Cosido de resultados -----------------------
+def _read_trades(path: Path) -> List[Dict[str, str]]:
+    try:
+        with open(path, encoding="latin-1", newline="") as f:
+            return list(csv.DictReader(f))
+    except OSError:
+        return []
+
+def _f(row: Dict[str, Any], key: str) -> float:
+    try:
+        return float(row.get(key) or 0.0)
+    except ValueError:
+        return 0.0
+
+def stitch(shards: List[Dict[str, Any]], deposit: float, compounding: str = "additive") -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Une los resultados de los shards (en orden cronológico). Cada shard: {"report": dict, "trades": [rows]}.
+    additive: lote fijo, el beneficio de cada tramo no depende del capital -> se suman.
+    multiplicative: tamaño proporcional al capital -> final = deposit · Π(fb_i / dep_i) y los
+    importes de cada tramo se escalan por el capital acumulado al inicio del tramo.
+    """
+    if compounding not in ("additive", "multiplicative"):
+        raise RuntimeError(f"Compounding no soportado: {compounding} (usa additive o multiplicative)")
+    trades: List[Dict[str, Any]] = []
+    balance = float(deposit)
+    scale = 1.0
+    gp = gl = 0.0
+    n_trades = 0
+    max_dd_shard = 0.0
+    for sh in shards:
+        rep = sh["report"]
+        dep_i = float(rep.get("initial_deposit") or deposit)
+        fb_i = float(rep["final_balance"])
+        scale = balance / dep_i if compounding == "multiplicative" else 1.0
+        for row in sh["trades"]:
+            row = dict(row)
+            if scale != 1.0:
+                for key in ("profit", "commission", "swap"):
+                    row[key] = f"{_f(row, key) * scale:.2f}"
+            trades.append(row)
+        gp += float(rep.get("gross_profit") or max(0.0, fb_i - dep_i)) * scale
+        gl += float(rep.get("gross_loss") or min(0.0, fb_i - dep_i)) * scale
+        n_trades += int(rep.get("total_trades") or 0)
+        max_dd_shard = max(max_dd_shard, float(rep.get("max_dd_rel_pct") or 0.0))
+        balance += (fb_i - dep_i) * scale
+
+    # Drawdown sobre la curva de balance cosida (los DD por equity de cada shard acotan por abajo)
+    curve, peak, dd = float(deposit), float(deposit), 0.0
+    for row in trades:
+        curve += _f(row, "profit") + _f(row, "commission") + _f(row, "swap")
+        peak = max(peak, curve)
+        if peak > 0:
+            dd = max(dd, (peak - curve) / peak * 100.0)
+
+    report = {
+        "initial_deposit": round(float(deposit), 2),
+        "final_balance": round(balance, 2),
+        "total_net_profit": round(balance - float(deposit), 2),
+        "gross_profit": round(gp, 2),
+        "gross_loss": round(gl, 2),
+        "profit_factor": round(gp / abs(gl), 2) if gl else (9999.0 if gp > 0 else 0.0),
+        "total_trades": n_trades,
+        "max_dd_rel_pct": round(max(dd, max_dd_shard), 2),
+        "compounding": compounding,
+        "shards": len(shards),
+    }
+    return report, trades
+
+def write_stitched(run_dir: Path, report: Dict[str, Any], trades: List[Dict[str, Any]]) -> None:
+    run_dir.mkdir(parents=True, exist_ok=True)
+    (run_dir / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    with open(run_dir / "trades.csv", "w", encoding="latin-1", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=TRADES_HEADER, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(trades)
+    (run_dir / "_READY").write_text("OK_JSON|OK_CSV", encoding="utf-8")
+
+
+# ----------------------- Runner -----------------------
+class ShardedRunner:
+    """
+    Sustituto de run_single (misma firma y retorno) que ejecuta el trial en K shards.
+    Cada `drift_every` trials ejecuta también el rango completo y compara; si la deriva
+    supera `tolerance` (fracción del depósito) desactiva el sharding para el resto del study.
+    """
+
+    def __init__(self, run_single: Callable[..., Tuple[bool, Optional[float], str, Path]], shards: int,
+                 compounding: str = "additive", drift_every: int = 20, tolerance: float = 0.05):
+        self.run_single = run_single
+        self.shards = int(shards)
+        self.compounding = compounding
+        self.drift_every = int(drift_every)
+        self.tolerance = float(tolerance)
+        self.disabled = False
+        self.drift: "deque[Dict[str, Any]]" = deque(maxlen=100)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, cfg, exe_path: str, guard_sec: int, auto_close: bool,
+                 base_overrides: Optional[Dict[str, Any]] = None, layout=None):
+        with self._lock:
+            if self.disabled:
+                check = None
+            else:
+                self._count += 1
+                check = self.drift_every > 0 and self._count % self.drift_every == 0
+        if check is None:
+            return self.run_single(cfg, exe_path, guard_sec, auto_close, base_overrides=base_overrides, layout=layout)
+
+        result = self._run_sharded(cfg, exe_path, guard_sec, auto_close, base_overrides, layout)
+        if not check:
+            return result
+        full = self.run_single(cfg, exe_path, guard_sec, auto_close, base_overrides=base_overrides, layout=layout)
+        self._record_drift(cfg, result, full)
+        return full
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            drifts = [d["drift"] for d in self.drift]
+            return {"shards": self.shards, "compounding": self.compounding, "disabled": self.disabled,
+                    "drift_checks": len(drifts), "max_drift": max(drifts) if drifts else None}
+
+    def _record_drift(self, cfg, sharded, full) -> None:
+        if sharded[1] is None or full[1] is None:
+            return
+        rel = abs(float(sharded[1]) - float(full[1])) / max(1e-9, float(cfg.test.deposit))
+        with self._lock:
+            self.drift.append({"run_id": full[2], "sharded": sharded[1], "full": full[1], "drift": round(rel, 4)})
+            if rel > self.tolerance and not self.disabled:
+                self.disabled = True
+                print(f"WARNING Deriva sharding vs rango completo {rel:.2%} > {self.tolerance:.0%}: "
+                      f"sharding desactivado para el resto del study.")
+
+    def _map(self, tasks: List[Callable[[], Any]]) -> List[Any]:
+        """Ejecuta los tramos en paralelo; el optimizador lo sustituye para que ocupen slots del trial"""
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = [pool.submit(t) for t in tasks]
+            return [f.result() for f in futures]
+
+    def _run_sharded(self, cfg, exe_path, guard_sec, auto_close, base_overrides, layout):
+        ranges = split_range(cfg.test.from_, cfg.test.to, self.shards)
+        shard_cfgs = [replace(cfg, test=replace(cfg.test, from_=a, to=b)) for a, b in ranges]
+        tasks = [functools.partial(self.run_single, c, exe_path, guard_sec, auto_close,
+                                   base_overrides=dict(base_overrides or {}), layout=layout) for c in shard_cfgs]
+        results = self._map(tasks)  # propaga TimeoutError/TrialAborted de cualquier shard
+
+        if not all(ok and fb is not None for ok, fb, _rid, _dir in results):
+            raise TimeoutError(f"Shards sin resultado: {[rid for ok, fb, rid, _d in results if not ok or fb is None]}")
+        parts = []
+        for ok, fb, rid, run_dir in results:
+            rep_path = Path(run_dir) / "report.json"
+            try:
+                rep = json.loads(rep_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                rep = {}
+            rep.setdefault("final_balance", fb)
+            rep.setdefault("initial_deposit", cfg.test.deposit)
+            parts.append({"report": rep, "trades": _read_trades(Path(run_dir) / "trades.csv")})
+
+        report, trades = stitch(parts, cfg.test.deposit, self.compounding)
+        first_rid, first_dir = results[0][2], Path(results[0][3])
+        run_id = f"{first_rid}_k{len(results)}"
+        report.update(run_id=run_id, start_date=cfg.test.from_, end_date=cfg.test.to,
+                      shard_run_ids=[r[2] for r in results], shard_ranges=ranges)
+        run_dir = first_dir.parent / run_id
+        write_stitched(run_dir, report, trades)
+        print(f"INFO Trial cosido de {len(results)} shards ({self.compounding}): {run_dir}")
+        return True, report["final_balance"], run_id, run_dir
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Estado en vivo del study para MT5 Smart Optimizer v2
+Acumula el progreso de los trials y lo expone como JSON por HTTP local y/o consola"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+
+class ProgressTracker:
+    """Contadores de progreso thread-safe alimentados por los trials en curso"""
+
+    def __init__(self, n_trials: int = 0, n_slots: int = 1):
+        self.n_trials = int(n_trials or 0)
+        self.n_slots = max(1, int(n_slots))
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.in_flight: Dict[int, Dict[str, Any]] = {}
+        self.slot_busy: Dict[int, float] = {}
+        self.phase_stats: Dict[str, Dict[str, float]] = {}
+        self.timeframe_stats: Dict[str, Dict[str, float]] = {}
+        self.best_value: Optional[float] = None
+        self.best_params: Optional[Dict[str, Any]] = None
+        self.best_trial: Optional[int] = None
+        # Secciones extra del snapshot (p.ej. precisión del modelo de coste), evaluadas al consultar
+        self.providers: Dict[str, Callable[[], Any]] = {}
+
+    # ---------------- Alimentación ----------------
+    def trial_started(self, number: int, slot: int, params: Optional[Dict[str, Any]] = None) -> None:
+        timeframe = (params or {}).get("timeframe")
+        with self._lock:
+            self.in_flight[number] = {
+                "slot": slot,
+                "started": time.time(),
+                "phase": "start",
+                "timeframe": timeframe,
+                "run_id": None,
+            }
+
+    def event(self, name: str, **fields: Any) -> None:
+        """Sink de eventos de fase (misma firma que OptimizerLogger.event)"""
+        if name != "phase":
+            return
+        trial = fields.get("trial")
+        phase = str(fields.get("phase"))
+        with self._lock:
+            info = self.in_flight.get(trial)
+            if info is not None:
+                info["phase"] = phase
+                info["phase_since"] = time.time()
+                if fields.get("run_id"):
+                    info["run_id"] = fields["run_id"]
+                if fields.get("timeframe"):
+                    info["timeframe"] = fields["timeframe"]
+            seconds = fields.get("seconds")
+            if isinstance(seconds, (int, float)):
+                st = self.phase_stats.setdefault(phase, {"n": 0, "total": 0.0, "max": 0.0})
+                st["n"] += 1
+                st["total"] += float(seconds)
+                st["max"] = max(st["max"], float(seconds))
+
+    def trial_finished(self, number: int, slot: int, value: float, phase: str,
+                       params: Optional[Dict[str, Any]] = None, seconds: float = 0.0) -> None:
+        with self._lock:
+            info = self.in_flight.pop(number, {})
+            self.slot_busy[slot] = self.slot_busy.get(slot, 0.0) + float(seconds)
+            if phase == "complete":
+                self.completed += 1
+                if self.best_value is None or value > self.best_value:
+                    self.best_value, self.best_params, self.best_trial = value, dict(params or {}), number
+            else:
+                self.failed += 1
+            timeframe = info.get("timeframe") or (params or {}).get("timeframe")
+            if timeframe:
+                st = self.timeframe_stats.setdefault(str(timeframe), {"n": 0, "total": 0.0})
+                st["n"] += 1
+                st["total"] += float(seconds)
+
+    # ---------------- Consulta ----------------
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        extra = {name: fn() for name, fn in list(self.providers.items())}
+        with self._lock:
+            elapsed = max(1e-9, now - self.started_at)
+            finished = self.completed + self.failed
+            rate_h = finished / elapsed * 3600.0
+            eta = None
+            if self.n_trials and finished:
+                eta = max(0, self.n_trials - finished) / (finished / elapsed)
+
+            slots = {}
+            for slot in range(self.n_slots):
+                busy = self.slot_busy.get(slot, 0.0)
+                running = [i for i in self.in_flight.values() if i["slot"] == slot]
+                busy += sum(now - i["started"] for i in running)
+                slots[str(slot)] = {
+                    "utilisation": round(min(1.0, busy / elapsed), 4),
+                    "busy_seconds": round(busy, 2),
+                    "running": bool(running),
+                }
+
+            phases = {
+                k: {"n": int(v["n"]), "mean_seconds": round(v["total"] / v["n"], 3), "max_seconds": round(v["max"], 3)}
+                for k, v in self.phase_stats.items() if v["n"]
+            }
+            slowest = max(phases, key=lambda k: phases[k]["mean_seconds"]) if phases else None
+
+            return {
+                "elapsed_seconds": round(elapsed, 2),
+                "n_trials": self.n_trials,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": [
+                    {"trial": n, "slot": i["slot"], "phase": i["phase"], "run_id": i["run_id"],
+                     "timeframe": i["timeframe"], "age_seconds": round(now - i["started"], 2)}
+                    for n, i in sorted(self.in_flight.items())
+                ],
+                "trials_per_hour": round(rate_h, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "slots": slots,
+                "phases": phases,
+                "slowest_phase": slowest,
+                "timeframes": {
+                    k: {"n": int(v["n"]), "mean_seconds": round(v["total"] / v["n"], 3)}
+                    for k, v in self.timeframe_stats.items() if v["n"]
+                },
+                "best": {"trial": self.best_trial, "value": self.best_value, "params": self.best_params},
+                **extra,
+            }
+
+    def status_line(self) -> str:
+        s = self.snapshot()
+        eta = s["eta_seconds"]
+        eta_txt = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "?"
+        return (
+            f"STATUS {s['completed'] + s['failed']}/{s['n_trials'] or '?'} "
+            f"ok={s['completed']} fail={s['failed']} en_curso={len(s['in_flight'])} "
+            f"{s['trials_per_hour']} trials/h ETA {eta_txt} "
+            f"best={s['best']['value']} fase_lenta={s['slowest_phase']}"
+        )
+
+
+class StatusServer:
+    """Servidor HTTP local (hilo daemon) que sirve ProgressTracker.snapshot() como JSON"""
+
+    def __init__(self, tracker: ProgressTracker, host: str = "127.0.0.1", port: int = 0):
+        self.tracker = tracker
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):  # noqa: N805
+                if handler.path.split("?", 1)[0] not in ("/", "/status"):
+                    handler.send_error(404)
+                    return
+                body = json.dumps(tracker.snapshot(), default=str).encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):  # noqa: N805
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="StatusServer", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self) -> "StatusServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ConsoleStatus:
+    """Imprime periódicamente una línea de estado en consola"""
+
+    def __init__(self, tracker: ProgressTracker, every: float = 60.0):
+        self.tracker = tracker
+        self.every = every
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="ConsoleStatus", daemon=True)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.every):
+            print(self.tracker.status_line(), flush=True)
+
+    def start(self) -> "ConsoleStatus":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
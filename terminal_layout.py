@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Layout de directorios de un terminal MT5 para MT5 Smart Optimizer v2
+Resuelve una sola vez las rutas por HASH y cachea el directorio del agente del Tester"""
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+@dataclass
+class TerminalLayout:
+    """
+    Rutas de un terminal (por HASH) resueltas una vez y reutilizadas por cada run. Con data_dir
+    (instalación portable, /portable) los datos y los agentes cuelgan de ella y no de appdata;
+    Common/Files sigue en appdata.
+    """
+
+    terminal_hash: str
+    appdata: Path
+    reports_dir: Path
+    ini_dir: Path
+    data_dir: Optional[Path] = None
+
+    _agent_dir: Optional[Path] = field(default=None, init=False, repr=False)
+    _agent_sig: Optional[Tuple[int, bool]] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    # ---------------- Directorios fijos ----------------
+    @property
+    def terminal_data_dir(self) -> Path:
+        if self.data_dir is not None:
+            return self.data_dir
+        return self.appdata / "MetaQuotes" / "Terminal" / self.terminal_hash
+
+    @property
+    def profiles_tester_dir(self) -> Path:
+        return self.terminal_data_dir / "MQL5" / "Profiles" / "Tester"
+
+    @property
+    def experts_root_dir(self) -> Path:
+        return self.terminal_data_dir / "MQL5" / "Experts"
+
+    @property
+    def common_mt5_so_dir(self) -> Path:
+        return self.appdata / "MetaQuotes" / "Terminal" / "Common" / "Files" / "MT5_SO"
+
+    @property
+    def tester_root(self) -> Path:
+        if self.data_dir is not None:
+            return self.data_dir / "Tester"
+        return self.appdata / "MetaQuotes" / "Tester" / self.terminal_hash
+
+    # ---------------- Agente del Tester (cacheado) ----------------
+    def _tester_signature(self) -> Optional[Tuple[int, bool]]:
+        """mtime del directorio de agentes: cambia cuando aparece o desaparece un Agent-*"""
+        try:
+            mtime = self.tester_root.stat().st_mtime_ns
+        except OSError:
+            return None
+        cached_alive = self._agent_dir is not None and self._agent_dir.parents[2].exists()
+        return (mtime, cached_alive)
+
+    def _scan_agent_dir(self) -> Optional[Path]:
+        agents = sorted(self.tester_root.glob("Agent-*-*"))
+        for p in agents:
+            candidate = p / "MQL5" / "Files" / "MT5_SO"
+            if candidate.exists():
+                return candidate
+        if agents:
+            return agents[0] / "MQL5" / "Files" / "MT5_SO"
+        return None
+
+    def local_agent_files_dir(self) -> Optional[Path]:
+        """Directorio MT5_SO del agente local; sólo re-escanea si cambió el árbol de agentes"""
+        with self._lock:
+            sig = self._tester_signature()
+            if sig is None:
+                self._agent_dir, self._agent_sig = None, None
+                return None
+            if sig != self._agent_sig:
+                self._agent_dir = self._scan_agent_dir()
+                self._agent_sig = self._tester_signature()
+            return self._agent_dir
+
+    def invalidate(self) -> None:
+        """Fuerza un nuevo escaneo de agentes en la próxima consulta"""
+        with self._lock:
+            self._agent_dir, self._agent_sig = None, None
+
+    # ---------------- Artefactos por run ----------------
+    def set_name(self, run_id: str) -> str:
+        return f"params_{run_id}.set"
+
+    def set_path(self, run_id: str) -> Path:
+        return self.profiles_tester_dir / self.set_name(run_id)
+
+    def ini_path(self, run_id: str) -> Path:
+        return self.ini_dir / f"{run_id}.ini"
+
+    def report_html(self, run_id: str) -> Path:
+        return self.reports_dir / f"report_{run_id}.html"
+
+    # ---------------- Validación al arranque ----------------
+    def validate(self) -> "TerminalLayout":
+        """Crea los directorios de trabajo y verifica que sean escribibles"""
+        problems = []
+        for d in (self.profiles_tester_dir, self.common_mt5_so_dir, self.reports_dir, self.ini_dir):
+            try:
+                d.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                problems.append(f"{d}: {e}")
+                continue
+            if not os.access(d, os.W_OK):
+                problems.append(f"{d}: sin permisos de escritura")
+        if problems:
+            raise RuntimeError(
+                f"Layout del terminal {self.terminal_hash} inválido:\n" + "\n".join(f"  - {p}" for p in problems)
+            )
+        return self
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Fixtures compartidas por los tests"""
+import os
+
+import pytest
+
+from journal_tail import JournalRules
+from optimizer_v2 import Config, Mt5Cfg, TestCfg, EaCfg, SearchCfg
+
+
+def build_cfg(root=None, space=None, sampler=None, backend=None, options=None, inputs=None,
+              stateless=False, compounding="additive", constraints=None, constraints_mode="prune",
+              from_="2023.01.01", to="2023.12.31", journal=None):
+    """Config mínimo en memoria; con root, las raíces del layout (appdata, reports, ini) cuelgan de él"""
+    mt5 = Mt5Cfg(terminal_path="terminal64.exe", terminal_hash="ABCDEF", backend_options=dict(options or {}))
+    if root:
+        mt5.appdata = os.path.join(root, "appdata")
+        mt5.reports_dir = os.path.join(root, "reports")
+        mt5.ini_dir = os.path.join(root, "ini")
+    if backend:
+        mt5.backend = backend
+    return Config(
+        mt5=mt5,
+        test=TestCfg(symbol="EURUSD", timeframe="H1", model=1, from_=from_,
+                     to=to, deposit=1000, leverage=100),
+        ea=EaCfg(name="Estrategia.ex5", inputs={"lot_size": 0.1} if inputs is None else dict(inputs),
+                 stateless_across_boundaries=stateless, shard_compounding=compounding),
+        search=SearchCfg(space=dict(space or {}), sampler=sampler, constraints=constraints,
+                         constraints_mode=constraints_mode),
+        journal=JournalRules() if journal is True else journal,
+    )
+
+
+@pytest.fixture
+def make_cfg():
+    """Fábrica de Config: make_cfg(root, space=..., sampler=..., backend=...); un módulo puede fijar
+    sus valores por defecto redefiniendo la fixture con functools.partial"""
+    return build_cfg
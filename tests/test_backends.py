@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Tests unitarios para backends.py y mt5_emulator.py"""
+import pytest
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+import backends
+import optimizer_v2 as opt
+from backends import EmulatorBackend, WindowsBackend, WineBackend, make_backend, pid_alive, stop_process_tree
+from optimizer_v2 import Mt5Cfg
+from robustness import load_trades
+from sharding import ShardedRunner
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config con el emulador, EA sin estado y grid sobre un trimestre"""
+    return functools.partial(make_cfg, backend="emulator", sampler="grid", stateless=True, to="2023.03.31")
+
+
+class TestWineBackend:
+    """Tests de rutas y lanzamiento bajo Wine"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def backend(self, **options):
+        mt5 = Mt5Cfg(terminal_path="C:\\MT5\\terminal64.exe", terminal_hash="ABCDEF",
+                     reports_dir=os.path.join(self.temp_dir, "reports"), ini_dir=os.path.join(self.temp_dir, "ini"),
+                     backend="wine", backend_options=dict({"prefix": os.path.join(self.temp_dir, "wine{slot}"),
+                                                           "user": "mt5"}, **options))
+        return make_backend(mt5)
+
+    def test_per_slot_prefix_layout(self):
+        """Test que cada slot tiene su WINEPREFIX y su AppData dentro de drive_c"""
+        b = self.backend()
+        assert isinstance(b, WineBackend) and b.per_slot
+        l0, l3 = b.layout(0), b.layout(3)
+        assert l3.common_mt5_so_dir == (Path(self.temp_dir) / "wine3" / "drive_c" / "users" / "mt5" / "AppData" /
+                                        "Roaming" / "MetaQuotes" / "Terminal" / "Common" / "Files" / "MT5_SO")
+        assert l0.appdata != l3.appdata
+        assert b.env(3)["WINEPREFIX"] == os.path.join(self.temp_dir, "wine3")
+
+    def test_terminal_paths_and_command(self, monkeypatch):
+        """Test que el .ini se pasa con ruta Windows y el proceso hereda el prefix del slot"""
+        b = self.backend(wine="wine64")
+        assert b.terminal_path(Path("/srv/runs/x.ini")) == "Z:\\srv\\runs\\x.ini"
+        inside = b.prefix(1) / "drive_c" / "MT5" / "a.ini"
+        assert b.terminal_path(inside) == "C:\\MT5\\a.ini"
+        seen = {}
+
+        class FakePopen:
+            pid = 77
+
+            def __init__(self, args, env=None, start_new_session=False):
+                seen.update(args=args, env=env)
+        monkeypatch.setattr(backends.subprocess, "Popen", FakePopen)
+        b.launch("C:\\MT5\\terminal64.exe", Path("/srv/runs/x.ini"), slot=2)
+        assert seen["args"][:3] == ["wine64", "C:\\MT5\\terminal64.exe", "/config:Z:\\srv\\runs\\x.ini"]
+        assert seen["env"]["WINEPREFIX"].endswith("wine2")
+
+    def test_check_reports_missing_prefix(self):
+        """Test que preflight recibe el prefix inexistente como error"""
+        findings = self.backend(wine="no-existe-wine").check()
+        assert [lvl for lvl, _ in findings] == ["error", "error"]
+
+    def test_unknown_backend(self):
+        """Test que un backend desconocido falla con la lista de disponibles"""
+        with pytest.raises(RuntimeError, match="Backend desconocido"):
+            make_backend(Mt5Cfg(terminal_path="x", terminal_hash="y", backend="docker"))
+
+
+class TestPortableSlots:
+    """Tests de las instalaciones portables por slot (mt5.slot_root)"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.slots = Path(self.temp_dir) / "slots"
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_command_and_layout_per_slot(self):
+        """Test que cada slot lanza su propio exe con /portable y usa su carpeta como datos"""
+        b = make_backend(Mt5Cfg(terminal_path="C:\\MT5\\terminal64.exe", terminal_hash="ABCDEF",
+                                appdata=os.path.join(self.temp_dir, "appdata"), slot_root=str(self.slots)))
+        assert isinstance(b, WindowsBackend)
+        cmd = b.command("C:\\MT5\\terminal64.exe", Path("/srv/x.ini"), slot=3)
+        assert cmd[0] == str(self.slots / "slot_03" / "terminal64.exe") and cmd[-1] == "/portable"
+        assert b.layout(3).profiles_tester_dir == self.slots / "slot_03" / "MQL5" / "Profiles" / "Tester"
+        assert b.layout(0).common_mt5_so_dir == b.layout(3).common_mt5_so_dir
+        plain = make_backend(Mt5Cfg(terminal_path="terminal64.exe", terminal_hash="ABCDEF"))
+        assert "/portable" not in plain.command("terminal64.exe", Path("x.ini"), slot=3)
+
+    def test_grid_uses_each_slot_install(self, make_cfg):
+        """Test que un grid con dos slots deja los presets en la instalación de cada slot"""
+        cfg = make_cfg(self.temp_dir, options={"delay": 0.2}, space={"bb_period": ["choice", [10, 20, 30, 40]]})
+        cfg.mt5.slot_root = str(self.slots)
+        summary = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=os.path.join(self.temp_dir, "logs"))
+        assert summary["phases"] == {"complete": 4}
+        used = {p.parents[3].name for p in self.slots.glob("slot_*/MQL5/Profiles/Tester/params_*.set")}
+        assert used == {"slot_00", "slot_01"}
+        assert len(list(opt.get_layout(cfg).common_mt5_so_dir.glob("*/report.json"))) == 4
+
+
+class TestProcesses:
+    """Tests de vivo/cierre por PID"""
+
+    @pytest.mark.skipif(os.name == "nt", reason="árbol de procesos POSIX")
+    def test_stop_process_tree(self):
+        """Test que se cierra el proceso y también sus hijos"""
+        code = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); time.sleep(60)"
+        proc = subprocess.Popen([sys.executable, "-c", code], start_new_session=True)
+        try:
+            assert pid_alive(proc.pid)
+            assert stop_process_tree(proc.pid, timeout=5)
+            proc.wait(timeout=5)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+        assert not pid_alive(-1)
+
+
+class TestEmulatorOrchestration:
+    """Orquestación completa (run_single, grid, sharding) contra el emulador en Linux"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_single_run_writes_artifacts(self, make_cfg):
+        """Test que un run del emulador deja report.json, trades.csv, HTML y meta.json"""
+        cfg = make_cfg(self.temp_dir)
+        assert isinstance(opt.backend_for(cfg), EmulatorBackend)
+        ok, fb, rid, run_dir = opt.run_single(cfg, "terminal64.exe", 30, True, base_overrides={"bb_period": 20})
+        assert ok and fb is not None
+        report = json.loads((run_dir / "report.json").read_text(encoding="utf-8"))
+        assert report["run_id"] == rid and report["inputs"]["bb_period"] == "20"
+        assert report["final_balance"] == fb
+        assert (run_dir / "trades.csv").exists() and (run_dir / "meta.json").exists()
+        assert opt.get_layout(cfg).report_html(rid).exists()
+        # Deals de entrada/salida como so_report.mqh: una posición por trade del informe
+        pnl = load_trades(run_dir / "trades.csv")
+        assert len(pnl) == report["total_trades"] and round(pnl.sum(), 2) == report["total_net_profit"]
+
+    def test_grid_end_to_end(self, make_cfg):
+        """Test que el grid acotado corre con varios slots y el mejor es reproducible"""
+        cfg = make_cfg(self.temp_dir, options={"delay": 0.05}, space={"bb_period": ["choice", [10, 20, 30, 40]]})
+        logs = os.path.join(self.temp_dir, "logs")
+        first = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=logs)
+        again = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=logs)
+        assert first["phases"] == {"complete": 4}
+        assert first["best_params"] == again["best_params"] and first["best_value"] == again["best_value"]
+
+    def test_sharded_matches_full_range(self, make_cfg):
+        """Test que con un EA sin estado el resultado cosido coincide con el rango completo"""
+        cfg = make_cfg(self.temp_dir)
+        full = opt.run_single(cfg, "terminal64.exe", 30, True, base_overrides={"bb_period": 25})
+        sharded = ShardedRunner(opt.run_single, 3, drift_every=0)(cfg, "terminal64.exe", 30, True,
+                                                                   base_overrides={"bb_period": 25})
+        assert sharded[1] == pytest.approx(full[1], abs=0.05)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Tests unitarios para batch_eval.py"""
+import pytest
+import json
+import os
+import tempfile
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import optimizer_v2 as opt
+from batch_eval import apply_overrides, evaluate_many, load_candidates, read_metrics
+
+
+class TestEvaluateMany:
+    """Tests de la evaluación por lotes sobre un run_single simulado"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.logs = os.path.join(self.temp_dir, "logs")
+        self.calls = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def fake_run_single(self, monkeypatch):
+        """Beneficio = 10·k; duerme `delay` s; k < 0 agota el guard"""
+        def run(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            params = dict(base_overrides or {})
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                rid = f"run_{len(self.calls)}"
+                self.calls.append((cfg.test.from_, cfg.test.to, params))
+            try:
+                time.sleep(params.get("delay", 0.01))
+                if params["k"] < 0:
+                    raise TimeoutError("sin _READY")
+                run_dir = Path(self.temp_dir) / "MT5_SO" / rid
+                run_dir.mkdir(parents=True)
+                fb = cfg.test.deposit + 10 * params["k"]
+                report = {"final_balance": fb, "profit_factor": 1.5, "max_dd_rel_pct": 3.2, "total_trades": 7,
+                          "inputs": params, "account_info": {"leverage": 100}}
+                (run_dir / "report.json").write_text(json.dumps(report), encoding="utf-8")
+                return True, fb, rid, run_dir
+            finally:
+                with self.lock:
+                    self.active -= 1
+        monkeypatch.setattr(opt, "run_single", run)
+
+    def test_streams_results_as_they_finish(self, make_cfg, monkeypatch):
+        """Test que los resultados salen en orden de finalización con métricas del report"""
+        self.fake_run_single(monkeypatch)
+        cands = [{"k": 1, "delay": 0.3}, {"k": 2}, {"k": 3}]
+        results = list(evaluate_many(make_cfg(self.temp_dir), cands, n_jobs=3, log_dir=self.logs))
+        assert [r.index for r in results][-1] == 0
+        first = min(results, key=lambda r: r.index)
+        assert first.ok and first.value == 10.0
+        assert first.metrics["profit_factor"] == 1.5 and "inputs" not in first.metrics
+
+    def test_concurrency_limit_and_overrides(self, make_cfg, monkeypatch):
+        """Test que nunca hay más de n_jobs runs a la vez y los overrides llegan al run"""
+        self.fake_run_single(monkeypatch)
+        cands = [{"k": i, "lot_size": 0.2} for i in range(8)]
+        overrides = {"from": "2024.01.01", "to": "2024.06.30", "lot_size": 0.05}
+        results = list(evaluate_many(make_cfg(self.temp_dir), cands, overrides=overrides, n_jobs=2, log_dir=self.logs))
+        assert len(results) == 8 and self.peak <= 2
+        assert {c[:2] for c in self.calls} == {("2024.01.01", "2024.06.30")}
+        assert all(c[2]["lot_size"] == 0.05 for c in self.calls)
+
+    def test_failures_do_not_stop_batch(self, make_cfg, monkeypatch):
+        """Test que un candidato con timeout queda registrado y el lote sigue"""
+        self.fake_run_single(monkeypatch)
+        results = {r.index: r for r in evaluate_many(make_cfg(self.temp_dir), [{"k": -1}, {"k": 4}], log_dir=self.logs)}
+        assert results[0].phase == "timeout" and "sin _READY" in results[0].error
+        assert results[1].value == 40.0
+
+    def test_stop_iterating_launches_no_more(self, make_cfg, monkeypatch):
+        """Test que al cerrar el iterador no se lanzan más candidatos"""
+        self.fake_run_single(monkeypatch)
+        it = evaluate_many(make_cfg(self.temp_dir), ({"k": i} for i in range(10)), n_jobs=1, log_dir=self.logs)
+        next(it)
+        it.close()
+        assert len(self.calls) <= 2
+
+
+class TestCandidatesAndOverrides:
+    """Tests de carga de candidatos y reparto de overrides"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_overrides_split_test_and_inputs(self, make_cfg):
+        """Test que las claves de test van al config y el resto son inputs comunes"""
+        cfg, common = apply_overrides(make_cfg(str(self.temp_dir)), {"from": "2024.01.01", "deposit": "5000", "bb": 20})
+        assert cfg.test.from_ == "2024.01.01" and cfg.test.deposit == 5000
+        assert common == {"bb": 20}
+
+    def test_load_csv_with_top(self):
+        """Test que el CSV (columnas params_ de Optuna) se ordena por value para --top"""
+        path = self.temp_dir / "top.csv"
+        path.write_text("number,value,params_k,params_tf\n0,5.5,1,H1\n1,9.0,2,H4\n2,,3,H6\n", encoding="utf-8")
+        assert load_candidates(str(path), top=2) == [{"k": 2, "tf": "H4"}, {"k": 1, "tf": "H1"}]
+        assert len(load_candidates(str(path))) == 3
+
+    def test_load_results_json(self):
+        """Test que results.json del optimizador sirve como fuente de candidatos"""
+        path = self.temp_dir / "results.json"
+        path.write_text(json.dumps({"trials": [{"params": {"k": 1}, "value": 1.0},
+                                               {"params": {"k": 2}, "value": 3.0}]}), encoding="utf-8")
+        assert load_candidates(str(path), top=1) == [{"k": 2}]
+        with pytest.raises(RuntimeError):
+            load_candidates(str(self.temp_dir / "nada.json"))
+
+    def test_read_metrics_missing(self):
+        """Test que sin report.json no hay métricas"""
+        assert read_metrics(self.temp_dir) == {}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Tests unitarios para constraints.py"""
+import pytest
+import functools
+import json
+import os
+import tempfile
+import shutil
+from pathlib import Path
+
+import constraints
+import optimizer_v2 as opt
+from constraints import Constraint, ConstraintSet
+from grid_shards import merge
+
+SPACE = {"sto_period_k": ["int", 5, 9], "sto_period_d": ["int", 3, 9]}
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config con restricciones en search.constraints sobre un trimestre"""
+    return functools.partial(make_cfg, space=SPACE, sampler="tpe", constraints=["sto_period_d <= sto_period_k"],
+                             to="2023.03.31")
+
+
+class TestExpressions:
+    """Tests del compilado y la evaluación"""
+
+    def test_only_safe_expressions(self):
+        """Test que llamadas, atributos y subíndices se rechazan al compilar"""
+        for expr in ("__import__('os').system('x')", "a.real > 0", "a[0] > 1", "open('f')", "lambda: 1", "a >"):
+            with pytest.raises(RuntimeError):
+                Constraint("c", expr)
+        c = Constraint("c", "abs(a - b) <= max(2, c) and tf in ('H1', 'H4')")
+        assert c.names == {"a", "b", "c", "tf"}
+        assert c.holds({"a": 5, "b": 4, "c": 0, "tf": "H1"})
+        assert not c.holds({"a": 5, "b": 1, "c": 0, "tf": "H1"})
+
+    def test_margins_measure_the_violation(self):
+        """Test que una comparación simple devuelve cuánto falta y el resto 1.0"""
+        cs = ConstraintSet.build({"dk": "d <= k", "tf": "timeframe != 'M1'"}, ["d", "k"], {"timeframe": "H1"})
+        assert cs.margins({"d": 3, "k": 5}) == [0.0, 0.0]
+        assert cs.margins({"d": 8, "k": 5}) == [3.0, 0.0]
+        assert cs.margins({"d": 3, "k": 5, "timeframe": "M1"}) == [0.0, 1.0]
+        assert cs.checked == 0
+
+    def test_unknown_names_and_bad_mode(self):
+        """Test que un nombre que no está en el espacio ni en los inputs falla al construir"""
+        with pytest.raises(RuntimeError, match="desconocidos"):
+            ConstraintSet.build(["sto_perod_d <= k"], ["k"])
+        with pytest.raises(RuntimeError, match="constraints_mode"):
+            ConstraintSet.build(["k > 1"], ["k"], mode="retry")
+        assert ConstraintSet.build([], ["k"]) is None
+
+    def test_eval_error_counts_as_violation(self, capsys):
+        """Test que un error al evaluar rechaza el punto y avisa una vez"""
+        cs = ConstraintSet.build(["1 / k > 0.1"], ["k"])
+        assert cs.violations({"k": 0}) == ["1 / k > 0.1"]
+        assert cs.violations({"k": 0}) == ["1 / k > 0.1"]
+        assert capsys.readouterr().out.count("WARNING") == 1
+        assert cs.report()["rejected"] == 2 and "ZeroDivisionError" in cs.report()["errors"]["1 / k > 0.1"]
+
+
+class TestStudy:
+    """Tests del rechazo antes de lanzar en Optuna y en el grid"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.launched = []
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def fake_run_single(self, cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+        self.launched.append(dict(base_overrides))
+        return True, 1000.0 + base_overrides["sto_period_k"], "rid", None
+
+    def test_prune_mode_never_launches_violations(self, make_cfg, monkeypatch):
+        """Test que los puntos que incumplen quedan pruned sin lanzar y el TPE los ve como no factibles"""
+        optuna = pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self.fake_run_single)
+        log_dir = os.path.join(self.temp_dir, "logs")
+        study = opt.run_optuna(make_cfg(self.temp_dir), "exe", 10, n_trials=20, n_jobs=1, auto_close=False, log_dir=log_dir)
+
+        assert all(p["sto_period_d"] <= p["sto_period_k"] for p in self.launched)
+        pruned = [t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED]
+        assert len(study.trials) == 20 and len(self.launched) == 20 - len(pruned) and pruned
+        assert all(t.system_attrs["constraints"][0] > 0 for t in pruned)
+        report = study.user_attrs["constraints"]
+        assert report["rejected"] == report["saved_launches"] == len(pruned)
+        with open(os.path.join(log_dir, "results.json"), encoding="utf-8") as f:
+            assert json.load(f)["constraints"]["checked"] == 20
+
+    def test_resample_mode_counts_launches(self, make_cfg, monkeypatch):
+        """Test que con resample n_trials cuenta lanzamientos y los rechazos no consumen cupo"""
+        optuna = pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self.fake_run_single)
+        cfg = make_cfg(self.temp_dir, sampler="random", constraints_mode="resample")
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=6, n_jobs=1, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "logs"))
+        assert len(self.launched) == 6
+        complete = study.get_trials(states=(optuna.trial.TrialState.COMPLETE,))
+        assert len(complete) == 6 and study.user_attrs["constraints"]["rejected"] > 0
+
+    def test_resample_stops_when_unsatisfiable(self, make_cfg, monkeypatch):
+        """Test que unas restricciones imposibles paran el study en vez de girar para siempre"""
+        pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self.fake_run_single)
+        monkeypatch.setattr(constraints, "MAX_CONSECUTIVE_REJECTIONS", 5)
+        cfg = make_cfg(self.temp_dir, sampler="random", constraints_mode="resample", constraints=["sto_period_k > 100"])
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=3, n_jobs=1, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "logs"))
+        assert self.launched == [] and len(study.trials) == 5
+
+    def test_warm_start_carries_feasibility(self, make_cfg):
+        """Test que los trials inyectados por warm start llevan sus valores de restricción"""
+        optuna = pytest.importorskip("optuna")
+        from warm_start import apply_warm_start
+        prior = Path(self.temp_dir) / "results.json"
+        prior.write_text(json.dumps({"trials": [
+            {"params": {"sto_period_k": 5, "sto_period_d": 7}, "value": 10.0, "state": "COMPLETE"},
+            {"params": {"sto_period_k": 8, "sto_period_d": 4}, "value": 12.0, "state": "COMPLETE"},
+        ]}), encoding="utf-8")
+        cfg = make_cfg(self.temp_dir)
+        study = optuna.create_study(direction="maximize")
+        ws = apply_warm_start(study, cfg, [str(prior)], constraints=opt.constraints_for(cfg))
+        assert ws["infeasible"] == 1
+        assert sorted(t.system_attrs["constraints"][0] for t in study.trials) == [0.0, 2.0]
+
+    def test_grid_skips_and_shards_close_rejected_points(self, make_cfg):
+        """Test que el grid acotado no lanza los puntos rechazados y el merge no los da por pendientes"""
+        grid = {"sto_period_k": [5, 7], "sto_period_d": [3, 6, 9]}
+        cfg = make_cfg(self.temp_dir, space={}, sampler={"type": "grid", "search_space": grid}, backend="emulator")
+        shared = Path(self.temp_dir) / "shared"
+        for i in (1, 2):
+            summary = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 1, True,
+                                           log_dir=os.path.join(self.temp_dir, f"logs{i}"),
+                                           grid_shard=(i, 2), shard_dir=str(shared))
+        merged = merge(shared)["shards"]
+        assert merged["complete"] == 3 and merged["pending"] == 0 and merged["phases"]["rejected"] == 3
+        assert summary["constraints"]["rejected"] + summary["phases"]["complete"] == 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Tests unitarios para early_abort.py"""
+import pytest
+import json
+import tempfile
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import optimizer_v2 as opt
+from early_abort import AbortMonitor, AbortRules, ProgressTail, TrialAborted, make_abort_check
+
+
+def stub_writer(path, points, interval=0.02, stop=None):
+    """Simula a so_report.mqh anexando líneas de progreso (con escrituras partidas)"""
+    def run():
+        for p in points:
+            if stop is not None and stop.is_set():
+                return
+            line = json.dumps(p) + "\n"
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line[:5])
+                f.flush()
+                f.write(line[5:])
+            time.sleep(interval)
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+
+class TestProgressTail:
+    """Tests para el lector incremental de progress.jsonl"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.path = self.temp_dir / "progress.jsonl"
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_missing_file_is_empty(self):
+        """Test que un archivo aún inexistente no es un error"""
+        assert ProgressTail(self.path).poll() == []
+
+    def test_reads_only_new_complete_lines(self):
+        """Test que cada poll devuelve sólo líneas completas nuevas"""
+        tail = ProgressTail(self.path)
+        self.path.write_text('{"equity": 1000}\n{"equity": 9', encoding="utf-8")
+        assert tail.poll() == [{"equity": 1000}]
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('90}\nbasura\n')
+        assert tail.poll() == [{"equity": 990}]
+        assert tail.poll() == []
+
+
+class TestAbortMonitor:
+    """Tests para las reglas de aborto"""
+
+    def make(self, **rules):
+        return AbortMonitor(AbortRules(**rules), 1000, "2023.01.01", "2023.12.31")
+
+    def test_drawdown_from_peak(self):
+        """Test que el drawdown se mide desde el pico de equity"""
+        m = self.make(max_dd_pct=20)
+        assert m.update([{"equity": 1500, "trades": 3}, {"equity": 1250, "trades": 4}]) is None
+        reason = m.update([{"equity": 1190, "trades": 5, "time": "2023.03.01 00:00"}])
+        assert reason.startswith("drawdown")
+        assert m.partial_metrics()["max_dd_pct"] == pytest.approx(20.67, abs=0.01)
+
+    def test_equity_floor(self):
+        """Test del piso absoluto de equity"""
+        m = self.make(equity_floor=600)
+        assert m.update([{"equity": 601}]) is None
+        assert "piso" in m.update([{"equity": 600}])
+
+    def test_zero_trades_after_fraction_of_range(self):
+        """Test que 0 trades sólo aborta tras el porcentaje configurado del rango"""
+        m = self.make(zero_trades_after_pct=30)
+        assert m.update([{"equity": 1000, "trades": 0, "time": "2023.03.01 00:00"}]) is None
+        assert "0 trades" in m.update([{"equity": 1000, "trades": 0, "time": "2023.05.01 00:00"}])
+        m2 = self.make(zero_trades_after_pct=30)
+        assert m2.update([{"equity": 1000, "trades": 2, "time": "2023.06.01 00:00"}]) is None
+
+    def test_rules_from_dict(self):
+        """Test del parseo del bloque abort del config"""
+        assert AbortRules.from_dict(None) is None
+        rules = AbortRules.from_dict({"max_dd_pct": "35", "progress_every_sec": 2})
+        assert rules.max_dd_pct == 35.0 and rules.equity_floor is None
+        assert rules.enabled
+        assert not AbortRules().enabled
+
+
+class TestAbortInWaitLoop:
+    """Tests del aborto en vuelo contra un escritor simulado"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.run = self.temp_dir / "run_x"
+        self.run.mkdir()
+        (self.run / "origin.txt").write_text("run_x")
+        self.stop = threading.Event()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        self.stop.set()
+        shutil.rmtree(self.temp_dir)
+
+    def test_wait_raises_when_rule_fires(self):
+        """Test que wait_ready_and_report corta el run en cuanto la regla se dispara"""
+        points = [{"equity": 1000 - 50 * i, "balance": 1000, "trades": i,
+                   "time": f"2023.{1 + i:02d}.01 00:00"} for i in range(10)]
+        stub_writer(self.run / "progress.jsonl", points, stop=self.stop)
+        check = make_abort_check(AbortRules(max_dd_pct=25), self.run / "progress.jsonl",
+                                 1000, "2023.01.01", "2023.12.31")
+        t0 = time.time()
+        with pytest.raises(TrialAborted) as exc:
+            opt.wait_ready_and_report(self.run, None, 30, self.temp_dir / "r.html", abort_check=check)
+        assert time.time() - t0 < 5
+        assert exc.value.metrics["equity"] == 750
+        assert exc.value.metrics["trades"] == 5
+
+    def test_no_rules_no_check(self):
+        """Test que sin reglas activas no se instala ningún chequeo"""
+        assert make_abort_check(None, self.run / "progress.jsonl", 1000, "", "") is None
+        assert make_abort_check(AbortRules(), self.run / "progress.jsonl", 1000, "", "") is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Tests unitarios para error_handler.py"""
+import pytest
+from error_handler import ErrorHandler, error_fingerprint
+
+
+def _raise(exc):
+    try:
+        raise exc
+    except Exception as e:
+        return e
+
+
+class TestErrorHandler:
+    """Tests para la clase ErrorHandler"""
+
+    def test_history_is_bounded(self):
+        """Test que error_history es un buffer circular"""
+        handler = ErrorHandler(max_history=10)
+        for i in range(100):
+            try:
+                raise TimeoutError(f"run {i}")
+            except TimeoutError as e:
+                handler.handle(e)
+        assert handler.error_count == 100
+        assert len(handler.error_history) == 10
+        assert handler.error_history[-1]['message'] == "run 99"
+
+    def test_errors_aggregated_by_fingerprint(self):
+        """Test que errores equivalentes se agrupan en una sola huella"""
+        handler = ErrorHandler()
+        for i in range(50):
+            try:
+                raise TimeoutError(f"Timeout esperando _READY en run_{i}")
+            except TimeoutError as e:
+                handler.handle(e)
+        try:
+            raise ValueError("otro")
+        except ValueError as e:
+            handler.handle(e)
+
+        summary = handler.get_error_summary()
+        assert summary['total_errors'] == 51
+        assert sorted(summary['error_types']) == ['TimeoutError', 'ValueError']
+        assert summary['error_groups'][0]['count'] == 50
+        assert len(summary['recent_errors']) == 5
+
+    def test_groups_are_capped(self):
+        """Test que el número de huellas distintas está acotado"""
+        handler = ErrorHandler(max_groups=3)
+        for name in ("a", "b", "c", "d", "e"):
+            try:
+                raise KeyError(name)
+            except KeyError as e:
+                handler.handle(e)
+        assert len(handler.error_groups) == 4
+        assert handler.error_groups["__other__"]['count'] == 2
+
+    def test_fingerprint_ignores_numbers(self):
+        """Test que la huella normaliza números y direcciones"""
+        a = _raise(TimeoutError("run 1 at 0x7f00"))
+        b = _raise(TimeoutError("run 22 at 0x7fff"))
+        assert error_fingerprint(a) == error_fingerprint(b)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Tests unitarios para grid_shards.py"""
+import pytest
+import functools
+import json
+import os
+import tempfile
+import shutil
+from pathlib import Path
+
+import grid_shards
+import optimizer_v2 as opt
+from grid_shards import ShardLog, enumerate_grid, merge, parse_shard, shard_points
+
+GRID = {"bb_period": [10, 20, 30], "lot_size": [0.1, 0.2]}
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config con el emulador y un grid explícito en search.sampler.search_space"""
+    return functools.partial(make_cfg, backend="emulator", sampler={"type": "grid", "search_space": GRID}, inputs={}, to="2023.03.31")
+
+
+class TestEnumeration:
+    """Tests del orden estable y del reparto"""
+
+    def test_order_ignores_key_order_and_dedupes(self):
+        """Test que el orden no depende del orden de claves y que los puntos iguales tras cuantizar cuentan una vez"""
+        a = list(enumerate_grid({"b": [1, 2], "a": ["x", "y"]}))
+        b = list(enumerate_grid({"a": ["x", "y"], "b": [1, 2]}))
+        assert a == b and [i for i, _ in a] == [0, 1, 2, 3]
+        pts = list(enumerate_grid({"lot_size": [0.101, 0.1, 0.2]}, quantize=opt._quantize_params_for_broker))
+        assert pts == [(0, {"lot_size": 0.1}), (1, {"lot_size": 0.2})]
+        assert len(list(enumerate_grid(GRID, limit=4))) == 4
+
+    def test_shards_partition_the_grid(self):
+        """Test que los shards son disjuntos, cubren el grid y quedan equilibrados"""
+        seen = []
+        for i in range(1, 5):
+            part = [idx for idx, _ in shard_points(enumerate_grid({"x": list(range(10))}), i, 4)]
+            assert len(part) in (2, 3)
+            seen.extend(part)
+        assert sorted(seen) == list(range(10))
+
+    def test_parse_shard(self):
+        """Test que --grid-shard acepta i/N con 1 <= i <= N"""
+        assert parse_shard("2/4") == (2, 4)
+        for bad in ("0/4", "5/4", "2", "a/b"):
+            with pytest.raises(RuntimeError):
+                parse_shard(bad)
+
+
+class TestShardedGrid:
+    """Grid repartido contra el emulador, con una carpeta compartida"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.shared = Path(self.temp_dir) / "shared"
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def run_shard(self, cfg, i, n, host):
+        logs = os.path.join(self.temp_dir, f"logs_{host}")
+        return opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=logs,
+                                    grid_shard=(i, n), shard_dir=str(self.shared))
+
+    def test_shards_merge_to_full_grid(self, make_cfg):
+        """Test que tres shards unidos dan el mismo mejor que el grid completo, y relanzar retoma"""
+        cfg = make_cfg(self.temp_dir)
+        full = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=os.path.join(self.temp_dir, "full"))
+        for i in (1, 2, 3):
+            summary = self.run_shard(cfg, i, 3, f"h{i}")
+            assert summary["grid_shard"]["recorded"] == 2
+        merged = merge(self.shared)
+        s = merged["shards"]
+        assert s["complete"] == 6 and s["pending"] == 0 and s["missing"] == [] and s["total"] == 6
+        values = [t["value"] for t in merged["trials"]]
+        assert values == sorted(values, reverse=True)
+        assert merged["trials"][0]["value"] == full["best_value"]
+        assert merged["trials"][0]["params"] == full["best_params"]
+        assert {t["number"] for t in merged["trials"]} == set(range(6))
+
+        again = self.run_shard(cfg, 2, 3, "h2")
+        assert again["phases"] == {} and again["grid_shard"]["recorded"] == 0
+
+    def test_missing_shard_and_foreign_grid(self, make_cfg):
+        """Test que el merge avisa de los shards ausentes y rechaza mezclar grids distintos"""
+        cfg = make_cfg(self.temp_dir)
+        self.run_shard(cfg, 1, 2, "h1")
+        s = merge(self.shared)["shards"]
+        assert s["missing"] == [2] and s["pending"] == 3
+        assert grid_shards.main(["merge", str(self.shared)]) == 1
+        assert (self.shared / "merged_results.json").exists()
+
+        other = make_cfg(self.temp_dir, sampler={"type": "grid", "search_space": {"bb_period": [50, 60]}})
+        with pytest.raises(RuntimeError, match="otro grid"):
+            self.run_shard(other, 1, 2, "h1")
+        ShardLog(self.shared, 2, 2, "otrahuella", 2).start(1, 0)
+        with pytest.raises(RuntimeError, match="no son del mismo grid"):
+            merge(self.shared)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
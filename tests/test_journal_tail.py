@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Tests unitarios para journal_tail.py"""
+import pytest
+import codecs
+import functools
+import json
+import os
+import tempfile
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import journal_tail
+import optimizer_v2 as opt
+from journal_tail import (JournalFatal, JournalRules, JournalTail, make_journal_check, scan,
+                          DEFAULT_PATTERNS)
+from terminal_layout import TerminalLayout
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "journal"
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config con el emulador y la tabla de patrones de serie; options={"fatal": línea} lo cuelga"""
+    return functools.partial(make_cfg, backend="emulator", space={"bb_period": ["choice", [10, 20]]},
+                             sampler="grid", inputs={}, to="2023.03.31", journal=True)
+
+
+def append_utf16(path, text, bom=False):
+    """Anexa texto como lo escribe MT5 (UTF-16LE, BOM sólo al crear el fichero)"""
+    with open(path, "ab") as f:
+        if bom:
+            f.write(codecs.BOM_UTF16_LE)
+        f.write(text.encode("utf-16-le"))
+
+
+class TestJournalRules:
+    """Tests de la tabla de patrones contra journals reales de fixture"""
+
+    def test_fixture_classes(self):
+        """Test que cada fixture da su clase de error y el run limpio ninguna"""
+        hits = {Path(src).name: kind for src, kind, _line in scan([FIXTURES], JournalRules())}
+        assert hits == {"20231016_expert.log": "expert_not_found",
+                        "20231017_history.log": "no_history",
+                        "20231018_oninit.log": "init_failed"}
+
+    def test_config_overrides(self):
+        """Test que patterns se fusiona con la tabla de serie, null desactiva y _help se ignora"""
+        rules = JournalRules.from_dict({"patterns": {"init_failed": None, "broker": "trade server .* rejected",
+                                                     "_broker_help": "x"},
+                                        "ignore": ["Estrategia \\("]})
+        kinds = [k for k, _ in rules.patterns]
+        assert "init_failed" not in kinds and "broker" in kinds and "_broker_help" not in kinds
+        assert rules.match("Tester\ttester stopped because OnInit returns non-zero code 1") is None
+        assert rules.match("Network\ttrade server 1.2.3.4 rejected login") == "broker"
+        assert rules.match("Estrategia (EURUSD,H1)\tunknown symbol en un Print del EA") is None
+        assert JournalRules.from_dict(None).patterns == DEFAULT_PATTERNS
+
+    def test_invalid_regex(self):
+        """Test que un patrón mal escrito falla al cargar el config"""
+        with pytest.raises(RuntimeError, match="Patrón de journal inválido"):
+            JournalRules.from_dict({"patterns": {"x": "([sin cerrar"}})
+
+
+class TestJournalTail:
+    """Tests de la lectura incremental con rotación diaria"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.logs = Path(self.temp_dir) / "logs"
+        self.logs.mkdir()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_only_new_lines_and_split_characters(self):
+        """Test que lo previo al arranque no cuenta y un carácter partido entre lecturas llega entero"""
+        today = self.logs / "20231016.log"
+        shutil.copy(FIXTURES / "20231016_expert.log", today)
+        tail = JournalTail(lambda: [self.logs]).start()
+        assert tail.poll() == []
+
+        data = "CS\t0\t11:00:00.000\tEstrategia (EURUSD,H1)\tPeríodo ×2\r\n".encode("utf-16-le")
+        cut = data.index("í".encode("utf-16-le")) + 1  # a mitad de la unidad UTF-16
+        with open(today, "ab") as f:
+            f.write(data[:cut])
+        assert tail.poll() == []
+        with open(today, "ab") as f:
+            f.write(data[cut:])
+        assert [line for _src, line in tail.poll()] == ["CS\t0\t11:00:00.000\tEstrategia (EURUSD,H1)\tPeríodo ×2"]
+
+    def test_daily_rotation(self):
+        """Test que el fichero del día siguiente se lee desde el principio sin el BOM"""
+        append_utf16(self.logs / "20231016.log", "CS\t0\t23:59:59.000\tTester\tantes\r\n", bom=True)
+        tail = JournalTail(lambda: [self.logs]).start()
+        append_utf16(self.logs / "20231016.log", "CS\t0\t23:59:59.900\tTester\tcierre del día\r\n")
+        append_utf16(self.logs / "20231017.log", "CS\t0\t00:00:00.100\tTester\tdía nuevo\r\n", bom=True)
+        lines = tail.poll()
+        assert [(Path(src).name, line.split("\t")[-1]) for src, line in lines] == [
+            ("20231016.log", "cierre del día"), ("20231017.log", "día nuevo")]
+
+    def test_scan_reads_past_the_read_chunk(self):
+        """Test que scan recorre un journal de varios MB entero y ve la línea fatal del final"""
+        big = self.logs / "20231018.log"
+        filler = "CS\t0\t10:00:00.000\tTester\tEURUSD,H1: ticks generados sin incidencias\r\n"
+        append_utf16(big, filler * 30000, bom=True)
+        append_utf16(big, "CS\t2\t10:00:01.000\tTester\ttester stopped because OnInit returns non-zero code 1")
+        assert big.stat().st_size > 3 << 20
+        hits = scan([self.logs], JournalRules())
+        assert [(Path(src).name, kind) for src, kind, _line in hits] == [("20231018.log", "init_failed")]
+
+
+class TestJournalCheck:
+    """Tests del chequeo en el bucle de espera y de la integración con run_single"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_agent_log_raises_with_context(self):
+        """Test que un fatal en el log de un agente corta con su clase y las líneas previas"""
+        layout = TerminalLayout("ABCDEF", Path(self.temp_dir), Path(self.temp_dir) / "r", Path(self.temp_dir) / "i")
+        agent_logs = layout.tester_root / "Agent-127.0.0.1-3000" / "logs"
+        agent_logs.mkdir(parents=True)
+        check = make_journal_check(JournalRules(context_lines=2), layout)
+        check()
+        append_utf16(agent_logs / "20231017.log", "".join(
+            f"CS\t0\t10:00:0{i}.000\tTester\tlínea {i}\r\n" for i in range(3)) +
+            "CS\t2\t10:00:05.000\tTester\tno history data for EURUSD,H1\r\n", bom=True)
+        with pytest.raises(JournalFatal) as err:
+            check()
+        assert err.value.kind == "no_history" and err.value.reason == "journal:no_history"
+        assert err.value.lines == ["CS\t0\t10:00:02.000\tTester\tlínea 2",
+                                   "CS\t2\t10:00:05.000\tTester\tno history data for EURUSD,H1"]
+        assert make_journal_check(JournalRules(enabled=False), layout) is None
+
+    def test_run_single_fails_fast(self, make_cfg):
+        """Test que el emulador colgado con un fatal en el journal se corta sin esperar al guard"""
+        cfg = make_cfg(self.temp_dir, options={"fatal": "expert file Experts\\Estrategia.ex5 not found"})
+        t0 = time.time()
+        with pytest.raises(JournalFatal) as err:
+            opt.run_single(cfg, "terminal64.exe", 120, True, base_overrides={"bb_period": 20})
+        assert time.time() - t0 < 30
+        assert err.value.kind == "expert_not_found"
+        run_dir = next(opt.get_layout(cfg).common_mt5_so_dir.iterdir())
+        meta = json.loads((run_dir / "meta.json").read_text(encoding="utf-8"))
+        assert meta["aborted"] == "journal:expert_not_found"
+        assert meta["partial"]["journal"][-1].endswith("Estrategia.ex5 not found")
+
+    def test_shared_data_dir_attributes_fatal_to_its_run(self, make_cfg):
+        """Test que dos trials en vuelo sobre la misma carpeta de datos sólo cortan el run nombrado
+        en la línea fatal; el otro termina normalmente"""
+        slow = make_cfg(self.temp_dir, options={"delay": 4})
+        broken = make_cfg(self.temp_dir, options={"fatal": "cannot open file {set}"})
+        done = {}
+
+        def run_slow():
+            with opt.trial_context(opt.TrialContext(trial=0, slot=0)):
+                done["slow"] = opt.run_single(slow, "terminal64.exe", 60, True, base_overrides={"bb_period": 10})
+
+        worker = threading.Thread(target=run_slow)
+        worker.start()
+        t0 = time.time()
+        while not journal_tail._OWNERS and time.time() - t0 < 10:
+            time.sleep(0.05)
+        assert journal_tail._OWNERS
+        with opt.trial_context(opt.TrialContext(trial=1, slot=1)) as ctx:
+            with pytest.raises(JournalFatal) as err:
+                opt.run_single(broken, "terminal64.exe", 60, True, base_overrides={"bb_period": 20})
+        worker.join(60)
+        assert err.value.kind == "invalid_config" and ctx.run_id in err.value.line
+        ok, fb, run_id, _run_dir = done["slow"]
+        assert ok and fb is not None and run_id != ctx.run_id
+        assert journal_tail._OWNERS == {}
+
+    def test_grid_records_fatal_phase(self, make_cfg):
+        """Test que el grid marca los trials como fatal y deja el journal en su registro"""
+        cfg = make_cfg(self.temp_dir, options={"fatal": "EURUSD: history synchronization error"})
+        logs = os.path.join(self.temp_dir, "logs")
+        summary = opt.run_grid_bounded(cfg, "terminal64.exe", 120, 0, 1, True, log_dir=logs)
+        assert summary["phases"] == {"fatal": 2}
+        records = [json.loads(line) for p in Path(logs).glob("*.jsonl") for line in p.read_text(encoding="utf-8").splitlines()]
+        trials = [r for r in records if r.get("event") == "trial"]
+        assert [r["error_class"] for r in trials] == ["no_history", "no_history"]
+        assert all("history synchronization error" in r["journal"][-1] for r in trials)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
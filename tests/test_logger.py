@@ -5,7 +5,8 @@ import os
 import tempfile
 import shutil
 import logging
-from logger import OptimizerLogger, get_logger
+import json
+from logger import OptimizerLogger, StructuredTrialLog, get_logger
 
 
 class TestOptimizerLogger:
@@ -130,6 +131,85 @@ class TestOptimizerLogger:
             assert "value1" in content
 
 
+class TestStructuredTrialLog:
+    """Tests para el escritor JSONL asíncrono"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.test_log_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_log_dir, "trials.jsonl")
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        if os.path.exists(self.test_log_dir):
+            shutil.rmtree(self.test_log_dir)
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_close_drains_queue(self):
+        """Test que close() escribe todos los registros encolados"""
+        log = StructuredTrialLog(self.path, max_batch=7)
+        for i in range(100):
+            log.emit("trial", trial=i, run_id=f"run_{i}", slot=i % 4, phase="complete")
+        log.close()
+        records = self._read()
+        assert [r["trial"] for r in records] == list(range(100))
+        assert all(r["event"] == "trial" and "ts" in r for r in records)
+
+    def test_emit_after_close_is_ignored(self):
+        """Test que emitir tras cerrar no falla ni escribe"""
+        log = StructuredTrialLog(self.path)
+        log.close()
+        log.emit("trial", trial=1)
+        assert self._read() == []
+
+    def test_non_serializable_values(self):
+        """Test que valores no JSON se serializan como texto"""
+        log = StructuredTrialLog(self.path)
+        log.emit("trial", path=object.__new__(object))
+        log.close()
+        assert isinstance(self._read()[0]["path"], str)
+
+
+class TestAsyncOptimizerLogger:
+    """Tests para OptimizerLogger en modo asíncrono"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.test_log_dir = tempfile.mkdtemp()
+        self.logger = OptimizerLogger(
+            name="AsyncLogger",
+            log_dir=self.test_log_dir,
+            level=logging.DEBUG,
+            async_mode=True
+        )
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        self.logger.close()
+        if os.path.exists(self.test_log_dir):
+            shutil.rmtree(self.test_log_dir)
+
+    def test_log_trial_writes_text_and_jsonl(self):
+        """Test que log_trial produce línea de texto y registro JSONL"""
+        self.logger.log_trial(3, {'bb_period': 20}, 12.5, run_id="run_x", slot=1, phase="complete")
+        self.logger.close()
+
+        with open(os.path.join(self.test_log_dir, "AsyncLogger.log"), 'r') as f:
+            content = f.read()
+            assert "Trial 3 completado" in content
+            assert "run_x" in content
+
+        with open(os.path.join(self.test_log_dir, "AsyncLogger.trials.jsonl"), 'r') as f:
+            record = json.loads(f.readline())
+        assert record["trial"] == 3
+        assert record["slot"] == 1
+        assert record["phase"] == "complete"
+        assert record["params"] == {'bb_period': 20}
+
+
 class TestGetLogger:
     """Tests para la función get_logger"""
     
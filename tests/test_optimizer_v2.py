@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""Tests unitarios para optimizer_v2.py"""
+import pytest
+import os
+import itertools
+import json
+import tempfile
+import shutil
+import time
+from pathlib import Path
+
+import optimizer_v2 as opt
+
+
+class TestPrewarm:
+    """Tests para el pre-calentamiento de historial"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_targets_from_space_choice(self, make_cfg):
+        """Test que cada timeframe del space genera un objetivo distinto"""
+        cfg = make_cfg(space={"timeframe": ["choice", ["M30", "H1", "H1", "H4"]]})
+        targets = opt.warmup_targets(cfg)
+        assert [t[1] for t in targets] == ["M30", "H1", "H4"]
+        assert all(t[0] == "EURUSD" and t[2] == 1 for t in targets)
+
+    def test_targets_from_grid_sampler(self, make_cfg):
+        """Test que el grid del sampler también aporta timeframes"""
+        cfg = make_cfg(sampler={"type": "grid", "search_space": {"timeframe": ["H2", "H6"]}})
+        assert [t[1] for t in opt.warmup_targets(cfg)] == ["H2", "H6"]
+
+    def test_targets_default_to_test_timeframe(self, make_cfg):
+        """Test que sin timeframe en el study se usa test.timeframe"""
+        assert [t[1] for t in opt.warmup_targets(make_cfg())] == ["H1"]
+
+    def test_prewarm_runs_once_per_target(self, make_cfg, monkeypatch):
+        """Test que el estado persistido evita repetir el calentamiento"""
+        calls = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            calls.append(base_overrides["timeframe"])
+            return True, 1000.0, "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"timeframe": ["choice", ["M30", "H4"]]}, root=self.temp_dir)
+
+        first = opt.prewarm_history(cfg, "exe", 10, auto_close=False)
+        second = opt.prewarm_history(cfg, "exe", 10, auto_close=False)
+
+        assert calls == ["M30", "H4"]
+        assert len(first["warmed"]) == 2
+        assert len(second["skipped"]) == 2
+        state = opt.load_warm_state(opt.get_layout(cfg))
+        assert all(v["ok"] for v in state.values())
+
+    def test_prewarm_records_failures(self, make_cfg, monkeypatch):
+        """Test que un timeout no marca el objetivo como caliente"""
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            raise TimeoutError("sin artefactos")
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(root=self.temp_dir)
+        summary = opt.prewarm_history(cfg, "exe", 10, auto_close=False)
+        assert summary["failed"] == ["EURUSD|H1|1|2023.01.01|2023.12.31"]
+        assert not opt.load_warm_state(opt.get_layout(cfg))["EURUSD|H1|1|2023.01.01|2023.12.31"]["ok"]
+
+
+class TestRunOptunaLogging:
+    """Tests para el logging estructurado por trial en run_optuna"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_every_trial_gets_a_record(self, make_cfg, monkeypatch):
+        """Test que cada trial deja un registro JSONL con trial, run_id, slot y phase"""
+        pytest.importorskip("optuna")
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            ctx = opt.current_trial_context()
+            ctx.run_id = f"run_{ctx.trial}"
+            opt._trial_event("launch", pid=123)
+            if base_overrides["sto_period_k"] == 5:
+                raise TimeoutError("sin artefactos")
+            return True, 1000.0 + base_overrides["sto_period_k"], ctx.run_id, None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"sto_period_k": ["choice", [5, 6, 7]]},
+                       sampler={"type": "grid"}, root=self.temp_dir)
+        log_dir = os.path.join(self.temp_dir, "logs")
+        opt.run_optuna(cfg, "exe", 10, n_trials=3, n_jobs=2, auto_close=False, log_dir=log_dir)
+
+        with open(os.path.join(log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        trials = [r for r in records if r["event"] == "trial"]
+        assert sorted(r["trial"] for r in trials) == [0, 1, 2]
+        assert all(r["run_id"] == f"run_{r['trial']}" for r in trials)
+        assert all(r["slot"] in (0, 1) for r in trials)
+        assert sorted(r["phase"] for r in trials) == ["complete", "complete", "timeout"]
+        assert sum(1 for r in records if r["event"] == "phase" and r["phase"] == "launch") == 3
+        assert records[0]["event"] == "optimization_start"
+        assert records[-1]["event"] == "optimization_end"
+
+
+    def test_aborted_trial_is_pruned_with_partial_metrics(self, make_cfg, monkeypatch):
+        """Test que un trial abortado queda pruned y su registro lleva las métricas parciales"""
+        optuna = pytest.importorskip("optuna")
+        from early_abort import TrialAborted
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            if base_overrides["sto_period_k"] == 5:
+                raise TrialAborted("drawdown 45.0% >= 40%", {"equity": 550.0, "pct_of_range": 20.0})
+            return True, 1000.0 + base_overrides["sto_period_k"], "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"sto_period_k": ["choice", [5, 6]]},
+                       sampler={"type": "grid"}, root=self.temp_dir)
+        log_dir = os.path.join(self.temp_dir, "logs")
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=2, n_jobs=1, auto_close=False, log_dir=log_dir)
+
+        pruned = [t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED]
+        assert len(pruned) == 1
+        assert pruned[0].user_attrs["abort_reason"].startswith("drawdown")
+        assert pruned[0].intermediate_values == {20: -450.0}
+        with open(os.path.join(log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            trials = [json.loads(line) for line in f if '"event": "trial"' in line]
+        aborted = [r for r in trials if r["phase"] == "aborted"]
+        assert aborted[0]["partial"]["equity"] == 550.0
+
+    def test_timeout_stops_before_trial_that_does_not_fit(self, make_cfg, monkeypatch):
+        """Test que con --timeout no se lanza un trial cuyo runtime previsto no cabe"""
+        optuna = pytest.importorskip("optuna")
+        from scheduling import CostModel, trial_features
+        log_dir = os.path.join(self.temp_dir, "logs")
+        model = CostModel()
+        model.observe(trial_features("H1", 1, "2023.01.01", "2023.12.31"), 300.0)
+        model.save(os.path.join(log_dir, "cost_model.json"))
+        launched = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            launched.append(base_overrides)
+            return True, 1000.0, "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"sto_period_k": ["int", 5, 9]}, sampler="tpe", root=self.temp_dir)
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=5, n_jobs=1, auto_close=False, log_dir=log_dir, timeout=100)
+
+        assert launched == []
+        assert [t.state for t in study.trials] == [optuna.trial.TrialState.PRUNED]
+        assert study.trials[0].user_attrs["budget_skipped"]["predicted"] == pytest.approx(300.0, rel=0.01)
+        with open(os.path.join(log_dir, "results.json"), encoding="utf-8") as f:
+            results = json.load(f)
+        assert results["trials"][0]["state"] == "PRUNED"
+        assert results["budget"]["skipped"] == 1
+
+
+class TestBoundedGrid:
+    """Tests para el barrido de grid con memoria acotada"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.temp_dir, "logs")
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_requires_grid_sampler(self, make_cfg):
+        """Test que el modo acotado rechaza samplers que no son grid"""
+        cfg = make_cfg(space={"a": ["int", 1, 3]}, sampler="tpe", root=self.temp_dir)
+        with pytest.raises(RuntimeError, match="GridSampler"):
+            opt.run_grid_bounded(cfg, "exe", 10, 0, 1, False, log_dir=self.log_dir)
+
+    def test_best_and_streamed_records(self, make_cfg, monkeypatch):
+        """Test que se retiene el mejor y cada trial queda en el JSONL"""
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            if base_overrides["a"] == 2:
+                raise TimeoutError("sin artefactos")
+            return True, 1000.0 + base_overrides["a"] * base_overrides["b"], "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"a": ["choice", [1, 2, 3]], "b": ["choice", [10, 20]]},
+                       sampler="grid", root=self.temp_dir)
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 3, False, log_dir=self.log_dir)
+
+        assert summary["best_value"] == 60.0
+        assert summary["best_params"] == {"a": 3, "b": 20}
+        assert summary["phases"] == {"complete": 4, "timeout": 2}
+        assert summary["errors"][0]["count"] == 2
+        with open(os.path.join(self.log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            trials = [json.loads(line) for line in f if '"event": "trial"' in line]
+        assert sorted(r["trial"] for r in trials) == list(range(6))
+
+    def test_longest_timeframe_launched_first(self, make_cfg, monkeypatch):
+        """Test que con un modelo de coste aprendido el grid se lanza en orden LPT"""
+        from scheduling import CostModel, trial_features
+        model = CostModel()
+        for tf, secs in (("M30", 600.0), ("H1", 300.0), ("H6", 50.0)):
+            model.observe(trial_features(tf, 1, "2023.01.01", "2023.12.31"), secs)
+        model.save(os.path.join(self.log_dir, "cost_model.json"))
+        launched = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            launched.append(base_overrides["timeframe"])
+            return True, 1000.0, "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"timeframe": ["choice", ["H6", "H1", "M30"]], "a": ["choice", [1, 2]]},
+                       sampler="grid", root=self.temp_dir)
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 1, False, log_dir=self.log_dir)
+
+        assert launched == ["M30", "M30", "H1", "H1", "H6", "H6"]
+        assert summary["cost_model"]["n"] == 6
+        plan = summary["schedule"]
+        assert plan["launched"] == 6 and plan["unknown_cost"] == 0
+        # Un solo slot: el makespan previsto es la suma de lo previsto al lanzar cada trial
+        assert plan["predicted_makespan_seconds"] == plan["predicted_serial_seconds"] > 600.0
+        with open(os.path.join(self.log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            trials = [json.loads(line) for line in f if '"event": "trial"' in line]
+        assert trials[0]["predicted_seconds"] == pytest.approx(600.0, rel=0.01)
+        assert CostModel.load(os.path.join(self.log_dir, "cost_model.json")).groups["M30|1"]["n"] == 3
+
+    def test_timeout_skips_long_points_and_persists(self, make_cfg, monkeypatch):
+        """Test que el grid salta los puntos que no caben en el presupuesto y guarda resultados"""
+        from scheduling import CostModel, trial_features
+        model = CostModel()
+        for tf, secs in (("M30", 600.0), ("H1", 300.0)):
+            model.observe(trial_features(tf, 1, "2023.01.01", "2023.12.31"), secs)
+        model.save(os.path.join(self.log_dir, "cost_model.json"))
+        launched = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            launched.append(base_overrides["timeframe"])
+            return True, 1000.0 + base_overrides["a"], "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"timeframe": ["choice", ["H1", "M30"]], "a": ["choice", [1, 2]]},
+                       sampler="grid", root=self.temp_dir)
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 1, False, log_dir=self.log_dir, timeout=400)
+
+        assert launched == ["H1", "H1"]
+        assert summary["budget"]["skipped"] == 2
+        with open(os.path.join(self.log_dir, "results.json"), encoding="utf-8") as f:
+            results = json.load(f)
+        assert results["trials"][0]["params"] == {"timeframe": "H1", "a": 2}
+
+    def test_timeout_drains_then_cancels_in_flight(self, make_cfg, monkeypatch):
+        """Test que al agotarse el presupuesto y el drenaje el trial en vuelo se aborta"""
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            check = opt._with_cancel(None, opt.current_trial_context().cancel)
+            while True:  # como wait_ready_and_report: sondea hasta que llegue el reporte
+                check()
+                time.sleep(0.02)
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"a": ["choice", [1, 2]]}, sampler="grid", root=self.temp_dir)
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 1, False, log_dir=self.log_dir,
+                                       timeout=0.2, drain_grace=0.1)
+
+        assert summary["phases"] == {"aborted": 1}
+        assert summary["best_value"] is None
+        with open(os.path.join(self.log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            trials = [json.loads(line) for line in f if '"event": "trial"' in line]
+        assert trials[0]["abort_reason"].startswith("presupuesto")
+
+    def test_soak_memory_flat_over_50k_trials(self, make_cfg, monkeypatch):
+        """Soak: el RSS no crece con el número de trials (50k)"""
+        psutil = pytest.importorskip("psutil")
+        proc = psutil.Process()
+        samples = {}
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            n = opt.current_trial_context().trial
+            if n in (10_000, 49_999):
+                samples[n] = proc.memory_info().rss
+            if n % 7 == 0:
+                raise TimeoutError(f"Timeout esperando _READY en run {n}")
+            return True, 1000.0 + (n % 97), f"run_{n}", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"a": ["choice", list(range(250))], "b": ["choice", list(range(200))]},
+                       sampler="grid", root=self.temp_dir)
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 4, False, log_dir=self.log_dir)
+
+        assert sum(summary["phases"].values()) == 50_000
+        # Entre el trial 10k y el 50k el RSS se mantiene plano (sin historial por trial en RAM)
+        assert samples[49_999] - samples[10_000] < 4 * 1024 * 1024
+
+class TestRunNamespaces:
+    """Tests para IDs de run sin colisiones y artefactos por run"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_allocator_unique_across_threads_processes_and_hosts(self):
+        """Test que hilos de varios procesos/hosts simulados nunca repiten ID"""
+        from concurrent.futures import ThreadPoolExecutor
+        allocators = [opt.RunIdAllocator(host=h, pid=p) for h in ("nodo-a", "nodo-b") for p in (100, 101)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            ids = list(pool.map(lambda i: allocators[i % 4].next(slot=i % 8), range(20_000)))
+        assert len(set(ids)) == 20_000
+        assert allocators[0].host_tag != allocators[2].host_tag
+        assert "_p100_s03_" in allocators[0].next(slot=3)
+        # Estable entre procesos (crc32, no hash() con semilla aleatoria)
+        assert opt.RunIdAllocator(host="nodo-a").host_tag == allocators[0].host_tag
+
+    def test_existing_run_dir_is_a_collision(self, make_cfg, monkeypatch):
+        """Test que reutilizar un run_id falla en vez de leer artefactos ajenos"""
+        monkeypatch.setattr(opt, "now_run_id", lambda slot=None: "run_fijo")
+        cfg = make_cfg(root=self.temp_dir)
+        (opt.get_layout(cfg).common_mt5_so_dir / "run_fijo").mkdir(parents=True)
+        with pytest.raises(RuntimeError, match="Colisión"):
+            opt.run_single(cfg, "exe", 5, False, base_overrides={"a": 1})
+
+    def test_stress_thousands_of_concurrent_stub_runs(self, make_cfg, monkeypatch):
+        """Stress: miles de run_single concurrentes con un EA simulado; cada run lee sólo lo suyo"""
+        from concurrent.futures import ThreadPoolExecutor
+        cfg = make_cfg(root=self.temp_dir)
+        layout = opt.get_layout(cfg)
+
+        class FakeProc:
+            pid = 0
+
+            def wait(self, timeout=None):
+                return 0
+
+        def fake_launch(exe_path, ini_path, backend=None, slot=None):
+            # El "EA": lee su .set vía el .ini y escribe report.json + _READY en su carpeta
+            ini = dict(line.split("=", 1) for line in ini_path.read_text(encoding="utf-8").splitlines() if "=" in line)
+            set_path = layout.profiles_tester_dir / ini["ExpertParameters"].strip('"')
+            kv = dict(line.split("=", 1) for line in set_path.read_text(encoding="utf-8").splitlines())
+            run_dir = Path(kv["so_out_dir"]) / kv["so_run_id"]
+            (run_dir / "report.json").write_text(json.dumps({"final_balance": 1000 + int(kv["a"])}), encoding="utf-8")
+            (run_dir / "_READY").write_text("OK_JSON|OK_CSV", encoding="utf-8")
+            return FakeProc()
+
+        monkeypatch.setattr(opt, "_launch_mt5", fake_launch)
+        monkeypatch.setattr("builtins.print", lambda *a, **k: None)
+
+        def one(i):
+            with opt.trial_context(opt.TrialContext(trial=i, slot=i % 32)):
+                ok, fb, rid, run_dir = opt.run_single(cfg, "exe", 5, False, base_overrides={"a": i})
+            return i, ok, fb, rid
+
+        n = 2000
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            results = list(pool.map(one, range(n)))
+
+        assert all(ok and fb == 1000 + i for i, ok, fb, _rid in results)
+        rids = {rid for _i, _ok, _fb, rid in results}
+        assert len(rids) == n
+        assert len(list(layout.profiles_tester_dir.glob("params_*.set"))) == n
+        assert len(list(layout.ini_dir.glob("*.ini"))) == n
+        assert len([p for p in layout.common_mt5_so_dir.iterdir() if p.is_dir()]) == n
+        assert not (layout.common_mt5_so_dir / "__WHERE.txt").exists()
+
+
+class TestBackgroundPostProcessing:
+    """Tests para liberar el slot en _READY y post-procesar en segundo plano"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def run_grid(self, make_cfg, monkeypatch, post_workers, stop_sec=0.0, html_sec=0.2):
+        """Grid de 8 trials con EA simulado, cierre del terminal de stop_sec y reescritura del HTML de html_sec;
+        devuelve también los lanzamientos (slot, pid, PIDs ya cerrados en ese momento)"""
+        cfg = make_cfg(space={"a": ["choice", list(range(8))]}, sampler="grid", root=self.temp_dir)
+        layout = opt.get_layout(cfg)
+        pids = itertools.count(4242)
+        launches, closed = [], set()
+
+        class FakeProc:
+            def __init__(self):
+                self.pid = next(pids)
+
+        def fake_stop(pid, timeout=45, backend=None):
+            time.sleep(stop_sec)
+            closed.add(pid)
+            return True
+
+        def fake_launch(exe_path, ini_path, backend=None, slot=None):
+            ini = dict(line.split("=", 1) for line in ini_path.read_text(encoding="utf-8").splitlines() if "=" in line)
+            kv = dict(line.split("=", 1) for line in
+                      (layout.profiles_tester_dir / ini["ExpertParameters"].strip('"')).read_text(encoding="utf-8").splitlines())
+            run_dir = Path(kv["so_out_dir"]) / kv["so_run_id"]
+            (run_dir / "report.json").write_text(json.dumps({"final_balance": 1000 + int(kv["a"])}), encoding="utf-8")
+            (run_dir / "_READY").write_text("OK_JSON|OK_CSV", encoding="utf-8")
+            proc = FakeProc()
+            launches.append((slot, proc.pid, set(closed)))
+            return proc
+
+        monkeypatch.setattr(opt, "_launch_mt5", fake_launch)
+        monkeypatch.setattr(opt, "_stop_pid_gently", fake_stop)
+        monkeypatch.setattr(opt, "override_report_html_dates", lambda path, from_, to: time.sleep(html_sec))
+        log_dir = os.path.join(self.temp_dir, f"logs_{post_workers}_{stop_sec}")
+        summary = opt.run_grid_bounded(cfg, "exe", 10, 0, 2, True, log_dir=log_dir, post_workers=post_workers)
+        return summary, layout, log_dir, launches
+
+    def test_slot_released_before_teardown(self, make_cfg, monkeypatch):
+        """Test antes/después: con post-proceso en segundo plano el grid termina antes y todo se drena"""
+        before, _layout, _, _ = self.run_grid(make_cfg, monkeypatch, post_workers=0)
+        after, layout, log_dir, _ = self.run_grid(make_cfg, monkeypatch, post_workers=4)
+
+        assert before["best_value"] == after["best_value"] == 7.0
+        assert after["postprocess"]["done"] == 8 and after["postprocess"]["pending"] == 0
+        # 8 HTML de 0.2 s en 2 slots: ~0.8 s dentro del trial frente a ~0.4 s con 4 hilos de post-proceso
+        assert after["seconds"] < before["seconds"] * 0.8
+        # Drenado al final: meta.json de los 16 runs y un teardown por run en el JSONL
+        assert len(list(layout.common_mt5_so_dir.glob("*/meta.json"))) == 16
+        with open(os.path.join(log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        teardowns = [r for r in records if r["event"] == "phase" and r["phase"] == "teardown"]
+        assert len(teardowns) == 8 and all(r["run_id"] for r in teardowns)
+        assert records[-1]["event"] == "optimization_end"
+
+    def test_next_launch_waits_for_slot_teardown(self, make_cfg, monkeypatch):
+        """Test que el siguiente lanzamiento en un slot espera a que el PID anterior de ese slot esté cerrado"""
+        summary, _layout, _, launches = self.run_grid(make_cfg, monkeypatch, post_workers=4, stop_sec=0.3, html_sec=0.0)
+        assert summary["postprocess"]["done"] == 8 and len(launches) == 8
+        last = {}
+        for slot, pid, closed in launches:
+            if slot in last:
+                assert last[slot] in closed, f"slot {slot}: {pid} lanzado con {last[slot]} aún abierto"
+            last[slot] = pid
+
+
+class TestArtifactLevels:
+    """Tests de los artefactos lean en la búsqueda y la re-ejecución rich de los finalistas"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.temp_dir, "logs")
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_lean_ini_has_no_report(self, make_cfg):
+        """Test que sin ruta de informe el .ini no pide HTML a MT5"""
+        cfg = make_cfg(root=self.temp_dir)
+        ini = Path(self.temp_dir) / "t.ini"
+        opt.write_ini(cfg, "x.set", ini, None)
+        assert "Report=" not in ini.read_text(encoding="utf-8")
+        opt.write_ini(cfg, "x.set", ini, "C:/r/report_1.html")
+        assert 'Report="C:/r/report_1.html"' in ini.read_text(encoding="utf-8")
+
+    def test_lean_grid_reruns_top_k_rich(self, make_cfg):
+        """Test que la búsqueda lean sólo deja report.json y los K mejores se repiten con HTML y trades.csv"""
+        cfg = make_cfg(space={"bb_period": ["choice", [10, 20, 30, 40, 50]]}, sampler="grid", root=self.temp_dir)
+        cfg.mt5.backend = "emulator"
+        summary = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=self.log_dir,
+                                       artifacts="lean", finalists=2)
+        layout = opt.get_layout(cfg)
+        runs = list(layout.common_mt5_so_dir.iterdir())
+        assert len(runs) == 7 and all((r / "report.json").exists() for r in runs)
+        rich = {r.name for r in runs if (r / "trades.csv").exists()}
+        fin = summary["finalists"]
+        assert fin["k"] == 2 and fin["failed"] == 0
+        assert {t["run_id"] for t in fin["trials"]} == rich
+        assert {p.name for p in layout.reports_dir.glob("*.html")} == {f"report_{rid}.html" for rid in rich}
+        assert fin["trials"][0]["value"] == summary["best_value"] and all(t["drift"] == 0 for t in fin["trials"])
+
+        with open(os.path.join(self.log_dir, "MT5Optimizer.trials.jsonl"), encoding="utf-8") as f:
+            trials = [json.loads(line) for line in f if '"event": "trial"' in line]
+        assert sorted(r["artifacts"] for r in trials) == ["lean"] * 5 + ["rich"] * 2
+        with open(os.path.join(self.log_dir, "results.json"), encoding="utf-8") as f:
+            assert json.load(f)["finalists"]["k"] == 2
+
+    def test_optuna_finalists_use_rich_context(self, make_cfg, monkeypatch):
+        """Test que run_optuna lanza la búsqueda en lean y sólo los finalistas (sin repetir puntos) en rich"""
+        pytest.importorskip("optuna")
+        levels = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            levels.append((opt.current_trial_context().artifacts, base_overrides["sto_period_k"]))
+            return True, 1000.0 + base_overrides["sto_period_k"], f"run_{len(levels)}", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"sto_period_k": ["int", 5, 7]}, sampler="random", root=self.temp_dir)
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=6, n_jobs=1, auto_close=False, log_dir=self.log_dir,
+                               artifacts="lean", finalists=2)
+        assert [lv for lv, _ in levels[:6]] == ["lean"] * 6
+        rich = [k for lv, k in levels[6:] if lv == "rich"]
+        best = sorted({k for _, k in levels[:6]}, reverse=True)[:2]
+        assert rich == best
+        assert [t["number"] for t in study.user_attrs["finalists"]["trials"]] == [
+            next(t.number for t in study.trials if t.params["sto_period_k"] == k) for k in best]
+        with pytest.raises(RuntimeError, match="artefactos"):
+            opt.run_optuna(cfg, "exe", 10, n_trials=1, n_jobs=1, auto_close=False, log_dir=self.log_dir, artifacts="full")
+
+    def test_optuna_finalists_skip_timeouts(self, make_cfg, monkeypatch):
+        """Test que los timeouts (-inf) no son finalistas y results.json sigue siendo JSON válido"""
+        pytest.importorskip("optuna")
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            if base_overrides["sto_period_k"] != 5:
+                raise TimeoutError("sin _READY")
+            return True, 1010.0, "run_ok", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(space={"sto_period_k": ["int", 5, 9]}, sampler="random", root=self.temp_dir)
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=8, n_jobs=1, auto_close=False, log_dir=self.log_dir,
+                               artifacts="lean", finalists=3)
+        fin = study.user_attrs.get("finalists", {"trials": []})["trials"]
+        assert all(t["value"] == 10.0 for t in fin) and len(fin) <= 1
+
+        def reject(token):
+            raise ValueError(f"token no JSON: {token}")
+
+        with open(os.path.join(self.log_dir, "results.json"), encoding="utf-8") as f:
+            json.loads(f.read(), parse_constant=reject)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
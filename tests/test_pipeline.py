@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Tests unitarios para pipeline.py"""
+import pytest
+import json
+import tempfile
+import shutil
+from pathlib import Path
+
+import optimizer_v2 as opt
+import pipeline
+from optimizer_v2 import SearchCfg
+
+
+def write_stage(root, name, space, sampler="tpe"):
+    """Escribe un config de stage mínimo y devuelve su nombre"""
+    cfg = {
+        "mt5": {"terminal_path": "terminal64.exe", "terminal_hash": "ABCDEF",
+                "appdata": str(root / "appdata"), "reports_dir": str(root / "reports"),
+                "ini_dir": str(root / "ini")},
+        "test": {"symbol": "EURUSD", "timeframe": "H1", "model": 1, "from": "2023.01.01",
+                 "to": "2023.12.31", "deposit": 1000, "leverage": 100},
+        "ea": {"name": "Estrategia.ex5", "inputs": {"bb_period": 20, "sto_period_k": 14}},
+        "search": {"sampler": sampler, "space": space},
+    }
+    (root / name).write_text(json.dumps(cfg), encoding="utf-8")
+    return name
+
+
+class TestSpaceNarrowing:
+    """Tests para el congelado y estrechado del espacio"""
+
+    def test_freeze_params_routes_timeframe(self):
+        """Test que timeframe va a test y el resto a ea.inputs sin mutar el original"""
+        root = Path(tempfile.mkdtemp())
+        try:
+            cfg = opt.load_config(str(root / write_stage(root, "s.json", {})))
+            frozen = pipeline.freeze_params(cfg, {"timeframe": "H4", "bb_period": 22})
+            assert frozen.test.timeframe == "H4"
+            assert frozen.ea.inputs["bb_period"] == 22
+            assert cfg.ea.inputs["bb_period"] == 20
+            assert cfg.test.timeframe == "H1"
+        finally:
+            shutil.rmtree(root)
+
+    def test_shrink_numeric_ranges(self):
+        """Test que int/float se recortan alrededor del incumbente"""
+        search = SearchCfg(space={"k": ["int", 0, 20], "x": ["float", 1.0, 3.0], "t": ["choice", ["H1", "H4"]]})
+        out = pipeline.shrink_space(search, {"k": 18, "x": 1.2, "t": "H4"}, 0.5)
+        assert out.space["k"] == ["int", 13, 20]
+        assert out.space["x"] == ["float", 1.0, pytest.approx(1.7)]
+        assert out.space["t"] == ["choice", ["H1", "H4"]]
+
+    def test_shrink_numeric_choices_and_grid(self):
+        """Test que choices numéricos y el grid del sampler se filtran"""
+        search = SearchCfg(space={"k": ["choice", [5, 6, 7, 8, 9]]},
+                           sampler={"type": "grid", "search_space": {"k": [5, 6, 7, 8, 9]}})
+        out = pipeline.shrink_space(search, {"k": 9}, 0.5)
+        assert out.space["k"] == ["choice", [8, 9]]
+        assert out.sampler["search_space"]["k"] == [8, 9]
+
+    def test_variance_importances(self):
+        """Test que la importancia por omega² detecta la dimensión relevante"""
+        class T:
+            def __init__(self, params, value):
+                self.params, self.value = params, value
+        trials = [T({"a": a, "b": b}, a * 10.0) for a in range(4) for b in range(3)]
+        imps = pipeline._variance_importances(trials)
+        assert imps["a"] > 0.99
+        assert imps["b"] < 0.01
+
+
+class TestRunPipeline:
+    """Tests de encadenado de stages con run_single simulado"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.root = Path(tempfile.mkdtemp())
+        self.seen_inputs = []
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.root)
+
+    def _fake_run_single(self, cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+        merged = dict(cfg.ea.inputs)
+        merged.update(base_overrides or {})
+        self.seen_inputs.append((cfg.test.timeframe, merged))
+        score = -abs(merged["sto_period_k"] - 7) - abs(merged["bb_period"] - 24)
+        return True, 1000.0 + score, "rid", None
+
+    def test_best_params_frozen_into_next_stage(self, monkeypatch):
+        """Test que el mejor de un stage queda fijo en los siguientes"""
+        pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self._fake_run_single)
+        s1 = write_stage(self.root, "s1.json", {"sto_period_k": ["choice", [5, 6, 7]],
+                                                 "timeframe": ["choice", ["H1", "H4"]]}, sampler="grid")
+        s2 = write_stage(self.root, "s2.json", {"bb_period": ["choice", [20, 24]]}, sampler="grid")
+        spec = {"stages": [{"config": s1}, {"config": s2}]}
+
+        summary = pipeline.run_pipeline(spec, self.root, "exe", 10, False, 1, str(self.root / "logs"))
+
+        assert summary["stages"][0]["best_params"]["sto_period_k"] == 7
+        stage2_calls = self.seen_inputs[6:]
+        assert len(stage2_calls) == 2
+        assert all(inputs["sto_period_k"] == 7 for _, inputs in stage2_calls)
+        assert all(tf == summary["stages"][0]["best_params"]["timeframe"] for tf, _ in stage2_calls)
+        assert summary["frozen"]["bb_period"] == 24
+
+    def test_importance_freezes_irrelevant_dims(self, monkeypatch):
+        """Test que tras N trials se congelan dimensiones irrelevantes"""
+        pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self._fake_run_single)
+        s1 = write_stage(self.root, "s1.json", {"sto_period_k": ["int", 1, 20],
+                                                 "margen_cruce": ["float", 0.0, 1.0]})
+        spec = {"stages": [{"config": s1, "n_trials": 40,
+                            "importance": {"after_trials": 25, "min_importance": 0.2}, "shrink": 0.5}]}
+
+        summary = pipeline.run_pipeline(spec, self.root, "exe", 10, False, 1, str(self.root / "logs"))
+
+        stage = summary["stages"][0]
+        assert "margen_cruce" in stage["frozen_low_importance"]
+        assert len(self.seen_inputs) == 40
+        frozen_value = stage["frozen_low_importance"]["margen_cruce"]
+        assert all(inputs["margen_cruce"] == frozen_value for _, inputs in self.seen_inputs[25:])
+        # Cada fase deja su results.json y la segunda arranca con los 25 primeros inyectados
+        logs = self.root / "logs" / "stage01"
+        first = json.loads((logs / "fase1" / "results.json").read_text(encoding="utf-8"))
+        second = json.loads((logs / "fase2" / "results.json").read_text(encoding="utf-8"))
+        assert len(first["trials"]) == 25
+        assert len(second["trials"]) > 15 and second["warm_start"]["applied"] == len(second["trials"]) - 15
+        assert stage["log_dirs"] == [str(logs / "fase1"), str(logs / "fase2")]
+
+    def test_stage_without_complete_trials_does_not_abort(self, monkeypatch):
+        """Test que un stage sin trials completados no corta el pipeline y cada stage guarda sus resultados"""
+        pytest.importorskip("optuna")
+        from journal_tail import JournalFatal
+
+        def run(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            if "sto_period_k" in (base_overrides or {}):
+                raise JournalFatal("expert_not_found", "cannot load Experts\\Estrategia.ex5", [])
+            return self._fake_run_single(cfg, exe, guard, auto_close, base_overrides, layout)
+
+        monkeypatch.setattr(opt, "run_single", run)
+        s1 = write_stage(self.root, "s1.json", {"sto_period_k": ["choice", [5, 7]]}, sampler="grid")
+        s2 = write_stage(self.root, "s2.json", {"bb_period": ["choice", [20, 24]]}, sampler="grid")
+        spec = {"stages": [{"config": s1}, {"config": s2, "n_trials": 4,
+                                            "importance": {"after_trials": 2}}]}
+
+        summary = pipeline.run_pipeline(spec, self.root, "exe", 10, False, 1, str(self.root / "logs"))
+
+        assert summary["stages"][0]["best_value"] is None and summary["stages"][0]["best_params"] == {}
+        assert summary["frozen"]["bb_period"] == 24
+        logs = self.root / "logs"
+        assert (logs / "stage01" / "results.json").exists() and (logs / "stage02" / "fase1" / "results.json").exists()
+        assert (logs / "cost_model.json").exists()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Tests unitarios para postprocess.py"""
+import pytest
+import threading
+import time
+
+from postprocess import PostProcessor
+
+
+class TestPostProcessor:
+    """Tests para el pool de post-proceso en segundo plano"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.post = PostProcessor(workers=1, max_pending=2)
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        self.post.close(timeout=5)
+
+    def test_backpressure_blocks_when_full(self):
+        """Test que submit bloquea al llegar a max_pending hasta que se libera uno"""
+        gate = threading.Event()
+        self.post.submit("a", gate.wait)
+        self.post.submit("b", gate.wait)
+        threading.Timer(0.2, gate.set).start()
+        t0 = time.time()
+        self.post.submit("c", lambda: None)
+        assert time.time() - t0 >= 0.15
+        assert self.post.drain(timeout=5)
+        stats = self.post.stats()
+        assert stats["done"] == 3 and stats["pending"] == 0
+        assert stats["blocked_seconds"] >= 0.15
+        assert stats["pending_peak"] == 2
+
+    def test_failures_are_counted_not_raised(self):
+        """Test que un trabajo que falla no rompe el pool y queda registrado"""
+        def boom():
+            raise OSError("HTML bloqueado")
+
+        self.post.submit("run_1", boom)
+        self.post.submit("run_2", lambda: None)
+        assert self.post.drain(timeout=5)
+        stats = self.post.stats()
+        assert stats["failed"] == 1 and stats["done"] == 1
+        assert stats["errors"][0] == {"label": "run_1", "error": "OSError: HTML bloqueado"}
+
+    def test_drain_timeout(self):
+        """Test que drain devuelve False si lo pendiente no termina a tiempo"""
+        gate = threading.Event()
+        self.post.submit("lento", gate.wait)
+        assert not self.post.drain(timeout=0.1)
+        gate.set()
+        assert self.post.drain(timeout=5)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
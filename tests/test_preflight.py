@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Tests unitarios para preflight.py"""
+import pytest
+import json
+import sys
+import tempfile
+import shutil
+import time
+from pathlib import Path
+
+import optimizer_v2 as opt
+import preflight
+from preflight import run_preflight
+
+HASH = "ABCDEF0123"
+
+
+def build_terminal(root: Path) -> Path:
+    """Árbol de datos de un terminal con Expert, Profiles/Tester, Common/Files y un agente"""
+    appdata = root / "appdata"
+    data = appdata / "MetaQuotes" / "Terminal" / HASH / "MQL5"
+    (data / "Experts").mkdir(parents=True)
+    (data / "Experts" / "Estrategia.ex5").write_bytes(b"ex5")
+    (data / "Profiles" / "Tester").mkdir(parents=True)
+    (appdata / "MetaQuotes" / "Terminal" / "Common" / "Files").mkdir(parents=True)
+    (appdata / "MetaQuotes" / "Tester" / HASH / "Agent-127.0.0.1-3000").mkdir(parents=True)
+    (root / "terminal64.exe").write_bytes(b"exe")
+    return appdata
+
+
+def write_config(root: Path, **changes) -> str:
+    """Config JSON válido con cambios puntuales por bloque"""
+    cfg = {
+        "mt5": {"terminal_path": str(root / "terminal64.exe"), "terminal_hash": HASH,
+                "appdata": str(root / "appdata"), "reports_dir": str(root / "reports"), "ini_dir": str(root / "ini")},
+        "test": {"symbol": "EURUSD", "timeframe": "H1", "from": "2023.01.01", "to": "2023.12.31",
+                 "deposit": 1000, "leverage": 100},
+        "ea": {"name": "Estrategia.ex5", "inputs": {}},
+        "search": {"space": {"timeframe": ["choice", ["H1", "H4"]], "bb_period": ["int", 10, 30]}, "sampler": "tpe"},
+    }
+    for block, values in changes.items():
+        cfg.setdefault(block, {}).update(values)
+    path = root / "config.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return str(path)
+
+
+class TestPreflight:
+    """Tests para la verificación previa agregada"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.root = Path(tempfile.mkdtemp())
+        build_terminal(self.root)
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.root)
+
+    def test_valid_setup_passes(self):
+        """Test que un terminal completo pasa todos los checks y devuelve el Config"""
+        report, cfg = run_preflight(write_config(self.root))
+        assert report.ok, report.format()
+        assert set(report.checks.values()) == {"ok"}
+        assert cfg.ea.name == "Estrategia.ex5"
+        assert (self.root / "reports").is_dir()
+
+    def test_aggregates_every_problem(self):
+        """Test que todos los problemas salen juntos en un único informe"""
+        path = write_config(
+            self.root,
+            mt5={"terminal_hash": "WRONGHASH", "terminal_path": str(self.root / "nope.exe")},
+            search={"space": {"timeframe": ["choice", ["H1", "M5"]], "bb_period": ["int", 30, 10],
+                              "x": ["log", 1, 2]}},
+        )
+        report, _cfg = run_preflight(path)
+        assert not report.ok
+        for name in ("exe", "terminal_hash", "expert", "profiles_tester", "search_space"):
+            assert report.checks[name] == "error", name
+        text = report.format()
+        assert HASH in text  # pista con los hashes existentes
+        assert "['M5']" in text and "min 30 > max 10" in text and "'log'" in text
+
+    def test_bad_timeframe_and_source_only_expert(self):
+        """Test de timeframe fuera de ConfigValidator.TIMEFRAMES y Expert sin compilar"""
+        experts = self.root / "appdata" / "MetaQuotes" / "Terminal" / HASH / "MQL5" / "Experts"
+        (experts / "Estrategia.ex5").unlink()
+        (experts / "Estrategia.mq5").write_text("//", encoding="utf-8")
+        report, _cfg = run_preflight(write_config(self.root, test={"timeframe": "M7"}))
+        assert any("Timeframe inválido" in e for e in report.errors)
+        assert any("compílalo" in e for e in report.errors)
+
+    def test_abort_needs_progress_hook(self):
+        """Test que con abort se avisa si el fuente del EA no llama SO_ProgressOnTick() o no está"""
+        experts = self.root / "appdata" / "MetaQuotes" / "Terminal" / HASH / "MQL5" / "Experts"
+        path = write_config(self.root, abort={"max_dd_pct": 30})
+        report, _cfg = run_preflight(path)
+        assert report.ok and report.checks["progress_hook"] == "warning"
+        assert "no se puede comprobar" in report.warnings[0]
+        (experts / "Estrategia.mq5").write_text("void OnTick()\n{\n}\n", encoding="utf-8")
+        report, _cfg = run_preflight(path)
+        assert "no llama SO_ProgressOnTick()" in report.warnings[0]
+        (experts / "Estrategia.mq5").write_bytes(
+            "\ufeffvoid OnTick()\n{\n   SO_ProgressOnTick();\n}\n".encode("utf-16-le"))
+        report, _cfg = run_preflight(path)
+        assert report.checks["progress_hook"] == "ok"
+        report, _cfg = run_preflight(write_config(self.root, abort={}))
+        assert report.checks["progress_hook"] == "ok"
+
+    def test_slot_root_checks_portable_install(self):
+        """Test que con mt5.slot_root se comprueban el exe y MQL5 de slot_00, no los del HASH"""
+        slots = self.root / "slots"
+        report, _cfg = run_preflight(write_config(self.root, mt5={"slot_root": str(slots)}))
+        assert report.checks["exe"] == "error" and report.checks["terminal_hash"] == "error"
+        assert any("provision.py" in e for e in report.errors)
+        (slots / "slot_00" / "MQL5" / "Experts").mkdir(parents=True)
+        (slots / "slot_00" / "MQL5" / "Experts" / "Estrategia.ex5").write_bytes(b"ex5")
+        (slots / "slot_00" / "MQL5" / "Profiles" / "Tester").mkdir(parents=True)
+        (slots / "slot_00" / "terminal64.exe").write_bytes(b"exe")
+        report, _cfg = run_preflight(write_config(self.root, mt5={"slot_root": str(slots)}))
+        assert report.ok, report.format()
+
+    def test_hanging_check_times_out(self, monkeypatch):
+        """Test que un check colgado no bloquea el preflight"""
+        monkeypatch.setitem(preflight.DISK_CHECKS, "agents", lambda cfg, exe: time.sleep(2) or [])
+        t0 = time.time()
+        report, _cfg = run_preflight(write_config(self.root), timeout=0.3)
+        assert time.time() - t0 < 1.5
+        assert report.checks["agents"] == "error"
+        assert "sin respuesta" in report.errors[0]
+
+    def test_unreadable_config(self):
+        """Test que un config ilegible devuelve el error sin Config"""
+        bad = self.root / "bad.json"
+        bad.write_text("{roto", encoding="utf-8")
+        report, cfg = run_preflight(str(bad))
+        assert cfg is None and report.checks == {"config": "error"}
+
+    def test_cli_fails_fast_before_launch(self, monkeypatch):
+        """Test que optimizer_v2 sale con código 2 sin lanzar ningún terminal"""
+        launched = []
+        monkeypatch.setattr(opt, "run_single", lambda *a, **k: launched.append(a))
+        path = write_config(self.root, mt5={"terminal_hash": "WRONGHASH"})
+        monkeypatch.setattr(sys, "argv", ["optimizer_v2.py", "-c", path, "--single-run"])
+        with pytest.raises(SystemExit) as exc:
+            opt.main()
+        assert exc.value.code == 2
+        assert launched == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
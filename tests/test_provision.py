@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests unitarios para provision.py"""
+import pytest
+import os
+import tempfile
+import shutil
+from pathlib import Path
+
+import provision
+from provision import provision as provision_all, provision_slot, verify_slot
+
+
+def build_master(root: Path) -> Path:
+    """Árbol sintético de un terminal portable"""
+    master = root / "master"
+    files = {
+        "terminal64.exe": b"x" * 1000,
+        "bases/Server/history/EURUSD/2023.hcc": b"h" * 50_000,
+        "bases/Server/ticks/EURUSD/202301.tkc": b"t" * 80_000,
+        "MQL5/Experts/Estrategia.ex5": b"ea",
+        "MQL5/Include/so_report.mqh": b"//mqh",
+        "MQL5/Profiles/Tester/params.set": b"a=1",
+        "config/common.ini": b"[Common]",
+        "logs/20240101.log": b"log",
+        "Tester/Agent-127.0.0.1-3000/cache.bin": b"c" * 10_000,
+        "MQL5/Files/MT5_SO/run_1/report.json": b"{}",
+    }
+    for rel, data in files.items():
+        p = master / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(data)
+    return master
+
+
+class TestProvision:
+    """Tests para la clonación de terminales en slots"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.root = Path(tempfile.mkdtemp())
+        self.master = build_master(self.root)
+        self.dest = self.root / "slots"
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.root)
+
+    def test_hardlinks_shared_and_copies_rest(self):
+        """Test que bases/ y binarios se enlazan y el resto se copia por slot"""
+        summary = provision_all(self.master, self.dest, 3, mode="hardlink")
+        assert summary["problems"] == {}
+        slot = self.dest / "slot_01"
+        hcc = "bases/Server/history/EURUSD/2023.hcc"
+        assert os.path.samefile(self.master / hcc, slot / hcc)
+        assert os.path.samefile(self.master / "terminal64.exe", slot / "terminal64.exe")
+        assert not os.path.samefile(self.master / "config/common.ini", slot / "config/common.ini")
+        assert (slot / "MQL5/Experts/Estrategia.ex5").read_bytes() == b"ea"
+        assert summary["bytes_saved"] == 3 * (1000 + 50_000 + 80_000)
+
+    def test_excluded_paths_not_cloned(self):
+        """Test que logs, agentes del Tester y salidas MT5_SO no se clonan"""
+        provision_all(self.master, self.dest, 1, mode="hardlink")
+        slot = self.dest / "slot_00"
+        assert not (slot / "logs").exists()
+        assert not (slot / "Tester").exists()
+        assert not (slot / "MQL5/Files/MT5_SO").exists()
+
+    def test_slot_copies_are_independent(self):
+        """Test que editar la config de un slot no afecta al maestro"""
+        provision_all(self.master, self.dest, 1, mode="hardlink")
+        (self.dest / "slot_00" / "config/common.ini").write_bytes(b"[Slot]")
+        assert (self.master / "config/common.ini").read_bytes() == b"[Common]"
+
+    def test_idempotent_rerun(self):
+        """Test que volver a provisionar omite lo que ya está al día"""
+        provision_all(self.master, self.dest, 2, mode="hardlink")
+        again = provision_slot(self.master, self.dest / "slot_00", mode="hardlink")
+        assert again["skipped"] == 7
+        assert again["copy"] == again["hardlink"] == 0
+
+    def test_falls_back_to_copy(self, monkeypatch):
+        """Test que sin soporte de enlaces se copia y se verifica igual"""
+        monkeypatch.setattr(provision, "_hardlink", lambda src, dst: False)
+        monkeypatch.setattr(provision, "_reflink", lambda src, dst: False)
+        summary = provision_all(self.master, self.dest, 1, mode="auto")
+        stats = summary["slots"][0]
+        assert stats["hardlink"] == stats["reflink"] == 0
+        assert stats["copy"] == 7
+        assert summary["bytes_saved"] == 0
+
+    def test_verify_reports_damage(self):
+        """Test que la verificación detecta archivos ausentes o truncados"""
+        provision_all(self.master, self.dest, 1, mode="copy")
+        slot = self.dest / "slot_00"
+        (slot / "MQL5/Experts/Estrategia.ex5").unlink()
+        (slot / "config/common.ini").write_bytes(b"")
+        problems = verify_slot(self.master, slot)
+        assert "falta MQL5/Experts/Estrategia.ex5" in problems
+        assert "tamaño distinto en config/common.ini" in problems
+
+    def test_missing_master(self):
+        """Test que un maestro inexistente es un error"""
+        with pytest.raises(RuntimeError, match="maestro"):
+            provision_all(self.root / "nope", self.dest, 1)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Tests unitarios para proxy_backtester.py"""
+import pytest
+import json
+import tempfile
+import shutil
+from pathlib import Path
+
+np = pytest.importorskip("numpy")
+from proxy_backtester import (Bars, IndicatorCache, ProxyBacktester, ProxyParams,
+                              _sma, bars_identity, calibrate, load_bars_csv, load_mt5_reports,
+                              match_reports)
+
+
+def make_bars(n=3000, seed=7):
+    """Serie OHLC sintética (paseo aleatorio) para los tests"""
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0008, n))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    high = np.maximum(open_, close) + rng.uniform(0, 0.0005, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.0005, n)
+    return Bars(np.arange(n).astype(str), open_, high, low, close)
+
+
+def scripted_bt(k_buy=15.0):
+    """
+    Seis barras planas con indicadores fijados en la caché: la barra 1 cierra bajo la banda con
+    %K=k_buy sobre %D=10 (compra a la apertura de la 2, SL 0.98, TP 1.03, ATR 0.01); la barra 3
+    cierra en 1.02 y la 4 baja hasta 1.005
+    """
+    close = np.array([1.0, 0.98, 1.0, 1.02, 1.02, 1.0])
+    open_ = np.array([1.0, 1.0, 1.0, 1.0, 1.02, 1.0])
+    high = np.maximum(open_, close) + 0.001
+    low = np.minimum(open_, close) - 0.001
+    low[4] = 1.005
+    bt = ProxyBacktester(Bars(np.arange(6).astype(str), open_, high, low, close), deposit=1000.0)
+    flat = np.ones(6)
+    k = np.full(6, 50.0)
+    d = np.full(6, 50.0)
+    k[1], d[1] = k_buy, 10.0
+    bt.cache._cache[("bb", 20, 2.0)] = (flat, flat * 1.05, flat * 0.99)
+    bt.cache._cache[("sto", 14, 3, 3)] = (k, d)
+    bt.cache._cache[("atr", 14)] = flat * 0.01
+    return bt
+
+
+class TestIndicators:
+    """Tests para los indicadores y su caché"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.bars = make_bars(500)
+        self.cache = IndicatorCache(self.bars)
+
+    def test_sma_matches_naive(self):
+        """Test que la SMA coincide con la media ingenua y respeta NaN iniciales"""
+        x = np.array([np.nan, np.nan, 1.0, 2.0, 3.0, 4.0])
+        out = _sma(x, 2)
+        assert np.isnan(out[:3]).all()
+        assert out[3:].tolist() == [1.5, 2.5, 3.5]
+
+    def test_bollinger_and_stochastic_ranges(self):
+        """Test de bandas ordenadas y estocástico en [0, 100]"""
+        mid, up, lo = self.cache.bollinger(20, 2.0)
+        ok = ~np.isnan(mid)
+        assert (up[ok] >= mid[ok]).all() and (lo[ok] <= mid[ok]).all()
+        assert abs(mid[-1] - self.bars.close[-20:].mean()) < 1e-12
+        k, d = self.cache.stochastic(14, 3, 3)
+        valid = k[~np.isnan(k)]
+        assert valid.size and valid.min() >= 0 and valid.max() <= 100
+        assert np.isnan(d[:14 + 3 + 3 - 3]).all()
+
+    def test_cache_shares_periods(self):
+        """Test que combinaciones con los mismos periodos reutilizan los arrays"""
+        a = self.cache.bollinger(20, 2.0)
+        misses = self.cache.misses
+        b = self.cache.bollinger(20, 2.5)
+        assert self.cache.misses == misses + 1  # sólo las bandas; media y desviación se reutilizan
+        assert a[0] is b[0]
+        self.cache.stochastic(14, 3, 3)
+        misses = self.cache.misses
+        self.cache.stochastic(14, 5, 3)
+        assert self.cache.misses == misses + 1  # min/max del periodo %K cacheados
+
+
+class TestProxyBacktester:
+    """Tests para la simulación vectorizada"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.bt = ProxyBacktester(make_bars(), deposit=1000.0)
+        self.params = [
+            {"bb_period": bp, "bb_deviation": dv, "sto_period_k": k, "margen_cruce": 1.0,
+             "sl_atr_multiplier": 2.0, "tp_atr_multiplier": 3.0, "atrMultiplierTrailing": tr}
+            for bp in (15, 20) for dv in (1.5, 2.0) for k in (5, 10) for tr in (0.0, 0.5)
+        ]
+
+    def test_batch_equals_individual(self):
+        """Test que evaluar en lote da lo mismo que evaluar una a una"""
+        batch = self.bt.evaluate_batch(self.params)
+        single = [self.bt.evaluate(p) for p in self.params]
+        assert batch == single
+
+    def test_per_combination_deposits(self):
+        """Test que un lote con depósito por combinación equivale a un backtester por depósito"""
+        deposits = [500.0, 1000.0, 5000.0] * 2
+        batch = self.bt.evaluate_batch(self.params[:6], deposits=deposits)
+        for p, dep, r in zip(self.params, deposits, batch):
+            assert r == ProxyBacktester(make_bars(), deposit=dep).evaluate(p)
+        assert self.bt.evaluate(self.params[0], deposit=500.0) == batch[0]
+        with pytest.raises(RuntimeError):
+            self.bt.evaluate_batch(self.params[:2], deposits=[1000.0])
+
+    def test_metrics_are_consistent(self):
+        """Test de coherencia entre métricas del resultado"""
+        for r in self.bt.evaluate_batch(self.params):
+            assert r["final_balance"] == pytest.approx(1000.0 + r["total_net_profit"], abs=0.02)
+            assert r["total_net_profit"] == pytest.approx(r["gross_profit"] + r["gross_loss"], abs=0.02)
+            assert 0 <= r["max_dd_rel_pct"] <= 100
+        assert any(r["total_trades"] > 0 for r in self.bt.evaluate_batch(self.params))
+
+    def test_params_change_results(self):
+        """Test que desviación y margen afectan a la señal"""
+        base = {"bb_period": 20, "sto_period_k": 10}
+        narrow, wide = self.bt.evaluate_batch([dict(base, bb_deviation=1.0), dict(base, bb_deviation=3.0)])
+        assert narrow["total_trades"] > wide["total_trades"]
+        strict = self.bt.evaluate(dict(base, bb_deviation=1.0, margen_cruce=50.0))
+        assert strict["total_trades"] < narrow["total_trades"]
+
+    def test_entry_rules(self):
+        """Test que la compra exige cierre bajo la banda, %K < 20 y %K-%D > margen_cruce"""
+        assert scripted_bt().evaluate({"margen_cruce": 2.0})["total_trades"] == 1
+        assert scripted_bt().evaluate({"margen_cruce": 5.0})["total_trades"] == 0
+        assert scripted_bt(k_buy=25.0).evaluate({"margen_cruce": 2.0})["total_trades"] == 0
+
+    def test_trailing_only_in_profit(self):
+        """Test que el trailing no sube el stop en pérdida ni cerca del TP, y sí en beneficio"""
+        base = {"margen_cruce": 2.0, "atrMultiplierTrailing": 1.0}
+        # Barra 2: nuevo stop 0.99 < entrada 1.0 -> no se mueve; barra 3: 1.01 -> sí; la 4 lo toca
+        moved = scripted_bt().evaluate(dict(base, minDistanceToTPMultiplier=1.0))
+        assert moved["total_trades"] == 1 and moved["total_net_profit"] == pytest.approx(100.0)
+        # TP a 0.02 del nuevo stop, menos que ATR*3 -> el stop se queda en 0.98 y cierra al final
+        held = scripted_bt().evaluate(dict(base, minDistanceToTPMultiplier=3.0))
+        assert held == scripted_bt().evaluate({"margen_cruce": 2.0})
+        assert held["total_net_profit"] == 0.0
+
+    def test_window_limits_trading(self):
+        """Test que una ventana sin la barra de señal no abre y una vacía es un error"""
+        bt = scripted_bt()
+        assert bt.evaluate_batch([{"margen_cruce": 2.0}], window=(3, 6))[0]["total_trades"] == 0
+        assert bt.evaluate_batch([{"margen_cruce": 2.0}], window=(2, 6))[0]["total_trades"] == 1
+        with pytest.raises(RuntimeError, match="Ventana de barras vacía"):
+            bt.evaluate_batch([{}], window=(4, 4))
+
+    def test_from_inputs_ignores_unknown(self):
+        """Test que los inputs del EA ajenos al proxy se ignoran"""
+        p = ProxyParams.from_inputs({"bb_period": "21", "sto_slowing": 7.0, "so_run_id": "x", "lot_size": 0.12})
+        assert p.bb_period == 21 and p.sto_slowing == 7 and p.lot_size == 0.12
+
+
+class TestCalibration:
+    """Tests para el reporte de calibración"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_perfect_and_inverted_agreement(self):
+        """Test de correlaciones extremas y solapamiento del top"""
+        proxy = [{"total_net_profit": v, "total_trades": i} for i, v in enumerate([-5.0, 1.0, 3.0, 10.0])]
+        same = calibrate(proxy, proxy, top_fraction=0.25)
+        assert same["metrics"]["total_net_profit"]["spearman"] == 1.0
+        assert same["metrics"]["total_net_profit"]["mae"] == 0.0
+        assert same["top_overlap"] == {"k": 1, "overlap": 1.0}
+        inverted = [{"total_net_profit": -p["total_net_profit"], "total_trades": p["total_trades"]} for p in proxy]
+        rep = calibrate(proxy, inverted)
+        assert rep["metrics"]["total_net_profit"]["spearman"] == -1.0
+        assert rep["metrics"]["total_net_profit"]["sign_agreement"] == 0.0
+
+    def test_size_mismatch_raises(self):
+        """Test que listas de distinto tamaño son un error"""
+        with pytest.raises(RuntimeError):
+            calibrate([{}], [])
+
+    def test_load_reports_and_bars(self):
+        """Test de carga de report.json con inputs y de barras exportadas de MT5"""
+        run = self.temp_dir / "run_1"
+        run.mkdir()
+        (run / "report.json").write_text(json.dumps({"total_net_profit": 5.0, "inputs": {"bb_period": 21}}))
+        (self.temp_dir / "run_2").mkdir()
+        (self.temp_dir / "run_2" / "report.json").write_text("{roto")
+        reports = load_mt5_reports(self.temp_dir)
+        assert len(reports) == 1 and reports[0]["inputs"]["bb_period"] == 21
+
+        csv_path = self.temp_dir / "bars.csv"
+        csv_path.write_text("<DATE>\t<TIME>\t<OPEN>\t<HIGH>\t<LOW>\t<CLOSE>\t<TICKVOL>\n"
+                            "2024.01.02\t00:00:00\t1.1\t1.2\t1.0\t1.15\t10\n"
+                            "2024.01.02\t01:00:00\t1.15\t1.3\t1.1\t1.25\t12\n")
+        bars = load_bars_csv(str(csv_path))
+        assert len(bars) == 2
+        assert bars.close.tolist() == [1.15, 1.25]
+        assert bars.time[0] == "2024.01.02 00:00:00"
+
+    def test_match_reports_by_symbol_timeframe_and_dates(self):
+        """Test que los runs de otro símbolo, timeframe o rango sin barras se descartan y el resto
+        recibe su ventana por día completo"""
+        days = [f"2023.01.{d:02d} {h:02d}:00" for d in range(1, 11) for h in (0, 12)]
+        bars = make_bars(len(days))
+        bars.time = np.array(days)
+        base = {"symbol": "EURUSD", "timeframe": "PERIOD_H1", "inputs": {}, "_path": "r"}
+        reports = [dict(base, start_date="2023.01.03 00:00", end_date="2023.01.05 00:00"),
+                   dict(base, symbol="GBPUSD"),
+                   dict(base, timeframe="PERIOD_H4"),
+                   dict(base, start_date="2024.01.01 00:00", end_date="2024.02.01 00:00"),
+                   dict(base)]
+        kept, skipped = match_reports(reports, bars, "EURUSD", "H1")
+        assert [r["_window"] for r in kept] == [(4, 10), (0, 20)]
+        assert [why.split()[0] for _r, why in skipped] == ["símbolo", "timeframe", "sin"]
+        assert bars_identity("data/EURUSD_H1.csv") == ("EURUSD", "H1")
+        assert bars_identity("barras.csv") == (None, None)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
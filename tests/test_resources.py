@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Tests unitarios para resources.py"""
+import pytest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+pytest.importorskip("psutil")
+
+import optimizer_v2 as opt
+from resources import ResourceLedger, ResourceMeter
+
+# Hijo que asigna ~64 MB, quema CPU y escribe 4 MB a disco; el padre sólo espera
+BURN = """
+import os, sys, time
+buf = bytearray(64 * 1024 * 1024)
+for i in range(0, len(buf), 4096):
+    buf[i] = 1
+t = time.time()
+while time.time() - t < 0.6:
+    sum(range(10000))
+with open(sys.argv[1], "wb") as f:
+    f.write(os.urandom(4 * 1024 * 1024))
+    f.flush()
+    os.fsync(f.fileno())
+time.sleep(0.3)
+"""
+
+
+class TestResourceMeter:
+    """Tests del muestreo del árbol de procesos"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_measures_process_tree(self):
+        """Test que CPU, RSS pico y escritura del hijo cuentan para el terminal lanzado"""
+        script = Path(self.temp_dir) / "burn.py"
+        script.write_text(BURN, encoding="utf-8")
+        target = os.path.join(self.temp_dir, "out.bin")
+        parent = f"import subprocess, sys; subprocess.call([sys.executable, {str(script)!r}, {target!r}])"
+        proc = subprocess.Popen([sys.executable, "-c", parent])
+        meter = ResourceMeter.start(proc.pid, interval=0.05)
+        proc.wait(timeout=30)
+        usage = meter.stop()
+        assert usage["processes"] >= 2
+        assert usage["cpu_seconds"] >= 0.3
+        assert usage["peak_rss_mb"] >= 60
+        assert usage["write_mb"] >= 3.5 or usage["write_mb"] == 0.0  # sin /proc/<pid>/io no hay IO
+        assert usage["wall_seconds"] >= 0.6
+
+    def test_no_meter_without_pid(self):
+        """Test que un PID inválido no arranca contabilidad"""
+        assert ResourceMeter.start(-1) is None
+
+
+class TestResourceLedger:
+    """Tests de la agregación y la estimación de capacidad"""
+
+    def usage(self, wall, cpu, rss):
+        return {"wall_seconds": wall, "cpu_seconds": cpu, "cores": cpu / wall, "peak_rss_mb": rss,
+                "read_mb": 1.0, "write_mb": 2.0, "processes": 2, "samples": 5}
+
+    def test_groups_and_concurrency(self):
+        """Test que se agrupa por (timeframe, modelo, días) y el pared medio por concurrencia"""
+        ledger = ResourceLedger()
+        feats = {"timeframe": "H1", "model": 1, "span_days": 364.0}
+        ledger.record(feats, self.usage(10, 5, 300), concurrency=1)
+        ledger.record(feats, self.usage(14, 5, 320), concurrency=4)
+        ledger.record({"timeframe": "M30", "model": 0, "span_days": 30}, self.usage(20, 20, 900))
+        ledger.record(feats, None)
+        s = ledger.summary()
+        assert s["trials"] == 3
+        g = s["groups"]["H1|model1|364d"]
+        assert g["n"] == 2 and g["peak_rss_mb"] == 320
+        assert g["wall_by_concurrency"] == {"1": 10.0, "4": 14.0}
+
+    def test_capacity_takes_tighter_bound(self):
+        """Test que los slots sostenibles son el mínimo entre CPU y RAM"""
+        ledger = ResourceLedger()
+        ledger.record({"timeframe": "H1", "model": 1, "span_days": 10}, self.usage(10, 10, 1000))
+        cap = ledger.capacity(cpus=16, mem_mb=8000)
+        assert cap["groups"]["H1|model1|10d"] == {"slots": 6, "by_cpu": 13, "by_mem": 6}
+
+
+class TestTrialAccounting:
+    """Contabilidad integrada en el grid contra el emulador"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_grid_records_resources_per_trial(self, make_cfg):
+        """Test que cada trial lleva su uso en el JSONL y el resumen sale en results.json"""
+        root = self.temp_dir
+        cfg = make_cfg(root, backend="emulator", options={"delay": 0.3}, space={"bb_period": ["choice", [10, 20, 30]]},
+                       sampler="grid", inputs={}, to="2023.03.31")
+        logs = os.path.join(root, "logs")
+        summary = opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=logs, resource_interval=0.05)
+        assert summary["resources"]["trials"] == 3
+        group = summary["resources"]["groups"]["H1|model1|89d"]
+        assert group["wall_seconds"] >= 0.3 and group["peak_rss_mb"] > 0
+        assert summary["capacity"]["groups"]["H1|model1|89d"]["slots"] >= 1
+        records = [json.loads(line) for p in Path(logs).glob("*.jsonl") for line in p.read_text(encoding="utf-8").splitlines()]
+        trials = [r for r in records if r.get("event") == "trial"]
+        assert len(trials) == 3 and all(r["resources"]["cpu_seconds"] >= 0 for r in trials)
+        assert json.loads((Path(logs) / "results.json").read_text(encoding="utf-8"))["resources"]["trials"] == 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
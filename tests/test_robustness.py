@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Tests unitarios para robustness.py"""
+import pytest
+import csv
+import json
+import os
+import tempfile
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+import optimizer_v2 as opt
+import robustness
+from robustness import curve_stats, load_trades, monte_carlo, rank_runs, study_runs
+
+
+def write_run(run_dir, profits, deposit=1000.0):
+    """Carpeta de run con trades.csv como so_report.mqh (deal de balance, entrada y salida) y report.json"""
+    run_dir.mkdir(parents=True)
+    with open(run_dir / "trades.csv", "w", encoding="latin-1", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["ticket", "time", "type", "price", "volume", "profit", "commission", "swap", "symbol", "comment"])
+        w.writerow([1, "2023.01.02 00:00", 2, "0.0", "0.00", f"{deposit:.2f}", "0.00", "0.00", "", ""])
+        for i, p in enumerate(profits):
+            w.writerow([2 * i + 2, "2023.01.02 10:00", 0, "1.1", "0.1", "0.00", "-0.25", "0.00", "EURUSD", ""])
+            w.writerow([2 * i + 3, "2023.01.02 12:00", 1, "1.1", "0.1", f"{p + 0.5:.2f}", "-0.25", "0.00", "EURUSD", ""])
+    report = {"initial_deposit": deposit, "total_net_profit": round(sum(profits), 2), "inputs": {"n": len(profits)}}
+    (run_dir / "report.json").write_text(json.dumps(report), encoding="utf-8")
+    return run_dir
+
+
+class TestMonteCarlo:
+    """Tests de la simulación vectorizada"""
+
+    def test_curve_stats_matches_loop(self):
+        """Test que beneficio y drawdown por fila coinciden con recorrer la curva trade a trade"""
+        rng = np.random.default_rng(3)
+        pnl = rng.normal(0, 50, size=(20, 30))
+        profit, dd = curve_stats(pnl, 1000.0)
+        for row, p, d in zip(pnl, profit, dd):
+            balance = peak = 1000.0
+            worst = 0.0
+            for x in row:
+                balance += x
+                peak = max(peak, balance)
+                worst = max(worst, (peak - balance) / peak * 100.0)
+            assert p == pytest.approx(row.sum()) and d == pytest.approx(worst)
+
+    def test_methods(self):
+        """Test que shuffle conserva el beneficio, skip=0 reproduce lo observado y la semilla fija el resultado"""
+        pnl = np.random.default_rng(5).normal(3, 25, 200)
+        res = monte_carlo(pnl, 1000.0, n_sims=500, skip_prob=0.0, seed=7)
+        obs = res["observed"]
+        assert res["shuffle"]["profit_p05"] == res["shuffle"]["profit_p95"] == obs["profit"]
+        assert res["shuffle"]["dd_p05"] <= res["shuffle"]["dd_p50"] <= res["shuffle"]["dd_p95"]
+        assert res["skip"]["dd_p50"] == obs["dd"] and res["skip"]["profit_p50"] == obs["profit"]
+        assert res["bootstrap"]["profit_p05"] < obs["profit"] < res["bootstrap"]["profit_p95"]
+        again = monte_carlo(pnl, 1000.0, n_sims=500, skip_prob=0.0, seed=7)
+        assert again["bootstrap"] == res["bootstrap"]
+
+    def test_blocks_bound_memory(self, monkeypatch):
+        """Test que con bloques pequeños salen tantas simulaciones como se piden"""
+        monkeypatch.setattr(robustness, "MAX_CELLS", 100)
+        res = monte_carlo(np.arange(-10.0, 40.0), 1000.0, n_sims=37, methods=("bootstrap",))
+        assert res["n_sims"] == 37 and "bootstrap" in res and "shuffle" not in res
+
+    def test_unknown_method(self):
+        """Test que un método desconocido falla con la lista de disponibles"""
+        with pytest.raises(RuntimeError, match="Método de Monte Carlo desconocido"):
+            monte_carlo([1.0, 2.0], 1000.0, methods=("jackknife",))
+
+
+class TestRanking:
+    """Tests del ranking secundario sobre runs ya ejecutados"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_lucky_run_drops(self):
+        """Test que un run que depende de un único trade enorme baja frente a uno regular"""
+        runs = Path(self.temp_dir) / "MT5_SO"
+        steady = write_run(runs / "steady", [10.0] * 40)
+        lucky = write_run(runs / "lucky", [-5.0] * 39 + [600.0])
+        assert load_trades(steady / "trades.csv").tolist() == [10.0] * 40
+
+        rows = study_runs(runs)
+        assert [r["run_id"] for r in rows] == ["lucky", "steady"]
+        ranked = rank_runs(rows, key="bootstrap.profit_p05", n_sims=1000)
+        assert [(r["run_id"], r["primary_rank"]) for r in ranked] == [("steady", 2), ("lucky", 1)]
+        assert ranked[0]["robust"]["ms"] < 1000
+        by_dd = rank_runs(rows, key="shuffle.dd_p95", n_sims=200)
+        assert by_dd[0]["run_id"] == "steady"
+
+    def test_deals_become_one_result_per_position(self):
+        """Test que balance se ignora, la comisión de entrada va con la salida y un cierre a cero cuenta"""
+        path = Path(self.temp_dir) / "trades.csv"
+        with open(path, "w", encoding="latin-1", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["ticket", "time", "type", "price", "volume", "profit", "commission", "swap", "symbol", "comment"])
+            w.writerow([1, "2023.01.02 00:00", 2, "0.0", "0.00", "10000.00", "0.00", "0.00", "", ""])
+            w.writerow([2, "2023.01.02 10:00", 1, "1.1", "0.2", "0.00", "-1.00", "0.00", "EURUSD", ""])
+            w.writerow([3, "2023.01.02 12:00", 0, "1.1", "0.2", "30.00", "-1.00", "-0.50", "EURUSD", ""])
+            w.writerow([4, "2023.01.03 10:00", 0, "1.1", "0.1", "0.00", "0.00", "0.00", "EURUSD", ""])
+            w.writerow([5, "2023.01.03 12:00", 1, "1.1", "0.1", "0.00", "0.00", "0.00", "EURUSD", ""])
+            w.writerow([6, "2023.01.04 10:00", 0, "1.1", "0.1", "0.00", "-0.50", "0.00", "EURUSD", "abierta"])
+        assert load_trades(path).tolist() == [27.5, 0.0]
+
+    def test_missing_trades_goes_last(self):
+        """Test que un run sin trades.csv queda al final sin cortar el ranking"""
+        runs = Path(self.temp_dir) / "MT5_SO"
+        write_run(runs / "ok", [5.0, -2.0, 7.0])
+        (runs / "empty").mkdir()
+        rows = [{"run_id": "empty", "value": 50.0, "run_dir": runs / "empty"},
+                {"run_id": "ok", "value": 10.0, "run_dir": runs / "ok"}]
+        ranked = rank_runs(rows, n_sims=100)
+        assert [r["run_id"] for r in ranked] == ["ok", "empty"] and ranked[1]["score"] is None
+
+    def test_study_top_k_without_new_runs(self, make_cfg):
+        """Test que el top-K de un grid contra el emulador se re-ordena leyendo sólo sus artefactos"""
+        root = self.temp_dir
+        cfg = make_cfg(root, backend="emulator", space={"bb_period": ["choice", [10, 20, 30, 40]]}, sampler="grid",
+                       inputs={}, to="2023.06.30")
+        logs = os.path.join(root, "logs")
+        opt.run_grid_bounded(cfg, "terminal64.exe", 30, 0, 2, True, log_dir=logs)
+        runs_root = opt.get_layout(cfg).common_mt5_so_dir
+        n_runs = len(list(runs_root.iterdir()))
+        rows = study_runs(Path(logs), runs_root, top=3)
+        assert len(rows) == 3 and rows[0]["value"] >= rows[-1]["value"]
+        ranked = rank_runs(rows, n_sims=300)
+        assert sorted(r["rank"] for r in ranked) == [1, 2, 3]
+        assert all(r["robust"]["trades"] > 0 for r in ranked)
+        assert len(list(runs_root.iterdir())) == n_runs
+
+    def test_cli_run(self, capsys):
+        """Test que la CLI analiza un run y guarda el JSON"""
+        run = write_run(Path(self.temp_dir) / "r1", [4.0, -1.0, 3.0, -2.0, 6.0])
+        out = Path(self.temp_dir) / "mc.json"
+        assert robustness.main(["--run", str(run), "--sims", "200", "--out", str(out)]) == 0
+        data = json.loads(out.read_text(encoding="utf-8"))
+        assert data[str(run)]["observed"]["profit"] == 10.0
+        assert "shuffle" in capsys.readouterr().out
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
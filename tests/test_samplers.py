@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Tests unitarios para samplers.py"""
+import pytest
+
+optuna = pytest.importorskip("optuna")
+
+import optimizer_v2 as opt
+from optimizer_v2 import SearchCfg
+from samplers import (SAMPLERS, HaltonSampler, StartupSampler, benchmark, build_sampler,
+                      map_unit, register_sampler)
+
+
+class TestRegistry:
+    """Tests del registro y de la construcción desde search.sampler"""
+
+    def test_aliases_and_options(self):
+        """Test que los alias resuelven y las opciones de TPE llegan al sampler"""
+        assert isinstance(build_sampler(None), optuna.samplers.TPESampler)
+        assert isinstance(build_sampler("TPESampler"), optuna.samplers.TPESampler)
+        assert isinstance(build_sampler("RandomSampler"), optuna.samplers.RandomSampler)
+        tpe = build_sampler({"type": "tpe", "n_startup_trials": 3, "seed": 1})
+        assert tpe._n_startup_trials == 3
+        with pytest.raises(RuntimeError, match="Sampler desconocido"):
+            build_sampler("annealing")
+
+    def test_register_custom_sampler(self):
+        """Test que un sampler registrado fuera del módulo queda disponible por nombre"""
+        @register_sampler("mi_random")
+        def _factory(opts, grid):
+            return optuna.samplers.RandomSampler(seed=opts.get("seed", 0))
+        try:
+            assert isinstance(build_sampler({"type": "mi_random"}), optuna.samplers.RandomSampler)
+        finally:
+            SAMPLERS.pop("mi_random")
+
+    def test_startup_wraps_main_sampler(self):
+        """Test que startup antepone el diseño QMC y fija n_startup_trials de TPE"""
+        s = build_sampler({"type": "tpe", "startup": {"qmc_type": "halton", "n_trials": 5}})
+        assert isinstance(s, StartupSampler) and s.n_startup == 5
+        assert isinstance(s.startup, HaltonSampler)
+        assert s.main._n_startup_trials == 5
+
+    def test_constraints_warn_without_tpe(self, capsys):
+        """Test que search.constraints avisa con samplers que no aprenden la región no factible"""
+        def cons(trial):
+            return [0.0]
+        build_sampler("tpe", constraints_func=cons)
+        assert "WARNING" not in capsys.readouterr().out
+        build_sampler("random", constraints_func=cons)
+        assert "sólo TPE" in capsys.readouterr().out
+        build_sampler({"type": "tpe", "startup": {"qmc_type": "halton", "n_trials": 4}}, constraints_func=cons)
+        assert "los 4 trials del startup QMC" in capsys.readouterr().out
+
+    def test_optional_dependencies_raise_with_hint(self):
+        """Test que Sobol y CMA-ES piden su paquete si no está instalado"""
+        try:
+            import scipy  # noqa: F401
+        except ImportError:
+            with pytest.raises(RuntimeError, match="pip install scipy"):
+                build_sampler({"type": "qmc", "qmc_type": "sobol"})
+        try:
+            import cmaes  # noqa: F401
+        except ImportError:
+            with pytest.raises(RuntimeError, match="pip install cmaes"):
+                build_sampler("cmaes")
+
+    def test_cmaes_builds_when_available(self):
+        """Test que CMA-ES se construye con un sampler independiente para categóricas"""
+        pytest.importorskip("cmaes")
+        s = build_sampler({"type": "cmaes", "sigma0": 0.5})
+        assert isinstance(s, optuna.samplers.CmaEsSampler)
+
+    def test_resolve_sampler_uses_registry(self):
+        """Test que optimizer_v2 delega en el registro y el grid sigue saliendo de search.space"""
+        assert isinstance(opt._resolve_sampler(SearchCfg(space={}, sampler="random")), optuna.samplers.RandomSampler)
+        grid = opt._resolve_sampler(SearchCfg(space={"a": ["choice", [1, 2]]}, sampler="grid"))
+        assert isinstance(grid, optuna.samplers.GridSampler)
+
+
+class TestHalton:
+    """Tests del diseño Halton propio"""
+
+    def test_points_fill_unit_interval(self):
+        """Test que sin scramble la base 2 es la secuencia de van der Corput"""
+        s = HaltonSampler(scramble=False)
+        s._dim("x")
+        assert [s.point(i, 0) for i in range(1, 5)] == [0.5, 0.25, 0.75, 0.125]
+
+    def test_map_unit_respects_distributions(self):
+        """Test que u en [0,1) cae dentro de cada distribución"""
+        D = optuna.distributions
+        assert map_unit(0.999, D.IntDistribution(5, 9)) == 9
+        assert map_unit(0.0, D.IntDistribution(10, 40, step=5)) == 10
+        assert map_unit(0.5, D.FloatDistribution(1.0, 4.0, step=0.5)) == 2.5
+        assert map_unit(0.99, D.CategoricalDistribution(["H1", "H4", "H6"])) == "H6"
+        assert 1e-3 <= map_unit(0.5, D.FloatDistribution(1e-3, 1.0, log=True)) <= 1.0
+
+    def test_study_covers_space(self):
+        """Test que 16 trials Halton cubren los cuatro cuadrantes y todas las categorías"""
+        study = optuna.create_study(sampler=HaltonSampler(seed=3))
+        seen = []
+
+        def obj(t):
+            x, y = t.suggest_float("x", 0, 1), t.suggest_float("y", 0, 1)
+            tf = t.suggest_categorical("tf", ["H1", "H4", "H6"])
+            seen.append((x >= 0.5, y >= 0.5, tf))
+            return x + y
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study.optimize(obj, n_trials=16)
+        assert {(a, b) for a, b, _ in seen} == {(False, False), (False, True), (True, False), (True, True)}
+        assert {tf for _a, _b, tf in seen} == {"H1", "H4", "H6"}
+
+
+class TestBenchmark:
+    """Tests del harness de eficiencia de muestreo"""
+
+    def test_benchmark_reports_curves_and_skips(self):
+        """Test que el benchmark da curvas monótonas y omite samplers sin dependencias"""
+        result = benchmark({"random": "random", "halton": {"type": "tpe", "startup": {"qmc_type": "halton", "n_trials": 6}},
+                            "desconocido": "annealing"}, n_trials=12, seeds=(0, 1), checkpoints=(6,))
+        curve = result["random"]["curve"]
+        assert len(curve) == 12 and curve == sorted(curve)
+        assert set(result["halton"]["best_at"]) == {"6", "12"}
+        assert "Sampler desconocido" in result["desconocido"]["skipped"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Tests unitarios para scheduling.py"""
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+from scheduling import CostModel, SchedulePlan, TimeBudget, chunked_lpt, lpt_order, makespan, trial_features
+
+
+class TestTrialFeatures:
+    """Tests para los rasgos de coste"""
+
+    def test_bars_scale_with_timeframe(self):
+        """Test que M30 tiene 12 veces más barras que H6 en el mismo rango"""
+        m30 = trial_features("M30", 4, "2023.01.01", "2023.12.31")
+        h6 = trial_features("h6", 4, "2023-01-01", "2023-12-31")
+        assert m30["span_days"] == 364
+        assert m30["bars"] == pytest.approx(12 * h6["bars"])
+        assert h6["timeframe"] == "H6"
+
+    def test_unknown_inputs(self):
+        """Test que timeframes o fechas desconocidas no rompen"""
+        f = trial_features("X9", 0, "", "")
+        assert f["bars"] is None and f["span_days"] is None
+
+
+class TestCostModel:
+    """Tests para el estimador de runtime"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.model = CostModel()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_empty_model_unknown(self):
+        """Test que sin historia la predicción es desconocida"""
+        assert self.model.predict(trial_features("H1", 1, "2023.01.01", "2023.12.31")) is None
+
+    def test_group_scales_with_span(self):
+        """Test que el grupo predice proporcional al rango de fechas"""
+        self.model.observe(trial_features("H1", 1, "2023.01.01", "2023.07.01"), 181.0)
+        full = trial_features("H1", 1, "2023.01.01", "2023.12.31")
+        assert self.model.predict(full) == pytest.approx(364.0)
+
+    def test_global_fit_for_unseen_group(self):
+        """Test que un grupo no visto usa el ajuste lineal por nº de barras"""
+        for tf, secs in (("M30", 620.0), ("H1", 320.0), ("H4", 95.0)):
+            self.model.observe(trial_features(tf, 1, "2023.01.01", "2023.12.31"), secs)
+        m15 = self.model.predict(trial_features("M15", 1, "2023.01.01", "2023.12.31"))
+        h6 = self.model.predict(trial_features("H6", 1, "2023.01.01", "2023.12.31"))
+        assert m15 > 620.0 > h6 >= 1.0
+
+    def test_accuracy_tracking(self):
+        """Test de MAE/MAPE/sesgo entre predicho y real"""
+        self.model.record(100.0, 120.0, trial=0, features={"timeframe": "H1"})
+        self.model.record(100.0, 80.0, trial=1)
+        self.model.record(None, 50.0)
+        acc = self.model.accuracy()
+        assert acc["n"] == 2
+        assert acc["mae_seconds"] == 20.0
+        assert acc["bias_seconds"] == 0.0
+        assert acc["recent"][0] == {"trial": 0, "timeframe": "H1", "predicted": 100.0, "actual": 120.0}
+
+    def test_save_and_load(self):
+        """Test de persistencia del modelo entre studies"""
+        f = trial_features("H2", 0, "2023.01.01", "2023.12.31")
+        self.model.observe(f, 200.0)
+        path = self.temp_dir / "cost_model.json"
+        self.model.save(path)
+        assert CostModel.load(path).predict(f) == pytest.approx(200.0)
+        (self.temp_dir / "roto.json").write_text("{no json")
+        assert CostModel.load(self.temp_dir / "roto.json").groups == {}
+
+
+class TestLpt:
+    """Tests para el orden longest-first"""
+
+    def test_unknown_first_then_longest(self):
+        """Test que los desconocidos van primero y luego de mayor a menor"""
+        costs = {"a": 10.0, "b": None, "c": 50.0, "d": 10.0}
+        assert lpt_order(["a", "b", "c", "d"], costs.get) == ["b", "c", "a", "d"]
+
+    def test_chunked_keeps_blocks(self):
+        """Test que el orden LPT se aplica dentro de cada bloque"""
+        out = list(chunked_lpt(iter([1, 5, 3, 9, 2]), float, chunk=3))
+        assert out == [5, 3, 1, 9, 2]
+
+    def test_lpt_reduces_makespan(self):
+        """Test que LPT evita el slot rezagado del final"""
+        durations = [1.0] * 12 + [12.0]
+        fifo = makespan(durations, 4)
+        lpt = makespan(lpt_order(durations, lambda d: d), 4)
+        assert fifo == 15.0
+        assert lpt == 12.0
+
+    def test_schedule_plan_counts_unknown(self):
+        """Test que el plan acumula por slot y los trials sin previsión no suman"""
+        plan = SchedulePlan(2)
+        assert plan.summary()["predicted_makespan_seconds"] is None
+        for d in (None, 5.0, 3.0, 4.0):
+            plan.add(d)
+        assert plan.summary() == {"n_slots": 2, "launched": 4, "unknown_cost": 1,
+                                  "predicted_serial_seconds": 12.0, "predicted_makespan_seconds": 7.0}
+
+
+class TestTimeBudget:
+    """Tests para el presupuesto de --timeout"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.now = 0.0
+        self.budget = TimeBudget(100, grace=10, clock=lambda: self.now)
+
+    def test_fits_only_what_remains(self):
+        """Test que sólo cabe lo que no supera el tiempo restante"""
+        assert self.budget.fits(80.0)
+        self.now = 30.0
+        assert not self.budget.fits(80.0)
+        assert self.budget.fits(None)
+        assert self.budget.summary()["skipped"] == 1
+
+    def test_drain_then_cancel(self):
+        """Test que al vencer no cabe nada y tras el drenaje se cancela lo que sigue en vuelo"""
+        self.now = 100.0
+        assert self.budget.expired() and not self.budget.fits(None)
+        assert self.budget.cancel_reason() is None
+        self.now = 110.0
+        assert "presupuesto" in self.budget.cancel_reason()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Tests unitarios para sharding.py"""
+import pytest
+import functools
+import json
+import os
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+
+import optimizer_v2 as opt
+from sharding import ShardedRunner, split_range, stitch, write_stitched, _read_trades
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config de un EA sin estado con un espacio TPE mínimo"""
+    return functools.partial(make_cfg, space={"a": ["int", 1, 5]}, sampler="tpe", inputs={}, stateless=True)
+
+
+def write_run(run_dir: Path, deposit: float, final: float, trades):
+    """Carpeta de run como la deja so_report.mqh"""
+    gp = sum(p for p in trades if p > 0)
+    gl = sum(p for p in trades if p < 0)
+    rows = [{"ticket": i, "time": f"2023.01.{i + 1:02d} 10:00", "type": "buy", "price": 1.1, "volume": 0.1,
+             "profit": p, "commission": 0, "swap": 0, "symbol": "EURUSD", "comment": ""} for i, p in enumerate(trades)]
+    report = {"initial_deposit": deposit, "final_balance": final, "gross_profit": gp, "gross_loss": gl,
+              "total_trades": len(trades), "max_dd_rel_pct": 1.0}
+    write_stitched(run_dir, report, rows)
+
+
+class TestSplitAndStitch:
+    """Tests de división de rangos y cosido de resultados"""
+
+    def test_split_contiguous_covers_range(self):
+        """Test que los tramos son contiguos y cubren el rango completo"""
+        ranges = split_range("2023.01.01", "2023.12.31", 4)
+        assert ranges[0][0] == "2023.01.01" and ranges[-1][1] == "2023.12.31"
+        assert len(ranges) == 4
+        assert ranges[1][0] == "2023.04.02"
+        assert split_range("2023.01.01", "2023.01.02", 5) == [("2023.01.01", "2023.01.01"), ("2023.01.02", "2023.01.02")]
+
+    def test_additive_sums_profits(self):
+        """Test que con lote fijo los beneficios de los tramos se suman"""
+        parts = [
+            {"report": {"initial_deposit": 1000, "final_balance": 1100, "gross_profit": 150, "gross_loss": -50,
+                        "total_trades": 2}, "trades": [{"profit": "150"}, {"profit": "-50"}]},
+            {"report": {"initial_deposit": 1000, "final_balance": 950, "gross_profit": 0, "gross_loss": -50,
+                        "total_trades": 1}, "trades": [{"profit": "-50"}]},
+        ]
+        report, trades = stitch(parts, 1000, "additive")
+        assert report["final_balance"] == 1050.0
+        assert report["total_trades"] == 3
+        assert report["profit_factor"] == 1.5
+        # Curva cosida: 1000 -> 1150 -> 1100 -> 1050: DD = 100/1150
+        assert report["max_dd_rel_pct"] == round(100 / 1150 * 100, 2)
+        assert len(trades) == 3
+
+    def test_multiplicative_compounds_deposit(self):
+        """Test que con lote proporcional el capital se encadena y los trades se escalan"""
+        parts = [
+            {"report": {"initial_deposit": 1000, "final_balance": 1100}, "trades": [{"profit": "100"}]},
+            {"report": {"initial_deposit": 1000, "final_balance": 1100}, "trades": [{"profit": "100"}]},
+        ]
+        report, trades = stitch(parts, 1000, "multiplicative")
+        assert report["final_balance"] == 1210.0
+        assert trades[1]["profit"] == "110.00"
+        with pytest.raises(RuntimeError):
+            stitch(parts, 1000, "geometric")
+
+
+class TestShardedRunner:
+    """Tests del runner con sharding sobre un run_single simulado"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.runs = Path(self.temp_dir) / "MT5_SO"
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def fake_run_single(self):
+        """Un trade por tramo con beneficio igual a sus días; un run por llamada"""
+        def run(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            days = len(split_range(cfg.test.from_, cfg.test.to, 10_000))
+            with self.lock:
+                rid = f"run_{len(self.calls)}"
+                self.calls.append((cfg.test.from_, cfg.test.to))
+            final = cfg.test.deposit + days
+            write_run(self.runs / rid, cfg.test.deposit, final, [float(days)])
+            return True, final, rid, self.runs / rid
+        return run
+
+    def test_runs_shards_and_stitches(self, make_cfg):
+        """Test que un trial se ejecuta en K tramos y se cose en una carpeta propia"""
+        runner = ShardedRunner(self.fake_run_single(), 3, drift_every=0)
+        ok, fb, rid, run_dir = runner(make_cfg(self.temp_dir), "exe", 10, False, base_overrides={"a": 1})
+        assert ok and fb == 1365.0
+        assert sorted(self.calls) == [("2023.01.01", "2023.05.02"), ("2023.05.03", "2023.08.31"),
+                                      ("2023.09.01", "2023.12.31")]
+        assert rid.endswith("_k3")
+        report = json.loads((run_dir / "report.json").read_text(encoding="utf-8"))
+        assert report["shard_ranges"][0] == ["2023.01.01", "2023.05.02"]
+        assert len(_read_trades(run_dir / "trades.csv")) == 3
+        assert (run_dir / "_READY").exists()
+
+    def test_drift_check_disables_sharding(self, make_cfg, capsys):
+        """Test que la comparación periódica desactiva el sharding si hay deriva"""
+        full_calls = []
+        sharded = self.fake_run_single()
+
+        def run(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            if cfg.test.from_ == "2023.01.01" and cfg.test.to == "2023.12.31":
+                full_calls.append(1)
+                return True, 1765.0, "full", None
+            return sharded(cfg, exe, guard, auto_close, base_overrides, layout)
+
+        runner = ShardedRunner(run, 2, drift_every=2, tolerance=0.05)
+        cfg = make_cfg(self.temp_dir)
+        assert runner(cfg, "exe", 10, False)[1] == 1365.0
+        assert runner(cfg, "exe", 10, False)[1] == 1765.0  # la comprobación devuelve el rango completo
+        assert runner.disabled and "Deriva" in capsys.readouterr().out
+        runner(cfg, "exe", 10, False)
+        assert len(full_calls) == 2
+        assert runner.summary()["max_drift"] == 0.4
+
+    def test_run_optuna_requires_stateless_flag(self, make_cfg, monkeypatch):
+        """Test que --shards exige el EA marcado y se aplica en run_optuna"""
+        pytest.importorskip("optuna")
+        monkeypatch.setattr(opt, "run_single", self.fake_run_single())
+        logs = os.path.join(self.temp_dir, "logs")
+        with pytest.raises(RuntimeError, match="stateless_across_boundaries"):
+            opt.run_optuna(make_cfg(self.temp_dir, stateless=False), "exe", 10, n_trials=1, n_jobs=1,
+                           auto_close=False, log_dir=logs, shards=2)
+        study = opt.run_optuna(make_cfg(self.temp_dir), "exe", 10, n_trials=2, n_jobs=1, auto_close=False,
+                               log_dir=logs, shards=2, shard_drift_every=0)
+        assert len(self.calls) == 4
+        assert study.best_value == 365.0
+        assert study.user_attrs["sharding"]["shards"] == 2
+
+    def test_shard_runs_take_slots_from_the_pool(self, make_cfg, monkeypatch):
+        """Test que cada tramo corre con el contexto del trial en un slot propio del pool, nunca compartido"""
+        pytest.importorskip("optuna")
+        import time
+        sharded = self.fake_run_single()
+        active, seen, clashes = {}, [], []
+
+        def run(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            ctx = opt.current_trial_context()
+            with self.lock:
+                seen.append((ctx.trial, ctx.slot, ctx.artifacts))
+                if active.get(ctx.slot):
+                    clashes.append(ctx.slot)
+                active[ctx.slot] = True
+            time.sleep(0.05)
+            try:
+                return sharded(cfg, exe, guard, auto_close, base_overrides, layout)
+            finally:
+                with self.lock:
+                    active[ctx.slot] = False
+
+        monkeypatch.setattr(opt, "run_single", run)
+        study = opt.run_optuna(make_cfg(self.temp_dir), "exe", 10, n_trials=4, n_jobs=3, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "logs"), shards=2, shard_drift_every=0,
+                               artifacts="lean", finalists=0)
+        assert len(seen) == 8 and clashes == []
+        assert all(slot in (0, 1, 2) and trial is not None and level == "lean" for trial, slot, level in seen)
+        assert study.best_value == 365.0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Tests unitarios para status.py"""
+import pytest
+import json
+import urllib.request
+import urllib.error
+from status import ProgressTracker, StatusServer
+
+
+class TestProgressTracker:
+    """Tests para la clase ProgressTracker"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.tracker = ProgressTracker(n_trials=10, n_slots=2)
+
+    def test_counts_and_best(self):
+        """Test de contadores completados/fallidos y mejor valor"""
+        self.tracker.trial_started(0, 0, {"timeframe": "H1"})
+        self.tracker.trial_started(1, 1, {"timeframe": "M30"})
+        self.tracker.trial_finished(0, 0, 25.0, "complete", params={"timeframe": "H1"}, seconds=10)
+        self.tracker.trial_finished(1, 1, float("-inf"), "timeout", params={"timeframe": "M30"}, seconds=300)
+
+        snap = self.tracker.snapshot()
+        assert snap["completed"] == 1
+        assert snap["failed"] == 1
+        assert snap["in_flight"] == []
+        assert snap["best"] == {"trial": 0, "value": 25.0, "params": {"timeframe": "H1"}}
+        assert snap["timeframes"]["M30"]["mean_seconds"] == 300
+        assert snap["eta_seconds"] is not None
+
+    def test_in_flight_tracks_phase(self):
+        """Test que los eventos de fase actualizan el trial en curso"""
+        self.tracker.trial_started(3, 1)
+        self.tracker.event("phase", phase="launch", trial=3, slot=1, run_id="run_3", timeframe="H4")
+        flight = self.tracker.snapshot()["in_flight"][0]
+        assert flight["trial"] == 3
+        assert flight["phase"] == "launch"
+        assert flight["run_id"] == "run_3"
+        assert flight["timeframe"] == "H4"
+        assert self.tracker.snapshot()["slots"]["1"]["running"] is True
+
+    def test_slowest_phase(self):
+        """Test que la fase con mayor media se reporta como la más lenta"""
+        self.tracker.event("phase", phase="wait", trial=0, seconds=120.0)
+        self.tracker.event("phase", phase="teardown", trial=0, seconds=45.0)
+        self.tracker.event("phase", phase="wait", trial=1, seconds=80.0)
+        snap = self.tracker.snapshot()
+        assert snap["slowest_phase"] == "wait"
+        assert snap["phases"]["wait"]["mean_seconds"] == 100.0
+
+    def test_other_events_ignored(self):
+        """Test que eventos que no son de fase no alteran el estado"""
+        self.tracker.event("optimization_start", symbol="EURUSD")
+        assert self.tracker.snapshot()["phases"] == {}
+
+    def test_providers_extend_snapshot(self):
+        """Test que los providers añaden secciones al snapshot"""
+        self.tracker.providers["cost_model"] = lambda: {"n": 3, "mape": 0.1}
+        assert self.tracker.snapshot()["cost_model"] == {"n": 3, "mape": 0.1}
+
+    def test_status_line(self):
+        """Test de la línea de estado para consola"""
+        assert self.tracker.status_line().startswith("STATUS 0/10")
+
+
+class TestStatusServer:
+    """Tests para el endpoint HTTP de estado"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.tracker = ProgressTracker(n_trials=5)
+        self.server = StatusServer(self.tracker, port=0).start()
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        self.server.stop()
+
+    def test_serves_snapshot_json(self):
+        """Test que GET /status devuelve el snapshot en JSON"""
+        self.tracker.trial_started(0, 0)
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.server.port}/status", timeout=5) as r:
+            data = json.loads(r.read().decode("utf-8"))
+        assert data["n_trials"] == 5
+        assert data["in_flight"][0]["trial"] == 0
+
+    def test_unknown_path_404(self):
+        """Test que rutas desconocidas devuelven 404"""
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{self.server.port}/nope", timeout=5)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Tests unitarios para terminal_layout.py"""
+import pytest
+import os
+import tempfile
+import shutil
+from pathlib import Path
+from terminal_layout import TerminalLayout
+
+
+class TestTerminalLayout:
+    """Tests para la clase TerminalLayout"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.root = Path(tempfile.mkdtemp())
+        self.layout = TerminalLayout(
+            terminal_hash="ABCDEF",
+            appdata=self.root / "appdata",
+            reports_dir=self.root / "reports",
+            ini_dir=self.root / "ini",
+        )
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.root)
+
+    def _add_agent(self, name, with_files=False):
+        agent = self.layout.tester_root / name
+        agent.mkdir(parents=True)
+        if with_files:
+            (agent / "MQL5" / "Files" / "MT5_SO").mkdir(parents=True)
+        # Garantiza un mtime distinto en sistemas con resolución gruesa
+        st = self.layout.tester_root.stat()
+        os.utime(self.layout.tester_root, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        return agent
+
+    def test_paths_by_hash(self):
+        """Test que las rutas se derivan de appdata + hash"""
+        base = self.root / "appdata" / "MetaQuotes" / "Terminal"
+        assert self.layout.profiles_tester_dir == base / "ABCDEF" / "MQL5" / "Profiles" / "Tester"
+        assert self.layout.experts_root_dir == base / "ABCDEF" / "MQL5" / "Experts"
+        assert self.layout.common_mt5_so_dir == base / "Common" / "Files" / "MT5_SO"
+
+    def test_portable_data_dir(self):
+        """Test que con data_dir (instalación portable) datos y agentes cuelgan de ella y Common de appdata"""
+        slot = self.root / "slots" / "slot_01"
+        layout = TerminalLayout("ABCDEF", self.root / "appdata", self.root / "reports", self.root / "ini", slot)
+        assert layout.terminal_data_dir == slot
+        assert layout.profiles_tester_dir == slot / "MQL5" / "Profiles" / "Tester"
+        assert layout.tester_root == slot / "Tester"
+        assert layout.common_mt5_so_dir == self.layout.common_mt5_so_dir
+
+    def test_run_artifact_names_are_stable(self):
+        """Test que los nombres por run no dependen de hash() salado por proceso"""
+        assert self.layout.set_name("run_x") == "params_run_x.set"
+        assert self.layout.ini_path("run_x") == self.root / "ini" / "run_x.ini"
+        assert self.layout.report_html("run_x") == self.root / "reports" / "report_run_x.html"
+
+    def test_validate_creates_dirs(self):
+        """Test que validate crea los directorios de trabajo"""
+        self.layout.validate()
+        assert self.layout.profiles_tester_dir.is_dir()
+        assert self.layout.common_mt5_so_dir.is_dir()
+        assert (self.root / "reports").is_dir()
+        assert (self.root / "ini").is_dir()
+
+    def test_validate_reports_unusable_dir(self):
+        """Test que un directorio imposible de crear produce error agregado"""
+        (self.root / "ini").write_text("no soy un directorio")
+        with pytest.raises(RuntimeError, match="inválido"):
+            self.layout.validate()
+
+    def test_no_tester_root(self):
+        """Test que sin carpeta Tester no hay agente local"""
+        assert self.layout.local_agent_files_dir() is None
+
+    def test_agent_dir_cached(self, monkeypatch):
+        """Test que el directorio del agente se cachea entre llamadas"""
+        self._add_agent("Agent-127.0.0.1-3000", with_files=True)
+        first = self.layout.local_agent_files_dir()
+        scans = []
+        monkeypatch.setattr(self.layout, "_scan_agent_dir", lambda: scans.append(1))
+        assert self.layout.local_agent_files_dir() == first
+        assert scans == []
+
+    def test_agent_dir_invalidated_when_agents_change(self):
+        """Test que aparecer/desaparecer agentes invalida la caché"""
+        a1 = self._add_agent("Agent-127.0.0.1-3000")
+        assert self.layout.local_agent_files_dir() == a1 / "MQL5" / "Files" / "MT5_SO"
+
+        a2 = self._add_agent("Agent-127.0.0.1-3001", with_files=True)
+        assert self.layout.local_agent_files_dir() == a2 / "MQL5" / "Files" / "MT5_SO"
+
+        shutil.rmtree(a2)
+        st = self.layout.tester_root.stat()
+        os.utime(self.layout.tester_root, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000_000))
+        assert self.layout.local_agent_files_dir() == a1 / "MQL5" / "Files" / "MT5_SO"
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
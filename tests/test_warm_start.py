@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Tests unitarios para warm_start.py"""
+import pytest
+import functools
+import json
+import os
+import tempfile
+import shutil
+from pathlib import Path
+
+import optimizer_v2 as opt
+from warm_start import (PriorTrial, apply_warm_start, downweight, load_prior_trials,
+                        map_to_space, range_overlap)
+
+SPACE = {"a": ["int", 10, 20], "b": ["float", 1.0, 2.0], "tf": ["choice", [5, 10, 15]]}
+
+
+@pytest.fixture
+def make_cfg(make_cfg):
+    """Config con SPACE y b fijo en ea.inputs"""
+    return functools.partial(make_cfg, space=SPACE, sampler="tpe", inputs={"b": 1.5}, to="2024.12.31")
+
+
+class TestLoadAndMap:
+    """Tests de carga de fuentes y adaptación al espacio"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_trials_jsonl_only_complete(self):
+        """Test que del JSONL sólo se toman trials completos con su rango de fechas"""
+        path = self.temp_dir / "MT5Optimizer.trials.jsonl"
+        lines = [
+            {"event": "optimization_start", "date_from": "2023.01.01", "date_to": "2023.12.31"},
+            {"event": "trial", "trial": 0, "params": {"a": 12}, "value": 50.0, "phase": "complete"},
+            {"event": "trial", "trial": 1, "params": {"a": 13}, "value": float("-inf"), "phase": "timeout"},
+            {"event": "phase", "phase": "launch"},
+        ]
+        path.write_text("\n".join(json.dumps(r) for r in lines) + "\n", encoding="utf-8")
+        trials = load_prior_trials([str(path)])
+        assert len(trials) == 1
+        assert trials[0].params == {"a": 12}
+        assert (trials[0].from_, trials[0].to) == ("2023.01.01", "2023.12.31")
+
+    def test_load_runs_dir_and_results_json(self):
+        """Test de carpetas de runs con report.json y de JSON de resultados"""
+        run = self.temp_dir / "runs" / "run_1"
+        run.mkdir(parents=True)
+        (run / "report.json").write_text(json.dumps({
+            "total_net_profit": 80.0, "timeframe": "PERIOD_H4", "start_date": "2023.01.01 00:00",
+            "end_date": "2023.06.30 00:00", "inputs": {"a": 15}}))
+        results = self.temp_dir / "results.json"
+        results.write_text(json.dumps({"trials": [{"params": {"a": 11}, "value": 5}, {"params": {}, "value": None}]}))
+        trials = load_prior_trials([str(self.temp_dir / "runs"), str(results)])
+        assert [t.value for t in trials] == [80.0, 5.0]
+        assert trials[0].params["timeframe"] == "H4"
+        with pytest.raises(RuntimeError):
+            load_prior_trials([str(self.temp_dir / "nope.json")])
+
+    def test_map_clips_snaps_fills_and_drops(self):
+        """Test de recorte, ajuste a opción cercana, relleno desde ea.inputs y descarte"""
+        mapped = map_to_space(PriorTrial({"a": 21, "tf": 11, "extra": 1}, 1.0), SPACE, {"b": 1.5})
+        assert mapped.params == {"a": 20, "b": 1.5, "tf": 10}
+        assert len(mapped.notes) == 3
+        assert map_to_space(PriorTrial({"a": 40, "tf": 5}, 1.0), SPACE, {"b": 1.5}) is None
+        assert map_to_space(PriorTrial({"a": 12, "tf": 5}, 1.0), SPACE, {}) is None
+
+
+class TestDownweight:
+    """Tests del ajuste por rango de fechas"""
+
+    def test_overlap(self):
+        """Test de intersección sobre unión de rangos"""
+        assert range_overlap("2023.01.01", "2023.12.31", "2023.01.01", "2023.12.31") == 1.0
+        assert range_overlap("2020.01.01", "2020.12.31", "2023.01.01", "2023.12.31") == 0.0
+        assert range_overlap(None, "2023.12.31", "2023.01.01", "2023.12.31") is None
+
+    def test_shrinks_mismatched_toward_median(self):
+        """Test que trials de otro rango se reescalan y encogen hacia la mediana"""
+        trials = [
+            PriorTrial({}, 100.0, "2023.01.01", "2024.12.31"),
+            PriorTrial({}, 0.0, "2023.01.01", "2024.12.31"),
+            PriorTrial({}, 100.0, "2023.01.01", "2023.12.31"),
+        ]
+        out = downweight(trials, "2023.01.01", "2024.12.31")
+        assert out[0].value == 100.0 and out[1].value == 0.0
+        # 1 año -> 2 años: ~200 reescalado, encogido hacia la mediana (100) con peso ~0.5
+        assert 100.0 < out[2].value < 160.0
+        assert "solapamiento" in out[2].notes[-1]
+
+
+class TestApplyWarmStart:
+    """Tests de inyección/encolado en un study de Optuna"""
+
+    def setup_method(self):
+        """Setup antes de cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.results = os.path.join(self.temp_dir, "results.json")
+        rows = [{"params": {"a": a, "b": 1.2, "tf": 10}, "value": float(a)} for a in range(10, 16)]
+        rows.append({"params": {"a": 99, "b": 1.2, "tf": 10}, "value": 1000.0})
+        with open(self.results, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+
+    def teardown_method(self):
+        """Cleanup después de cada test"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_inject_adds_completed_trials(self, make_cfg):
+        """Test que inject añade los previos como COMPLETE sin ejecutarlos"""
+        optuna = pytest.importorskip("optuna")
+        study = optuna.create_study(direction="maximize")
+        summary = apply_warm_start(study, make_cfg(self.temp_dir), [self.results])
+        assert summary == {"loaded": 7, "dropped": 1, "mapped": 0, "applied": 6, "mode": "inject"}
+        assert study.best_value == 15.0
+        assert all(t.state == optuna.trial.TrialState.COMPLETE for t in study.trials)
+
+    def test_enqueue_top(self, make_cfg):
+        """Test que enqueue deja en cola los mejores para re-evaluarlos"""
+        optuna = pytest.importorskip("optuna")
+        study = optuna.create_study(direction="maximize")
+        apply_warm_start(study, make_cfg(self.temp_dir), [self.results], mode="enqueue", top=2)
+        waiting = study.get_trials(states=(optuna.trial.TrialState.WAITING,))
+        assert [t.system_attrs["fixed_params"]["a"] for t in waiting] == [15, 14]
+
+    def test_run_optuna_uses_warm_start(self, make_cfg, monkeypatch):
+        """Test que run_optuna inyecta los previos y sólo ejecuta los trials pedidos"""
+        pytest.importorskip("optuna")
+        runs = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            runs.append(base_overrides)
+            return True, 1000.0 + base_overrides["a"], "rid", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        study = opt.run_optuna(make_cfg(self.temp_dir), "exe", 10, n_trials=2, n_jobs=1, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "logs"), warm_start_from=[self.results])
+        assert len(runs) == 2
+        assert len(study.trials) == 8
+        assert study.user_attrs["warm_start"]["applied"] == 6
+
+    def test_lean_finalists_keep_enqueued_trials(self, make_cfg, monkeypatch):
+        """Test que los encolados sí se ejecutan y pueden ser finalistas; los inyectados no"""
+        pytest.importorskip("optuna")
+        levels = []
+
+        def fake_run_single(cfg, exe, guard, auto_close, base_overrides=None, layout=None):
+            levels.append((opt.current_trial_context().artifacts, base_overrides["a"]))
+            # Peor que cualquier previo: un inyectado ganaría si se colara entre los finalistas
+            return True, base_overrides["a"] - 100.0, f"run_{len(levels)}", None
+
+        monkeypatch.setattr(opt, "run_single", fake_run_single)
+        cfg = make_cfg(self.temp_dir, sampler="random")
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=1, n_jobs=1, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "enqueue"), warm_start_from=[self.results],
+                               warm_start_mode="enqueue", artifacts="lean", finalists=1)
+        assert levels == [("lean", 15), ("rich", 15)]
+        assert [t["number"] for t in study.user_attrs["finalists"]["trials"]] == [0]
+
+        levels.clear()
+        study = opt.run_optuna(cfg, "exe", 10, n_trials=1, n_jobs=1, auto_close=False,
+                               log_dir=os.path.join(self.temp_dir, "inject"), warm_start_from=[self.results],
+                               artifacts="lean", finalists=1)
+        assert [lv for lv, _ in levels] == ["lean", "rich"] and levels[0][1] == levels[1][1]
+        assert study.user_attrs["finalists"]["trials"][0]["number"] == 6
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
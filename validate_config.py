@@ -6,12 +6,16 @@ from pathlib import Path
 class ConfigValidator:
     REQUIRED = {'mt5': ['terminal_path', 'terminal_hash'], 'test': ['symbol', 'timeframe', 'from', 'to', 'deposit', 'leverage'], 'ea': ['name']}
     TIMEFRAMES = ['M30', 'H1', 'H2', 'H3', 'H4', 'H6', 'D1']
+    BACKENDS = ['windows', 'wine', 'emulator']
     
     def __init__(self, path): self.path, self.errors, self.warnings = Path(path), [], []
     
-    def validate(self):
-        try: self.cfg = json.loads(Path(self.path).read_text())
-        except Exception as e: self.errors.append(f"Error: {e}"); return False
+    def check(self, data=None):
+        """Valida sin imprimir; `data` permite pasar el config ya leído (p.ej. YAML o legacy)"""
+        if data is None:
+            try: data = json.loads(Path(self.path).read_text())
+            except Exception as e: self.errors.append(f"Error: {e}"); return False
+        self.cfg = data
         
         for b in ['mt5', 'test', 'ea']:
             if b not in self.cfg: self.errors.append(f"Falta bloque: {b}")
@@ -19,7 +23,10 @@ class ConfigValidator:
         if 'mt5' in self.cfg:
             for f in self.REQUIRED['mt5']:
                 if not self.cfg['mt5'].get(f): self.errors.append(f"Falta mt5.{f}")
-            if 'terminal_path' in self.cfg['mt5'] and not Path(self.cfg['mt5']['terminal_path']).exists():
+            backend = str(self.cfg['mt5'].get('backend') or 'windows').lower()
+            if backend not in self.BACKENDS:
+                self.errors.append(f"mt5.backend inválido: {backend} (usa {', '.join(self.BACKENDS)})")
+            if backend != 'emulator' and 'terminal_path' in self.cfg['mt5'] and not Path(self.cfg['mt5']['terminal_path']).exists():
                 self.warnings.append("Terminal MT5 no encontrado")
         
         if 'test' in self.cfg:
@@ -31,7 +38,10 @@ class ConfigValidator:
         
         if 'ea' in self.cfg and not self.cfg['ea'].get('name'):
             self.errors.append("Falta ea.name")
-        
+        return len(self.errors) == 0
+    
+    def validate(self):
+        self.check()
         print(f"\n{'='*60}\nValidación: {self.path}\n{'='*60}")
         if self.errors: print(f"\n❌ ERRORES:\n" + "\n".join(f"  {i+1}. {e}" for i,e in enumerate(self.errors)))
         if self.warnings: print(f"\n⚠️  ADVERTENCIAS:\n" + "\n".join(f"  {i+1}. {w}" for i,w in enumerate(self.warnings)))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Warm start de studies para MT5 Smart Optimizer v2
+Carga trials completados de studies previos (JSONL de trials, resultados JSON o carpetas
+de runs con report.json), los adapta al search.space actual y los inyecta o encola"""
+import json
+import math
+import re
+import statistics
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Clave de sistema en la que Optuna guarda los valores de constraints_func de cada trial
+_CONSTRAINTS_KEY = "constraints"
+# Tolerancia para recortar al rango nuevo un valor numérico que quedó fuera (fracción del ancho)
+MAP_TOLERANCE = 0.10
+
+
+@dataclass
+class PriorTrial:
+    params: Dict[str, Any]
+    value: float
+    from_: Optional[str] = None
+    to: Optional[str] = None
+    source: str = ""
+    notes: List[str] = field(default_factory=list)
+
+
+# ----------------------- Carga de fuentes -----------------------
+def _finite(v: Any) -> Optional[float]:
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return f if math.isfinite(f) else None
+
+def _load_trials_jsonl(path: Path) -> List[PriorTrial]:
+    """Registros 'trial' completos del JSONL estructurado; el rango sale del optimization_start previo"""
+    out: List[PriorTrial] = []
+    date_from = date_to = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("event") == "optimization_start":
+                date_from, date_to = rec.get("date_from"), rec.get("date_to")
+            elif rec.get("event") == "trial" and rec.get("phase", "complete") == "complete":
+                value = _finite(rec.get("value"))
+                if value is not None and isinstance(rec.get("params"), dict):
+                    out.append(PriorTrial(dict(rec["params"]), value, date_from, date_to, str(path)))
+    return out
+
+def _load_results_json(path: Path) -> List[PriorTrial]:
+    """Lista de {"params", "value", "from"?, "to"?} (o {"trials": [...]})"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    rows = data.get("trials", []) if isinstance(data, dict) else data
+    out: List[PriorTrial] = []
+    for r in rows if isinstance(rows, list) else []:
+        value = _finite(r.get("value")) if isinstance(r, dict) else None
+        if value is not None and isinstance(r.get("params"), dict):
+            out.append(PriorTrial(dict(r["params"]), value, r.get("from"), r.get("to"), str(path)))
+    return out
+
+def _load_runs_dir(path: Path) -> List[PriorTrial]:
+    """Carpeta MT5_SO: cada <run_id>/report.json aporta sus inputs y su beneficio neto"""
+    out: List[PriorTrial] = []
+    for rep in sorted(path.glob("*/report.json")):
+        try:
+            data = json.loads(rep.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        value = _finite(data.get("total_net_profit"))
+        if value is None or not isinstance(data.get("inputs"), dict):
+            continue
+        params = dict(data["inputs"])
+        if data.get("timeframe"):
+            params.setdefault("timeframe", str(data["timeframe"]).replace("PERIOD_", ""))
+        out.append(PriorTrial(params, value, data.get("start_date"), data.get("end_date"), str(rep)))
+    return out
+
+def load_prior_trials(sources: List[str]) -> List[PriorTrial]:
+    trials: List[PriorTrial] = []
+    for src in sources:
+        path = Path(src)
+        if path.is_dir():
+            trials.extend(_load_runs_dir(path))
+        elif path.suffix.lower() == ".jsonl":
+            trials.extend(_load_trials_jsonl(path))
+        elif path.is_file():
+            trials.extend(_load_results_json(path))
+        else:
+            raise RuntimeError(f"Fuente de warm start inexistente: {src}")
+    return trials
+
+
+# ----------------------- Adaptación al espacio nuevo -----------------------
+def _map_value(spec: Any, v: Any) -> Tuple[Optional[Any], str]:
+    """(valor adaptado o None si no cabe, nota) para una dimensión de search.space"""
+    kind = spec[0]
+    if kind in ("int", "float"):
+        x = _finite(v)
+        if x is None:
+            return None, "no numérico"
+        lo, hi = float(spec[1]), float(spec[2])
+        note = ""
+        if x < lo or x > hi:
+            if x < lo - (hi - lo) * MAP_TOLERANCE or x > hi + (hi - lo) * MAP_TOLERANCE:
+                return None, f"{x} fuera de [{lo}, {hi}]"
+            x, note = min(hi, max(lo, x)), "recortado"
+        return (int(round(x)) if kind == "int" else x), note
+    if kind == "choice":
+        choices = list(spec[1])
+        if v in choices:
+            return v, ""
+        x = _finite(v)
+        nums = [c for c in choices if _finite(c) is not None and not isinstance(c, bool)]
+        if x is not None and nums and len(nums) == len(choices):
+            return min(nums, key=lambda c: abs(float(c) - x)), "ajustado a la opción más cercana"
+        return None, f"{v!r} no está entre las opciones"
+    return None, f"tipo {kind} no soportado"
+
+def map_to_space(prior: PriorTrial, space: Dict[str, Any], base_inputs: Dict[str, Any]) -> Optional[PriorTrial]:
+    """
+    Adapta los params al search.space: claves ajenas se descartan, las que faltan se toman
+    de ea.inputs y los valores fuera de rango se recortan/ajustan o descartan el trial.
+    """
+    params: Dict[str, Any] = {}
+    notes: List[str] = []
+    for key, spec in space.items():
+        if key in prior.params:
+            raw, origin = prior.params[key], ""
+        elif key in base_inputs:
+            raw, origin = base_inputs[key], "de ea.inputs"
+        else:
+            return None
+        value, note = _map_value(spec, raw)
+        if value is None:
+            return None
+        params[key] = value
+        if note or origin:
+            notes.append(f"{key}: {note or origin}")
+    return replace(prior, params=params, notes=notes)
+
+
+# ----------------------- Rango de fechas -----------------------
+def _parse_date(s: Optional[str]) -> Optional[datetime]:
+    m = re.match(r"^(\d{4})[.\-/](\d{2})[.\-/](\d{2})", str(s or "").strip())
+    return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
+
+def range_overlap(a_from: Optional[str], a_to: Optional[str], b_from: Optional[str], b_to: Optional[str]) -> Optional[float]:
+    """Intersección / unión de dos rangos de fechas (None si alguno es desconocido)"""
+    a0, a1, b0, b1 = _parse_date(a_from), _parse_date(a_to), _parse_date(b_from), _parse_date(b_to)
+    if None in (a0, a1, b0, b1) or a1 <= a0 or b1 <= b0:
+        return None
+    inter = (min(a1, b1) - max(a0, b0)).total_seconds()
+    union = (max(a1, b1) - min(a0, b0)).total_seconds()
+    return max(0.0, inter) / union
+
+def downweight(trials: List[PriorTrial], from_: str, to: str) -> List[PriorTrial]:
+    """
+    Trials de otro rango de fechas: el beneficio se reescala a la duración nueva y se encoge
+    hacia la mediana en proporción al solapamiento, así pesan menos en el modelo del sampler.
+    """
+    new0, new1 = _parse_date(from_), _parse_date(to)
+    adjusted: List[PriorTrial] = []
+    for t in trials:
+        value = t.value
+        t0, t1 = _parse_date(t.from_), _parse_date(t.to)
+        if new0 and new1 and t0 and t1 and t1 > t0:
+            value *= (new1 - new0).total_seconds() / (t1 - t0).total_seconds()
+        adjusted.append(replace(t, value=value))
+    if not adjusted:
+        return adjusted
+    median = statistics.median(t.value for t in adjusted)
+    out = []
+    for t in adjusted:
+        w = range_overlap(t.from_, t.to, from_, to)
+        if w is None or w >= 1.0:
+            out.append(t)
+            continue
+        out.append(replace(t, value=median + (t.value - median) * w,
+                           notes=t.notes + [f"peso por solapamiento {w:.2f}"]))
+    return out
+
+
+# ----------------------- Aplicación al study -----------------------
+def _distributions(space: Dict[str, Any]):
+    import optuna  # type: ignore
+    dists = {}
+    for key, spec in space.items():
+        kind = spec[0]
+        if kind == "int":
+            dists[key] = optuna.distributions.IntDistribution(int(spec[1]), int(spec[2]))
+        elif kind == "float":
+            dists[key] = optuna.distributions.FloatDistribution(float(spec[1]), float(spec[2]))
+        elif kind == "choice":
+            dists[key] = optuna.distributions.CategoricalDistribution(list(spec[1]))
+    return dists
+
+def apply_warm_start(study, cfg, sources: List[str], mode: str = "inject",
+                     down_weight: bool = False, top: int = 10, constraints: Any = None) -> Dict[str, Any]:
+    """
+    inject: añade los trials previos como COMPLETE (no cuestan ejecuciones de MT5).
+    enqueue: encola los `top` mejores para re-evaluarlos en el rango/espacio actual.
+    Con constraints (ConstraintSet) los inyectados llevan su factibilidad para el TPE.
+    """
+    import optuna  # type: ignore
+    space = cfg.search.space
+    loaded = load_prior_trials(sources)
+    mapped = [m for m in (map_to_space(t, space, cfg.ea.inputs) for t in loaded) if m is not None]
+    summary: Dict[str, Any] = {"loaded": len(loaded), "dropped": len(loaded) - len(mapped),
+                               "mapped": sum(1 for t in mapped if t.notes), "applied": 0, "mode": mode}
+    if down_weight:
+        mapped = downweight(mapped, cfg.test.from_, cfg.test.to)
+
+    if mode == "enqueue":
+        best = sorted(mapped, key=lambda t: t.value, reverse=True)[:max(0, top)]
+        seen = set()
+        for t in best:
+            key = json.dumps(t.params, sort_keys=True, default=str)
+            if key in seen:
+                continue
+            seen.add(key)
+            study.enqueue_trial(t.params, user_attrs={"warm_start": t.source})
+            summary["applied"] += 1
+    elif mode == "inject":
+        dists = _distributions(space)
+        for t in mapped:
+            system_attrs = {}
+            if constraints is not None:
+                # Misma clave que escribe el TPE tras cada trial (sin ella lo daría por no factible)
+                margins = constraints.margins(t.params)
+                system_attrs[_CONSTRAINTS_KEY] = tuple(margins)
+                summary["infeasible"] = summary.get("infeasible", 0) + int(any(m > 0 for m in margins))
+            study.add_trial(optuna.trial.create_trial(
+                params=t.params, distributions=dists, value=t.value,
+                user_attrs={"warm_start": t.source, "warm_start_notes": t.notes, "warm_start_injected": True},
+                system_attrs=system_attrs,
+            ))
+            summary["applied"] += 1
+    else:
+        raise RuntimeError(f"Modo de warm start no soportado: {mode} (usa inject o enqueue)")
+    return summary